@@ -0,0 +1,27 @@
+# Generated by Django 4.2.20 on 2026-10-17 23:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0007_delete_verificationcode"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="user",
+            name="telegram_digest",
+            field=models.CharField(
+                choices=[
+                    ("instant", "Immédiat (rafales regroupées)"),
+                    ("hourly", "Récapitulatif horaire"),
+                    ("daily", "Récapitulatif quotidien"),
+                ],
+                default="instant",
+                max_length=10,
+                verbose_name="Regroupement des notifications Telegram",
+            ),
+        ),
+    ]
@@ -64,7 +64,8 @@ class User(AbstractUser):
         validators=[MinValueValidator(5), MaxValueValidator(50)],
     )
 
-    # Mémoisation des gains d'affiliation pour des performances optimales
+    # Anciens soldes mémorisés, plus mis à jour : les soldes sont tenus par le
+    # grand livre des commissions (apps/affiliate/services/commission_ledger.py)
     total_commission_earned = models.DecimalField(
         _("Total des commissions gagnées"),
         max_digits=10,
@@ -99,6 +100,16 @@ class User(AbstractUser):
             ("zh", "中文"),
         ],
     )
+    telegram_digest = models.CharField(
+        _("Regroupement des notifications Telegram"),
+        max_length=10,
+        default="instant",
+        choices=[
+            ("instant", _("Immédiat (rafales regroupées)")),
+            ("hourly", _("Récapitulatif horaire")),
+            ("daily", _("Récapitulatif quotidien")),
+        ],
+    )
 
     class Meta:
         verbose_name = _("user")
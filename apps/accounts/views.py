@@ -23,6 +23,12 @@ from .forms import (
     ProfileEditForm,
 )
 from apps.affiliate.utils import AffiliateService
+from apps.affiliate.services.attribution import (
+    get_attribution_code,
+    persist_attribution,
+    set_attribution_cookie,
+)
+from apps.affiliate.services.referral_resolver import get_referrer
 
 # Create your views here.
 
@@ -142,21 +148,17 @@ def custom_signup_view(request, site_slug=None):
     # Récupérer le code de parrainage s'il existe
     referral_code = None
 
-    # Vérifier dans l'URL, cookie, ou session
+    # Vérifier dans l'URL, puis l'attribution (cookie signé ou session)
     if "ref" in request.GET:
         referral_code = request.GET.get("ref")
-    elif getattr(settings, "AFFILIATE_COOKIE_NAME", "affiliate_code") in request.COOKIES:
-        referral_code = request.COOKIES.get(
-            getattr(settings, "AFFILIATE_COOKIE_NAME", "affiliate_code")
-        )
-    elif hasattr(request, "affiliate_code") and request.affiliate_code:
-        referral_code = request.affiliate_code
+    else:
+        referral_code = get_attribution_code(request)
 
     # Vérifier si le code est valide
     ambassador = None
     if referral_code:
         try:
-            ambassador = User.objects.get(referral_code=referral_code)
+            ambassador = get_referrer(referral_code)
             logger.info(
                 f"Code de référence valide pour l'inscription: {referral_code} ({ambassador.username})"
             )
@@ -237,6 +239,9 @@ def custom_signup_view(request, site_slug=None):
             referred_by=ambassador,
             is_active=False,  # Compte inactif jusqu'à la vérification par email
         )
+        if ambassador:
+            # Inscription effectuée : l'attribution peut désormais vivre en session
+            persist_attribution(request, referral_code)
 
         # Créer ou mettre à jour le profil utilisateur
         profile, created = UserProfile.objects.get_or_create(user=user)
@@ -380,13 +385,9 @@ def signup_redirect(request):
     if settings.AFFILIATE_REF_PARAM in request.GET:
         ref_code = request.GET.get(settings.AFFILIATE_REF_PARAM)
 
-    # Sinon, vérifier dans les cookies
-    elif settings.AFFILIATE_COOKIE_NAME in request.COOKIES:
-        ref_code = request.COOKIES.get(settings.AFFILIATE_COOKIE_NAME)
-
-    # Sinon, vérifier dans la session (middleware peut l'avoir stocké)
-    elif "affiliate_code" in request.session:
-        ref_code = request.session.get("affiliate_code")
+    # Sinon, l'attribution portée par le cookie signé (ou la session après inscription)
+    else:
+        ref_code = get_attribution_code(request)
 
     # Construire l'URL de redirection
     redirect_url = reverse("accounts:register_ambassador")
@@ -425,17 +426,8 @@ def register_ambassador_view(request):
         print(f"Code de référence détecté dans l'URL: {referral_code}", file=sys.stderr)
         logger.info(f"🔍 Code de référence détecté dans l'URL: {referral_code}")
 
-    # Récupérer depuis le cookie
-    cookie_ref_code = request.COOKIES.get(
-        getattr(settings, "AFFILIATE_COOKIE_NAME", "affiliate_code")
-    )
-    if cookie_ref_code and not referral_code:
-        referral_code = cookie_ref_code
-        print(f"Code de référence récupéré depuis le cookie: {referral_code}", file=sys.stderr)
-        logger.info(f"🔍 Code de référence récupéré depuis le cookie: {referral_code}")
-
-    # Récupérer depuis le middleware
-    middleware_code = getattr(request, "affiliate_code", None)
+    # Récupérer depuis l'attribution (cookie signé validé par le middleware)
+    middleware_code = get_attribution_code(request)
     if middleware_code and not referral_code:
         referral_code = middleware_code
         print(f"Code de référence récupéré depuis le middleware: {referral_code}", file=sys.stderr)
@@ -445,7 +437,7 @@ def register_ambassador_view(request):
     ambassador = None
     if referral_code:
         try:
-            ambassador = User.objects.get(referral_code=referral_code)
+            ambassador = get_referrer(referral_code)
             print(f"Code de référence valide, appartient à: {ambassador.username}", file=sys.stderr)
             logger.info(f"✅ Code de référence valide, appartient à: {ambassador.username}")
         except User.DoesNotExist:
@@ -470,7 +462,7 @@ def register_ambassador_view(request):
         if form_ref_code:
             # Vérifier si le code du formulaire est valide
             try:
-                form_ambassador = User.objects.get(referral_code=form_ref_code)
+                form_ambassador = get_referrer(form_ref_code)
                 referral_code = form_ref_code
                 ambassador = form_ambassador
                 logger.info(
@@ -523,6 +515,9 @@ def register_ambassador_view(request):
             referred_by=referred_by,  # Assigner directement le parrain
             is_active=False,  # Compte inactif jusqu'à la vérification par email
         )
+        if referred_by:
+            # Inscription effectuée : l'attribution peut désormais vivre en session
+            persist_attribution(request, referral_code)
 
         # 5. AMÉLIORATION: Traitement plus robuste de l'affiliation
         if referral_code and ambassador:
@@ -610,16 +605,8 @@ def register_ambassador_view(request):
 
         # Rediriger vers la page de confirmation d'envoi d'email
         if referral_code:
-            cookie_name = getattr(settings, "AFFILIATE_COOKIE_NAME", "affiliate_code")
-            cookie_age = getattr(settings, "AFFILIATE_COOKIE_AGE", 60 * 60 * 24 * 30)
             response = redirect("accounts:activation_sent")
-            response.set_cookie(
-                cookie_name,
-                referral_code,
-                max_age=cookie_age,
-                httponly=True,
-                samesite="Lax",
-            )
+            set_attribution_cookie(response, referral_code, request)
             return response
 
         return redirect("accounts:activation_sent")
@@ -677,25 +664,11 @@ def activate_account(request, uidb64, token):
 
                         notifier = TelegramNotifier()
 
-                        # Implémentation de retry
-                        max_attempts = 3
-                        for attempt in range(1, max_attempts + 1):
-                            telegram_success = notifier.send_new_ambassador_notification(
-                                ambassador, user
+                        # Mise en file : les reprises sont assurées par le dispatcher
+                        if notifier.send_new_ambassador_notification(ambassador, user):
+                            logger.info(
+                                f"✅ Notification Telegram mise en file pour {ambassador.username}"
                             )
-                            if telegram_success:
-                                logger.info(
-                                    f"✅ Notification Telegram envoyée à {ambassador.username} (tentative {attempt}/{max_attempts})"
-                                )
-                                break
-                            else:
-                                logger.warning(
-                                    f"⚠️ Échec de l'envoi de la notification Telegram à {ambassador.username} (tentative {attempt}/{max_attempts})"
-                                )
-                                if attempt < max_attempts:
-                                    import time
-
-                                    time.sleep(1)  # Attendre 1 seconde avant de réessayer
                     except Exception as e:
                         logger.error(
                             f"❌ Erreur lors de l'envoi de la notification Telegram: {str(e)}",
@@ -4,11 +4,24 @@ from .models import (
     Referral,
     Commission,
     CommissionRate,
+    CommissionRecalculation,
+    ExternalPayment,
     Payout,
     WhiteLabel,
     PaymentMethod,
     AffiliateProfile,
+    AffiliateDailyStats,
+    OutboxEvent,
+    RateChangeAudit,
 )
+from .services.bulk_payout import settle_commissions
+from .services.commission_export import commission_export_response
+from .services.commission_ledger import record_ledger_transitions
+from .services.daily_stats import record_commission_transitions, record_payout_completions
+from .services.dashboard_stats import commission_stats_owners, invalidate_stats
+from .services.outbox import requeue_dead
+from .services.profile_counters import record_earnings_transitions
+from django.db import transaction
 from django.utils import timezone
 from django.utils.html import format_html
 from django.urls import reverse
@@ -37,18 +50,38 @@ class CommissionAdmin(admin.ModelAdmin):
     list_filter = ("status", "created_at", "paid_at", "user")
     search_fields = ("user__username", "amount", "status")
     date_hierarchy = "created_at"
-    actions = ["mark_as_paid", "mark_as_rejected"]
+    actions = ["mark_as_paid", "mark_as_rejected", "export_as_csv", "export_as_ndjson_gz"]
 
     def mark_as_paid(self, request, queryset):
-        queryset.update(status="paid", paid_at=timezone.now())
+        with transaction.atomic():
+            record_ledger_transitions(queryset, "paid")
+            record_commission_transitions(queryset, "paid")
+            record_earnings_transitions(queryset, "paid")
+            invalidate_stats(*commission_stats_owners(queryset))
+            queryset.update(status="paid", paid_at=timezone.now())
 
     mark_as_paid.short_description = "Marquer comme payé"
 
     def mark_as_rejected(self, request, queryset):
-        queryset.update(status="rejected")
+        with transaction.atomic():
+            record_ledger_transitions(queryset, "rejected")
+            record_commission_transitions(queryset, "rejected")
+            record_earnings_transitions(queryset, "rejected")
+            invalidate_stats(*commission_stats_owners(queryset))
+            queryset.update(status="rejected")
 
     mark_as_rejected.short_description = "Marquer comme rejeté"
 
+    def export_as_csv(self, request, queryset):
+        return commission_export_response(queryset, export_format="csv")
+
+    export_as_csv.short_description = "Exporter en CSV"
+
+    def export_as_ndjson_gz(self, request, queryset):
+        return commission_export_response(queryset, export_format="ndjson", compress=True)
+
+    export_as_ndjson_gz.short_description = "Exporter en NDJSON compressé (gzip)"
+
 
 @admin.register(CommissionRate)
 class CommissionRateAdmin(admin.ModelAdmin):
@@ -73,16 +106,105 @@ class PayoutAdmin(admin.ModelAdmin):
     actions = ["mark_as_completed", "mark_as_failed"]
 
     def mark_as_completed(self, request, queryset):
-        queryset.update(status="completed", completed_at=timezone.now())
+        now = timezone.now()
+        with transaction.atomic():
+            record_payout_completions(queryset)
+            invalidate_stats(*queryset.values_list("ambassador_id", flat=True))
+            settle_commissions(
+                Commission.objects.filter(payouts__in=queryset.exclude(status="completed")), now
+            )
+            queryset.update(status="completed", completed_at=now)
 
     mark_as_completed.short_description = "Marquer comme complété"
 
     def mark_as_failed(self, request, queryset):
-        queryset.update(status="failed")
+        with transaction.atomic():
+            invalidate_stats(*queryset.values_list("ambassador_id", flat=True))
+            queryset.update(status="failed")
 
     mark_as_failed.short_description = "Marquer comme échoué"
 
 
+@admin.register(AffiliateDailyStats)
+class AffiliateDailyStatsAdmin(admin.ModelAdmin):
+    list_display = (
+        "ambassador",
+        "date",
+        "clicks",
+        "referrals",
+        "commissions_paid",
+        "payouts_amount",
+    )
+    list_filter = ("date",)
+    search_fields = ("ambassador__username",)
+    date_hierarchy = "date"
+
+
+@admin.register(OutboxEvent)
+class OutboxEventAdmin(admin.ModelAdmin):
+    list_display = (
+        "id",
+        "topic",
+        "aggregate_type",
+        "aggregate_id",
+        "status",
+        "attempts",
+        "created_at",
+    )
+    list_filter = ("status", "topic")
+    search_fields = ("aggregate_id", "last_error")
+    readonly_fields = ("created_at", "delivered_at")
+    actions = ["requeue"]
+
+    def requeue(self, request, queryset):
+        count = requeue_dead(queryset)
+        self.message_user(request, f"{count} événements remis en file")
+
+    requeue.short_description = "Rejouer les événements abandonnés"
+
+
+@admin.register(CommissionRecalculation)
+class CommissionRecalculationAdmin(admin.ModelAdmin):
+    list_display = (
+        "id",
+        "status",
+        "scanned",
+        "changed",
+        "amount_before",
+        "amount_after",
+        "created_at",
+        "completed_at",
+    )
+    list_filter = ("status",)
+    readonly_fields = [field.name for field in CommissionRecalculation._meta.fields]
+
+
+@admin.register(RateChangeAudit)
+class RateChangeAuditAdmin(admin.ModelAdmin):
+    list_display = (
+        "created_at",
+        "admin",
+        "operation",
+        "scope",
+        "ambassadors_count",
+        "pending_commissions",
+        "pending_amount",
+        "projected_amount",
+    )
+    list_filter = ("operation", "scope", "created_at")
+    search_fields = ("admin__username",)
+    readonly_fields = [field.name for field in RateChangeAudit._meta.fields]
+
+
+@admin.register(ExternalPayment)
+class ExternalPaymentAdmin(admin.ModelAdmin):
+    list_display = ("source", "payment_id", "user", "amount", "payment_date", "created_at")
+    list_filter = ("source", "created_at")
+    search_fields = ("payment_id", "user__username")
+    raw_id_fields = ("user",)
+    readonly_fields = [field.name for field in ExternalPayment._meta.fields]
+
+
 @admin.register(WhiteLabel)
 class WhiteLabelAdmin(admin.ModelAdmin):
     list_display = ("name", "domain", "ambassador", "is_active", "created_at")
@@ -126,6 +248,7 @@ class AffiliateProfileAdmin(admin.ModelAdmin):
     list_display = (
         "user",
         "points",
+        "total_clicks",
         "total_earnings",
         "total_referrals",
         "conversion_rate",
@@ -6,14 +6,13 @@ import json
 import hashlib
 import hmac
 import logging
+from collections import Counter
 from decimal import Decimal
 from django.contrib.auth import get_user_model
-from django.utils import timezone
 
 from apps.accounts.models import User
-from apps.affiliate.models import Referral, Commission
-from apps.dashboard.telegram_bot import TelegramNotifier
-from apps.affiliate.services import SupabaseService
+from apps.affiliate.services.external_payments import register_payments
+from apps.affiliate.services.external_signups import ingest_events
 
 logger = logging.getLogger(__name__)
 User = get_user_model()
@@ -21,15 +20,27 @@ User = get_user_model()
 # Clé d'API pour sécuriser les requêtes
 API_KEY = getattr(settings, "EXTERNAL_API_KEY", "change_this_to_a_secret_key")
 
+# Code HTTP de register_external_escort pour chaque refus de ingest_events
+ESCORT_REJECTION_STATUS = {
+    "invalid": 400,
+    "username_taken": 409,
+    "already_referred": 409,
+    "duplicate": 409,
+}
 
-def verify_signature(request):
-    """Vérifie la signature de la requête pour s'assurer qu'elle provient d'une source autorisée."""
+
+def verify_signature(request, body=None):
+    """
+    Vérifie la signature de la requête pour s'assurer qu'elle provient d'une source autorisée.
+
+    ``body`` : corps déjà lu par la vue (par défaut ``request.body``).
+    """
     provided_signature = request.headers.get("X-Api-Signature")
     if not provided_signature:
         return False
 
     # Calculer la signature attendue
-    body = request.body
+    body = request.body if body is None else body
     expected_signature = hmac.new(API_KEY.encode(), body, hashlib.sha256).hexdigest()
 
     # Comparer les signatures (constante pour éviter les attaques timing)
@@ -65,89 +76,29 @@ def register_external_escort(request):
                 logger.error(f"Champ manquant dans la requête: {field}")
                 return JsonResponse({"error": f"Champ manquant: {field}"}, status=400)
 
-        # Récupérer l'ambassadeur
-        try:
-            ambassador = User.objects.get(referral_code=data["affiliate_id"])
-            logger.info(f"Ambassadeur trouvé: {ambassador.username}")
-        except User.DoesNotExist:
+        # Même traitement que les lots : pas de hachage de mot de passe, parrainage
+        # et notification Telegram (outbox) créés avec l'utilisateur
+        result = ingest_events([{"event": "signup", **data}])[0]
+        if result["status"] == "invalid_code":
             logger.warning(f"Aucun ambassadeur trouvé avec le code: {data['affiliate_id']}")
             return JsonResponse({"error": "Code d'affiliation invalide"}, status=404)
-
-        # Créer l'utilisateur escorte
-        escort = User.objects.create_user(
-            username=data["escort_username"],
-            email=data["escort_email"],
-            password=User.objects.make_random_password(),
-            user_type="escort",
-            referred_by=ambassador,
-            is_active=True,
-        )
-
-        # Créer la relation de référence
-        referral = Referral.objects.create(
-            ambassador=ambassador,
-            referred_user=escort,
-            is_active=True,
-            created_at=timezone.now(),
-            total_earnings=0,
-        )
-
-        # Synchroniser avec Supabase
-        supabase_service = SupabaseService()
-        supabase_service.sync_referral(referral)
-
-        # Envoyer une notification Telegram à l'ambassadeur
-        try:
-            notifier = TelegramNotifier()
-
-            if ambassador.telegram_chat_id:
-                # Messages multilingues
-                languages = {
-                    "en": f"New escort registered through your referral link: {escort.username}",
-                    "fr": f"Nouvelle escorte inscrite via votre lien de parrainage : {escort.username}",
-                    "es": f"Nueva escort registrada a través de tu enlace de referido: {escort.username}",
-                    "de": f"Neue Escort über Ihren Empfehlungslink registriert: {escort.username}",
-                    "ru": f"Новая эскорт зарегистрирована по вашей реферальной ссылке: {escort.username}",
-                    "zh": f"通过您的推荐链接注册的新伴游：{escort.username}",
-                    "it": f"Nuova escort registrata tramite il tuo link di referral: {escort.username}",
-                    "ar": f"تم تسجيل مرافقة جديدة من خلال رابط الإحالة الخاص بك: {escort.username}",
-                }
-
-                # Déterminer la langue de l'utilisateur
-                lang = (
-                    ambassador.telegram_language
-                    if ambassador.telegram_language in languages
-                    else "en"
-                )
-                message = languages[lang]
-
-                # Titre de la notification
-                titles = {
-                    "en": "New Referral",
-                    "fr": "Nouveau Parrainage",
-                    "es": "Nueva Referencia",
-                    "de": "Neue Empfehlung",
-                    "ru": "Новая Реферальная",
-                    "zh": "新推荐",
-                    "it": "Nuovo Referral",
-                    "ar": "إحالة جديدة",
-                }
-                title = titles.get(lang, titles["en"])
-
-                # Envoyer la notification
-                notifier.send_message(
-                    chat_id=ambassador.telegram_chat_id,
-                    message=f"*{title}*\n\n{message}",
-                )
-        except Exception as e:
-            logger.error(f"Error sending Telegram notification: {str(e)}")
+        # Statuts de refus, sans écriture ; tous les autres ont été validés en base
+        if result["status"] in ESCORT_REJECTION_STATUS:
+            return JsonResponse(
+                {"error": result["message"], "status": result["status"]},
+                status=ESCORT_REJECTION_STATUS[result["status"]],
+            )
 
         return JsonResponse(
             {
                 "success": True,
-                "message": "Escort registered successfully",
-                "escort_id": str(escort.id),
-                "referral_id": str(referral.id),
+                "message": (
+                    "Escort already registered"
+                    if result["status"] == "exists"
+                    else "Escort registered successfully"
+                ),
+                "escort_id": result["user_id"],
+                "referral_id": result["referral_id"],
             }
         )
 
@@ -174,6 +125,9 @@ def register_external_payment(request):
         "payment_date": "2023-05-15T14:30:00Z",
         "description": "Premium subscription payment"
     }
+
+    Un paiement déjà enregistré (même source et payment_id) n'est pas compté
+    deux fois. Pour plusieurs paiements, voir ``register_external_payments``.
     """
     # Vérifier l'authentification
     if not verify_signature(request):
@@ -181,72 +135,29 @@ def register_external_payment(request):
         return JsonResponse({"status": "error", "message": "Unauthorized"}, status=401)
 
     try:
-        data = json.loads(request.body)
-        username = data.get("username")
-        amount = data.get("amount")
-        source = data.get("source", "unknown")
-        payment_id = data.get("payment_id")
-        data.get("payment_date")
-        description = data.get("description", "External payment")
-
-        if not username or not amount or not payment_id:
-            return JsonResponse(
-                {"status": "error", "message": "Missing required fields"}, status=400
-            )
-
-        # Vérifier si l'escorte existe
-        try:
-            escort = User.objects.get(username=username)
-        except User.DoesNotExist:
-            return JsonResponse(
-                {"status": "error", "message": f"User {username} not found"}, status=404
-            )
-
-        # Vérifier si l'escorte a un référent
-        if not escort.referred_by:
-            return JsonResponse(
-                {"status": "warning", "message": f"User {username} has no referrer"},
-                status=200,
-            )
-
-        # Calculer la commission (à personnaliser selon votre modèle économique)
-        # Par exemple, 10% du montant du paiement
-        commission_amount = amount * 0.10
-
-        # Créer l'entrée Commission
-        commission = Commission.objects.create(
-            referral=Referral.objects.get(ambassador=escort.referred_by, referred_user=escort),
-            amount=commission_amount,
-            description=f"{description} - {source} - {payment_id}",
-            status="approved",  # Ou 'pending' selon votre logique métier
-        )
-
-        # Mettre à jour le total des gains dans Referral
-        referral = commission.referral
-        referral.total_earnings += Decimal(str(commission_amount))
-        referral.save()
-
-        # Envoyer une notification Telegram au référent
-        try:
-            notifier = TelegramNotifier()
-            # Utiliser la méthode dédiée pour envoyer une notification de commission
-            notification_sent = notifier.send_commission_notification(
-                referrer=escort.referred_by,
-                referred_user=escort,
-                amount=commission_amount,
-                total_earnings=referral.total_earnings,
-            )
-        except Exception as e:
-            logger.error(f"Error sending Telegram notification: {str(e)}")
-            notification_sent = False
+        data = json.loads(request.body, parse_float=Decimal)
+        if not isinstance(data, dict):
+            return JsonResponse({"status": "error", "message": "Invalid JSON"}, status=400)
+
+        result = register_payments([data])[0]
+        if result["status"] == "invalid":
+            return JsonResponse({"status": "error", "message": result["message"]}, status=400)
+        if result["status"] == "unknown_user":
+            return JsonResponse({"status": "error", "message": result["message"]}, status=404)
+        if result["status"] == "no_referrer":
+            return JsonResponse({"status": "warning", "message": result["message"]}, status=200)
 
         return JsonResponse(
             {
                 "status": "success",
-                "message": "Payment registered successfully",
-                "commission_id": commission.id,
-                "commission_amount": float(commission_amount),
-                "notification_sent": notification_sent,
+                "message": (
+                    "Payment registered successfully"
+                    if result["status"] == "created"
+                    else "Payment already registered"
+                ),
+                "duplicate": result["status"] == "duplicate",
+                "commission_id": result["commission_id"],
+                "commission_amount": result["commission_amount"],
             }
         )
 
@@ -255,3 +166,134 @@ def register_external_payment(request):
     except Exception as e:
         logger.exception(f"Error in register_external_payment: {str(e)}")
         return JsonResponse({"status": "error", "message": str(e)}, status=500)
+
+
+def _parse_batch(body, key):
+    """
+    Éléments d'un corps de requête : tableau JSON, objet ``{key: [...]}`` ou
+    NDJSON (un objet par ligne). Lève ``ValueError`` si le corps est invalide.
+    """
+    text = body.decode("utf-8")
+    try:
+        data = json.loads(text, parse_float=Decimal)
+    except json.JSONDecodeError:
+        data = []
+        for number, line in enumerate(text.splitlines(), start=1):
+            if not line.strip():
+                continue
+            try:
+                data.append(json.loads(line, parse_float=Decimal))
+            except json.JSONDecodeError as e:
+                raise ValueError(f"Invalid JSON on line {number}: {e.msg}")
+
+    if isinstance(data, dict):
+        data = data.get(key, [data])
+    if not isinstance(data, list):
+        raise ValueError(f"Expected a JSON array of {key}")
+    return data
+
+
+def _read_signed_batch(request, key, max_body, max_batch):
+    """
+    Lit et vérifie un lot signé par ``X-Api-Signature`` (une vérification
+    pour tout le corps). Retourne ``(éléments, None)`` ou ``(None, réponse d'erreur)``.
+    """
+    try:
+        length = int(request.META.get("CONTENT_LENGTH") or 0)
+    except ValueError:
+        length = 0
+    if length > max_body:
+        return None, JsonResponse(
+            {"status": "error", "message": "Request body too large"}, status=413
+        )
+
+    # Lecture directe : DATA_UPLOAD_MAX_MEMORY_SIZE limiterait le lot bien en deçà
+    body = request.read(length)
+    if not verify_signature(request, body):
+        logger.warning(f"Tentative d'accès non autorisé à l'API {request.path}")
+        return None, JsonResponse({"status": "error", "message": "Unauthorized"}, status=401)
+
+    try:
+        items = _parse_batch(body, key)
+    except (UnicodeDecodeError, ValueError) as e:
+        return None, JsonResponse({"status": "error", "message": str(e)}, status=400)
+
+    if len(items) > max_batch:
+        return None, JsonResponse(
+            {"status": "error", "message": f"Too many {key} (max {max_batch} per request)"},
+            status=413,
+        )
+    return items, None
+
+
+def _batch_response(results):
+    return JsonResponse(
+        {
+            "status": "success",
+            "count": len(results),
+            "summary": dict(Counter(result["status"] for result in results)),
+            "results": results,
+        }
+    )
+
+
+@csrf_exempt
+@require_POST
+def register_external_payments(request):
+    """
+    Enregistre un lot de paiements externes : tableau JSON (ou objet
+    ``{"payments": [...]}``) ou NDJSON, un paiement par élément au format de
+    ``register_external_payment``. La signature ``X-Api-Signature`` porte sur
+    le corps entier.
+
+    Idempotent par (source, payment_id) : un partenaire peut renvoyer les
+    paiements d'une journée entière, seuls les nouveaux créent des
+    commissions. La réponse donne un résultat par paiement, dans l'ordre.
+    """
+    payments, error = _read_signed_batch(
+        request,
+        "payments",
+        settings.AFFILIATE_EXTERNAL_PAYMENTS_MAX_BODY,
+        settings.AFFILIATE_EXTERNAL_PAYMENTS_MAX_BATCH,
+    )
+    if error:
+        return error
+
+    try:
+        results = register_payments(payments)
+    except Exception as e:
+        logger.exception(f"Error in register_external_payments: {str(e)}")
+        return JsonResponse({"status": "error", "message": "Internal server error"}, status=500)
+    return _batch_response(results)
+
+
+@csrf_exempt
+@require_POST
+def register_external_events(request):
+    """
+    Enregistre un lot d'inscriptions et de parrainages d'un site white label :
+    tableau JSON (ou objet ``{"events": [...]}``) ou NDJSON, signé une fois
+    par ``X-Api-Signature``.
+
+    Exemple d'événements:
+    {"event": "signup", "ref_code": "AMB12345", "username": "escort_1", "email": "e1@example.com"}
+    {"event": "referral", "ref_code": "AMB12345", "user_id": "<id Supabase>", "username": "bob"}
+
+    Rejouer un lot ne crée rien. La réponse donne un résultat par événement,
+    dans l'ordre (voir ``services/external_signups.py``).
+    """
+    events, error = _read_signed_batch(
+        request,
+        "events",
+        settings.AFFILIATE_EXTERNAL_EVENTS_MAX_BODY,
+        settings.AFFILIATE_EXTERNAL_EVENTS_MAX_BATCH,
+    )
+    if error:
+        return error
+
+    try:
+        results = ingest_events(events)
+    except Exception as e:
+        logger.exception(f"Error in register_external_events: {str(e)}")
+        return JsonResponse({"status": "error", "message": "Internal server error"}, status=500)
+    return _batch_response(results)
@@ -0,0 +1,103 @@
+from collections import OrderedDict
+
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+from ..services.keyset import (
+    DEFAULT_ORDERING,
+    InvalidCursor,
+    KeysetPaginator,
+    approximate_count,
+)
+
+
+class KeysetCursorPagination(BasePagination):
+    """
+    Pagination par curseur opaque sur ``(created_at, id)``.
+
+    La vue peut changer la clé avec ``keyset_ordering``. Aucun total par
+    défaut ; ``?count=approx`` ajoute un total estimé et mis en cache.
+    """
+
+    cursor_query_param = "cursor"
+    page_size = api_settings.PAGE_SIZE
+    page_size_query_param = "page_size"
+    max_page_size = 100
+    count_query_param = "count"
+    invalid_cursor_message = "Curseur invalide."
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        ordering = getattr(view, "keyset_ordering", DEFAULT_ORDERING)
+        paginator = KeysetPaginator(queryset, self.get_page_size(request), ordering)
+        try:
+            self.page = paginator.page(request.query_params.get(self.cursor_query_param))
+        except InvalidCursor:
+            raise NotFound(self.invalid_cursor_message)
+
+        self.count = None
+        if request.query_params.get(self.count_query_param) == "approx":
+            self.count = approximate_count(queryset)
+        return list(self.page)
+
+    def _link(self, cursor):
+        if cursor is None:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, cursor)
+
+    def get_paginated_response(self, data):
+        payload = OrderedDict(
+            [
+                ("next", self._link(self.page.next_cursor)),
+                ("previous", self._link(self.page.previous_cursor)),
+            ]
+        )
+        if self.count is not None:
+            payload["approximate_count"] = self.count
+        payload["results"] = data
+        return Response(payload)
+
+    def get_paginated_response_schema(self, schema):
+        properties = {
+            "next": {"type": "string", "nullable": True, "format": "uri"},
+            "previous": {"type": "string", "nullable": True, "format": "uri"},
+            "approximate_count": {"type": "integer"},
+            "results": schema,
+        }
+        return {"type": "object", "properties": properties}
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            {
+                "name": self.cursor_query_param,
+                "required": False,
+                "in": "query",
+                "description": "Curseur opaque renvoyé par « next » ou « previous ».",
+                "schema": {"type": "string"},
+            },
+            {
+                "name": self.page_size_query_param,
+                "required": False,
+                "in": "query",
+                "description": f"Taille de page (maximum {self.max_page_size}).",
+                "schema": {"type": "integer"},
+            },
+            {
+                "name": self.count_query_param,
+                "required": False,
+                "in": "query",
+                "description": "« approx » pour un total estimé et mis en cache.",
+                "schema": {"type": "string", "enum": ["approx"]},
+            },
+        ]
@@ -1,10 +1,23 @@
+from django.conf import settings
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from . import views
+from . import register_external_events, register_external_payments
 from rest_framework import permissions
 from drf_yasg.views import get_schema_view
 from drf_yasg import openapi
 
+external_referral_view = views.ExternalReferralAPI.as_view()
+public_whitelabels_view = views.PublicWhiteLabelAPI.as_view()
+referral_signup_view = views.ReferralSignupAPI.as_view()
+if settings.AFFILIATE_ASYNC_VIEWS:
+    # Mode ASGI : mêmes URL, servies par les vues asynchrones
+    from .. import async_views
+
+    external_referral_view = async_views.external_referral
+    public_whitelabels_view = async_views.public_whitelabels
+    referral_signup_view = async_views.referral_signup
+
 router = DefaultRouter()
 router.register(r"referral-clicks", views.ReferralClickViewSet, basename="referral-click")
 router.register(r"referrals", views.ReferralViewSet, basename="referral")
@@ -36,7 +49,17 @@ urlpatterns = [
     path("redoc/", schema_view.with_ui("redoc", cache_timeout=0), name="schema-redoc"),
     
     # Nouveaux endpoints publics
-    path("external/referral/", views.ExternalReferralAPI.as_view(), name="external-referral"),
-    path("public/whitelabels/", views.PublicWhiteLabelAPI.as_view(), name="public-whitelabels"),
-    path("signup/referral/", views.ReferralSignupAPI.as_view(), name="signup-referral"),
+    path("external/referral/", external_referral_view, name="external-referral"),
+    path("public/whitelabels/", public_whitelabels_view, name="public-whitelabels"),
+    path("signup/referral/", referral_signup_view, name="signup-referral"),
+    path(
+        "external/payments/batch/",
+        register_external_payments,
+        name="external-payments-batch",
+    ),
+    path(
+        "external/events/batch/",
+        register_external_events,
+        name="external-events-batch",
+    ),
 ]
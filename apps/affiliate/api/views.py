@@ -4,11 +4,10 @@ from rest_framework.response import Response
 from rest_framework.views import APIView
 from django.db.models import Sum
 from django.utils import timezone
-from django.http import HttpResponse
 from django.conf import settings
-import csv
 from django.contrib.auth import get_user_model
 from django.shortcuts import get_object_or_404
+import logging
 import uuid
 
 from ..models import (
@@ -31,8 +30,17 @@ from ..serializers import (
 )
 from ..services import SupabaseService
 from ..services.telegram_service import TelegramService
+from ..services.referral_resolver import get_referrer
+from ..services.commission_ledger import ambassador_balance
+from .pagination import KeysetCursorPagination
+from ..services.commission_export import (
+    ExportError,
+    commission_export_response,
+    filter_commissions,
+)
 
 User = get_user_model()
+logger = logging.getLogger(__name__)
 
 
 class IsAmbassador(permissions.BasePermission):
@@ -46,27 +54,33 @@ class IsEscort(permissions.BasePermission):
 
 
 class ReferralClickViewSet(viewsets.ModelViewSet):
-    queryset = ReferralClick.objects.all()
+    queryset = ReferralClick.objects.select_related("user")
     serializer_class = ReferralClickSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = KeysetCursorPagination
+    keyset_ordering = ("-clicked_at", "-id")
 
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
 
 
 class ReferralViewSet(viewsets.ModelViewSet):
-    queryset = Referral.objects.all()
+    queryset = Referral.objects.select_related("referrer", "referred")
     serializer_class = ReferralSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = KeysetCursorPagination
 
     def get_queryset(self):
         return self.queryset.filter(referrer=self.request.user)
 
 
 class CommissionViewSet(viewsets.ModelViewSet):
-    queryset = Commission.objects.all()
+    queryset = Commission.objects.select_related(
+        "user", "referral__referrer", "referral__referred"
+    )
     serializer_class = CommissionSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = KeysetCursorPagination
 
     def get_queryset(self):
         return self.queryset.filter(user=self.request.user)
@@ -79,38 +93,43 @@ class CommissionViewSet(viewsets.ModelViewSet):
         commission.save()
         return Response({"status": "commission marked as paid"})
 
-    @action(detail=False, methods=["get"])
-    def export_csv(self, request):
+    def _export(self, request, export_format):
         queryset = self.get_queryset()
-        response = HttpResponse(content_type="text/csv")
-        response["Content-Disposition"] = 'attachment; filename="commissions.csv"'
-        writer = csv.writer(response)
-        writer.writerow(
-            [
-                "ID",
-                "User",
-                "Referral",
-                "Amount",
-                "Status",
-                "Transaction ID",
-                "Created At",
-                "Paid At",
-            ]
-        )
-        for commission in queryset:
-            writer.writerow(
-                [
-                    commission.id,
-                    commission.user.username,
-                    commission.referral.id if commission.referral else "",
-                    commission.amount,
-                    commission.status,
-                    commission.transaction_id,
-                    commission.created_at,
-                    commission.paid_at,
-                ]
+        filename = f"commissions-{request.user.username}"
+
+        # Export de tous les ambassadeurs réservé au staff
+        if request.query_params.get("scope") == "all":
+            if not request.user.is_staff:
+                return Response(
+                    {"error": "Export global réservé aux administrateurs."},
+                    status=status.HTTP_403_FORBIDDEN,
+                )
+            queryset = Commission.objects.all()
+            filename = "commissions"
+            ambassador = request.query_params.get("ambassador")
+            if ambassador:
+                queryset = queryset.filter(user__username=ambassador)
+
+        compress = request.query_params.get("gzip") in ("1", "true")
+        try:
+            queryset = filter_commissions(queryset, request.query_params)
+            return commission_export_response(
+                queryset, export_format=export_format, compress=compress, filename=filename
             )
-        return response
+        except ExportError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    @action(detail=False, methods=["get"])
+    def export_csv(self, request):
+        return self._export(request, "csv")
+
+    @action(detail=False, methods=["get"])
+    def export(self, request):
+        """
+        Export en flux : ``?file_format=csv|ndjson&gzip=1&status=&date_from=&date_to=``.
+        Le staff peut exporter tous les ambassadeurs avec ``scope=all``.
+        """
+        return self._export(request, request.query_params.get("file_format", "csv"))
 
 
 class CommissionRateViewSet(viewsets.ModelViewSet):
@@ -139,8 +158,14 @@ class PayoutViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
-        # Vérifier le solde disponible
-        available_balance = request.user.pending_commission
+        # Vérifier le solde disponible (grand livre), hors paiements déjà en cours
+        in_progress = (
+            Payout.objects.filter(ambassador=request.user, status="processing")
+            .exclude(pk=payout.pk)
+            .aggregate(total=Sum("amount"))["total"]
+            or 0
+        )
+        available_balance = ambassador_balance(request.user.id).available - in_progress
         if available_balance < payout.amount:
             return Response({"error": "Solde insuffisant."}, status=status.HTTP_400_BAD_REQUEST)
 
@@ -236,7 +261,7 @@ class ExternalReferralAPI(APIView):
         
         # Trouver l'ambassadeur par code de parrainage
         try:
-            referrer = User.objects.get(referral_code=ref_code, is_active=True)
+            referrer = get_referrer(ref_code)
         except User.DoesNotExist:
             return Response(
                 {"error": "Code de parrainage invalide."}, 
@@ -267,11 +292,8 @@ class ExternalReferralAPI(APIView):
             }
         )
         
-        # Envoyer notification Telegram seulement si nouvelle référence
-        if ref_created:
-            telegram_service = TelegramService()
-            telegram_service.notify_new_referral(referrer, referred)
-        
+        # La notification Telegram d'un nouveau parrainage est publiée dans l'outbox par Referral.save
+
         return Response({
             "success": True,
             "message": "Parrainage enregistré avec succès.",
@@ -400,7 +422,7 @@ class ReferralSignupAPI(APIView):
         
         # Vérifier la validité du code de parrainage
         try:
-            ambassador = User.objects.get(referral_code=referral_code, is_active=True)
+            ambassador = get_referrer(referral_code)
         except User.DoesNotExist:
             return Response({
                 "success": False, 
@@ -438,14 +460,9 @@ class ReferralSignupAPI(APIView):
                 referral_code=referral_code
             )
             
-            # Envoyer notification Telegram
-            telegram_service = TelegramService()
-            telegram_service.notify_new_referral(
-                ambassador, 
-                referred_user, 
-                custom_message=f"Source: {source}"
-            )
-            
+            # La notification Telegram est publiée dans l'outbox par Referral.save
+            logger.info(f"✅ Parrainage {referral.id} enregistré via l'API (source: {source})")
+
             return Response({
                 "success": True,
                 "message": "Parrainage enregistré avec succès.",
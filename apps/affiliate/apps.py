@@ -7,4 +7,21 @@ class AffiliateConfig(AppConfig):
     verbose_name = "Système d'affiliation"
 
     def ready(self):
-        pass
+        # Invalidation du cache des codes de parrainage sur modification d'un utilisateur
+        from .services import referral_resolver  # noqa: F401
+
+        # Maintenance incrémentale des statistiques quotidiennes et des compteurs
+        from .services import daily_stats  # noqa: F401
+        from . import signals  # noqa: F401
+
+        # Invalidation du cache des tableaux de bord (version par ambassadeur)
+        from .services import dashboard_stats  # noqa: F401
+
+        # Table de fermeture du graphe de parrainage (suit User.referred_by)
+        from .services import referral_tree  # noqa: F401
+
+        # Grand livre des commissions (soldes des ambassadeurs)
+        from .services import commission_ledger  # noqa: F401
+
+        # Table en mémoire des taux de commission (invalidée sur CommissionRate / UserProfile)
+        from .services import rate_resolver  # noqa: F401
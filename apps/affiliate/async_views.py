@@ -0,0 +1,240 @@
+"""
+Versions asynchrones des endpoints dominés par les E/S (mode ASGI).
+
+Servies lorsque ``AFFILIATE_ASYNC_VIEWS`` est actif (par défaut avec
+``core.asgi``, voir la section « Production » du README) : un worker uvicorn
+traite de nombreuses requêtes à la fois pendant qu'elles attendent la base ou
+le cache, là où un worker gunicorn synchrone n'en traite qu'une.
+
+Les endpoints gardent les mêmes URL, paramètres et réponses que leurs
+équivalents synchrones (``views.track_click``, ``api.views.ExternalReferralAPI``,
+``PublicWhiteLabelAPI``, ``ReferralSignupAPI`` et le webhook de paiement).
+Les notifications Telegram et la synchronisation Supabase partent par
+l'outbox : aucun appel HTTP sortant n'est fait pendant la requête.
+
+Django 4.2 n'adapte pas ``csrf_exempt`` ni ``require_POST`` aux vues
+asynchrones : l'exemption CSRF est posée directement sur la vue et la méthode
+vérifiée dans la vue.
+"""
+
+import json
+import logging
+import uuid
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import transaction
+from django.http import HttpResponse, HttpResponseNotAllowed, JsonResponse
+
+from apps.accounts.models import User
+
+from .models import Referral, WhiteLabel
+from .services.click_ingestion import enqueue_click
+from .services.referral_resolver import aget_referrer, aresolve_referral_code
+from .services.telegram_service import TelegramService
+from .services.webhook_handler import WebhookHandler
+from .views import TRACKING_PIXEL
+
+logger = logging.getLogger(__name__)
+
+webhook_handler = WebhookHandler()
+
+
+def _request_data(request):
+    """Corps JSON ou formulaire, comme les parseurs par défaut de DRF."""
+    if request.content_type == "application/json":
+        try:
+            data = json.loads(request.body or b"{}")
+        except ValueError:
+            return None
+        return data if isinstance(data, dict) else None
+    return request.POST
+
+
+async def track_click(request, referral_code):
+    """Pixel de suivi : code vérifié dans le LRU local, clic mis en tampon."""
+    if await aresolve_referral_code(referral_code) is not None:
+        await sync_to_async(enqueue_click)(request, referral_code)
+    return HttpResponse(TRACKING_PIXEL, content_type="image/gif")
+
+
+track_click.csrf_exempt = True
+
+
+async def external_referral(request):
+    """Équivalent asynchrone de ``ExternalReferralAPI``."""
+    if request.method != "POST":
+        return HttpResponseNotAllowed(["POST"])
+    data = _request_data(request)
+    if data is None:
+        return JsonResponse({"error": "Corps JSON invalide."}, status=400)
+
+    ref_code = data.get("ref_code")
+    user_id = data.get("user_id")
+    username = data.get("username")
+    email = data.get("email")
+
+    if not ref_code or not user_id:
+        return JsonResponse(
+            {"error": "Le code de parrainage et l'ID utilisateur sont requis."}, status=400
+        )
+
+    try:
+        referrer = await aget_referrer(ref_code)
+    except User.DoesNotExist:
+        return JsonResponse({"error": "Code de parrainage invalide."}, status=404)
+
+    referred, created = await User.objects.aget_or_create(
+        supabase_id=user_id,
+        defaults={
+            "username": username or f"user_{user_id[:8]}",
+            "email": email or f"user_{user_id[:8]}@example.com",
+            "referred_by": referrer,
+        },
+    )
+    if not created and not referred.referred_by_id:
+        referred.referred_by = referrer
+        await referred.asave()
+
+    # La notification Telegram est publiée dans l'outbox par Referral.save
+    referral, ref_created = await Referral.objects.aget_or_create(
+        referrer=referrer, referred=referred, defaults={"referral_code": ref_code}
+    )
+
+    return JsonResponse(
+        {
+            "success": True,
+            "message": "Parrainage enregistré avec succès.",
+            "referral_id": str(referral.id),
+            "created": ref_created,
+        },
+        status=201 if ref_created else 200,
+    )
+
+
+external_referral.csrf_exempt = True
+
+
+async def public_whitelabels(request):
+    """Équivalent asynchrone de ``PublicWhiteLabelAPI``."""
+    if request.method != "GET":
+        return HttpResponseNotAllowed(["GET"])
+
+    data = []
+    async for wl in WhiteLabel.objects.filter(is_active=True):
+        domain = wl.custom_domain if wl.dns_verified and wl.custom_domain else wl.domain
+        data.append(
+            {
+                "id": str(wl.id),
+                "name": wl.name,
+                "domain": domain,
+                "custom_domain": wl.custom_domain if wl.dns_verified else None,
+                "logo_url": request.build_absolute_uri(wl.logo.url) if wl.logo else None,
+                "favicon_url": request.build_absolute_uri(wl.favicon.url) if wl.favicon else None,
+                "primary_color": wl.primary_color,
+                "secondary_color": wl.secondary_color,
+                "created_at": wl.created_at,
+            }
+        )
+
+    if getattr(settings, "TELEGRAM_NOTIFY_API_CALLS", False):
+        await sync_to_async(TelegramService().send_message)(
+            f"🔍 <b>API Request</b>\n\n"
+            f"Liste des White Labels demandée\n"
+            f"IP: {request.META.get('REMOTE_ADDR')}\n"
+            f"User Agent: {request.META.get('HTTP_USER_AGENT', 'Non spécifié')}\n"
+            f"Nombre d'entrées: {len(data)}"
+        )
+
+    return JsonResponse(data, safe=False)
+
+
+def _create_referred_user(ambassador, referral_code, user_email, user_name):
+    """Crée l'utilisateur parrainé et son parrainage dans une seule transaction."""
+    username = user_email.split("@")[0]
+    if User.objects.filter(username=username).exists():
+        username = f"{username}_{uuid.uuid4().hex[:6]}"
+
+    with transaction.atomic():
+        referred_user = User.objects.create_user(
+            username=username,
+            email=user_email,
+            password=uuid.uuid4().hex,  # Mot de passe aléatoire, l'utilisateur devra le changer
+            first_name=user_name.split(" ")[0] if " " in user_name else user_name,
+            last_name=user_name.split(" ")[1] if " " in user_name else "",
+            is_active=True,
+            referred_by=ambassador,
+        )
+        return Referral.objects.create(
+            referrer=ambassador, referred=referred_user, referral_code=referral_code
+        )
+
+
+async def referral_signup(request):
+    """Équivalent asynchrone de ``ReferralSignupAPI``."""
+    if request.method != "POST":
+        return HttpResponseNotAllowed(["POST"])
+    data = _request_data(request)
+    if data is None:
+        return JsonResponse({"success": False, "message": "Corps JSON invalide."}, status=400)
+
+    referral_code = data.get("referral_code")
+    user_email = data.get("user_email")
+    user_name = data.get("user_name", "")
+
+    if not referral_code or not user_email:
+        return JsonResponse(
+            {
+                "success": False,
+                "message": "Le code de parrainage et l'email de l'utilisateur sont obligatoires.",
+            },
+            status=400,
+        )
+
+    try:
+        ambassador = await aget_referrer(referral_code)
+    except User.DoesNotExist:
+        return JsonResponse(
+            {"success": False, "message": "Code de parrainage invalide."}, status=404
+        )
+
+    if await User.objects.filter(email=user_email).aexists():
+        return JsonResponse(
+            {"success": False, "message": "Cet utilisateur est déjà inscrit."}, status=409
+        )
+
+    try:
+        # Hachage du mot de passe et écritures : un seul passage en synchrone
+        referral = await sync_to_async(_create_referred_user)(
+            ambassador, referral_code, user_email, user_name
+        )
+    except Exception as e:
+        return JsonResponse(
+            {
+                "success": False,
+                "message": f"Erreur lors de l'enregistrement du parrainage: {str(e)}",
+            },
+            status=500,
+        )
+
+    return JsonResponse(
+        {
+            "success": True,
+            "message": "Parrainage enregistré avec succès.",
+            "referral_id": str(referral.id),
+        },
+        status=201,
+    )
+
+
+referral_signup.csrf_exempt = True
+
+
+async def payout_webhook(request):
+    """Notification de paiement sortant (signature HMAC vérifiée par le handler)."""
+    if request.method != "POST":
+        return HttpResponseNotAllowed(["POST"])
+    return await webhook_handler.ahandle_payout_notification(request)
+
+
+payout_webhook.csrf_exempt = True
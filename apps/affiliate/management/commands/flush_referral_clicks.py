@@ -0,0 +1,65 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from apps.affiliate.services.click_ingestion import (
+    SpoolClickBuffer,
+    flush_click_buffer,
+    get_click_buffer,
+)
+
+
+class Command(BaseCommand):
+    help = "Vide le tampon des clics de parrainage par lots (bulk_create)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=settings.AFFILIATE_CLICK_FLUSH_SIZE,
+            help="Nombre maximum de clics insérés par lot",
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=settings.AFFILIATE_CLICK_FLUSH_INTERVAL,
+            help="Délai en secondes entre deux passes lorsque le tampon est vide",
+        )
+        parser.add_argument(
+            "--loop",
+            action="store_true",
+            help="Tourner en continu (mode worker) au lieu d'une seule passe",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        interval = options["interval"]
+
+        # Le spool local est toujours drainé : il sert de repli quand Redis tombe.
+        buffers = [get_click_buffer()]
+        if buffers[0].name != "spool":
+            buffers.append(SpoolClickBuffer())
+
+        total_read = total_saved = 0
+        while True:
+            drained = False
+            for buffer in buffers:
+                read, saved = flush_click_buffer(buffer, batch_size)
+                total_read += read
+                total_saved += saved
+                if read:
+                    drained = True
+                    self.stdout.write(
+                        f"[{buffer.name}] lot de {read} clics lus, {saved} enregistrés"
+                    )
+
+            if drained:
+                continue
+            if not options["loop"]:
+                break
+            time.sleep(interval)
+
+        self.stdout.write(
+            self.style.SUCCESS(f"{total_saved} clics enregistrés sur {total_read} lus")
+        )
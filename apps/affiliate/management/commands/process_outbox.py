@@ -0,0 +1,68 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from apps.affiliate.services.outbox import process_outbox, purge_delivered
+from apps.affiliate.services.supabase_sync import metrics
+
+
+class Command(BaseCommand):
+    help = "Livre les effets de bord en attente dans l'outbox (Telegram, Supabase)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=settings.AFFILIATE_OUTBOX_BATCH_SIZE,
+            help="Nombre maximum d'événements réclamés par passe",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=settings.AFFILIATE_OUTBOX_WORKERS,
+            help="Nombre de threads de livraison",
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=settings.AFFILIATE_OUTBOX_POLL_INTERVAL,
+            help="Délai en secondes entre deux passes lorsque la file est vide",
+        )
+        parser.add_argument(
+            "--loop",
+            action="store_true",
+            help="Tourner en continu (mode worker) au lieu d'une seule passe",
+        )
+        parser.add_argument(
+            "--purge-days",
+            type=int,
+            help="Supprimer d'abord les événements livrés depuis plus de N jours",
+        )
+
+    def handle(self, *args, **options):
+        if options["purge_days"] is not None:
+            deleted = purge_delivered(options["purge_days"])
+            self.stdout.write(f"{deleted} événements livrés supprimés")
+
+        total_claimed = total_delivered = 0
+        while True:
+            claimed, delivered = process_outbox(options["batch_size"], options["workers"])
+            total_claimed += claimed
+            total_delivered += delivered
+            if claimed:
+                self.stdout.write(f"lot de {claimed} événements, {delivered} livrés")
+                continue
+            if not options["loop"]:
+                break
+            time.sleep(options["interval"])
+
+        sync = metrics.snapshot()
+        if sync["requests"]:
+            self.stdout.write(
+                f"Supabase: {sync['rows_sent']} lignes en {sync['requests']} requêtes "
+                f"({sync['rows_coalesced']} fusionnées, {sync['failures']} échecs)"
+            )
+        self.stdout.write(
+            self.style.SUCCESS(f"{total_delivered} événements livrés sur {total_claimed} réclamés")
+        )
@@ -0,0 +1,43 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.accounts.models import User
+from apps.affiliate.services.daily_stats import rebuild_daily_stats
+
+
+class Command(BaseCommand):
+    help = "Reconstruit (ou initialise) la table des statistiques quotidiennes d'affiliation"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--ambassador",
+            action="append",
+            dest="ambassadors",
+            help="Nom d'utilisateur de l'ambassadeur à reconstruire (répétable)",
+        )
+        parser.add_argument(
+            "--since",
+            help="Reconstruire uniquement à partir de cette date (AAAA-MM-JJ)",
+        )
+
+    def handle(self, *args, **options):
+        ambassador_ids = None
+        if options["ambassadors"]:
+            ambassador_ids = list(
+                User.objects.filter(username__in=options["ambassadors"]).values_list(
+                    "id", flat=True
+                )
+            )
+            if not ambassador_ids:
+                raise CommandError("Aucun ambassadeur trouvé")
+
+        since = None
+        if options["since"]:
+            try:
+                since = date.fromisoformat(options["since"])
+            except ValueError:
+                raise CommandError(f"Date invalide: {options['since']}")
+
+        rows = rebuild_daily_stats(ambassador_ids=ambassador_ids, since=since)
+        self.stdout.write(self.style.SUCCESS(f"{rows} lignes de statistiques quotidiennes créées"))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from apps.affiliate.services.referral_tree import rebuild_referral_closure
+
+
+class Command(BaseCommand):
+    help = "Reconstruit la table de fermeture du graphe de parrainage depuis User.referred_by"
+
+    def handle(self, *args, **options):
+        links = rebuild_referral_closure()
+        self.stdout.write(self.style.SUCCESS(f"{links} liens de parrainage créés"))
@@ -0,0 +1,83 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.accounts.models import User
+from apps.affiliate.models import CommissionRecalculation
+from apps.affiliate.services.commission_recalculation import (
+    run_recalculation,
+    start_recalculation,
+)
+
+
+class Command(BaseCommand):
+    help = "Recalcule les commissions en attente aux taux courants, par lots reprenables"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--ambassador",
+            action="append",
+            dest="ambassadors",
+            help="Nom d'utilisateur de l'ambassadeur à recalculer (répétable)",
+        )
+        parser.add_argument(
+            "--since", help="Commissions créées à partir de cette date (AAAA-MM-JJ)"
+        )
+        parser.add_argument("--until", help="Commissions créées jusqu'à cette date (AAAA-MM-JJ)")
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument(
+            "--max-batches",
+            type=int,
+            help="S'arrêter après ce nombre de lots (reprise avec --resume)",
+        )
+        parser.add_argument(
+            "--resume",
+            type=int,
+            metavar="ID",
+            help="Reprendre un recalcul interrompu au lieu d'en créer un",
+        )
+
+    def _date(self, value):
+        if not value:
+            return None
+        try:
+            return date.fromisoformat(value)
+        except ValueError:
+            raise CommandError(f"Date invalide: {value}")
+
+    def handle(self, *args, **options):
+        if options["resume"]:
+            try:
+                recalculation = CommissionRecalculation.objects.get(pk=options["resume"])
+            except CommissionRecalculation.DoesNotExist:
+                raise CommandError(f"Recalcul {options['resume']} introuvable")
+        else:
+            ambassador_ids = None
+            if options["ambassadors"]:
+                ambassador_ids = list(
+                    User.objects.filter(username__in=options["ambassadors"]).values_list(
+                        "id", flat=True
+                    )
+                )
+                if not ambassador_ids:
+                    raise CommandError("Aucun ambassadeur trouvé")
+            recalculation = start_recalculation(
+                ambassador_ids, self._date(options["since"]), self._date(options["until"])
+            )
+
+        recalculation = run_recalculation(
+            recalculation, batch_size=options["batch_size"], max_batches=options["max_batches"]
+        )
+        summary = (
+            f"Recalcul {recalculation.id} : {recalculation.changed} commissions modifiées sur "
+            f"{recalculation.scanned} examinées ({recalculation.amount_before} € -> "
+            f"{recalculation.amount_after} €)"
+        )
+        if recalculation.status == "completed":
+            self.stdout.write(self.style.SUCCESS(summary))
+        else:
+            self.stdout.write(
+                self.style.WARNING(
+                    f"{summary}, interrompu : reprendre avec --resume {recalculation.id}"
+                )
+            )
@@ -0,0 +1,50 @@
+from django.core.management.base import BaseCommand
+
+from apps.accounts.models import User
+from apps.affiliate.services.profile_counters import reconcile_profile_counters
+
+
+class Command(BaseCommand):
+    help = (
+        "Recalcule les compteurs des profils d'affiliation depuis les tables sources "
+        "et signale les écarts (à planifier périodiquement, ex. cron quotidien)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--fix",
+            action="store_true",
+            help="Corriger les profils en écart au lieu de simplement les signaler",
+        )
+        parser.add_argument(
+            "--ambassador",
+            action="append",
+            dest="ambassadors",
+            help="Limiter à cet ambassadeur (nom d'utilisateur, répétable)",
+        )
+
+    def handle(self, *args, **options):
+        user_ids = None
+        if options["ambassadors"]:
+            user_ids = list(
+                User.objects.filter(username__in=options["ambassadors"]).values_list(
+                    "id", flat=True
+                )
+            )
+
+        drifts = reconcile_profile_counters(fix=options["fix"], user_ids=user_ids)
+
+        for profile, drift in drifts:
+            details = ", ".join(
+                f"{field}: {stored} -> {expected}" for field, (stored, expected) in drift.items()
+            )
+            self.stdout.write(self.style.WARNING(f"{profile.user.username}: {details}"))
+
+        if not drifts:
+            self.stdout.write(self.style.SUCCESS("Aucun écart détecté"))
+        elif options["fix"]:
+            self.stdout.write(self.style.SUCCESS(f"{len(drifts)} profils corrigés"))
+        else:
+            self.stdout.write(
+                self.style.WARNING(f"{len(drifts)} profils en écart (relancer avec --fix)")
+            )
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+
+from apps.affiliate.services.single_flight import reset_shared_metrics, shared_metrics
+
+
+class Command(BaseCommand):
+    help = "Affiche les compteurs du regroupement des calculs de statistiques (single flight)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--reset",
+            action="store_true",
+            help="Remet les compteurs à zéro après affichage",
+        )
+
+    def handle(self, *args, **options):
+        data = shared_metrics()
+        self.stdout.write(f"Calculs exécutés: {data['computed']}")
+        self.stdout.write(
+            f"Calculs dédoublonnés (attente d'un autre worker): {data['deduplicated']}"
+        )
+        self.stdout.write(f"Résultats partagés déjà disponibles: {data['shared']}")
+        self.stdout.write(f"Attentes expirées (calcul local): {data['timeouts']}")
+        self.stdout.write(f"Erreurs de cache: {data['errors']}")
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Part des demandes servies sans recalcul: {data['dedup_ratio']:.1%}"
+            )
+        )
+
+        if options["reset"]:
+            reset_shared_metrics()
+            self.stdout.write("Compteurs remis à zéro")
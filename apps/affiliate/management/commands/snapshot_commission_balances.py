@@ -0,0 +1,40 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from apps.affiliate.services.commission_ledger import backfill_ledger, take_balance_snapshots
+
+
+class Command(BaseCommand):
+    help = "Reporte les écritures du grand livre des commissions dans les instantanés de solde"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--backfill",
+            action="store_true",
+            help="Compléter d'abord le grand livre avec les commissions antérieures",
+        )
+        parser.add_argument(
+            "--loop",
+            action="store_true",
+            help="Tourner en continu au lieu d'un seul report",
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=settings.AFFILIATE_LEDGER_SNAPSHOT_INTERVAL,
+            help="Délai en secondes entre deux reports en mode --loop",
+        )
+
+    def handle(self, *args, **options):
+        if options["backfill"]:
+            created = backfill_ledger()
+            self.stdout.write(f"{created} écritures d'ouverture ajoutées")
+
+        while True:
+            updated = take_balance_snapshots()
+            self.stdout.write(self.style.SUCCESS(f"{updated} instantanés de solde mis à jour"))
+            if not options["loop"]:
+                break
+            time.sleep(options["interval"])
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from apps.affiliate.services.supabase_sync import sync_lag, sync_throughput
+
+
+class Command(BaseCommand):
+    help = "Affiche le retard et le débit de la synchronisation Supabase (outbox)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--minutes",
+            type=int,
+            default=5,
+            help="Fenêtre en minutes pour le calcul du débit",
+        )
+
+    def handle(self, *args, **options):
+        lag = sync_lag()
+        for topic, data in lag.items():
+            self.stdout.write(
+                f"{topic}: {data['pending']} en attente, retard {data['lag_seconds']}s"
+            )
+
+        throughput = sync_throughput(options["minutes"])
+        self.stdout.write(f"Débit: {throughput} lignes/min sur {options['minutes']} min")
+
+        if not lag:
+            self.stdout.write(self.style.SUCCESS("Synchronisation Supabase à jour"))
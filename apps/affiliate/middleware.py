@@ -1,175 +1,82 @@
 from django.utils.deprecation import MiddlewareMixin
 from django.conf import settings
 import logging
-from apps.accounts.models import User
+import time
+from apps.affiliate.services.attribution import (
+    AttributionToken,
+    is_tracked_path,
+    read_attribution_cookie,
+    write_token_cookie,
+)
+from apps.affiliate.services.referral_resolver import resolve_referral_code
 from django.utils.timezone import now
 
 logger = logging.getLogger(__name__)
 logger_audit = logging.getLogger("affiliate.audit")
 
 
-class AffiliateMiddleware(MiddlewareMixin):
+class AttributionMiddleware(MiddlewareMixin):
     """
-    Middleware qui capture les codes d'affiliation et les stocke dans un cookie persistant.
-    Le cookie est conservé pendant 30 jours pour maximiser les chances de conversion,
-    même si l'utilisateur revient après plusieurs jours.
+    Middleware unique d'attribution des visiteurs aux ambassadeurs.
+
+    - les fichiers statiques, médias et sondes de santé sont ignorés d'emblée ;
+    - le code d'un lien ``?ref=`` valide est conservé dans un jeton signé et
+      versionné (voir ``services/attribution.py``) valable
+      ``AFFILIATE_COOKIE_AGE`` secondes ; en « first touch », un cookie
+      existant l'emporte ;
+    - un jeton authentique est approuvé sans requête : le résolveur n'est
+      consulté que pour un parrain révoqué ;
+    - la session n'est jamais écrite ici : aucun enregistrement de session
+      n'est créé pour un visiteur anonyme (voir ``persist_attribution``).
+
+    Le code retenu est exposé dans ``request.affiliate_code`` et l'id du
+    parrain dans ``request.affiliate_referrer_id``.
     """
 
     def process_request(self, request):
-        # Configuration
-        REF_PARAM = getattr(settings, "AFFILIATE_REF_PARAM", "ref")
-        COOKIE_NAME = getattr(settings, "AFFILIATE_COOKIE_NAME", "affiliate_code")
-        # Durée explicite de 30 jours en secondes (2 592 000 secondes)
-        COOKIE_AGE = getattr(
-            settings, "AFFILIATE_COOKIE_AGE", 60 * 60 * 24 * 30
-        )  # 30 jours par défaut
-        AFFILIATE_FIRST_TOUCH = getattr(
-            settings, "AFFILIATE_FIRST_TOUCH", True
-        )  # Conserver le premier affiliateur
-
-        # AMÉLIORATION: Logging plus détaillé des paramètres d'URL pour le débogage
-        full_path = request.get_full_path()
-        if "?" in full_path:
-            logger.info(f"📥 URL avec paramètres: {full_path}")
-            # Journaliser de manière plus détaillée chaque paramètre (utile pour debug)
-            for key, value in request.GET.items():
-                logger.info(f"📝 Paramètre URL: {key}={value}")
-
-        # Vérifier s'il y a un code de référence dans l'URL
-        ref_code = request.GET.get(REF_PARAM)
-
-        if ref_code:
-            # AMÉLIORATION: Vérification de la validité du code
-            try:
-                referrer = User.objects.get(referral_code=ref_code)
-                logger.info(
-                    f"✅ Code de référence valide dans l'URL: {ref_code} (Utilisateur: {referrer.username})"
-                )
-                is_valid = True
-            except User.DoesNotExist:
-                logger.warning(f"❌ Code de référence invalide dans l'URL: {ref_code}")
-                is_valid = False
-            except Exception as e:
-                logger.error(f"❌ Erreur lors de la vérification du code de référence: {str(e)}")
-                is_valid = False
-
-            # Continuer uniquement si le code est valide
-            if is_valid:
-                # Ajouter le code à l'objet request pour faciliter l'accès
-                request.affiliate_code = ref_code
-
-                # Vérifier si nous respectons le "first touch" (premier contact)
-                cookie_ref_code = request.COOKIES.get(COOKIE_NAME)
-                if cookie_ref_code and AFFILIATE_FIRST_TOUCH:
-                    logger.info(
-                        f"ℹ️ Cookie existant trouvé: {cookie_ref_code}, respectant 'first touch'"
-                    )
-                    request.affiliate_code = cookie_ref_code
-                    return
-
-                # AMÉLIORATION: Ajout de méta-données supplémentaires
-                request._affiliate_meta = {
-                    "referrer_username": referrer.username,
-                    "referrer_id": referrer.id,
-                    "source": "url_param",
-                    "timestamp": request.META.get("REQUEST_TIME", 0),
-                }
-
-                # Définir un cookie qui sera placé dans la réponse
-                request._affiliate_cookie_to_set = {
-                    "name": COOKIE_NAME,
-                    "value": ref_code,
-                    "max_age": COOKIE_AGE,
-                    "secure": request.is_secure(),
-                    "httponly": True,
-                    "samesite": "Lax",  # Permet le suivi lors d'une redirection depuis un site externe
-                    "expires": None,  # Laissez Django calculer la date d'expiration à partir de max_age
-                }
-        else:
-            # AMÉLIORATION: Récupérer le code depuis le cookie avec validation
-            cookie_ref_code = request.COOKIES.get(COOKIE_NAME)
-            if cookie_ref_code:
-                # Vérifier si le code dans le cookie est toujours valide
-                try:
-                    referrer = User.objects.get(referral_code=cookie_ref_code)
-                    logger.info(
-                        f"✅ Code de référence valide dans le cookie: {cookie_ref_code} (Utilisateur: {referrer.username})"
-                    )
-                    request.affiliate_code = cookie_ref_code
-
-                    # AMÉLIORATION: Ajout de méta-données supplémentaires
-                    request._affiliate_meta = {
-                        "referrer_username": referrer.username,
-                        "referrer_id": referrer.id,
-                        "source": "cookie",
-                        "timestamp": request.META.get("REQUEST_TIME", 0),
-                    }
-                except User.DoesNotExist:
-                    logger.warning(
-                        f"❌ Code de référence invalide dans le cookie: {cookie_ref_code}"
-                    )
-                    request.affiliate_code = None
-                except Exception as e:
-                    logger.error(
-                        f"❌ Erreur lors de la vérification du code de référence dans le cookie: {str(e)}"
-                    )
-                    request.affiliate_code = None
-            else:
-                logger.debug(f"ℹ️ Aucun code de référence trouvé (ni URL, ni cookie)")
-                request.affiliate_code = None
-
-    def process_response(self, request, response):
-        # AMÉLIORATION: Gestion plus robuste du cookie avec logging détaillé
-        if hasattr(request, "_affiliate_cookie_to_set"):
-            cookie_data = request._affiliate_cookie_to_set
-            logger.info(f"🍪 Définition du cookie d'affiliation: {cookie_data['value']}")
-
-            # Définir le cookie pour la durée spécifiée
-            try:
-                response.set_cookie(
-                    cookie_data["name"],
-                    cookie_data["value"],
-                    max_age=cookie_data["max_age"],
-                    secure=cookie_data["secure"],
-                    httponly=cookie_data["httponly"],
-                    samesite=cookie_data["samesite"],
-                )
-                logger.info(f"✅ Cookie d'affiliation défini avec succès: {cookie_data['value']}")
-            except Exception as e:
-                logger.error(f"❌ Erreur lors de la définition du cookie d'affiliation: {str(e)}")
-
-        return response
-
-
-class ReferralMiddleware(MiddlewareMixin):
-    def process_request(self, request):
-        # Ne pas traiter les requêtes pour les fichiers statiques
-        if request.path.startswith("/static/"):
+        request.affiliate_code = None
+        request.affiliate_referrer_id = None
+        if not is_tracked_path(request.path):
             return None
 
-        # Récupérer le code de référence de l'URL ou du cookie
-        ref_code = request.GET.get("ref") or request.COOKIES.get("ref_code")
+        token, reissue = read_attribution_cookie(request)
+        ref_code = request.GET.get(settings.AFFILIATE_REF_PARAM)
 
-        if ref_code:
-            # Si un code est trouvé, on le stocke dans la session
-            request.session["ref_code"] = ref_code
-            logger.debug(f"✅ Code de référence trouvé : {ref_code}")
-        else:
-            # Ne pas logger pour les requêtes statiques ou les assets
-            if not any(request.path.startswith(p) for p in ["/static/", "/media/", "/favicon.ico"]):
-                logger.debug("ℹ️ Aucun code de référence trouvé")
+        if ref_code and not (token and settings.AFFILIATE_FIRST_TOUCH):
+            referrer = resolve_referral_code(ref_code)
+            if referrer is not None:
+                logger.debug(
+                    f"✅ Code de référence valide dans l'URL: {ref_code} ({referrer.username})"
+                )
+                if token is None or token.referrer_id != referrer.id:
+                    token = AttributionToken(
+                        referrer.id, referrer.referral_code, int(time.time()), None
+                    )
+                    reissue = True
+            else:
+                logger.warning(f"❌ Code de référence invalide dans l'URL: {ref_code}")
 
+        if token:
+            request.affiliate_code = token.code
+            request.affiliate_referrer_id = token.referrer_id
+            if reissue:
+                # Nouveau parrain, ancien format ou rotation de clé
+                request._affiliate_token_to_set = token
         return None
 
     def process_response(self, request, response):
-        # Si un code de référence est trouvé dans l'URL, on le stocke dans un cookie
-        ref_code = request.GET.get("ref")
-        if ref_code:
-            # Définir le cookie pour 30 jours
-            response.set_cookie("ref_code", ref_code, max_age=30 * 24 * 60 * 60)
+        token = getattr(request, "_affiliate_token_to_set", None)
+        if token:
+            write_token_cookie(response, token, request)
+            logger.debug(f"🍪 Cookie d'attribution émis pour le parrain {token.referrer_id}")
         return response
 
 
+# Anciens noms, conservés pour les configurations existantes (un seul suffit dans MIDDLEWARE)
+AffiliateMiddleware = AttributionMiddleware
+ReferralMiddleware = AttributionMiddleware
+
+
 SENSITIVE_PATHS = [
     "/admin/",
     "/api/commission-rates/",
@@ -0,0 +1,19 @@
+# Generated by Django 4.2.20 on 2026-10-17 23:14
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("affiliate", "0011_delete_transaction"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="referralclick",
+            name="clicked_at",
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
@@ -0,0 +1,84 @@
+# Generated by Django 4.2.20 on 2026-10-17 23:18
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("affiliate", "0012_referralclick_clicked_at_default"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="AffiliateDailyStats",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("date", models.DateField(verbose_name="Date")),
+                ("clicks", models.PositiveIntegerField(default=0)),
+                ("referrals", models.PositiveIntegerField(default=0)),
+                ("ambassador_referrals", models.PositiveIntegerField(default=0)),
+                ("escort_referrals", models.PositiveIntegerField(default=0)),
+                (
+                    "commissions_pending",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=12),
+                ),
+                (
+                    "commissions_approved",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=12),
+                ),
+                (
+                    "commissions_paid",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=12),
+                ),
+                (
+                    "commissions_rejected",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=12),
+                ),
+                (
+                    "ambassador_commissions",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=12),
+                ),
+                (
+                    "escort_commissions",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=12),
+                ),
+                ("payouts_count", models.PositiveIntegerField(default=0)),
+                (
+                    "payouts_amount",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=12),
+                ),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                (
+                    "ambassador",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="daily_stats",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "statistiques quotidiennes",
+                "verbose_name_plural": "statistiques quotidiennes",
+                "ordering": ["date"],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="affiliatedailystats",
+            constraint=models.UniqueConstraint(
+                fields=("ambassador", "date"), name="unique_affiliate_daily_stats"
+            ),
+        ),
+    ]
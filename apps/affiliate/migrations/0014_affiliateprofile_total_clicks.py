@@ -0,0 +1,18 @@
+# Generated by Django 4.2.20 on 2026-10-17 23:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("affiliate", "0013_affiliatedailystats"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="affiliateprofile",
+            name="total_clicks",
+            field=models.IntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,77 @@
+# Generated by Django 4.2.20 on 2026-10-17 23:25
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("affiliate", "0014_affiliateprofile_total_clicks"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="OutboxEvent",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("topic", models.CharField(max_length=64, verbose_name="Sujet")),
+                (
+                    "aggregate_type",
+                    models.CharField(max_length=64, verbose_name="Type d'objet"),
+                ),
+                (
+                    "aggregate_id",
+                    models.CharField(
+                        max_length=64, verbose_name="Identifiant de l'objet"
+                    ),
+                ),
+                ("payload", models.JSONField(blank=True, default=dict)),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("pending", "En attente"),
+                            ("processing", "En cours"),
+                            ("delivered", "Livré"),
+                            ("dead", "Abandonné"),
+                        ],
+                        default="pending",
+                        max_length=20,
+                    ),
+                ),
+                ("attempts", models.PositiveIntegerField(default=0)),
+                ("last_error", models.TextField(blank=True)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                (
+                    "available_at",
+                    models.DateTimeField(default=django.utils.timezone.now),
+                ),
+                ("locked_until", models.DateTimeField(blank=True, null=True)),
+                ("delivered_at", models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                "verbose_name": "événement sortant",
+                "verbose_name_plural": "événements sortants",
+                "ordering": ["id"],
+                "indexes": [
+                    models.Index(
+                        fields=["status", "available_at"],
+                        name="affiliate_o_status_f9d5fc_idx",
+                    ),
+                    models.Index(
+                        fields=["aggregate_type", "aggregate_id", "status"],
+                        name="affiliate_o_aggrega_fbbe5e_idx",
+                    ),
+                ],
+            },
+        ),
+    ]
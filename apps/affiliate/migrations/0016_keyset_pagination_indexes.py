@@ -0,0 +1,33 @@
+# Generated by Django 4.2.20 on 2026-10-17 23:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("affiliate", "0015_outboxevent"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="commission",
+            index=models.Index(
+                fields=["user", "created_at", "id"],
+                name="affiliate_c_user_id_3ee9e5_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="referral",
+            index=models.Index(
+                fields=["referrer", "created_at", "id"],
+                name="affiliate_r_referre_03c234_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="referralclick",
+            index=models.Index(
+                fields=["clicked_at", "id"], name="affiliate_r_clicked_8f7bdb_idx"
+            ),
+        ),
+    ]
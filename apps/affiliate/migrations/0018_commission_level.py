@@ -0,0 +1,29 @@
+# Generated by Django 4.2.20 on 2026-10-18 00:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("affiliate", "0017_referralclosure"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="commission",
+            name="level",
+            field=models.PositiveSmallIntegerField(default=1, verbose_name="Niveau"),
+        ),
+        migrations.AddConstraint(
+            model_name="commission",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(
+                    ("transaction_id__isnull", False),
+                    models.Q(("transaction_id", ""), _negated=True),
+                ),
+                fields=("transaction_id", "level"),
+                name="unique_commission_transaction_level",
+            ),
+        ),
+    ]
@@ -0,0 +1,70 @@
+# Generated by Django 4.2.20 on 2026-10-18 00:17
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("affiliate", "0019_commission_ledger"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="RateChangeAudit",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "operation",
+                    models.CharField(
+                        choices=[
+                            ("base_rate", "Taux de base"),
+                            ("specific_rates", "Taux spécifiques"),
+                        ],
+                        max_length=20,
+                        verbose_name="Opération",
+                    ),
+                ),
+                ("scope", models.CharField(max_length=20, verbose_name="Périmètre")),
+                ("parameters", models.JSONField(blank=True, default=dict)),
+                ("ambassadors_count", models.PositiveIntegerField(default=0)),
+                ("notifications_count", models.PositiveIntegerField(default=0)),
+                ("pending_commissions", models.PositiveIntegerField(default=0)),
+                (
+                    "pending_amount",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=14),
+                ),
+                (
+                    "projected_amount",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=14),
+                ),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                (
+                    "admin",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="rate_changes",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "modification de taux",
+                "verbose_name_plural": "modifications de taux",
+                "ordering": ["-created_at"],
+            },
+        ),
+    ]
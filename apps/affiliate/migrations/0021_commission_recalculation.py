@@ -0,0 +1,98 @@
+# Generated by Django 4.2.20 on 2026-10-18 00:20
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("affiliate", "0020_rate_change_audit"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CommissionRecalculation",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("ambassador_ids", models.JSONField(blank=True, default=list)),
+                ("since", models.DateField(blank=True, null=True)),
+                ("until", models.DateField(blank=True, null=True)),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[("running", "En cours"), ("completed", "Terminé")],
+                        default="running",
+                        max_length=20,
+                    ),
+                ),
+                ("last_commission_id", models.UUIDField(blank=True, null=True)),
+                ("scanned", models.PositiveIntegerField(default=0)),
+                ("changed", models.PositiveIntegerField(default=0)),
+                (
+                    "amount_before",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=14),
+                ),
+                (
+                    "amount_after",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=14),
+                ),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                ("completed_at", models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                "verbose_name": "recalcul de commissions",
+                "verbose_name_plural": "recalculs de commissions",
+                "ordering": ["-created_at"],
+            },
+        ),
+        migrations.CreateModel(
+            name="CommissionRecalculationDiff",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("rate_before", models.DecimalField(decimal_places=2, max_digits=5)),
+                ("rate_after", models.DecimalField(decimal_places=2, max_digits=5)),
+                ("amount_before", models.DecimalField(decimal_places=2, max_digits=10)),
+                ("amount_after", models.DecimalField(decimal_places=2, max_digits=10)),
+                (
+                    "commission",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="recalculations",
+                        to="affiliate.commission",
+                    ),
+                ),
+                (
+                    "recalculation",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="diffs",
+                        to="affiliate.commissionrecalculation",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "écart de recalcul",
+                "verbose_name_plural": "écarts de recalcul",
+            },
+        ),
+    ]
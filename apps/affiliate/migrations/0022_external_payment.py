@@ -0,0 +1,58 @@
+# Generated by Django 4.2.20 on 2026-10-18 00:28
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("affiliate", "0021_commission_recalculation"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ExternalPayment",
+            fields=[
+                (
+                    "id",
+                    models.UUIDField(
+                        default=uuid.uuid4,
+                        editable=False,
+                        primary_key=True,
+                        serialize=False,
+                    ),
+                ),
+                ("source", models.CharField(max_length=100)),
+                ("payment_id", models.CharField(max_length=100)),
+                ("amount", models.DecimalField(decimal_places=2, max_digits=12)),
+                ("payment_date", models.DateTimeField(blank=True, null=True)),
+                ("description", models.CharField(blank=True, max_length=255)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                (
+                    "user",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="external_payments",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "paiement externe",
+                "verbose_name_plural": "paiements externes",
+                "ordering": ["-created_at"],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="externalpayment",
+            constraint=models.UniqueConstraint(
+                fields=("source", "payment_id"), name="unique_external_payment"
+            ),
+        ),
+    ]
@@ -0,0 +1,54 @@
+"""
+Remplit la table de fermeture depuis ``User.referred_by``.
+
+``0017_referralclosure`` créait la table vide ; le moteur de commissions ne
+trouve les parrains qu'à travers elle. Même reconstruction niveau par niveau
+que ``rebuild_referral_closure``, sur les modèles historiques.
+"""
+
+from django.conf import settings
+from django.db import migrations
+
+# Garde-fou contre un cycle dans referred_by (voir referral_tree.MAX_DEPTH)
+MAX_DEPTH = 100
+
+
+def backfill_referral_closure(apps, schema_editor):
+    connection = schema_editor.connection
+    closure = connection.ops.quote_name(
+        apps.get_model("affiliate", "ReferralClosure")._meta.db_table
+    )
+    users = connection.ops.quote_name(apps.get_model(settings.AUTH_USER_MODEL)._meta.db_table)
+
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {closure}")
+        cursor.execute(f"""
+            INSERT INTO {closure} (ancestor_id, descendant_id, depth)
+            SELECT referred_by_id, id, 1 FROM {users}
+            WHERE referred_by_id IS NOT NULL AND referred_by_id <> id
+            """)
+        inserted, depth = cursor.rowcount, 1
+        while inserted > 0 and depth < MAX_DEPTH:
+            cursor.execute(
+                f"""
+                INSERT INTO {closure} (ancestor_id, descendant_id, depth)
+                SELECT c.ancestor_id, u.id, c.depth + 1
+                FROM {closure} c
+                JOIN {users} u ON u.referred_by_id = c.descendant_id
+                WHERE c.depth = %s AND u.id <> c.ancestor_id
+                """,
+                [depth],
+            )
+            inserted, depth = cursor.rowcount, depth + 1
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("affiliate", "0022_external_payment"),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_referral_closure, migrations.RunPython.noop),
+    ]
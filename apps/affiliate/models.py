@@ -1,4 +1,4 @@
-from django.db import models
+from django.db import models, transaction
 from django.utils.translation import gettext_lazy as _
 from django.conf import settings
 from django.core.validators import MinValueValidator, MaxValueValidator
@@ -28,9 +28,10 @@ def create_affiliate_profile(sender, instance, created, **kwargs):
 
 @receiver(post_save, sender=User)
 def save_affiliate_profile(sender, instance, **kwargs):
+    # Pas de save() du profil ici : ses compteurs sont maintenus par des UPDATE
+    # atomiques et une instance en mémoire les écraserait.
     if not hasattr(instance, "affiliate_profile"):
         AffiliateProfile.objects.create(user=instance)
-    instance.affiliate_profile.save()
 
 
 class ReferralClick(models.Model):
@@ -46,12 +47,17 @@ class ReferralClick(models.Model):
     referral_code = models.CharField(max_length=10)
     ip_address = models.GenericIPAddressField()
     user_agent = models.TextField()
-    clicked_at = models.DateTimeField(auto_now_add=True)
+    # Horodatage fourni par le pipeline d'ingestion (heure réelle du clic, pas du flush)
+    clicked_at = models.DateTimeField(default=timezone.now)
 
     class Meta:
         verbose_name = "Referral Click"
         verbose_name_plural = "Referral Clicks"
         ordering = ["-clicked_at"]
+        indexes = [
+            # Pagination par curseur sur (clicked_at, id)
+            models.Index(fields=["clicked_at", "id"]),
+        ]
 
     def __str__(self):
         return f"Click from {self.user.username} at {self.clicked_at}"
@@ -80,20 +86,34 @@ class Referral(models.Model):
         verbose_name_plural = "Referrals"
         ordering = ["-created_at"]
         unique_together = ["referrer", "referred"]
+        indexes = [
+            # Pagination par curseur des parrainages d'un ambassadeur
+            models.Index(fields=["referrer", "created_at", "id"]),
+        ]
 
     def __str__(self):
         return f"{self.referrer.username} referred {self.referred.username}"
 
     def save(self, *args, **kwargs):
-        is_new = self.pk is None
-        super().save(*args, **kwargs)
+        # Importer l'outbox ici pour éviter l'importation circulaire
+        from .services.outbox import publish
 
-        if is_new:
-            # Importer le service ici pour éviter l'importation circulaire
-            from .services import TelegramService
+        is_new = self._state.adding
+        with transaction.atomic():
+            super().save(*args, **kwargs)
 
-            telegram_service = TelegramService()
-            telegram_service.notify_new_referral(self.referrer, self.referred)
+            if is_new:
+                # Notification Telegram livrée par le worker de l'outbox
+                publish("telegram.new_referral", self)
+
+
+# Taux par défaut (%) selon la catégorie du filleul
+DEFAULT_COMMISSION_RATES = {
+    "escort": Decimal("30.00"),  # 30% pour les escortes
+    "ambassador": Decimal("10.00"),  # 10% pour les ambassadeurs
+    "agency": Decimal("30.00"),  # 30% pour les agences
+    "member": Decimal("30.00"),  # 30% pour les membres
+}
 
 
 class CommissionManager(models.Manager):
@@ -105,55 +125,42 @@ class CommissionManager(models.Manager):
         self,
         referred_user,
         transaction_amount,
-        commission_type,
+        commission_type="direct",
         description="",
         reference_id="",
     ):
         """
-        Crée une commission à partir d'une transaction d'un utilisateur référé
+        Crée les commissions (tous niveaux) d'une transaction d'un utilisateur référé
 
         Args:
             referred_user: L'utilisateur qui a effectué la transaction
             transaction_amount: Le montant de la transaction
-            commission_type: Le type de commission (signup, purchase, etc.)
+            commission_type: Conservé pour compatibilité ; le type (directe ou
+                indirecte) découle désormais du niveau
             description: Description de la transaction
-            reference_id: Identifiant de référence externe
+            reference_id: Identifiant de référence externe, qui sert aussi
+                d'identifiant de transaction (idempotence)
 
         Returns:
-            La commission créée ou None si l'utilisateur n'a pas été référé
+            La commission du parrain direct, ou None si l'utilisateur n'a pas été référé
         """
-        # Vérifier si l'utilisateur a été référé
-        try:
-            referral = Referral.objects.get(referred=referred_user)
-        except Referral.DoesNotExist:
-            return None
-
-        # Calculer le montant de la commission en fonction du taux
-        commission_amount = Decimal(transaction_amount) * (referral.commission_rate / 100)
-
-        # Créer la commission
-        commission = self.create(
-            user=referral.referrer,
-            referral=referral,
-            amount=commission_amount,
-            gross_amount=transaction_amount,
-            commission_type=commission_type,
-            description=description,
-            reference_id=reference_id,
-            status="pending",
+        from .services.commission_engine import (
+            CommissionTransaction,
+            create_transaction_commissions,
         )
 
-        # Mettre à jour les totaux sur le modèle Referral
-        referral.commission_rate = 30.00  # 30% pour les escortes
-        referral.save()
-
-        # Mettre à jour les totaux sur l'ambassadeur
-        ambassador = referral.referrer
-        ambassador.pending_commission += commission_amount
-        ambassador.total_commission_earned += commission_amount
-        ambassador.save()
-
-        return commission
+        commissions = create_transaction_commissions(
+            [
+                CommissionTransaction(
+                    transaction_id=reference_id or None,
+                    user_id=referred_user.pk,
+                    amount=transaction_amount,
+                    description=description,
+                    reference_id=reference_id,
+                )
+            ]
+        )
+        return next((commission for commission in commissions if commission.level == 1), None)
 
 
 class Commission(models.Model):
@@ -209,6 +216,8 @@ class Commission(models.Model):
 
     # Transaction liée
     transaction_id = models.CharField(_("ID de transaction"), max_length=100, blank=True, null=True)
+    # Niveau dans la lignée du filleul (1 = parrain direct)
+    level = models.PositiveSmallIntegerField(_("Niveau"), default=1)
 
     # Dates
     created_at = models.DateTimeField(_("Créée le"), auto_now_add=True)
@@ -238,6 +247,16 @@ class Commission(models.Model):
             models.Index(fields=["status"]),
             models.Index(fields=["user", "status"]),
             models.Index(fields=["created_at"]),
+            # Pagination par curseur des commissions d'un utilisateur
+            models.Index(fields=["user", "created_at", "id"]),
+        ]
+        constraints = [
+            # Idempotence du moteur multi-niveaux : une commission par (transaction, niveau)
+            models.UniqueConstraint(
+                fields=["transaction_id", "level"],
+                condition=models.Q(transaction_id__isnull=False) & ~models.Q(transaction_id=""),
+                name="unique_commission_transaction_level",
+            ),
         ]
 
     def __str__(self):
@@ -247,7 +266,10 @@ class Commission(models.Model):
         """
         Sauvegarde la commission avec des actions supplémentaires
         """
-        is_new = self.pk is None
+        from .services.outbox import publish
+
+        # L'identifiant UUID est attribué avant l'insertion : pk n'est jamais None
+        is_new = self._state.adding
 
         # Mettre à jour les dates selon le statut
         if self.status == "approved" and not self.approved_at:
@@ -256,29 +278,25 @@ class Commission(models.Model):
         if self.status == "paid" and not self.paid_at:
             self.paid_at = timezone.now()
 
-        super().save(*args, **kwargs)
-
-        # Action pour les nouvelles commissions
-        if is_new:
-            # Notifier l'ambassadeur par Telegram
-            from .services import TelegramService
-
-            telegram_service = TelegramService()
-            telegram_service.notify_commission(self)
-
-            # Mettre à jour les totaux sur l'ambassadeur
-            self.update_ambassador_stats()
-
-        # Synchroniser avec Supabase
-        try:
-            from .services import SupabaseService
+        # Les totaux de l'ambassadeur sont maintenus par les signaux (voir signals.py) ;
+        # Telegram et Supabase sont appelés par le worker de l'outbox.
+        with transaction.atomic():
+            if not is_new:
+                # État enregistré, ligne verrouillée : de deux transitions concurrentes
+                # (webhook et admin), le grand livre n'enregistre que la première
+                stored = (
+                    Commission.objects.select_for_update()
+                    .filter(pk=self.pk)
+                    .values_list("status", "amount")
+                    .first()
+                )
+                if stored:
+                    self._ledger_state = stored
+            super().save(*args, **kwargs)
 
-            supabase = SupabaseService()
-            supabase.sync_commission(self)
-        except Exception as e:
-            logger.error(
-                f"Erreur lors de la synchronisation Supabase de la commission {self.id}: {str(e)}"
-            )
+            if is_new:
+                publish("telegram.commission", self)
+            publish("supabase.commission", self)
 
     def update_ambassador_stats(self):
         """
@@ -362,23 +380,10 @@ class Commission(models.Model):
         """
         Calcule le montant de la commission basé sur les taux par défaut ou personnalisés
         """
-        # Taux par défaut
-        default_rates = {
-            "escort": Decimal("30.00"),  # 30% pour les escortes
-            "ambassador": Decimal("10.00"),  # 10% pour les ambassadeurs
-            "agency": Decimal("30.00"),  # 30% pour les agences
-            "member": Decimal("30.00"),  # 30% pour les membres
-        }
+        from .services.rate_resolver import resolve_rate
 
-        rate = default_rates.get(user_type, Decimal("0.00"))
-
-        # Vérifier si l'ambassadeur a un taux personnalisé
-        if referrer:
-            try:
-                custom_rate = CommissionRate.objects.get(ambassador=referrer, target_type=user_type)
-                rate = custom_rate.rate
-            except CommissionRate.DoesNotExist:
-                pass
+        # Taux personnalisé, à défaut taux du profil, à défaut taux par défaut (en mémoire)
+        rate = resolve_rate(referrer.pk if referrer else None, user_type)
 
         # Calculer le montant de la commission
         amount = (Decimal(gross_amount) * rate) / Decimal("100.00")
@@ -426,7 +431,12 @@ class CommissionRate(models.Model):
         # Vérifier que l'utilisateur est un ambassadeur
         if not self.ambassador.is_ambassador:
             raise ValidationError(_("Seuls les ambassadeurs peuvent avoir des taux de commission."))
-        super().save(*args, **kwargs)
+
+        from .services.outbox import publish
+
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            publish("supabase.commission_rate", self)
 
 
 class Payout(models.Model):
@@ -472,34 +482,23 @@ class Payout(models.Model):
         return f"Paiement de {self.amount}€ à {self.ambassador.username}"
 
     def save(self, *args, **kwargs):
-        is_new = self.pk is None
-        if self.status == "completed" and not self.completed_at:
-            self.completed_at = timezone.now()
-            # Marquer les commissions comme payées
-            for commission in self.commissions.all():
-                commission.status = "paid"
-                commission.paid_at = self.completed_at
-                commission.save()
+        # Importer les services ici pour éviter l'importation circulaire
+        from .services.bulk_payout import settle_commissions
+        from .services.outbox import publish
 
-        super().save(*args, **kwargs)
+        # L'identifiant UUID est attribué avant l'insertion : pk n'est jamais None
+        is_new = self._state.adding
+        with transaction.atomic():
+            if self.status == "completed" and not self.completed_at:
+                self.completed_at = timezone.now()
+                # Marquer les commissions comme payées (un seul UPDATE)
+                settle_commissions(self.commissions.all(), self.completed_at)
 
-        if is_new:
-            # Importer le service ici pour éviter l'importation circulaire
-            from .services import TelegramService
+            super().save(*args, **kwargs)
 
-            telegram_service = TelegramService()
-            telegram_service.notify_payout(self)
-
-        # Synchroniser avec Supabase
-        try:
-            from .services import SupabaseService
-
-            supabase = SupabaseService()
-            supabase.sync_payout(self)
-        except Exception as e:
-            logger.error(
-                f"Erreur lors de la synchronisation Supabase du paiement {self.id}: {str(e)}"
-            )
+            if is_new:
+                publish("telegram.payout", self)
+            publish("supabase.payout", self)
 
     @classmethod
     def create_from_commissions(cls, ambassador, commissions, payment_method):
@@ -627,18 +626,13 @@ class WhiteLabel(models.Model):
         if not self.dns_verification_code:
             self.dns_verification_code = secrets.token_hex(16)
 
-        super().save(*args, **kwargs)
+        from .services.outbox import publish
 
-        # Synchroniser avec Supabase après sauvegarde
-        try:
-            from .services import SupabaseService
+        with transaction.atomic():
+            super().save(*args, **kwargs)
 
-            supabase = SupabaseService()
-            supabase.sync_white_label(self)
-        except Exception as e:
-            logger.error(
-                f"Erreur lors de la synchronisation Supabase du white label {self.id}: {str(e)}"
-            )
+            # Synchronisation Supabase livrée par le worker de l'outbox
+            publish("supabase.white_label", self)
 
     def verify_dns(self):
         """
@@ -692,6 +686,8 @@ class WhiteLabel(models.Model):
 class AffiliateProfile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name="affiliate_profile")
     points = models.IntegerField(default=0)
+    # Compteurs maintenus par services/profile_counters.py (deltas F() atomiques)
+    total_clicks = models.IntegerField(default=0)
     total_earnings = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     total_referrals = models.IntegerField(default=0)
     conversion_rate = models.DecimalField(max_digits=5, decimal_places=2, default=0)
@@ -707,8 +703,192 @@ class AffiliateProfile(models.Model):
 
     def calculate_conversion_rate(self):
         """Calcule le taux de conversion des parrainages."""
-        # TODO: implémenter le calcul du taux de conversion
-        return 0.0
+        if not self.total_clicks:
+            return 0.0
+        return (self.total_referrals / self.total_clicks) * 100
+
+
+class AffiliateDailyStats(models.Model):
+    """
+    Statistiques quotidiennes pré-agrégées d'un ambassadeur (date locale).
+
+    Mises à jour de manière incrémentale à chaque clic, parrainage, commission
+    et paiement (voir ``services/daily_stats.py``) ; reconstruites au besoin
+    avec ``python manage.py rebuild_daily_stats``.
+    """
+
+    ambassador = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="daily_stats",
+    )
+    date = models.DateField(_("Date"))
+
+    # Trafic et parrainages
+    clicks = models.PositiveIntegerField(default=0)
+    referrals = models.PositiveIntegerField(default=0)
+    ambassador_referrals = models.PositiveIntegerField(default=0)
+    escort_referrals = models.PositiveIntegerField(default=0)
+
+    # Commissions (date de création) par statut
+    commissions_pending = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    commissions_approved = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    commissions_paid = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    commissions_rejected = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+
+    # Commissions (tous statuts) par catégorie du filleul
+    ambassador_commissions = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    escort_commissions = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+
+    # Paiements complétés (date de complétion)
+    payouts_count = models.PositiveIntegerField(default=0)
+    payouts_amount = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = _("statistiques quotidiennes")
+        verbose_name_plural = _("statistiques quotidiennes")
+        ordering = ["date"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["ambassador", "date"], name="unique_affiliate_daily_stats"
+            )
+        ]
+
+    def __str__(self):
+        return f"Stats {self.ambassador_id} du {self.date}"
+
+    @property
+    def commissions_total(self):
+        return (
+            self.commissions_pending
+            + self.commissions_approved
+            + self.commissions_paid
+            + self.commissions_rejected
+        )
+
+    @property
+    def earnings(self):
+        """Gains validés (approuvés + payés)."""
+        return self.commissions_approved + self.commissions_paid
+
+
+class ReferralClosure(models.Model):
+    """
+    Table de fermeture du graphe de parrainage (``User.referred_by``).
+
+    Une ligne par couple (ancêtre, descendant) à ``depth`` niveaux d'écart
+    (1 = filleul direct). Maintenue à chaque changement de parrain (voir
+    ``services/referral_tree.py``) ; reconstruite au besoin avec
+    ``python manage.py rebuild_referral_closure``.
+    """
+
+    ancestor = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="downline_paths",
+    )
+    descendant = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="upline_paths",
+    )
+    depth = models.PositiveSmallIntegerField(_("Niveau"))
+
+    class Meta:
+        verbose_name = _("lien de parrainage indirect")
+        verbose_name_plural = _("liens de parrainage indirects")
+        constraints = [
+            models.UniqueConstraint(
+                fields=["ancestor", "descendant"], name="unique_referral_closure"
+            )
+        ]
+        indexes = [
+            # Downline d'un ambassadeur, limitée ou groupée par niveau
+            models.Index(fields=["ancestor", "depth"]),
+            # Lignée (upline) d'un utilisateur
+            models.Index(fields=["descendant", "depth"]),
+        ]
+
+    def __str__(self):
+        return f"{self.ancestor_id} -> {self.descendant_id} (niveau {self.depth})"
+
+
+class CommissionLedgerEntry(models.Model):
+    """
+    Écriture du grand livre des commissions (ajout seul, jamais modifiée).
+
+    Chaque changement d'état d'une commission ajoute une écriture portant les
+    variations des soldes « en attente », « disponible » (approuvé, non payé)
+    et « payé » de l'ambassadeur. Le solde courant vaut le dernier
+    ``CommissionBalanceSnapshot`` plus les écritures postérieures (voir
+    ``services/commission_ledger.py``) : aucune écriture ne touche la ligne
+    ``User`` de l'ambassadeur.
+    """
+
+    ENTRY_TYPES = [
+        ("accrual", _("Commission générée")),
+        ("approval", _("Approbation")),
+        ("payout", _("Paiement")),
+        ("reversal", _("Annulation")),
+    ]
+
+    ambassador = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="ledger_entries",
+    )
+    commission = models.ForeignKey(
+        Commission,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="ledger_entries",
+    )
+    entry_type = models.CharField(_("Type"), max_length=10, choices=ENTRY_TYPES)
+    pending_delta = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    available_delta = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    paid_delta = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = _("écriture de commission")
+        verbose_name_plural = _("grand livre des commissions")
+        indexes = [
+            # Écritures d'un ambassadeur postérieures à son dernier instantané
+            models.Index(fields=["ambassador", "id"]),
+        ]
+
+    def __str__(self):
+        return f"{self.get_entry_type_display()} - {self.ambassador_id} ({self.created_at})"
+
+
+class CommissionBalanceSnapshot(models.Model):
+    """
+    Soldes d'un ambassadeur arrêtés à l'écriture ``last_entry_id`` incluse.
+
+    Recalculé périodiquement par ``python manage.py snapshot_commission_balances``,
+    seul processus à écrire dans cette table.
+    """
+
+    ambassador = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="balance_snapshot",
+    )
+    last_entry_id = models.BigIntegerField(default=0)
+    pending = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    available = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    paid = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = _("instantané de solde")
+        verbose_name_plural = _("instantanés de solde")
+
+    def __str__(self):
+        return f"Solde {self.ambassador_id} @ {self.last_entry_id}"
 
 
 class PaymentMethod(models.Model):
@@ -736,3 +916,185 @@ class PaymentMethod(models.Model):
 
     def __str__(self):
         return f"{self.get_payment_type_display()} - {self.account_name}"
+
+
+class OutboxEvent(models.Model):
+    """
+    Effet de bord (notification Telegram, synchronisation Supabase…) enregistré
+    dans la même transaction que la sauvegarde qui le déclenche, puis livré
+    par le worker ``process_outbox`` (voir ``services/outbox.py``).
+    """
+
+    STATUS_CHOICES = [
+        ("pending", _("En attente")),
+        ("processing", _("En cours")),
+        ("delivered", _("Livré")),
+        ("dead", _("Abandonné")),
+    ]
+
+    topic = models.CharField(_("Sujet"), max_length=64)
+    aggregate_type = models.CharField(_("Type d'objet"), max_length=64)
+    aggregate_id = models.CharField(_("Identifiant de l'objet"), max_length=64)
+    payload = models.JSONField(default=dict, blank=True)
+
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="pending")
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    available_at = models.DateTimeField(default=timezone.now)
+    locked_until = models.DateTimeField(null=True, blank=True)
+    delivered_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = _("événement sortant")
+        verbose_name_plural = _("événements sortants")
+        ordering = ["id"]
+        indexes = [
+            models.Index(fields=["status", "available_at"]),
+            models.Index(fields=["aggregate_type", "aggregate_id", "status"]),
+        ]
+
+    def __str__(self):
+        return f"{self.topic} {self.aggregate_type}:{self.aggregate_id} ({self.status})"
+
+
+class RateChangeAudit(models.Model):
+    """
+    Trace d'une modification de taux de commission en masse, une ligne par
+    opération (voir ``services/rate_changes.py``) : qui, sur quel périmètre,
+    avec quels taux, combien d'ambassadeurs touchés et l'impact projeté sur
+    les commissions en attente au moment du changement.
+    """
+
+    OPERATIONS = [
+        ("base_rate", _("Taux de base")),
+        ("specific_rates", _("Taux spécifiques")),
+    ]
+
+    admin = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="rate_changes",
+    )
+    operation = models.CharField(_("Opération"), max_length=20, choices=OPERATIONS)
+    scope = models.CharField(_("Périmètre"), max_length=20)
+    parameters = models.JSONField(default=dict, blank=True)
+
+    ambassadors_count = models.PositiveIntegerField(default=0)
+    notifications_count = models.PositiveIntegerField(default=0)
+    pending_commissions = models.PositiveIntegerField(default=0)
+    pending_amount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    projected_amount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = _("modification de taux")
+        verbose_name_plural = _("modifications de taux")
+        ordering = ["-created_at"]
+
+    def __str__(self):
+        return f"{self.get_operation_display()} ({self.scope}) - {self.ambassadors_count} ambassadeurs"
+
+
+class CommissionRecalculation(models.Model):
+    """
+    Recalcul des commissions en attente aux taux courants (voir
+    ``services/commission_recalculation.py``), par lots reprenables : chaque
+    lot validé avance ``last_commission_id``, d'où un recalcul interrompu
+    repart.
+    """
+
+    STATUS_CHOICES = [
+        ("running", _("En cours")),
+        ("completed", _("Terminé")),
+    ]
+
+    ambassador_ids = models.JSONField(default=list, blank=True)
+    since = models.DateField(null=True, blank=True)
+    until = models.DateField(null=True, blank=True)
+
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="running")
+    last_commission_id = models.UUIDField(null=True, blank=True)
+    scanned = models.PositiveIntegerField(default=0)
+    changed = models.PositiveIntegerField(default=0)
+    amount_before = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    amount_after = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = _("recalcul de commissions")
+        verbose_name_plural = _("recalculs de commissions")
+        ordering = ["-created_at"]
+
+    def __str__(self):
+        return f"Recalcul {self.id} ({self.get_status_display()}) - {self.changed}/{self.scanned}"
+
+
+class CommissionRecalculationDiff(models.Model):
+    """Avant / après d'une commission modifiée par un recalcul."""
+
+    recalculation = models.ForeignKey(
+        CommissionRecalculation, on_delete=models.CASCADE, related_name="diffs"
+    )
+    commission = models.ForeignKey(
+        Commission,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="recalculations",
+    )
+    rate_before = models.DecimalField(max_digits=5, decimal_places=2)
+    rate_after = models.DecimalField(max_digits=5, decimal_places=2)
+    amount_before = models.DecimalField(max_digits=10, decimal_places=2)
+    amount_after = models.DecimalField(max_digits=10, decimal_places=2)
+
+    class Meta:
+        verbose_name = _("écart de recalcul")
+        verbose_name_plural = _("écarts de recalcul")
+
+    def __str__(self):
+        return f"{self.commission_id} : {self.amount_before} -> {self.amount_after}"
+
+
+class ExternalPayment(models.Model):
+    """
+    Paiement déclaré par un site partenaire (voir
+    ``services/external_payments.py``). La clé (source, payment_id) rend
+    l'enregistrement idempotent : un paiement rejoué ne crée pas de nouvelles
+    commissions, dont l'identifiant de transaction est celui du paiement.
+    """
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    source = models.CharField(max_length=100)
+    payment_id = models.CharField(max_length=100)
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="external_payments",
+    )
+    amount = models.DecimalField(max_digits=12, decimal_places=2)
+    payment_date = models.DateTimeField(null=True, blank=True)
+    description = models.CharField(max_length=255, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = _("paiement externe")
+        verbose_name_plural = _("paiements externes")
+        ordering = ["-created_at"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["source", "payment_id"], name="unique_external_payment"
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.source}/{self.payment_id} - {self.amount} €"
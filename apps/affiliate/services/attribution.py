@@ -0,0 +1,199 @@
+"""
+Attribution des visiteurs à un ambassadeur.
+
+L'attribution d'un visiteur anonyme tient dans un seul cookie portant un jeton
+signé et versionné :
+
+    v1.<id de clé>.<données base64>.<signature>
+
+Les données contiennent l'id du parrain, son code et la date du premier
+contact ; la signature est un HMAC-SHA256 calculé avec la clé
+``AFFILIATE_ATTRIBUTION_KEYS[id de clé]``. Un jeton valide est approuvé sans
+requête en base ni session ; le résolveur n'est consulté que si le parrain a
+été révoqué (code modifié, compte désactivé ou supprimé).
+
+Rotation des clés : ajouter la nouvelle clé à ``AFFILIATE_ATTRIBUTION_KEYS``,
+la désigner dans ``AFFILIATE_ATTRIBUTION_KEY_ID`` et conserver l'ancienne
+pendant ``AFFILIATE_COOKIE_AGE``. Les cookies signés avec une ancienne clé
+restent valides et sont réémis avec la clé courante (même date d'expiration).
+
+La session n'est écrite qu'à l'inscription (``persist_attribution``). Les
+anciens cookies (code en clair, ``ref_code``, cookie signé par Django) sont
+encore acceptés s'ils désignent un code valide, puis remplacés par un jeton.
+"""
+
+import base64
+import json
+import logging
+import time
+from collections import namedtuple
+
+from django.conf import settings
+from django.utils.crypto import constant_time_compare, salted_hmac
+
+from apps.affiliate.services.referral_resolver import is_referrer_revoked, resolve_referral_code
+
+logger = logging.getLogger(__name__)
+
+TOKEN_VERSION = "v1"
+ATTRIBUTION_SALT = "affiliate.attribution"
+LEGACY_COOKIE_NAME = "ref_code"
+SESSION_KEY = "affiliate_code"
+
+AttributionToken = namedtuple("AttributionToken", ["referrer_id", "code", "first_touch", "key_id"])
+
+
+def _b64encode(data):
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+
+
+def _b64decode(value):
+    return base64.urlsafe_b64decode(value + "=" * (-len(value) % 4))
+
+
+def _signature(key_id, message):
+    secret = settings.AFFILIATE_ATTRIBUTION_KEYS[key_id]
+    return _b64encode(
+        salted_hmac(ATTRIBUTION_SALT, message, secret=secret, algorithm="sha256").digest()
+    )
+
+
+def encode_token(referrer_id, code, first_touch=None, key_id=None):
+    """Jeton signé avec la clé ``key_id`` (par défaut la clé courante)."""
+    key_id = key_id or settings.AFFILIATE_ATTRIBUTION_KEY_ID
+    first_touch = int(first_touch if first_touch is not None else time.time())
+    payload = _b64encode(
+        json.dumps([referrer_id, code, first_touch], separators=(",", ":")).encode("utf-8")
+    )
+    message = f"{TOKEN_VERSION}.{key_id}.{payload}"
+    return f"{message}.{_signature(key_id, message)}"
+
+
+def decode_token(value):
+    """
+    ``AttributionToken`` d'un jeton authentique et non expiré, sinon None.
+    Aucune E/S : seules la signature et la date du premier contact sont vérifiées.
+    """
+    try:
+        version, key_id, payload, signature = value.split(".")
+    except (AttributeError, ValueError):
+        return None
+    if version != TOKEN_VERSION or key_id not in settings.AFFILIATE_ATTRIBUTION_KEYS:
+        return None
+    if not constant_time_compare(signature, _signature(key_id, f"{version}.{key_id}.{payload}")):
+        logger.warning(f"❌ Signature invalide pour le cookie d'attribution (clé {key_id})")
+        return None
+    try:
+        referrer_id, code, first_touch = json.loads(_b64decode(payload))
+    except ValueError:
+        return None
+    if first_touch + settings.AFFILIATE_COOKIE_AGE < time.time():
+        return None
+    return AttributionToken(referrer_id, code, first_touch, key_id)
+
+
+def is_tracked_path(path):
+    """False pour les fichiers statiques, médias et sondes de santé."""
+    return not path.startswith(tuple(settings.AFFILIATE_ATTRIBUTION_SKIP_PREFIXES))
+
+
+def _legacy_token(request):
+    """Jeton reconstruit depuis un ancien cookie, après validation par le résolveur."""
+    candidates = [
+        request.get_signed_cookie(
+            settings.AFFILIATE_COOKIE_NAME,
+            default=None,
+            salt=ATTRIBUTION_SALT,
+            max_age=settings.AFFILIATE_COOKIE_AGE,
+        )
+    ]
+    for name in (settings.AFFILIATE_COOKIE_NAME, LEGACY_COOKIE_NAME):
+        raw = request.COOKIES.get(name)
+        if raw and ":" not in raw and "." not in raw:
+            candidates.append(raw)
+
+    for code in candidates:
+        referrer = resolve_referral_code(code) if code else None
+        if referrer is not None:
+            return AttributionToken(referrer.id, referrer.referral_code, int(time.time()), None)
+    return None
+
+
+def read_attribution_cookie(request):
+    """
+    Jeton d'attribution porté par la requête, ou None.
+
+    Retourne ``(token, reissue)`` : ``reissue`` est vrai si le cookie doit être
+    réémis (ancien format ou clé qui n'est plus la clé courante).
+    """
+    value = request.COOKIES.get(settings.AFFILIATE_COOKIE_NAME)
+    token = decode_token(value) if value else None
+
+    if token is None:
+        if value is None and LEGACY_COOKIE_NAME not in request.COOKIES:
+            return None, False
+        token = _legacy_token(request)
+        return token, token is not None
+
+    if is_referrer_revoked(token.referrer_id):
+        # Code modifié ou compte désactivé depuis l'émission : revérifier
+        referrer = resolve_referral_code(token.code)
+        if referrer is None or referrer.id != token.referrer_id:
+            logger.info(f"ℹ️ Cookie d'attribution révoqué pour le parrain {token.referrer_id}")
+            return None, False
+
+    return token, token.key_id != settings.AFFILIATE_ATTRIBUTION_KEY_ID
+
+
+def write_token_cookie(response, token, request=None):
+    """
+    Place ``token`` (signé avec la clé courante) sur ``response``, sans E/S.
+
+    L'expiration suit la date du premier contact : réémettre un jeton ne
+    prolonge pas l'attribution.
+    """
+    max_age = max(0, token.first_touch + settings.AFFILIATE_COOKIE_AGE - int(time.time()))
+    response.set_cookie(
+        settings.AFFILIATE_COOKIE_NAME,
+        encode_token(token.referrer_id, token.code, token.first_touch),
+        max_age=max_age,
+        secure=request.is_secure() if request is not None else False,
+        httponly=True,
+        samesite="Lax",  # Permet le suivi lors d'une redirection depuis un site externe
+    )
+    if request is not None and LEGACY_COOKIE_NAME in request.COOKIES:
+        response.delete_cookie(LEGACY_COOKIE_NAME)
+
+
+def set_attribution_cookie(response, code, request=None, first_touch=None):
+    """
+    Place sur ``response`` le jeton d'attribution du parrain de ``code``.
+    Retourne False si le code est invalide.
+    """
+    referrer = resolve_referral_code(code)
+    if referrer is None:
+        return False
+    first_touch = int(first_touch if first_touch is not None else time.time())
+    token = AttributionToken(referrer.id, referrer.referral_code, first_touch, None)
+    write_token_cookie(response, token, request)
+    return True
+
+
+def get_attribution_code(request):
+    """
+    Code de parrainage attribué à la requête : paramètre d'URL validé ou
+    cookie (posé par ``AttributionMiddleware``), sinon session d'un
+    utilisateur déjà inscrit.
+    """
+    code = getattr(request, "affiliate_code", None)
+    if code:
+        return code
+    session = getattr(request, "session", None)
+    # Lecture seule : ne crée pas de session pour un visiteur anonyme
+    return session.get(SESSION_KEY) if session is not None else None
+
+
+def persist_attribution(request, code):
+    """Conserve l'attribution dans la session, une fois l'utilisateur inscrit."""
+    if code and request.session.get(SESSION_KEY) != code:
+        request.session[SESSION_KEY] = code
@@ -0,0 +1,163 @@
+"""
+Paiement des commissions en masse.
+
+Le tableau de bord administrateur paie d'un coup les commissions d'un mois,
+d'une sélection ou d'un ambassadeur. ``pay_commissions`` traite le lot en un
+nombre fixe de requêtes, quelle que soit sa taille :
+
+- les commissions sélectionnées sont verrouillées une fois
+  (``select_for_update``) puis passent à « payée » par un seul ``UPDATE`` ;
+  grand livre, statistiques quotidiennes, compteurs et caches sont mis à jour
+  par groupe ;
+- un ``Payout`` complété par ambassadeur est inséré par ``bulk_create``, avec
+  ses liens vers les commissions ;
+- la synchronisation Supabase des commissions et des paiements part dans
+  l'outbox (livrée par lot), avec une seule notification Telegram par paiement.
+
+``settle_commissions`` est la partie commune avec ``Payout.save``, quand un
+paiement passe à « complété ».
+"""
+
+import logging
+import uuid
+from collections import defaultdict, namedtuple
+from decimal import Decimal
+
+from django.db import transaction
+from django.utils import timezone
+
+from apps.accounts.models import UserProfile
+from apps.affiliate.models import Commission, Payout
+from apps.affiliate.services.commission_ledger import record_ledger_transitions
+from apps.affiliate.services.daily_stats import (
+    record_commission_transitions,
+    record_new_payouts,
+)
+from apps.affiliate.services.dashboard_stats import commission_stats_owners, invalidate_stats
+from apps.affiliate.services.outbox import publish_many
+from apps.affiliate.services.profile_counters import record_earnings_transitions
+
+logger = logging.getLogger(__name__)
+
+PayoutBatch = namedtuple(
+    "PayoutBatch", ["reference", "payouts", "commission_count", "total", "skipped"]
+)
+
+# Seules les commissions approuvées sont payables (voir Commission.mark_as_paid)
+PAYABLE_STATUSES = ("approved",)
+
+# Méthode de paiement d'un ambassadeur : premier portefeuille renseigné du profil
+WALLET_FIELDS = (
+    ("usdt", "usdt_trc20_wallet"),
+    ("btc", "btc_wallet"),
+    ("eth", "eth_erc20_wallet"),
+)
+DEFAULT_PAYMENT_METHOD = "usdt"
+
+
+def settle_commissions(queryset, paid_at=None, admin_user=None):
+    """
+    Passe au statut « payée » les commissions non payées de ``queryset``.
+
+    Les lignes sont verrouillées puis modifiées par un seul ``UPDATE`` ; les
+    effets de bord que les signaux ne voient pas passer sont appliqués par
+    groupe. Retourne les commissions réglées (``id``, ``user_id``, ``amount``).
+    """
+    paid_at = paid_at or timezone.now()
+    with transaction.atomic():
+        # Ordre stable des verrous : deux lots concurrents ne s'interbloquent pas.
+        # Une jointure (commissions de plusieurs paiements) peut dupliquer des lignes.
+        commissions = list(
+            {
+                commission.id: commission
+                for commission in queryset.exclude(status="paid")
+                .select_related(None)
+                .select_for_update()
+                .order_by("id")
+                .only("id", "user_id", "amount")
+            }.values()
+        )
+        if not commissions:
+            return []
+
+        locked = Commission.objects.filter(id__in=[commission.id for commission in commissions])
+        record_ledger_transitions(locked, "paid")
+        record_commission_transitions(locked, "paid")
+        record_earnings_transitions(locked, "paid")
+        invalidate_stats(*commission_stats_owners(locked))
+
+        updates = {"status": "paid", "paid_at": paid_at}
+        if admin_user:
+            updates["updated_by"] = admin_user
+        locked.update(**updates)
+
+        # Un événement par commission, fusionné avec ceux déjà en attente
+        publish_many("supabase.commission", commissions)
+    return commissions
+
+
+def _payment_methods(ambassador_ids):
+    """``{ambassadeur: (méthode, adresse)}`` d'après les portefeuilles des profils."""
+    fields = [field for _, field in WALLET_FIELDS]
+    methods = {}
+    for row in UserProfile.objects.filter(user_id__in=ambassador_ids).values("user_id", *fields):
+        methods[row["user_id"]] = next(
+            ((method, row[field]) for method, field in WALLET_FIELDS if row[field]),
+            (DEFAULT_PAYMENT_METHOD, None),
+        )
+    return methods
+
+
+def pay_commissions(queryset, admin_user=None, reference=None):
+    """
+    Paie les commissions approuvées de ``queryset`` : un paiement complété par
+    ambassadeur, identifié par ``reference`` (``transaction_id`` des paiements).
+
+    Retourne un ``PayoutBatch`` ; ``skipped`` compte les commissions non payées
+    de ``queryset`` ignorées faute d'être approuvées (en attente, annulées).
+    """
+    reference = reference or f"BATCH-{uuid.uuid4().hex[:8]}"
+    paid_at = timezone.now()
+
+    with transaction.atomic():
+        skipped = queryset.exclude(status__in=(*PAYABLE_STATUSES, "paid")).count()
+        commissions = settle_commissions(
+            queryset.filter(status__in=PAYABLE_STATUSES), paid_at, admin_user
+        )
+        by_ambassador = defaultdict(list)
+        for commission in commissions:
+            by_ambassador[commission.user_id].append(commission)
+
+        methods = _payment_methods(by_ambassador)
+        payouts = []
+        links = []
+        for ambassador_id, owned in by_ambassador.items():
+            method, wallet = methods.get(ambassador_id, (DEFAULT_PAYMENT_METHOD, None))
+            payout = Payout(
+                ambassador_id=ambassador_id,
+                amount=sum((commission.amount for commission in owned), Decimal("0")),
+                payment_method=method,
+                wallet_address=wallet,
+                status="completed",
+                transaction_id=reference,
+                completed_at=paid_at,
+            )
+            payouts.append(payout)
+            links.extend(
+                Payout.commissions.through(payout_id=payout.id, commission_id=commission.id)
+                for commission in owned
+            )
+
+        if payouts:
+            Payout.objects.bulk_create(payouts)
+            Payout.commissions.through.objects.bulk_create(links, batch_size=1000)
+            record_new_payouts(payouts)
+            publish_many("telegram.payout", payouts)
+            publish_many("supabase.payout", payouts)
+
+    total = sum((payout.amount for payout in payouts), Decimal("0"))
+    logger.info(
+        f"💰 Lot {reference} : {len(commissions)} commissions payées ({total} €) "
+        f"en {len(payouts)} paiements, {skipped} non approuvées ignorées"
+    )
+    return PayoutBatch(reference, payouts, len(commissions), total, skipped)
@@ -0,0 +1,317 @@
+"""
+Pipeline d'ingestion des clics de parrainage.
+
+Le chemin de requête (pixel ``track_click`` et ``referral_redirect``) se contente
+d'ajouter le clic dans un tampon rapide puis rend la main immédiatement :
+
+- un stream Redis lorsque ``REDIS_URL`` est configuré ;
+- sinon (ou si Redis est indisponible) un spool local de fichiers JSONL.
+
+Le worker ``python manage.py flush_referral_clicks`` vide ensuite le tampon par
+lots : une seule requête pour résoudre les codes de parrainage, un
+``bulk_create`` pour les clics et une seule mise à jour des statistiques
+d'affiliation par lot.
+"""
+
+import json
+import logging
+import os
+import socket
+import time
+from collections import defaultdict
+from datetime import datetime, timezone as dt_timezone
+from pathlib import Path
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+
+def _click_payload(request, referral_code):
+    """Construit la représentation compacte d'un clic à mettre en tampon."""
+    return {
+        "code": referral_code,
+        "ip": request.META.get("REMOTE_ADDR") or "0.0.0.0",
+        "ua": request.META.get("HTTP_USER_AGENT", ""),
+        "ts": time.time(),
+    }
+
+
+class SpoolClickBuffer:
+    """
+    Tampon local : un fichier JSONL par processus et par fenêtre de flush.
+
+    Chaque écriture ouvre le fichier en mode append puis le referme. Le worker
+    revendique une fenêtre écoulée en la renommant atomiquement en
+    ``.processing`` avant de la lire : un processus qui avait déjà calculé
+    l'ancien nom recrée alors un nouveau fichier, consommé au passage suivant,
+    au lieu d'écrire dans un fichier lu puis supprimé.
+    """
+
+    name = "spool"
+    claimed_suffix = ".processing"
+    # Une revendication plus ancienne (worker interrompu) est reprise
+    stale_claim_seconds = 300
+
+    def __init__(self, directory=None, window=None):
+        self.directory = Path(directory or settings.AFFILIATE_CLICK_SPOOL_DIR)
+        self.window = max(1, int(window or settings.AFFILIATE_CLICK_FLUSH_INTERVAL))
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    def _current_bucket(self):
+        return int(time.time()) // self.window
+
+    def push(self, payload):
+        path = self.directory / f"clicks-{self._current_bucket()}-{os.getpid()}.jsonl"
+        with open(path, "a", encoding="utf-8") as spool:
+            spool.write(json.dumps(payload, separators=(",", ":")) + "\n")
+
+    def _claim(self, path):
+        """Renomme ``path`` en ``.processing`` ; ``None`` si un autre worker l'a pris."""
+        # Nom unique par revendication : une reprise renomme à nouveau le fichier
+        name = path.name.split(".jsonl")[0]
+        claimed = path.with_name(
+            f"{name}.jsonl.{os.getpid()}-{time.time_ns()}{self.claimed_suffix}"
+        )
+        try:
+            os.rename(path, claimed)
+            os.utime(claimed)
+        except FileNotFoundError:
+            return None
+        return claimed
+
+    def _claimable(self):
+        """Fenêtres fermées, puis revendications abandonnées par un worker interrompu."""
+        current = self._current_bucket()
+        for path in sorted(self.directory.glob("clicks-*.jsonl")):
+            try:
+                bucket = int(path.name.split("-")[1])
+            except (IndexError, ValueError):
+                continue
+            if bucket < current:
+                yield path
+
+        stale_before = time.time() - self.stale_claim_seconds
+        for path in sorted(self.directory.glob(f"clicks-*{self.claimed_suffix}")):
+            try:
+                if path.stat().st_mtime < stale_before:
+                    yield path
+            except FileNotFoundError:
+                continue
+
+    def read_batch(self, max_items):
+        """
+        Retourne ``(fichiers, clics)`` pour les fenêtres fermées.
+
+        Seuls les fichiers revendiqués par ce worker sont lus. Ils sont
+        consommés entiers : un lot peut donc dépasser légèrement ``max_items``.
+        """
+        files, clicks = [], []
+        for path in self._claimable():
+            claimed = self._claim(path)
+            if claimed is None:
+                continue
+            with open(claimed, encoding="utf-8") as spool:
+                for line in spool:
+                    try:
+                        clicks.append(json.loads(line))
+                    except ValueError:
+                        logger.warning(f"Ligne de spool illisible ignorée dans {claimed.name}")
+            files.append(claimed)
+            if len(clicks) >= max_items:
+                break
+        return files, clicks
+
+    def ack(self, files):
+        for path in files:
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+
+    def pending(self):
+        return sum(1 for _ in self.directory.glob("clicks-*"))
+
+
+class RedisClickBuffer:
+    """Tampon partagé basé sur un stream Redis et un groupe de consommateurs."""
+
+    name = "redis"
+
+    def __init__(self, url=None, stream=None, group="affiliate-click-workers"):
+        import redis
+
+        self.client = redis.Redis.from_url(url or settings.REDIS_URL)
+        self.stream = stream or settings.AFFILIATE_CLICK_STREAM_KEY
+        self.group = group
+        self.consumer = f"{socket.gethostname()}-{os.getpid()}"
+        self._group_ready = False
+
+    def push(self, payload):
+        self.client.xadd(
+            self.stream,
+            {"c": json.dumps(payload, separators=(",", ":"))},
+            maxlen=settings.AFFILIATE_CLICK_STREAM_MAXLEN,
+            approximate=True,
+        )
+
+    def _ensure_group(self):
+        if self._group_ready:
+            return
+        import redis
+
+        try:
+            self.client.xgroup_create(self.stream, self.group, id="0", mkstream=True)
+        except redis.ResponseError as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+        self._group_ready = True
+
+    def read_batch(self, max_items):
+        self._ensure_group()
+        # Reprendre d'abord les messages non acquittés de ce consommateur
+        # (worker interrompu avant l'ack), puis les nouveaux messages.
+        entries = []
+        for start_id in ("0", ">"):
+            response = self.client.xreadgroup(
+                self.group, self.consumer, {self.stream: start_id}, count=max_items
+            )
+            for _stream, messages in response or []:
+                entries.extend(messages)
+            if entries:
+                break
+
+        ids, clicks = [], []
+        for message_id, fields in entries:
+            ids.append(message_id)
+            try:
+                clicks.append(json.loads(fields[b"c"]))
+            except (KeyError, ValueError):
+                logger.warning(f"Message de clic illisible ignoré: {message_id}")
+        return ids, clicks
+
+    def ack(self, ids):
+        if ids:
+            pipe = self.client.pipeline()
+            pipe.xack(self.stream, self.group, *ids)
+            pipe.xdel(self.stream, *ids)
+            pipe.execute()
+
+    def pending(self):
+        return self.client.xlen(self.stream)
+
+
+_buffer = None
+
+
+def get_click_buffer():
+    """Retourne le tampon configuré (Redis si disponible, sinon spool local)."""
+    global _buffer
+    if _buffer is None:
+        if getattr(settings, "REDIS_URL", ""):
+            _buffer = RedisClickBuffer()
+        else:
+            _buffer = SpoolClickBuffer()
+    return _buffer
+
+
+def enqueue_click(request, referral_code):
+    """
+    Ajoute un clic au tampon d'ingestion sans toucher à la base de données.
+
+    Si le tampon Redis est indisponible, le clic est écrit dans le spool local
+    pour ne pas être perdu ; le worker draine les deux.
+    """
+    payload = _click_payload(request, referral_code)
+
+    if not settings.AFFILIATE_CLICK_BUFFER_ENABLED:
+        return ingest_clicks([payload])
+
+    buffer = get_click_buffer()
+    try:
+        buffer.push(payload)
+    except Exception as e:
+        logger.error(f"❌ Tampon de clics {buffer.name} indisponible, repli sur le spool: {str(e)}")
+        SpoolClickBuffer().push(payload)
+    return 0
+
+
+def record_click_counters(clicks):
+    """
+    Répercute un lot de clics sur les compteurs ``AffiliateProfile``.
+
+    Remplace, pour l'ingestion par lots, le handler ``post_save`` déclenché à
+    chaque clic : un seul UPDATE atomique par ambassadeur et par lot.
+    """
+    from apps.affiliate.services.profile_counters import increment_counters_many
+
+    rows = defaultdict(lambda: {"clicks": 0})
+    for click in clicks:
+        rows[click.user_id]["clicks"] += 1
+    increment_counters_many(rows)
+
+
+def ingest_clicks(payloads):
+    """
+    Persiste un lot de clics : résolution des codes en une requête,
+    ``bulk_create`` puis mise à jour des statistiques une seule fois.
+
+    Retourne le nombre de clics enregistrés. Les clics portant un code
+    inconnu sont ignorés.
+    """
+    from apps.accounts.models import User
+    from apps.affiliate.models import ReferralClick
+    from apps.affiliate.services.daily_stats import record_clicks
+    from apps.affiliate.services.dashboard_stats import invalidate_stats
+
+    if not payloads:
+        return 0
+
+    codes = {payload.get("code") for payload in payloads if payload.get("code")}
+    users = dict(User.objects.filter(referral_code__in=codes).values_list("referral_code", "id"))
+
+    clicks = []
+    for payload in payloads:
+        user_id = users.get(payload.get("code"))
+        if user_id is None:
+            continue
+        clicked_at = payload.get("ts")
+        clicks.append(
+            ReferralClick(
+                user_id=user_id,
+                referral_code=payload["code"],
+                ip_address=payload.get("ip") or "0.0.0.0",
+                user_agent=payload.get("ua", ""),
+                clicked_at=(
+                    datetime.fromtimestamp(clicked_at, tz=dt_timezone.utc)
+                    if clicked_at
+                    else timezone.now()
+                ),
+            )
+        )
+
+    with transaction.atomic():
+        ReferralClick.objects.bulk_create(clicks, batch_size=settings.AFFILIATE_CLICK_FLUSH_SIZE)
+        record_click_counters(clicks)
+        record_clicks(clicks)
+        invalidate_stats(*{click.user_id for click in clicks})
+
+    return len(clicks)
+
+
+def flush_click_buffer(buffer, max_items=None):
+    """
+    Draine un lot du tampon donné et l'acquitte une fois la transaction validée.
+
+    L'acquittement après commit donne une garantie « au moins une fois » : un
+    worker interrompu entre le commit et l'ack peut rejouer son dernier lot.
+    """
+    max_items = max_items or settings.AFFILIATE_CLICK_FLUSH_SIZE
+    token, payloads = buffer.read_batch(max_items)
+    if not token:
+        return 0, 0
+    saved = ingest_clicks(payloads)
+    buffer.ack(token)
+    return len(payloads), saved
@@ -0,0 +1,211 @@
+"""
+Moteur de commissions multi-niveaux.
+
+Une transaction d'un filleul rémunère son parrain direct (niveau 1,
+commission « directe ») et les parrains de ses parrains jusqu'à
+``len(AFFILIATE_COMMISSION_LEVEL_SHARES)`` niveaux (commissions
+« indirectes »). Le taux d'un niveau est celui du bénéficiaire :
+
+- niveau 1 : taux pour la catégorie du filleul (escorte ou ambassadeur) ;
+- niveaux suivants : taux « ambassadeur » du bénéficiaire, qui touche sur le
+  réseau d'un ambassadeur qu'il a parrainé ;
+
+résolu par ``rate_resolver`` (``CommissionRate``, à défaut ``UserProfile``, à
+défaut ``DEFAULT_COMMISSION_RATES``), puis multiplié par la part du niveau.
+
+Un lot de transactions est traité en quelques requêtes, quelle que soit sa
+taille : lignées (table de fermeture) et parrainages sont lus en une requête
+chacun, les taux servis par la table en mémoire du résolveur, les commissions
+insérées par ``bulk_create``. Le grand livre des soldes, les statistiques
+quotidiennes, les caches de tableau de bord et les événements d'outbox, que
+les signaux ne voient pas passer, sont mis à jour par lot.
+
+Le traitement est idempotent par (transaction, niveau) : les niveaux déjà
+payés sont ignorés et la contrainte ``unique_commission_transaction_level``
+écarte les doublons concurrents.
+"""
+
+import logging
+from collections import defaultdict, namedtuple
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+
+from apps.accounts.models import User
+from apps.affiliate.models import Commission, Referral, ReferralClosure
+from apps.affiliate.services.commission_ledger import (
+    record_new_commissions as record_ledger_accruals,
+)
+from apps.affiliate.services.daily_stats import record_new_commissions
+from apps.affiliate.services.dashboard_stats import invalidate_stats
+from apps.affiliate.services.outbox import publish_many
+from apps.affiliate.services.rate_resolver import RateTable
+
+logger = logging.getLogger(__name__)
+
+
+class ReferralClosureMissing(RuntimeError):
+    """Un filleul a un parrain mais aucune lignée dans la table de fermeture."""
+
+
+CommissionTransaction = namedtuple(
+    "CommissionTransaction",
+    ["transaction_id", "user_id", "amount", "description", "reference_id"],
+    defaults=("", ""),
+)
+
+# Catégorie de référence des niveaux indirects
+INDIRECT_TARGET = "ambassador"
+CENT = Decimal("0.01")
+
+
+def level_shares():
+    """``{niveau: part du taux}`` d'après ``AFFILIATE_COMMISSION_LEVEL_SHARES``."""
+    return {
+        level: Decimal(str(share))
+        for level, share in enumerate(settings.AFFILIATE_COMMISSION_LEVEL_SHARES, start=1)
+    }
+
+
+def level_commission(rates, beneficiary_id, target, share, gross):
+    """``(taux appliqué, montant)`` d'une commission de niveau de part ``share``."""
+    rate = (rates.rate(beneficiary_id, target) * share).quantize(CENT)
+    return rate, (Decimal(gross) * rate / 100).quantize(CENT)
+
+
+def _existing_levels(transaction_ids):
+    if not transaction_ids:
+        return set()
+    return set(
+        Commission.objects.filter(transaction_id__in=transaction_ids).values_list(
+            "transaction_id", "level"
+        )
+    )
+
+
+def _build_commissions(transactions, shares):
+    """Commissions (non enregistrées) d'un lot, et catégorie du filleul par parrainage."""
+    user_ids = {tx.user_id for tx in transactions}
+    max_level = max(shares)
+
+    # Lignée de chaque filleul (niveau -> bénéficiaire) et sa catégorie
+    uplines = defaultdict(dict)
+    categories = {}
+    for descendant_id, category, ancestor_id, depth in ReferralClosure.objects.filter(
+        descendant_id__in=user_ids, depth__lte=max_level
+    ).values_list("descendant_id", "descendant__user_category", "ancestor_id", "depth"):
+        uplines[descendant_id][depth] = ancestor_id
+        categories[descendant_id] = category
+
+    # Parrainage (parrain direct -> filleul) auquel rattacher toutes les commissions
+    referrals = {
+        (referred_id, referrer_id): referral_id
+        for referral_id, referred_id, referrer_id in Referral.objects.filter(
+            referred_id__in=uplines
+        ).values_list("id", "referred_id", "referrer_id")
+    }
+
+    rates = RateTable({ancestor for upline in uplines.values() for ancestor in upline.values()})
+    existing = _existing_levels({tx.transaction_id for tx in transactions if tx.transaction_id})
+
+    commissions = []
+    referral_categories = {}
+    skipped = 0
+    for tx in transactions:
+        upline = uplines.get(tx.user_id)
+        referral_id = upline and referrals.get((tx.user_id, upline.get(1)))
+        if not referral_id:
+            skipped += 1
+            continue
+        referral_categories[referral_id] = categories[tx.user_id]
+        gross = Decimal(str(tx.amount))
+
+        for level, beneficiary_id in upline.items():
+            if (tx.transaction_id, level) in existing:
+                continue
+            target = categories[tx.user_id] if level == 1 else INDIRECT_TARGET
+            rate, amount = level_commission(rates, beneficiary_id, target, shares[level], gross)
+            if amount <= 0:
+                continue
+            commissions.append(
+                Commission(
+                    user_id=beneficiary_id,
+                    referral_id=referral_id,
+                    amount=amount,
+                    gross_amount=gross,
+                    rate_applied=rate,
+                    commission_type="direct" if level == 1 else "indirect",
+                    status="pending",
+                    description=tx.description,
+                    reference_id=tx.reference_id,
+                    transaction_id=tx.transaction_id or None,
+                    level=level,
+                )
+            )
+
+    if skipped:
+        # Un parrain sans lignée signale une table de fermeture non remplie :
+        # ignorer la transaction perdrait ses commissions (paiement déjà enregistré)
+        unlinked = list(
+            User.objects.filter(id__in=user_ids.difference(uplines), referred_by__isnull=False)
+            .exclude(referred_by=F("id"))
+            .values_list("id", flat=True)[:10]
+        )
+        if unlinked:
+            raise ReferralClosureMissing(
+                f"Lignée absente de la table de fermeture pour les utilisateurs {unlinked} : "
+                "lancer rebuild_referral_closure"
+            )
+        logger.warning(f"⚠️ {skipped} transactions sans parrainage ignorées")
+    return commissions, referral_categories
+
+
+def _record_created(commissions, referral_categories):
+    """Effets de bord des commissions insérées (les signaux ne sont pas émis)."""
+    # Soldes : écritures du grand livre, sans verrou sur les lignes User
+    record_ledger_accruals(commissions)
+    record_new_commissions(commissions, referral_categories)
+    publish_many("telegram.commission", commissions)
+    publish_many("supabase.commission", commissions)
+    invalidate_stats(*{commission.user_id for commission in commissions})
+
+
+def create_transaction_commissions(transactions, batch_size=1000):
+    """
+    Crée les commissions de tous les niveaux pour ``transactions``
+    (itérable de ``CommissionTransaction``). Retourne les commissions créées.
+
+    Rejouer un lot (import relancé, webhook reçu deux fois) ne crée que les
+    niveaux manquants des transactions identifiées par ``transaction_id``.
+    """
+    shares = level_shares()
+    transactions = list(transactions)
+    created = []
+
+    for start in range(0, len(transactions), batch_size):
+        chunk = transactions[start : start + batch_size]
+        with transaction.atomic():
+            commissions, referral_categories = _build_commissions(chunk, shares)
+            if not commissions:
+                continue
+            Commission.objects.bulk_create(commissions, ignore_conflicts=True)
+
+            # Les UUID sont attribués côté client : on relit ceux réellement insérés
+            # (un import concurrent a pu payer les mêmes niveaux entre-temps)
+            inserted = set(
+                Commission.objects.filter(
+                    id__in=[commission.id for commission in commissions]
+                ).values_list("id", flat=True)
+            )
+            commissions = [commission for commission in commissions if commission.id in inserted]
+            if commissions:
+                _record_created(commissions, referral_categories)
+            created.extend(commissions)
+
+    logger.info(
+        f"💰 {len(created)} commissions créées pour {len(transactions)} transactions "
+        f"({len(shares)} niveaux)"
+    )
+    return created
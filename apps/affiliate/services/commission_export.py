@@ -0,0 +1,164 @@
+"""
+Export en flux des commissions (CSV ou NDJSON, éventuellement compressé gzip).
+
+Les lignes sont lues par paquets (``iterator(chunk_size=...)``) avec une
+seule jointure sur l'utilisateur, encodées au fil de l'eau et envoyées via
+``StreamingHttpResponse`` : la mémoire consommée reste constante quel que
+soit le nombre de commissions exportées.
+"""
+
+import csv
+import json
+import zlib
+from datetime import datetime
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+EXPORT_FORMATS = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+}
+
+# (en-tête, champ lu en base)
+EXPORT_COLUMNS = (
+    ("ID", "id"),
+    ("User", "user__username"),
+    ("Referral", "referral_id"),
+    ("Amount", "amount"),
+    ("Status", "status"),
+    ("Transaction ID", "transaction_id"),
+    ("Created At", "created_at"),
+    ("Paid At", "paid_at"),
+)
+
+# Nombre de lignes lues par aller-retour en base
+EXPORT_CHUNK_SIZE = 2000
+
+# Taille minimale d'un morceau envoyé au client (octets)
+STREAM_BUFFER_SIZE = 64 * 1024
+
+
+class ExportError(ValueError):
+    """Paramètres d'export invalides."""
+
+
+class _Echo:
+    """Pseudo-fichier : ``csv.writer`` renvoie la ligne au lieu de l'écrire."""
+
+    def write(self, value):
+        return value
+
+
+def _parse_day(value, name):
+    if not value:
+        return None
+    day = parse_date(value)
+    if day is None:
+        raise ExportError(f"Date invalide pour '{name}' (format attendu : AAAA-MM-JJ)")
+    return day
+
+
+def filter_commissions(queryset, params):
+    """
+    Applique les filtres ``status``, ``date_from`` et ``date_to`` (inclus)
+    issus des paramètres de la requête.
+    """
+    status = params.get("status")
+    if status and status != "all":
+        queryset = queryset.filter(status=status)
+
+    date_from = _parse_day(params.get("date_from"), "date_from")
+    date_to = _parse_day(params.get("date_to"), "date_to")
+    tz = timezone.get_current_timezone()
+    if date_from:
+        start = datetime.combine(date_from, datetime.min.time())
+        queryset = queryset.filter(created_at__gte=timezone.make_aware(start, tz))
+    if date_to:
+        end = datetime.combine(date_to + timezone.timedelta(days=1), datetime.min.time())
+        queryset = queryset.filter(created_at__lt=timezone.make_aware(end, tz))
+    return queryset
+
+
+def export_rows(queryset, chunk_size=EXPORT_CHUNK_SIZE):
+    """Tuples des colonnes exportées, lus par paquets de ``chunk_size``."""
+    fields = [field for _, field in EXPORT_COLUMNS]
+    # values_list joint l'utilisateur dans la même requête (pas de N+1)
+    return queryset.order_by("id").values_list(*fields).iterator(chunk_size=chunk_size)
+
+
+def _format_value(value):
+    if value is None:
+        return ""
+    if isinstance(value, datetime):
+        return timezone.localtime(value).isoformat()
+    return value
+
+
+def _csv_lines(rows):
+    writer = csv.writer(_Echo())
+    yield writer.writerow([header for header, _ in EXPORT_COLUMNS])
+    for row in rows:
+        yield writer.writerow([_format_value(value) for value in row])
+
+
+def _ndjson_lines(rows):
+    keys = [field.replace("__", "_") for _, field in EXPORT_COLUMNS]
+    for row in rows:
+        yield json.dumps(dict(zip(keys, row)), cls=DjangoJSONEncoder) + "\n"
+
+
+def _buffered(lines, size=STREAM_BUFFER_SIZE):
+    """Regroupe les lignes en morceaux d'au moins ``size`` octets."""
+    buffer = []
+    buffered = 0
+    for line in lines:
+        data = line.encode("utf-8")
+        buffer.append(data)
+        buffered += len(data)
+        if buffered >= size:
+            yield b"".join(buffer)
+            buffer = []
+            buffered = 0
+    if buffer:
+        yield b"".join(buffer)
+
+
+def _gzipped(chunks):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # 31 : en-tête gzip
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def stream_commissions(queryset, export_format="csv", compress=False, chunk_size=EXPORT_CHUNK_SIZE):
+    """Générateur d'octets de l'export au format demandé."""
+    if export_format not in EXPORT_FORMATS:
+        raise ExportError(
+            f"Format d'export inconnu '{export_format}' (disponibles : "
+            f"{', '.join(EXPORT_FORMATS)})"
+        )
+    rows = export_rows(queryset, chunk_size=chunk_size)
+    lines = _csv_lines(rows) if export_format == "csv" else _ndjson_lines(rows)
+    chunks = _buffered(lines)
+    return _gzipped(chunks) if compress else chunks
+
+
+def commission_export_response(
+    queryset, export_format="csv", compress=False, filename="commissions"
+):
+    """``StreamingHttpResponse`` téléchargeable pour l'export demandé."""
+    stream = stream_commissions(queryset, export_format=export_format, compress=compress)
+    filename = f"{filename}.{export_format}"
+    content_type = EXPORT_FORMATS[export_format]
+    if compress:
+        filename += ".gz"
+        content_type = "application/gzip"
+
+    response = StreamingHttpResponse(stream, content_type=content_type)
+    response["Content-Disposition"] = f'attachment; filename="{filename}"'
+    return response
@@ -0,0 +1,396 @@
+"""
+Grand livre des commissions et soldes des ambassadeurs.
+
+Les soldes ne sont plus des champs de ``User`` modifiés en lecture-écriture
+(``pending_commission += montant`` puis ``save()``), qui verrouillaient la
+ligne de l'ambassadeur et perdaient des mises à jour sous webhooks
+concurrents. Chaque changement d'état d'une commission ajoute une écriture
+(``CommissionLedgerEntry``) ; les écrivains ne font que des ``INSERT`` et ne
+se bloquent jamais entre eux.
+
+Le solde courant vaut le dernier instantané de l'ambassadeur
+(``CommissionBalanceSnapshot``) plus la somme de ses écritures postérieures,
+lue sur l'index ``(ambassador, id)``. ``take_balance_snapshots`` reporte
+périodiquement les nouvelles écritures dans les instantanés pour que cette
+somme reste courte.
+
+Correspondance des statuts de commission et des soldes :
+
+- ``pending`` : en attente ;
+- ``approved`` : disponible (payable) ;
+- ``paid`` : payé ;
+- ``rejected`` ou suppression : hors solde.
+"""
+
+import logging
+from collections import defaultdict, namedtuple
+from decimal import Decimal
+
+from django.db import connection, transaction
+from django.db.models import F, Max, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import Coalesce
+from django.db.models.signals import post_init, post_save, pre_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from apps.affiliate.models import (
+    Commission,
+    CommissionBalanceSnapshot,
+    CommissionLedgerEntry,
+)
+
+logger = logging.getLogger(__name__)
+
+STATUS_BUCKETS = {"pending": "pending", "approved": "available", "paid": "paid"}
+BUCKET_FIELDS = {
+    "pending": "pending_delta",
+    "available": "available_delta",
+    "paid": "paid_delta",
+}
+ZERO = Decimal("0.00")
+
+
+class Balance(namedtuple("Balance", ["pending", "available", "paid"])):
+    """Soldes d'un ambassadeur."""
+
+    __slots__ = ()
+
+    @property
+    def earned(self):
+        """Total généré (en attente, disponible et payé)."""
+        return self.pending + self.available + self.paid
+
+    def __add__(self, other):
+        return Balance(*(mine + theirs for mine, theirs in zip(self, other)))
+
+    def quantize(self):
+        return Balance(*(Decimal(value or 0).quantize(ZERO) for value in self))
+
+
+EMPTY_BALANCE = Balance(ZERO, ZERO, ZERO)
+
+
+def _entry_type(previous_bucket, bucket):
+    if previous_bucket is None:
+        return "accrual"
+    if bucket is None:
+        return "reversal"
+    if (previous_bucket, bucket) == ("pending", "available"):
+        return "approval"
+    if bucket == "paid":
+        return "payout"
+    return "reversal"
+
+
+def transition_entries(
+    ambassador_id, commission_id, previous_status, previous_amount, status, amount
+):
+    """Écritures (non enregistrées) d'une commission passant d'un état à un autre."""
+    previous_bucket = STATUS_BUCKETS.get(previous_status)
+    bucket = STATUS_BUCKETS.get(status)
+    previous_amount = Decimal(previous_amount or 0)
+    amount = Decimal(amount or 0)
+    if previous_bucket == bucket and (bucket is None or previous_amount == amount):
+        return []
+
+    def entry(entry_type, **deltas):
+        return CommissionLedgerEntry(
+            ambassador_id=ambassador_id,
+            commission_id=commission_id,
+            entry_type=entry_type,
+            **deltas,
+        )
+
+    if previous_bucket == bucket:
+        # Montant corrigé sans changement de statut : annulation puis nouvelle écriture
+        field = BUCKET_FIELDS[bucket]
+        return [
+            entry("reversal", **{field: -previous_amount}),
+            entry("accrual", **{field: amount}),
+        ]
+
+    deltas = {}
+    if previous_bucket:
+        deltas[BUCKET_FIELDS[previous_bucket]] = -previous_amount
+    if bucket:
+        deltas[BUCKET_FIELDS[bucket]] = amount
+    return [entry(_entry_type(previous_bucket, bucket), **deltas)]
+
+
+def record_new_commissions(commissions):
+    """Écritures d'accumulation de commissions créées en masse (``bulk_create``)."""
+    entries = []
+    for commission in commissions:
+        entries.extend(
+            transition_entries(
+                commission.user_id, commission.pk, None, None, commission.status, commission.amount
+            )
+        )
+    CommissionLedgerEntry.objects.bulk_create(entries, batch_size=1000)
+
+
+def record_amount_changes(changes):
+    """
+    Écritures de commissions dont le montant a été corrigé en masse
+    (``bulk_update``). ``changes`` : tuples ``(ambassadeur, commission,
+    statut, ancien montant, nouveau montant)``.
+    """
+    entries = []
+    for ambassador_id, commission_id, status, previous_amount, amount in changes:
+        entries.extend(
+            transition_entries(
+                ambassador_id, commission_id, status, previous_amount, status, amount
+            )
+        )
+    CommissionLedgerEntry.objects.bulk_create(entries, batch_size=1000)
+
+
+def record_ledger_transitions(queryset, new_status):
+    """
+    Répercute un changement de statut en masse (``QuerySet.update``) dans le
+    grand livre. À appeler avant l'``update``, dans la même transaction : les
+    commissions concernées restent verrouillées jusqu'à la mise à jour.
+    """
+    entries = []
+    rows = (
+        queryset.select_for_update()
+        .exclude(status=new_status)
+        .values_list("id", "user_id", "status", "amount")
+    )
+    for commission_id, user_id, status, amount in rows:
+        entries.extend(
+            transition_entries(user_id, commission_id, status, amount, new_status, amount)
+        )
+    CommissionLedgerEntry.objects.bulk_create(entries, batch_size=1000)
+
+
+# --- Soldes -----------------------------------------------------------------
+
+
+def _snapshot_cutoff():
+    return Coalesce(
+        Subquery(
+            CommissionBalanceSnapshot.objects.filter(
+                ambassador_id=OuterRef("ambassador_id")
+            ).values("last_entry_id")[:1]
+        ),
+        0,
+    )
+
+
+def _delta_sums(entries):
+    return entries.values("ambassador_id").annotate(
+        pending=Sum("pending_delta"),
+        available=Sum("available_delta"),
+        paid=Sum("paid_delta"),
+    )
+
+
+def ambassador_balances(user_ids):
+    """``{id: Balance}`` pour plusieurs ambassadeurs, en deux requêtes."""
+    balances = dict.fromkeys(user_ids, EMPTY_BALANCE)
+    cutoffs = defaultdict(list)
+    snapshots = CommissionBalanceSnapshot.objects.filter(ambassador_id__in=user_ids).values_list(
+        "ambassador_id", "last_entry_id", "pending", "available", "paid"
+    )
+    for ambassador_id, last_entry_id, *amounts in snapshots:
+        balances[ambassador_id] = Balance(*amounts)
+        cutoffs[last_entry_id].append(ambassador_id)
+    without_snapshot = set(balances).difference(*cutoffs.values())
+    if without_snapshot:
+        cutoffs[0].extend(without_snapshot)
+
+    # Écritures postérieures à l'instantané lu (et non à un instantané plus
+    # récent écrit entre-temps) ; les instantanés partagent presque tous la
+    # même borne, d'où quelques groupes seulement
+    recent = Q()
+    for last_entry_id, ambassador_ids in cutoffs.items():
+        recent |= Q(ambassador_id__in=ambassador_ids, id__gt=last_entry_id)
+    if recent:
+        for row in _delta_sums(CommissionLedgerEntry.objects.filter(recent)).order_by():
+            balances[row["ambassador_id"]] += Balance(row["pending"], row["available"], row["paid"])
+    return {ambassador_id: balance.quantize() for ambassador_id, balance in balances.items()}
+
+
+def ambassador_balance(user_id):
+    """Solde courant d'un ambassadeur (instantané + écritures postérieures)."""
+    return ambassador_balances([user_id])[user_id]
+
+
+def recompute_balance(user_id):
+    """Solde recalculé depuis les commissions elles-mêmes (contrôle)."""
+    totals = dict(
+        Commission.objects.filter(user_id=user_id, status__in=STATUS_BUCKETS)
+        .values("status")
+        .annotate(total=Sum("amount"))
+        .order_by()
+        .values_list("status", "total")
+    )
+    return Balance(totals.get("pending"), totals.get("approved"), totals.get("paid")).quantize()
+
+
+def _committed_cutoff():
+    """
+    Identifiant d'écriture en deçà duquel toutes les écritures sont validées.
+
+    Sous PostgreSQL, un identifiant attribué par une transaction encore
+    ouverte peut être inférieur au maximum visible : le verrou ``SHARE``
+    attend la fin des insertions en cours (et bloque les nouvelles le temps
+    de lire le maximum), si bien qu'aucune écriture validée plus tard ne
+    pourra porter un identifiant inférieur.
+    """
+    with transaction.atomic():
+        if connection.vendor == "postgresql":
+            with connection.cursor() as cursor:
+                table = connection.ops.quote_name(CommissionLedgerEntry._meta.db_table)
+                cursor.execute(f"LOCK TABLE {table} IN SHARE MODE")
+        return CommissionLedgerEntry.objects.aggregate(last=Max("id"))["last"] or 0
+
+
+def take_balance_snapshots():
+    """
+    Reporte dans les instantanés les écritures validées depuis le précédent.
+    Retourne le nombre d'ambassadeurs mis à jour.
+    """
+    cutoff = _committed_cutoff()
+    now = timezone.now()
+    with transaction.atomic():
+        snapshots = {
+            snapshot.ambassador_id: snapshot
+            for snapshot in CommissionBalanceSnapshot.objects.select_for_update()
+        }
+        new_entries = (
+            CommissionLedgerEntry.objects.filter(id__lte=cutoff)
+            .annotate(last_snapshot=_snapshot_cutoff())
+            .filter(id__gt=F("last_snapshot"))
+        )
+        to_update, to_create = [], []
+        for row in _delta_sums(new_entries).order_by():
+            snapshot = snapshots.get(row["ambassador_id"])
+            if snapshot is None:
+                snapshot = CommissionBalanceSnapshot(ambassador_id=row["ambassador_id"])
+                to_create.append(snapshot)
+            else:
+                to_update.append(snapshot)
+            snapshot.pending += row["pending"]
+            snapshot.available += row["available"]
+            snapshot.paid += row["paid"]
+            snapshot.last_entry_id = cutoff
+            snapshot.updated_at = now
+
+        CommissionBalanceSnapshot.objects.bulk_update(
+            to_update, ["pending", "available", "paid", "last_entry_id", "updated_at"], 500
+        )
+        CommissionBalanceSnapshot.objects.bulk_create(to_create, batch_size=500)
+        # Sans nouvelle écriture, le solde est inchangé : seule la borne avance,
+        # ce qui garde une borne commune à presque tous les instantanés
+        CommissionBalanceSnapshot.objects.filter(last_entry_id__lt=cutoff).update(
+            last_entry_id=cutoff
+        )
+
+    updated = len(to_update) + len(to_create)
+    logger.info(
+        f"📒 Instantanés de solde mis à jour pour {updated} ambassadeurs (écriture {cutoff})"
+    )
+    return updated
+
+
+def _commission_deltas(status, amount):
+    deltas = dict.fromkeys(BUCKET_FIELDS.values(), ZERO)
+    if status in STATUS_BUCKETS:
+        deltas[BUCKET_FIELDS[STATUS_BUCKETS[status]]] = Decimal(amount or 0)
+    return deltas
+
+
+def _reconcile_chunk(commissions):
+    recorded = {
+        row.pop("commission_id"): row
+        for row in CommissionLedgerEntry.objects.filter(commission__in=commissions)
+        .values("commission_id")
+        .annotate(
+            pending_delta=Sum("pending_delta"),
+            available_delta=Sum("available_delta"),
+            paid_delta=Sum("paid_delta"),
+        )
+        .order_by()
+    }
+    entries = []
+    for commission in commissions:
+        expected = _commission_deltas(commission.status, commission.amount)
+        current = recorded.get(commission.pk, {})
+        gap = {field: value - (current.get(field) or ZERO) for field, value in expected.items()}
+        if any(gap.values()):
+            entries.append(
+                CommissionLedgerEntry(
+                    ambassador_id=commission.user_id,
+                    commission_id=commission.pk,
+                    entry_type="accrual",
+                    **gap,
+                )
+            )
+    CommissionLedgerEntry.objects.bulk_create(entries)
+    return len(entries)
+
+
+def backfill_ledger(batch_size=1000):
+    """
+    Complète le grand livre pour que la somme des écritures de chaque
+    commission corresponde à son état courant : écriture d'ouverture des
+    commissions antérieures au grand livre, y compris celles qui ont changé
+    de statut avant le report. Idempotent ; retourne le nombre d'écritures.
+    """
+    created = 0
+    batch = []
+    commissions = Commission.objects.only("id", "user_id", "status", "amount").order_by("pk")
+    for commission in commissions.iterator(chunk_size=batch_size):
+        batch.append(commission)
+        if len(batch) >= batch_size:
+            created += _reconcile_chunk(batch)
+            batch = []
+    if batch:
+        created += _reconcile_chunk(batch)
+    logger.info(f"📒 {created} écritures d'ouverture ajoutées au grand livre")
+    return created
+
+
+# --- Maintenance incrémentale -----------------------------------------------
+
+
+@receiver(post_init, sender=Commission)
+def remember_ledger_state(sender, instance, **kwargs):
+    instance._ledger_state = (
+        instance.__dict__.get("status"),
+        instance.__dict__.get("amount"),
+    )
+
+
+@receiver(post_save, sender=Commission)
+def ledger_on_commission(sender, instance, created, **kwargs):
+    previous_status, previous_amount = (
+        (None, None) if created else getattr(instance, "_ledger_state", (None, None))
+    )
+    instance._ledger_state = (instance.status, instance.amount)
+    entries = transition_entries(
+        instance.user_id,
+        instance.pk,
+        previous_status,
+        previous_amount,
+        instance.status,
+        instance.amount,
+    )
+    CommissionLedgerEntry.objects.bulk_create(entries)
+
+
+@receiver(pre_delete, sender=Commission)
+def ledger_on_commission_delete(sender, instance, **kwargs):
+    # La commission disparaît : ses écritures restent (commission=NULL) et sont
+    # soldées d'après l'état enregistré, pas celui d'une instance périmée
+    stored = (
+        Commission.objects.select_for_update()
+        .filter(pk=instance.pk)
+        .values_list("status", "amount")
+        .first()
+    )
+    if stored:
+        entries = transition_entries(instance.user_id, None, *stored, None, 0)
+        CommissionLedgerEntry.objects.bulk_create(entries)
@@ -0,0 +1,185 @@
+"""
+Recalcul des commissions en attente aux taux courants.
+
+Un changement de taux (``update_specific_rates``, admin des
+``CommissionRate``, taux du ``UserProfile``) ne touche que les commissions
+futures. ``run_recalculation`` recalcule ``rate_applied`` et ``amount`` des
+commissions en attente d'un périmètre (ambassadeurs, période de création) à
+partir de ``gross_amount``, avec les règles du moteur de commissions.
+
+Le recalcul avance par lots, dans l'ordre des identifiants. Chaque lot est
+traité dans une transaction :
+
+- les commissions sont verrouillées puis modifiées par ``bulk_update`` ;
+- un écart avant / après est enregistré par commission modifiée ;
+- le grand livre, les statistiques quotidiennes, les caches et la
+  synchronisation Supabase sont mis à jour par lot ;
+- le curseur du ``CommissionRecalculation`` avance.
+
+Un recalcul interrompu reprend ainsi après le dernier lot validé. Les
+commissions sans montant brut (antérieures au moteur) sont laissées telles
+quelles.
+"""
+
+import logging
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.utils import timezone
+
+from apps.affiliate.models import (
+    Commission,
+    CommissionRecalculation,
+    CommissionRecalculationDiff,
+)
+from apps.affiliate.services.commission_engine import (
+    INDIRECT_TARGET,
+    level_commission,
+    level_shares,
+)
+from apps.affiliate.services.commission_ledger import record_amount_changes
+from apps.affiliate.services.daily_stats import record_commission_amount_changes
+from apps.affiliate.services.dashboard_stats import invalidate_stats
+from apps.affiliate.services.outbox import publish_many
+from apps.affiliate.services.rate_resolver import RateTable
+
+logger = logging.getLogger(__name__)
+
+# Catégories de filleul pour lesquelles un taux de niveau 1 existe
+TARGETS = ("escort", "ambassador")
+
+
+def start_recalculation(ambassador_ids=None, since=None, until=None):
+    """Crée un recalcul pour les ambassadeurs et la période (dates incluses) donnés."""
+    return CommissionRecalculation.objects.create(
+        ambassador_ids=list(ambassador_ids or []), since=since, until=until
+    )
+
+
+def _local_midnight(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def _scope(recalculation):
+    commissions = Commission.objects.filter(status="pending").exclude(gross_amount=0)
+    if recalculation.ambassador_ids:
+        commissions = commissions.filter(user_id__in=recalculation.ambassador_ids)
+    if recalculation.since:
+        commissions = commissions.filter(created_at__gte=_local_midnight(recalculation.since))
+    if recalculation.until:
+        commissions = commissions.filter(
+            created_at__lt=_local_midnight(recalculation.until + timedelta(days=1))
+        )
+    return commissions
+
+
+def recalculate_batch(recalculation, batch_size=1000):
+    """
+    Traite le lot suivant de ``recalculation``. Retourne le nombre de
+    commissions examinées (0 : recalcul terminé).
+    """
+    with transaction.atomic():
+        # Un seul processus par recalcul : le verrou sérialise les reprises concurrentes
+        run = CommissionRecalculation.objects.select_for_update().get(pk=recalculation.pk)
+        if run.status == "completed":
+            return 0
+
+        commissions = _scope(run)
+        if run.last_commission_id:
+            commissions = commissions.filter(id__gt=run.last_commission_id)
+        rows = list(
+            commissions.select_for_update(of=("self",))
+            .order_by("id")
+            .values_list(
+                "id",
+                "user_id",
+                "level",
+                "gross_amount",
+                "amount",
+                "rate_applied",
+                "created_at",
+                "referral__referred__user_category",
+            )[:batch_size]
+        )
+        if not rows:
+            run.status = "completed"
+            run.completed_at = timezone.now()
+            run.save(update_fields=["status", "completed_at", "updated_at"])
+            return 0
+
+        shares = level_shares()
+        rates = RateTable({row[1] for row in rows})
+        changed, diffs, ledger, stats = [], [], [], []
+        for row in rows:
+            commission_id, user_id, level, gross, amount, rate_applied, created_at, category = row
+            if level not in shares or category not in TARGETS:
+                continue
+            target = category if level == 1 else INDIRECT_TARGET
+            rate, new_amount = level_commission(rates, user_id, target, shares[level], gross)
+            if (rate, new_amount) == (rate_applied, amount):
+                continue
+            changed.append(
+                Commission(id=commission_id, user_id=user_id, rate_applied=rate, amount=new_amount)
+            )
+            diffs.append(
+                CommissionRecalculationDiff(
+                    recalculation=run,
+                    commission_id=commission_id,
+                    rate_before=rate_applied,
+                    rate_after=rate,
+                    amount_before=amount,
+                    amount_after=new_amount,
+                )
+            )
+            ledger.append((user_id, commission_id, "pending", amount, new_amount))
+            stats.append((user_id, created_at, "pending", category, amount, new_amount))
+
+        if changed:
+            Commission.objects.bulk_update(changed, ["rate_applied", "amount"], batch_size=500)
+            CommissionRecalculationDiff.objects.bulk_create(diffs, batch_size=1000)
+            record_amount_changes(ledger)
+            record_commission_amount_changes(stats)
+            publish_many("supabase.commission", changed)
+            invalidate_stats(*{commission.user_id for commission in changed})
+
+        run.last_commission_id = rows[-1][0]
+        run.scanned += len(rows)
+        run.changed += len(changed)
+        run.amount_before += sum((diff.amount_before for diff in diffs), Decimal("0"))
+        run.amount_after += sum((diff.amount_after for diff in diffs), Decimal("0"))
+        run.save(
+            update_fields=[
+                "last_commission_id",
+                "scanned",
+                "changed",
+                "amount_before",
+                "amount_after",
+                "updated_at",
+            ]
+        )
+
+    logger.info(
+        f"🔁 Recalcul {run.id} : {len(changed)} commissions modifiées sur {len(rows)} "
+        f"({run.scanned} examinées au total)"
+    )
+    return len(rows)
+
+
+def run_recalculation(recalculation, batch_size=1000, max_batches=None):
+    """
+    Enchaîne les lots de ``recalculation`` jusqu'à la fin (ou ``max_batches``
+    lots). Relancer sur le même recalcul reprend après le dernier lot validé.
+    """
+    batches = 0
+    while recalculate_batch(recalculation, batch_size):
+        batches += 1
+        if max_batches and batches >= max_batches:
+            break
+    recalculation.refresh_from_db()
+    if recalculation.status == "completed":
+        logger.info(
+            f"✅ Recalcul {recalculation.id} terminé : {recalculation.changed} commissions "
+            f"modifiées ({recalculation.amount_before} € -> {recalculation.amount_after} €)"
+        )
+    return recalculation
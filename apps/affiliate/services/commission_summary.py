@@ -0,0 +1,129 @@
+"""
+Requêtes de synthèse des commissions d'un ambassadeur.
+
+Toutes les combinaisons statut × catégorie du filleul sont calculées en une
+seule requête d'agrégation conditionnelle (``filter=Q(...)``) et l'historique
+mensuel est regroupé en base avec ``TruncMonth`` : le coût de la page des
+commissions ne dépend plus du nombre de commissions.
+"""
+
+from decimal import Decimal
+
+from django.db.models import Avg, Count, Q, Sum
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+
+from apps.affiliate.models import Commission
+
+STATUSES = ("pending", "approved", "paid", "rejected")
+CATEGORIES = ("escort", "ambassador")
+
+# Commissions dues mais pas encore versées
+OPEN_STATUSES = ("pending", "approved")
+
+ZERO = Decimal("0.00")
+
+
+def ambassador_commissions(ambassador):
+    """Commissions d'un ambassadeur (directes et indirectes)."""
+    return Commission.objects.filter(user=ambassador)
+
+
+def _month_bounds(now):
+    current_month_start = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    prev_month_start = (current_month_start - timezone.timedelta(days=1)).replace(day=1)
+    return current_month_start, prev_month_start
+
+
+def commission_summary(queryset, recent_days=30):
+    """
+    Totaux et nombres de commissions par statut, par catégorie de filleul et
+    leurs croisements, plus le mois courant, le mois précédent et la moyenne
+    récente — le tout en une seule requête.
+    """
+    now = timezone.localtime()
+    current_month_start, prev_month_start = _month_bounds(now)
+    recent_start = now - timezone.timedelta(days=recent_days)
+    category = "referral__referred__user_category"
+
+    aggregates = {
+        "total": Sum("amount"),
+        "count": Count("id"),
+        "current_month": Sum("amount", filter=Q(created_at__gte=current_month_start)),
+        "prev_month": Sum(
+            "amount",
+            filter=Q(created_at__gte=prev_month_start, created_at__lt=current_month_start),
+        ),
+        "recent_avg": Avg("amount", filter=Q(created_at__gte=recent_start)),
+        "open": Sum("amount", filter=Q(status__in=OPEN_STATUSES)),
+        "open_count": Count("id", filter=Q(status__in=OPEN_STATUSES)),
+    }
+    for status in STATUSES:
+        aggregates[status] = Sum("amount", filter=Q(status=status))
+        aggregates[f"{status}_count"] = Count("id", filter=Q(status=status))
+    for cat in CATEGORIES:
+        aggregates[f"{cat}_total"] = Sum("amount", filter=Q(**{category: cat}))
+        aggregates[f"{cat}_paid"] = Sum("amount", filter=Q(**{category: cat}, status="paid"))
+        aggregates[f"{cat}_open"] = Sum(
+            "amount", filter=Q(**{category: cat}, status__in=OPEN_STATUSES)
+        )
+
+    summary = queryset.order_by().aggregate(**aggregates)
+    for key, value in summary.items():
+        if value is None:
+            summary[key] = 0 if key.endswith("count") else ZERO
+    return summary
+
+
+def monthly_summary(queryset):
+    """
+    Historique mensuel (du plus récent au plus ancien) calculé en base :
+    total, payé, en attente et nombre de commissions par mois.
+    """
+    rows = (
+        queryset.annotate(month=TruncMonth("created_at"))
+        .values("month")
+        .annotate(
+            total_amount=Sum("amount"),
+            paid_amount=Sum("amount", filter=Q(status="paid")),
+            pending_amount=Sum("amount", filter=Q(status__in=OPEN_STATUSES)),
+            count=Count("id"),
+        )
+        .order_by("-month")
+    )
+    return [
+        {
+            "month": row["month"],
+            "month_name": row["month"].strftime("%B %Y"),
+            "total_amount": row["total_amount"] or ZERO,
+            "paid_amount": row["paid_amount"] or ZERO,
+            "pending_amount": row["pending_amount"] or ZERO,
+            "count": row["count"],
+        }
+        for row in rows
+    ]
+
+
+def referred_users_summary(queryset):
+    """
+    Montants bruts et commissions par filleul, en une requête groupée.
+
+    Retourne ``{referred_id: {"gross_amount", "commission_amount", "has_paid"}}``.
+    """
+    rows = (
+        queryset.values("referral__referred_id")
+        .annotate(
+            gross_amount=Sum("gross_amount"),
+            commission_amount=Sum("amount"),
+            paid_count=Count("id", filter=Q(status="paid")),
+        )
+        .order_by()
+    )
+    return {
+        row["referral__referred_id"]: {
+            "gross_amount": row["gross_amount"] or ZERO,
+            "commission_amount": row["commission_amount"] or ZERO,
+            "has_paid": row["paid_count"] > 0,
+        }
+        for row in rows
+    }
@@ -0,0 +1,397 @@
+"""
+Maintenance de la table de statistiques quotidiennes ``AffiliateDailyStats``.
+
+Chaque événement (clic, parrainage, commission, paiement) applique un delta
+atomique (``F()``) sur la ligne (ambassadeur, date locale) concernée. Les
+tableaux de bord lisent ensuite une période entière en un seul parcours
+d'index. ``rebuild_daily_stats`` recalcule la table depuis les tables sources.
+"""
+
+import logging
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDate
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from apps.accounts.models import User
+from apps.affiliate.models import (
+    AffiliateDailyStats,
+    Commission,
+    Payout,
+    Referral,
+    ReferralClick,
+)
+
+logger = logging.getLogger(__name__)
+
+COMMISSION_STATUS_FIELDS = {
+    "pending": "commissions_pending",
+    "approved": "commissions_approved",
+    "paid": "commissions_paid",
+    "rejected": "commissions_rejected",
+}
+CATEGORY_COMMISSION_FIELDS = {
+    "ambassador": "ambassador_commissions",
+    "escort": "escort_commissions",
+}
+CATEGORY_REFERRAL_FIELDS = {
+    "ambassador": "ambassador_referrals",
+    "escort": "escort_referrals",
+}
+
+
+def local_date(value):
+    """Date locale (TIME_ZONE) d'un datetime, utilisée comme clé de la table."""
+    if value is None:
+        return timezone.localdate()
+    if timezone.is_naive(value):
+        return value.date()
+    return timezone.localdate(value)
+
+
+def bump_daily_stats(ambassador_id, day, **deltas):
+    """Applique des deltas atomiques à la ligne (ambassadeur, jour), créée au besoin."""
+    deltas = {field: value for field, value in deltas.items() if value}
+    if not ambassador_id or not deltas:
+        return
+
+    updates = {field: F(field) + value for field, value in deltas.items()}
+    with transaction.atomic():
+        if AffiliateDailyStats.objects.filter(ambassador_id=ambassador_id, date=day).update(
+            **updates
+        ):
+            return
+        try:
+            with transaction.atomic():
+                AffiliateDailyStats.objects.create(ambassador_id=ambassador_id, date=day, **deltas)
+        except IntegrityError:
+            # Ligne créée entre-temps par une requête concurrente
+            AffiliateDailyStats.objects.filter(ambassador_id=ambassador_id, date=day).update(
+                **updates
+            )
+
+
+def bump_daily_stats_many(rows):
+    """Applique un dictionnaire ``{(ambassadeur, jour): {champ: delta}}``."""
+    for (ambassador_id, day), deltas in rows.items():
+        bump_daily_stats(ambassador_id, day, **deltas)
+
+
+def record_clicks(clicks):
+    """Comptabilise un lot de clics (une mise à jour par ambassadeur et par jour)."""
+    rows = defaultdict(lambda: defaultdict(int))
+    for click in clicks:
+        rows[(click.user_id, local_date(click.clicked_at))]["clicks"] += 1
+    bump_daily_stats_many(rows)
+
+
+def _commission_deltas(status, amount, category, sign=1):
+    deltas = {}
+    amount = Decimal(amount or 0) * sign
+    if status in COMMISSION_STATUS_FIELDS:
+        deltas[COMMISSION_STATUS_FIELDS[status]] = amount
+    if category in CATEGORY_COMMISSION_FIELDS:
+        deltas[CATEGORY_COMMISSION_FIELDS[category]] = amount
+    return deltas
+
+
+def _merge(target, deltas):
+    for field, value in deltas.items():
+        target[field] = target.get(field, 0) + value
+
+
+def record_new_commissions(commissions, categories):
+    """
+    Comptabilise des commissions créées en masse (``bulk_create``).
+
+    ``categories`` associe l'identifiant du parrainage à la catégorie du filleul.
+    """
+    rows = defaultdict(dict)
+    for commission in commissions:
+        deltas = _commission_deltas(
+            commission.status, commission.amount, categories.get(commission.referral_id)
+        )
+        _merge(rows[(commission.user_id, local_date(commission.created_at))], deltas)
+    bump_daily_stats_many(rows)
+
+
+def record_new_referrals(referrals, categories):
+    """
+    Comptabilise des parrainages créés en masse (``bulk_create``).
+
+    ``categories`` associe l'identifiant du filleul à sa catégorie.
+    """
+    rows = defaultdict(dict)
+    for referral in referrals:
+        deltas = {"referrals": 1}
+        category = categories.get(referral.referred_id)
+        if category in CATEGORY_REFERRAL_FIELDS:
+            deltas[CATEGORY_REFERRAL_FIELDS[category]] = 1
+        _merge(rows[(referral.referrer_id, local_date(referral.created_at))], deltas)
+    bump_daily_stats_many(rows)
+
+
+def record_commission_amount_changes(changes):
+    """
+    Comptabilise des montants de commission corrigés en masse (``bulk_update``).
+
+    ``changes`` : tuples ``(ambassadeur, créée le, statut, catégorie du filleul,
+    ancien montant, nouveau montant)``.
+    """
+    rows = defaultdict(dict)
+    for user_id, created_at, status, category, previous_amount, amount in changes:
+        key = (user_id, local_date(created_at))
+        _merge(rows[key], _commission_deltas(status, amount, category))
+        _merge(rows[key], _commission_deltas(status, previous_amount, category, sign=-1))
+    bump_daily_stats_many(rows)
+
+
+def record_commission_transitions(queryset, new_status):
+    """
+    Répercute un changement de statut en masse (``QuerySet.update``) sur la table.
+
+    À appeler avant l'``update`` : les montants sont déplacés d'un statut à
+    l'autre par groupe (ambassadeur, jour, statut d'origine).
+    """
+    target_field = COMMISSION_STATUS_FIELDS[new_status]
+    grouped = (
+        queryset.exclude(status=new_status)
+        .annotate(day=TruncDate("created_at"))
+        .values("user_id", "day", "status")
+        .annotate(total=Sum("amount"))
+        .order_by()
+    )
+    rows = defaultdict(dict)
+    for row in grouped:
+        key = (row["user_id"], row["day"])
+        _merge(rows[key], {COMMISSION_STATUS_FIELDS[row["status"]]: -row["total"]})
+        _merge(rows[key], {target_field: row["total"]})
+    bump_daily_stats_many(rows)
+
+
+def record_new_payouts(payouts):
+    """Comptabilise des paiements créés en masse (``bulk_create``) déjà complétés."""
+    rows = defaultdict(dict)
+    for payout in payouts:
+        if payout.status == "completed":
+            _merge(
+                rows[(payout.ambassador_id, local_date(payout.completed_at))],
+                {"payouts_count": 1, "payouts_amount": payout.amount},
+            )
+    bump_daily_stats_many(rows)
+
+
+def record_payout_completions(queryset):
+    """Comptabilise des paiements complétés en masse (avant un ``QuerySet.update``)."""
+    today = timezone.localdate()
+    for row in (
+        queryset.exclude(status="completed")
+        .values("ambassador_id")
+        .annotate(count=Count("id"), total=Sum("amount"))
+        .order_by()
+    ):
+        bump_daily_stats(
+            row["ambassador_id"], today, payouts_count=row["count"], payouts_amount=row["total"]
+        )
+
+
+# --- Maintenance incrémentale ---------------------------------------------
+
+
+@receiver(post_save, sender=ReferralClick)
+def daily_stats_on_click(sender, instance, created, **kwargs):
+    # Les clics ingérés par lots (bulk_create) passent par record_clicks
+    if created:
+        record_clicks([instance])
+
+
+@receiver(post_save, sender=Referral)
+def daily_stats_on_referral(sender, instance, created, **kwargs):
+    if not created:
+        return
+    category = instance.referred.user_category
+    deltas = {"referrals": 1}
+    if category in CATEGORY_REFERRAL_FIELDS:
+        deltas[CATEGORY_REFERRAL_FIELDS[category]] = 1
+    bump_daily_stats(instance.referrer_id, local_date(instance.created_at), **deltas)
+
+
+@receiver(post_delete, sender=Referral)
+def daily_stats_on_referral_delete(sender, instance, **kwargs):
+    deltas = {"referrals": -1}
+    category = (
+        User.objects.filter(pk=instance.referred_id).values_list("user_category", flat=True).first()
+    )
+    if category in CATEGORY_REFERRAL_FIELDS:
+        deltas[CATEGORY_REFERRAL_FIELDS[category]] = -1
+    bump_daily_stats(instance.referrer_id, local_date(instance.created_at), **deltas)
+
+
+@receiver(post_init, sender=Commission)
+def remember_commission_state(sender, instance, **kwargs):
+    instance._daily_stats_state = (
+        instance.__dict__.get("status"),
+        instance.__dict__.get("amount"),
+    )
+
+
+def _referred_category(commission):
+    return (
+        Referral.objects.filter(pk=commission.referral_id)
+        .values_list("referred__user_category", flat=True)
+        .first()
+    )
+
+
+@receiver(post_save, sender=Commission)
+def daily_stats_on_commission(sender, instance, created, **kwargs):
+    previous_status, previous_amount = getattr(instance, "_daily_stats_state", (None, None))
+    current = (instance.status, instance.amount)
+    instance._daily_stats_state = current
+
+    if not created and current == (previous_status, previous_amount):
+        return
+
+    category = _referred_category(instance)
+    deltas = _commission_deltas(instance.status, instance.amount, category)
+    if not created:
+        _merge(deltas, _commission_deltas(previous_status, previous_amount, category, sign=-1))
+    bump_daily_stats(instance.user_id, local_date(instance.created_at), **deltas)
+
+
+@receiver(post_delete, sender=Commission)
+def daily_stats_on_commission_delete(sender, instance, **kwargs):
+    deltas = _commission_deltas(
+        instance.status, instance.amount, _referred_category(instance), sign=-1
+    )
+    bump_daily_stats(instance.user_id, local_date(instance.created_at), **deltas)
+
+
+@receiver(post_init, sender=Payout)
+def remember_payout_state(sender, instance, **kwargs):
+    instance._daily_stats_status = instance.__dict__.get("status")
+
+
+@receiver(post_save, sender=Payout)
+def daily_stats_on_payout(sender, instance, created, **kwargs):
+    previous_status = None if created else getattr(instance, "_daily_stats_status", None)
+    instance._daily_stats_status = instance.status
+    if instance.status == "completed" and previous_status != "completed":
+        bump_daily_stats(
+            instance.ambassador_id,
+            local_date(instance.completed_at),
+            payouts_count=1,
+            payouts_amount=instance.amount,
+        )
+
+
+# --- Reconstruction -------------------------------------------------------
+
+
+def rebuild_daily_stats(ambassador_ids=None, since=None, batch_size=1000):
+    """
+    Recalcule la table depuis les tables sources (optionnellement pour
+    certains ambassadeurs et à partir d'une date). Retourne le nombre de lignes.
+    """
+    clicks = ReferralClick.objects.all()
+    referrals = Referral.objects.all()
+    commissions = Commission.objects.all()
+    payouts = Payout.objects.filter(status="completed", completed_at__isnull=False)
+    existing = AffiliateDailyStats.objects.all()
+
+    if ambassador_ids:
+        clicks = clicks.filter(user_id__in=ambassador_ids)
+        referrals = referrals.filter(referrer_id__in=ambassador_ids)
+        commissions = commissions.filter(user_id__in=ambassador_ids)
+        payouts = payouts.filter(ambassador_id__in=ambassador_ids)
+        existing = existing.filter(ambassador_id__in=ambassador_ids)
+    if since:
+        clicks = clicks.filter(clicked_at__date__gte=since)
+        referrals = referrals.filter(created_at__date__gte=since)
+        commissions = commissions.filter(created_at__date__gte=since)
+        payouts = payouts.filter(completed_at__date__gte=since)
+        existing = existing.filter(date__gte=since)
+
+    rows = defaultdict(dict)
+
+    for row in (
+        clicks.annotate(day=TruncDate("clicked_at"))
+        .values("user_id", "day")
+        .annotate(total=Count("id"))
+        .order_by()
+    ):
+        _merge(rows[(row["user_id"], row["day"])], {"clicks": row["total"]})
+
+    for row in (
+        referrals.annotate(day=TruncDate("created_at"))
+        .values("referrer_id", "day", "referred__user_category")
+        .annotate(total=Count("id"))
+        .order_by()
+    ):
+        deltas = {"referrals": row["total"]}
+        field = CATEGORY_REFERRAL_FIELDS.get(row["referred__user_category"])
+        if field:
+            deltas[field] = row["total"]
+        _merge(rows[(row["referrer_id"], row["day"])], deltas)
+
+    for row in (
+        commissions.annotate(day=TruncDate("created_at"))
+        .values("user_id", "day", "status", "referral__referred__user_category")
+        .annotate(total=Sum("amount"))
+        .order_by()
+    ):
+        _merge(
+            rows[(row["user_id"], row["day"])],
+            _commission_deltas(
+                row["status"], row["total"], row["referral__referred__user_category"]
+            ),
+        )
+
+    for row in (
+        payouts.annotate(day=TruncDate("completed_at"))
+        .values("ambassador_id", "day")
+        .annotate(count=Count("id"), total=Sum("amount"))
+        .order_by()
+    ):
+        _merge(
+            rows[(row["ambassador_id"], row["day"])],
+            {"payouts_count": row["count"], "payouts_amount": row["total"]},
+        )
+
+    objects = [
+        AffiliateDailyStats(ambassador_id=ambassador_id, date=day, **values)
+        for (ambassador_id, day), values in rows.items()
+    ]
+    with transaction.atomic():
+        existing.delete()
+        AffiliateDailyStats.objects.bulk_create(objects, batch_size=batch_size)
+
+    logger.info(f"📊 Statistiques quotidiennes reconstruites: {len(objects)} lignes")
+    return len(objects)
+
+
+# --- Lecture --------------------------------------------------------------
+
+
+def get_daily_stats(ambassador, start_date, end_date):
+    """
+    Retourne la liste des jours de ``start_date`` à ``end_date`` inclus avec
+    leurs statistiques (jours vides remplis de zéros), en une seule requête.
+    """
+    rows = {
+        row.date: row
+        for row in AffiliateDailyStats.objects.filter(
+            ambassador=ambassador, date__range=(start_date, end_date)
+        )
+    }
+    days = []
+    current = start_date
+    while current <= end_date:
+        days.append(rows.get(current) or AffiliateDailyStats(ambassador=ambassador, date=current))
+        current += timezone.timedelta(days=1)
+    return days
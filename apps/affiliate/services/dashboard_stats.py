@@ -0,0 +1,232 @@
+"""
+Statistiques des tableaux de bord, mises en cache par ambassadeur.
+
+Chaque ambassadeur a un numéro de version dans le cache partagé. Les
+agrégats (clics, parrainages, gains) sont stockés avec la version qui a
+servi à les calculer ; toute écriture sur ses clics, parrainages,
+commissions ou paiements incrémente la version après le commit, ce qui
+invalide exactement ses entrées, sans TTL court ni balayage de clés.
+
+Cela suppose un cache partagé : les versions incrémentées par les workers
+(clics, outbox, actions d'administration) doivent être vues des processus
+web. Avec un cache propre au processus (``LocMemCache`` sans ``REDIS_URL``),
+les entrées expirent après ``AFFILIATE_STATS_LOCAL_CACHE_TTL`` secondes.
+
+Une page de tableau de bord lit la version et l'entrée en un seul aller-retour
+(``get_many``) ; la base n'est interrogée que si la version a changé, et une
+seule fois pour toutes les requêtes concurrentes (``single_flight``).
+Les écritures en masse (``QuerySet.update``, ``bulk_create``) ne déclenchent
+pas de signal : elles appellent ``invalidate_stats`` elles-mêmes.
+"""
+
+import datetime
+import logging
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDay
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from apps.affiliate.models import Commission, Payout, Referral, ReferralClick
+from apps.affiliate.services.shared_cache import is_shared_cache
+from apps.affiliate.services.single_flight import single_flight
+
+logger = logging.getLogger(__name__)
+
+VERSION_KEY = "affiliate:stats:version:{user_id}"
+ENTRY_KEY = "affiliate:stats:{user_id}:{name}"
+
+# Statuts de commission comptés dans les gains affichés
+EARNING_STATUSES = ("approved", "paid")
+
+
+def _cache():
+    return caches[settings.AFFILIATE_STATS_CACHE]
+
+
+def _fresh_version():
+    # Jamais réutilisée : une version évincée du cache ne peut pas revalider d'anciennes entrées
+    return time.time_ns()
+
+
+def bump_stats_version(*user_ids):
+    """Incrémente immédiatement la version des ambassadeurs donnés."""
+    cache = _cache()
+    for user_id in {user_id for user_id in user_ids if user_id}:
+        key = VERSION_KEY.format(user_id=user_id)
+        try:
+            try:
+                cache.incr(key)
+            except ValueError:
+                cache.set(key, _fresh_version(), None)
+        except Exception as e:
+            logger.error(f"❌ Impossible d'invalider les statistiques de {user_id}: {str(e)}")
+
+
+def invalidate_stats(*user_ids):
+    """Invalide les statistiques des ambassadeurs donnés après le commit en cours."""
+    user_ids = [user_id for user_id in user_ids if user_id]
+    if user_ids:
+        transaction.on_commit(lambda: bump_stats_version(*user_ids))
+
+
+def commission_stats_owners(queryset):
+    """Ambassadeurs dont les statistiques dépendent des commissions de ``queryset``."""
+    owners = set()
+    for user_id, referrer_id in queryset.values_list("user_id", "referral__referrer_id"):
+        owners.update((user_id, referrer_id))
+    return owners
+
+
+def cached_stats(user_id, name, builder, timeout=None):
+    """
+    Résultat de ``builder()`` pour l'ambassadeur ``user_id``, recalculé
+    seulement si sa version a changé depuis la dernière mise en cache.
+    """
+    cache = _cache()
+    version_key = VERSION_KEY.format(user_id=user_id)
+    entry_key = ENTRY_KEY.format(user_id=user_id, name=name)
+    timeout = settings.AFFILIATE_STATS_CACHE_TTL if timeout is None else timeout
+    if not is_shared_cache(cache):
+        # Invalidations des autres processus invisibles : durée de vie bornée
+        timeout = min(timeout, settings.AFFILIATE_STATS_LOCAL_CACHE_TTL)
+
+    try:
+        values = cache.get_many([version_key, entry_key])
+        version = values.get(version_key)
+        entry = values.get(entry_key)
+        if version is not None and entry is not None and entry[0] == version:
+            return entry[1]
+
+        if version is None:
+            # Première lecture (ou version évincée) : la version lue avant le calcul
+            # garantit qu'une écriture concurrente invalidera le résultat
+            version = _fresh_version()
+            if not cache.add(version_key, version, None):
+                version = cache.get(version_key, version)
+    except Exception as e:
+        logger.error(f"❌ Cache des statistiques indisponible: {str(e)}")
+        return builder()
+
+    # Onglets ou appels simultanés : un seul calcul par (entrée, version)
+    data = single_flight(f"{entry_key}:{version}", builder)
+    try:
+        cache.set(entry_key, (version, data), timeout)
+    except Exception as e:
+        logger.error(f"❌ Impossible de mettre en cache les statistiques de {user_id}: {str(e)}")
+    return data
+
+
+def _day_start(day):
+    return timezone.make_aware(datetime.datetime.combine(day, datetime.time.min))
+
+
+def dashboard_summary(user_id, since):
+    """Clics, parrainages, gains validés et taux de conversion depuis la date ``since``."""
+
+    def build():
+        start = _day_start(since)
+        clicks = ReferralClick.objects.filter(user_id=user_id, clicked_at__gte=start).count()
+        referrals = Referral.objects.filter(referrer_id=user_id, created_at__gte=start).count()
+        earnings = (
+            Commission.objects.filter(
+                user_id=user_id,
+                status__in=EARNING_STATUSES,
+                created_at__gte=start,
+            ).aggregate(Sum("amount"))["amount__sum"]
+            or 0
+        )
+        return {
+            "clicks": clicks,
+            "referrals": referrals,
+            "earnings": earnings,
+            "conversion_rate": (referrals / clicks) * 100 if clicks > 0 else 0,
+        }
+
+    return cached_stats(user_id, f"summary:{since.isoformat()}", build)
+
+
+def daily_activity(user_id, since):
+    """Totaux et séries quotidiennes (clics, inscriptions, gains approuvés) depuis ``since``."""
+
+    def build():
+        start = _day_start(since)
+        clicks = ReferralClick.objects.filter(user_id=user_id, clicked_at__gte=start)
+        referrals = Referral.objects.filter(referrer_id=user_id, created_at__gte=start)
+        approved = Commission.objects.filter(
+            user_id=user_id, status="approved", created_at__gte=start
+        )
+
+        total_clicks = clicks.count()
+        total_referrals = referrals.count()
+        return {
+            "total_clicks": total_clicks,
+            "total_referrals": total_referrals,
+            "total_earnings": approved.aggregate(Sum("amount"))["amount__sum"] or 0,
+            "conversion_rate": (
+                round(total_referrals / total_clicks * 100, 2) if total_clicks > 0 else 0
+            ),
+            "clicks_by_day": list(
+                clicks.annotate(day=TruncDay("clicked_at"))
+                .values("day")
+                .annotate(count=Count("id"))
+                .order_by("day")
+            ),
+            "referrals_by_day": list(
+                referrals.annotate(day=TruncDay("created_at"))
+                .values("day")
+                .annotate(count=Count("id"))
+                .order_by("day")
+            ),
+            "earnings_by_day": list(
+                approved.annotate(day=TruncDay("created_at"))
+                .values("day")
+                .annotate(total=Sum("amount"))
+                .order_by("day")
+            ),
+        }
+
+    return cached_stats(user_id, f"activity:{since.isoformat()}", build)
+
+
+# --- Invalidation sur écriture ----------------------------------------------
+
+
+def _commission_referrer_id(commission):
+    if Commission.referral.is_cached(commission):
+        return commission.referral.referrer_id
+    return (
+        Referral.objects.filter(pk=commission.referral_id)
+        .values_list("referrer_id", flat=True)
+        .first()
+    )
+
+
+@receiver(post_save, sender=ReferralClick)
+@receiver(post_delete, sender=ReferralClick)
+def invalidate_on_click(sender, instance, **kwargs):
+    # Les clics ingérés par lots (bulk_create) sont invalidés par ingest_clicks
+    invalidate_stats(instance.user_id)
+
+
+@receiver(post_save, sender=Referral)
+@receiver(post_delete, sender=Referral)
+def invalidate_on_referral(sender, instance, **kwargs):
+    invalidate_stats(instance.referrer_id)
+
+
+@receiver(post_save, sender=Commission)
+@receiver(post_delete, sender=Commission)
+def invalidate_on_commission(sender, instance, **kwargs):
+    invalidate_stats(instance.user_id, _commission_referrer_id(instance))
+
+
+@receiver(post_save, sender=Payout)
+@receiver(post_delete, sender=Payout)
+def invalidate_on_payout(sender, instance, **kwargs):
+    invalidate_stats(instance.ambassador_id)
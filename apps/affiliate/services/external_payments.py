@@ -0,0 +1,214 @@
+"""
+Enregistrement des paiements déclarés par les sites partenaires.
+
+Un partenaire envoie ses paiements par lots (voir
+``api.register_external_payments``), par exemple tous les paiements d'une
+journée. ``register_payments`` traite un lot
+en un nombre fixe de requêtes, quelle que soit sa taille :
+
+- les utilisateurs et leurs parrainages sont résolus en deux requêtes ;
+- les paiements sont insérés par ``bulk_create`` ; la contrainte unique
+  (source, payment_id) écarte ceux déjà enregistrés, y compris par un envoi
+  concurrent ;
+- les commissions de tous les niveaux sont créées par le moteur de
+  commissions, avec l'identifiant du paiement comme identifiant de
+  transaction.
+
+Rejouer un lot est donc sans effet : chaque paiement déjà connu est signalé
+« duplicate » avec ses commissions existantes. Le résultat donne un statut
+par paiement, dans l'ordre du lot.
+"""
+
+import logging
+from collections import Counter, defaultdict
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from apps.accounts.models import User
+from apps.affiliate.models import Commission, ExternalPayment, Referral
+from apps.affiliate.services.commission_engine import (
+    CommissionTransaction,
+    create_transaction_commissions,
+)
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SOURCE = "unknown"
+DEFAULT_DESCRIPTION = "External payment"
+CENT = Decimal("0.01")
+
+# Longueurs maximales des champs de ``ExternalPayment``
+MAX_LENGTHS = {"source": 100, "payment_id": 100, "username": 150}
+
+
+def _clean(item, default_source):
+    """Champs validés d'un paiement ; lève ``ValueError`` s'il est invalide."""
+    if not isinstance(item, dict):
+        raise ValueError("Payment must be a JSON object")
+
+    username = item.get("username")
+    payment_id = item.get("payment_id")
+    if not username or not payment_id or item.get("amount") in (None, ""):
+        raise ValueError("Missing required fields")
+    try:
+        amount = Decimal(str(item["amount"])).quantize(CENT)
+    except (InvalidOperation, ValueError):
+        raise ValueError(f"Invalid amount: {item['amount']}")
+    if not amount.is_finite() or amount <= 0:
+        raise ValueError(f"Invalid amount: {item['amount']}")
+
+    payment_date = item.get("payment_date")
+    if payment_date:
+        parsed = parse_datetime(str(payment_date))
+        if parsed is None:
+            raise ValueError(f"Invalid payment_date: {payment_date}")
+        payment_date = timezone.make_aware(parsed) if timezone.is_naive(parsed) else parsed
+
+    cleaned = {
+        "username": str(username),
+        "payment_id": str(payment_id),
+        "source": str(item.get("source") or default_source),
+        "amount": amount,
+        "payment_date": payment_date or None,
+        "description": str(item.get("description") or DEFAULT_DESCRIPTION)[:255],
+    }
+    for field, max_length in MAX_LENGTHS.items():
+        if len(cleaned[field]) > max_length:
+            raise ValueError(f"Field {field} is too long (max {max_length})")
+    return cleaned
+
+
+def _commission_description(payment):
+    return f"{payment.description} - {payment.source} - {payment.payment_id}"[:255]
+
+
+def _result(index, status, item=None, message="", payment=None, commissions=()):
+    item = item if isinstance(item, dict) else {}
+    direct = next((commission for commission in commissions if commission.level == 1), None)
+    return {
+        "index": index,
+        "source": payment.source if payment else item.get("source"),
+        "payment_id": payment.payment_id if payment else item.get("payment_id"),
+        "status": status,
+        "message": message,
+        "external_payment_id": str(payment.id) if payment else None,
+        "commission_id": str(direct.id) if direct else None,
+        "commission_amount": direct.amount if direct else None,
+        "commissions": len(commissions),
+    }
+
+
+def register_payments(items, default_source=DEFAULT_SOURCE):
+    """
+    Enregistre les paiements ``items`` (dictionnaires tels que reçus) et crée
+    leurs commissions. Retourne un résultat par paiement, de statut :
+
+    - ``created`` : paiement enregistré, commissions créées ;
+    - ``duplicate`` : (source, payment_id) déjà enregistré, ou répété dans le lot ;
+    - ``no_referrer`` : l'utilisateur n'a pas été parrainé (rien n'est enregistré) ;
+    - ``unknown_user`` : aucun utilisateur de ce nom ;
+    - ``invalid`` : paiement mal formé (voir ``message``).
+    """
+    results = [None] * len(items)
+    valid = {}
+    for index, item in enumerate(items):
+        try:
+            cleaned = _clean(item, default_source)
+        except ValueError as e:
+            results[index] = _result(index, "invalid", item, str(e))
+            continue
+        key = (cleaned["source"], cleaned["payment_id"])
+        if key in valid:
+            results[index] = _result(index, "duplicate", item, "Duplicate payment in batch")
+            continue
+        valid[key] = (index, cleaned)
+
+    # Utilisateurs et parrainages de tout le lot : deux requêtes
+    users = {
+        username: (user_id, referrer_id)
+        for username, user_id, referrer_id in User.objects.filter(
+            username__in={cleaned["username"] for _, cleaned in valid.values()}
+        ).values_list("username", "id", "referred_by_id")
+    }
+    referred = set(
+        Referral.objects.filter(
+            referred_id__in=[user_id for user_id, referrer_id in users.values() if referrer_id]
+        ).values_list("referred_id", "referrer_id")
+    )
+
+    payments = {}
+    for index, cleaned in valid.values():
+        username = cleaned.pop("username")
+        user_id, referrer_id = users.get(username, (None, None))
+        if user_id is None:
+            results[index] = _result(index, "unknown_user", cleaned, f"User {username} not found")
+        elif (user_id, referrer_id) not in referred:
+            results[index] = _result(
+                index, "no_referrer", cleaned, f"User {username} has no referrer"
+            )
+        else:
+            payments[index] = ExternalPayment(user_id=user_id, **cleaned)
+
+    with transaction.atomic():
+        ExternalPayment.objects.bulk_create(
+            payments.values(), batch_size=1000, ignore_conflicts=True
+        )
+        # Les UUID sont attribués côté client : on relit ceux réellement insérés
+        inserted = set(
+            ExternalPayment.objects.filter(
+                id__in=[payment.id for payment in payments.values()]
+            ).values_list("id", flat=True)
+        )
+        created = create_transaction_commissions(
+            CommissionTransaction(
+                transaction_id=str(payment.id),
+                user_id=payment.user_id,
+                amount=payment.amount,
+                description=_commission_description(payment),
+                reference_id=payment.payment_id,
+            )
+            for payment in payments.values()
+            if payment.id in inserted
+        )
+
+    # Paiements déjà enregistrés : ceux de la base, et leurs commissions
+    duplicates = [index for index, payment in payments.items() if payment.id not in inserted]
+    if duplicates:
+        keys = {(payments[index].source, payments[index].payment_id) for index in duplicates}
+        existing = {
+            (payment.source, payment.payment_id): payment
+            for payment in ExternalPayment.objects.filter(
+                source__in={source for source, _ in keys},
+                payment_id__in={payment_id for _, payment_id in keys},
+            )
+        }
+        for index in duplicates:
+            payments[index] = existing[(payments[index].source, payments[index].payment_id)]
+        created.extend(
+            Commission.objects.filter(
+                transaction_id__in=[str(payments[index].id) for index in duplicates]
+            ).only("id", "transaction_id", "level", "amount")
+        )
+
+    by_payment = defaultdict(list)
+    for commission in created:
+        by_payment[commission.transaction_id].append(commission)
+    for index, payment in payments.items():
+        if payment.id in inserted:
+            status, message = "created", ""
+        else:
+            status, message = "duplicate", "Payment already registered"
+        results[index] = _result(
+            index, status, message=message, payment=payment, commissions=by_payment[str(payment.id)]
+        )
+
+    summary = Counter(result["status"] for result in results)
+    logger.info(
+        f"💰 Paiements externes : {summary['created']} enregistrés, "
+        f"{summary['duplicate']} doublons, {len(results) - summary['created'] - summary['duplicate']} "
+        f"refusés sur {len(results)}"
+    )
+    return results
@@ -0,0 +1,374 @@
+"""
+Ingestion par lots des inscriptions et parrainages des sites partenaires.
+
+Un site white label envoie ses événements par lots, de deux types :
+
+- ``signup`` : inscription d'un utilisateur (par défaut une escorte), comme
+  ``register_external_escort`` (``affiliate_id``, ``escort_username`` et
+  ``escort_email`` sont acceptés pour ``ref_code``, ``username`` et ``email``) ;
+- ``referral`` : utilisateur identifié par son identifiant Supabase
+  (``user_id``), créé au besoin puis rattaché au parrain, comme
+  ``ExternalReferralAPI``.
+
+Seul un événement ``referral`` rattache un compte existant (sans parrain) :
+une inscription dont le nom d'utilisateur existe déjà est refusée, sans quoi
+un partenaire pourrait s'attribuer n'importe quel compte du site.
+
+``ingest_events`` traite chaque tranche de ``batch_size`` événements en un
+nombre fixe de requêtes :
+
+- codes de parrainage, utilisateurs existants et parrainages existants sont
+  lus en une requête chacun ;
+- utilisateurs, profils, liens de la table de fermeture et parrainages sont
+  insérés par ``bulk_create`` ;
+- compteurs, statistiques quotidiennes et caches sont mis à jour par
+  ambassadeur ; notifications Telegram et synchronisation Supabase partent
+  dans l'outbox.
+
+Les comptes créés n'ont pas de mot de passe utilisable : aucun hachage sur
+le chemin de la requête, l'utilisateur choisit son mot de passe par la
+réinitialisation. Rejouer un lot ne crée rien : un événement déjà traité est
+signalé ``exists``.
+"""
+
+import logging
+import random
+import string
+from collections import Counter, defaultdict
+
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from apps.accounts.models import User, UserProfile
+from apps.affiliate.models import AffiliateProfile, Referral, ReferralClosure
+from apps.affiliate.services.daily_stats import record_new_referrals
+from apps.affiliate.services.dashboard_stats import invalidate_stats
+from apps.affiliate.services.outbox import publish_many
+from apps.affiliate.services.profile_counters import increment_counters_many
+from apps.affiliate.services.referral_resolver import invalidate_referral_code
+from apps.affiliate.services.referral_tree import (
+    ReferralCycleError,
+    check_referrer,
+    move_subtree,
+)
+
+logger = logging.getLogger(__name__)
+
+EVENT_TYPES = ("signup", "referral")
+DEFAULT_SIGNUP_CATEGORY = "escort"
+CATEGORIES = {value for value, _ in User._meta.get_field("user_category").choices}
+
+# Champs de register_external_escort acceptés sous leur ancien nom
+ALIASES = {"affiliate_id": "ref_code", "escort_username": "username", "escort_email": "email"}
+MAX_LENGTHS = {"username": 150, "email": 254, "supabase_id": 36}
+REFERRAL_CODE_LENGTH = 8
+
+
+def _clean(item):
+    """Champs validés d'un événement ; lève ``ValueError`` s'il est invalide."""
+    if not isinstance(item, dict):
+        raise ValueError("Event must be a JSON object")
+    item = {ALIASES.get(key, key): value for key, value in item.items()}
+
+    kind = item.get("event")
+    if kind not in EVENT_TYPES:
+        raise ValueError(f"Unknown event: {kind}")
+    ref_code = str(item.get("ref_code") or "")
+    if not ref_code:
+        raise ValueError("Missing ref_code")
+
+    supabase_id = str(item.get("user_id") or "") or None
+    username = str(item.get("username") or "")
+    email = str(item.get("email") or "")
+    if kind == "referral":
+        if not supabase_id:
+            raise ValueError("Missing user_id")
+        username = username or f"user_{supabase_id[:8]}"
+        email = email or f"user_{supabase_id[:8]}@example.com"
+        category = item.get("user_category") or User._meta.get_field("user_category").default
+    else:
+        if not username or not email:
+            raise ValueError("Missing username or email")
+        category = item.get("user_category") or DEFAULT_SIGNUP_CATEGORY
+    if category not in CATEGORIES:
+        raise ValueError(f"Invalid user_category: {category}")
+
+    cleaned = {
+        "event": kind,
+        "ref_code": ref_code,
+        "supabase_id": supabase_id,
+        "username": username,
+        "email": email,
+        "category": category,
+    }
+    for field, max_length in MAX_LENGTHS.items():
+        if len(cleaned[field] or "") > max_length:
+            raise ValueError(f"Field {field} is too long (max {max_length})")
+    return cleaned
+
+
+def _result(index, event, status, message="", user_id=None, referral_id=None):
+    return {
+        "index": index,
+        "event": event,
+        "status": status,
+        "message": message,
+        "user_id": str(user_id) if user_id else None,
+        "referral_id": str(referral_id) if referral_id else None,
+    }
+
+
+def _new_referral_codes(count):
+    """``count`` codes de parrainage libres (une requête par tirage)."""
+    alphabet = string.ascii_uppercase + string.digits
+    codes = set()
+    while len(codes) < count:
+        drawn = {
+            "".join(random.choices(alphabet, k=REFERRAL_CODE_LENGTH))
+            for _ in range(count - len(codes))
+        }
+        taken = set(
+            User.objects.filter(referral_code__in=drawn).values_list("referral_code", flat=True)
+        )
+        codes |= drawn - taken
+    return list(codes)
+
+
+def _closure_rows(users):
+    """Liens de la table de fermeture des nouveaux utilisateurs (sans filleul)."""
+    parents = {user.referred_by_id for user in users}
+    ancestors = defaultdict(list)
+    for ancestor_id, descendant_id, depth in ReferralClosure.objects.filter(
+        descendant_id__in=parents
+    ).values_list("ancestor_id", "descendant_id", "depth"):
+        ancestors[descendant_id].append((ancestor_id, depth))
+
+    rows = []
+    for user in users:
+        for ancestor_id, depth in [(user.referred_by_id, 0), *ancestors[user.referred_by_id]]:
+            rows.append(
+                ReferralClosure(ancestor_id=ancestor_id, descendant_id=user.id, depth=depth + 1)
+            )
+    return rows
+
+
+def _create_users(events):
+    """Crée les utilisateurs de ``events`` (``(événement, parrain)``) et leurs profils."""
+    codes = _new_referral_codes(len(events))
+    # Mot de passe inutilisable : pas de hachage (PBKDF2) pendant la requête
+    users = User.objects.bulk_create(
+        [
+            User(
+                username=event["username"],
+                email=event["email"],
+                supabase_id=event["supabase_id"],
+                user_category=event["category"],
+                referred_by_id=referrer_id,
+                referral_code=code,
+                password=make_password(None),
+                is_active=True,
+            )
+            for (event, referrer_id), code in zip(events, codes)
+        ],
+        batch_size=1000,
+    )
+    UserProfile.objects.bulk_create(
+        [UserProfile(user_id=user.id) for user in users], batch_size=1000
+    )
+    AffiliateProfile.objects.bulk_create(
+        [AffiliateProfile(user_id=user.id) for user in users], batch_size=1000
+    )
+    ReferralClosure.objects.bulk_create(_closure_rows(users), batch_size=1000)
+    # Codes éventuellement mis en cache comme invalides avant leur attribution
+    invalidate_referral_code(*codes)
+    return users
+
+
+def _link_users(links):
+    """Rattache des utilisateurs existants sans parrain (``{utilisateur: parrain}``)."""
+    by_referrer = defaultdict(list)
+    for user_id, referrer_id in links.items():
+        by_referrer[referrer_id].append(user_id)
+    now = timezone.now()
+    for referrer_id, user_ids in by_referrer.items():
+        User.objects.filter(id__in=user_ids).update(referred_by_id=referrer_id, updated_at=now)
+    # Un utilisateur existant peut avoir une downline : rattachement ensembliste
+    for user_id, referrer_id in links.items():
+        move_subtree(user_id, referrer_id)
+
+
+def _record_referrals(referrals, categories):
+    """Effets de bord des parrainages insérés (les signaux ne sont pas émis)."""
+    per_referrer = Counter(referral.referrer_id for referral in referrals)
+    increment_counters_many({user_id: {"referrals": n} for user_id, n in per_referrer.items()})
+    record_new_referrals(referrals, categories)
+    invalidate_stats(*per_referrer)
+    publish_many("telegram.new_referral", referrals)
+    publish_many("supabase.referral", referrals)
+
+
+def _ingest_chunk(chunk, results):
+    """Traite ``chunk`` (``[(index, événement validé)]``) dans une transaction."""
+    with transaction.atomic():
+        referrers = dict(
+            User.objects.filter(
+                referral_code__in={event["ref_code"] for _, event in chunk}, is_active=True
+            ).values_list("referral_code", "id")
+        )
+        # Utilisateurs déjà connus, verrouillés jusqu'à la fin de la tranche
+        by_supabase_id, by_username = {}, {}
+        for row in (
+            User.objects.filter(
+                Q(
+                    supabase_id__in={
+                        event["supabase_id"] for _, event in chunk if event["supabase_id"]
+                    }
+                )
+                | Q(username__in={event["username"] for _, event in chunk})
+            )
+            .select_for_update()
+            .values_list("id", "username", "supabase_id", "referred_by_id")
+        ):
+            by_username[row[1]] = row
+            if row[2]:
+                by_supabase_id[row[2]] = row
+        existing_referrals = {
+            (referred_id, referrer_id): referral_id
+            for referral_id, referred_id, referrer_id in Referral.objects.filter(
+                referred_id__in=[row[0] for row in by_username.values()]
+            ).values_list("id", "referred_id", "referrer_id")
+        }
+
+        to_create, to_link, to_refer = [], {}, {}
+        new_usernames, new_supabase_ids = set(), set()
+        for index, event in chunk:
+            kind = event["event"]
+            referrer_id = referrers.get(event["ref_code"])
+            if referrer_id is None:
+                results[index] = _result(index, kind, "invalid_code", "Invalid referral code")
+                continue
+
+            known = by_supabase_id.get(event["supabase_id"]) if event["supabase_id"] else None
+            if known is None and event["username"] in by_username:
+                known = by_username[event["username"]]
+                if kind == "referral" or (
+                    event["supabase_id"] and known[2] != event["supabase_id"]
+                ):
+                    results[index] = _result(
+                        index, kind, "username_taken", "Username already taken"
+                    )
+                    continue
+
+            if known is None:
+                if event["supabase_id"] in new_supabase_ids or (
+                    event["username"] in new_usernames and not event["supabase_id"]
+                ):
+                    results[index] = _result(index, kind, "duplicate", "Duplicate event in batch")
+                    continue
+                if event["username"] in new_usernames:
+                    results[index] = _result(
+                        index, kind, "username_taken", "Username already taken"
+                    )
+                    continue
+                new_usernames.add(event["username"])
+                if event["supabase_id"]:
+                    new_supabase_ids.add(event["supabase_id"])
+                to_create.append((index, event, referrer_id))
+                continue
+
+            user_id, _, _, current_referrer_id = known
+            if kind == "signup" and current_referrer_id != referrer_id:
+                # Une inscription ne revendique jamais un compte existant : seul
+                # le rejeu (compte déjà rattaché à ce parrain) est accepté
+                results[index] = _result(index, kind, "username_taken", "Username already taken")
+                continue
+            if current_referrer_id is None and user_id not in to_link:
+                try:
+                    check_referrer(user_id, referrer_id)
+                except ReferralCycleError as e:
+                    results[index] = _result(index, kind, "invalid", str(e), user_id)
+                    continue
+                to_link[user_id] = referrer_id
+                status = "linked"
+            elif to_link.get(user_id, current_referrer_id) != referrer_id:
+                results[index] = _result(
+                    index, kind, "already_referred", "User already has a referrer", user_id
+                )
+                continue
+            else:
+                status = "exists"
+            results[index] = _result(
+                index,
+                kind,
+                status,
+                user_id=user_id,
+                referral_id=existing_referrals.get((user_id, referrer_id)),
+            )
+            if (user_id, referrer_id) not in existing_referrals:
+                to_refer[(user_id, referrer_id)] = (index, event["ref_code"])
+
+        if to_link:
+            _link_users(to_link)
+        users = _create_users([(event, referrer_id) for _, event, referrer_id in to_create])
+        categories = {}
+        for (index, event, referrer_id), user in zip(to_create, users):
+            results[index] = _result(index, event["event"], "created", user_id=user.id)
+            categories[user.id] = event["category"]
+            to_refer[(user.id, referrer_id)] = (index, event["ref_code"])
+
+        referrals = Referral.objects.bulk_create(
+            [
+                Referral(referrer_id=referrer_id, referred_id=user_id, referral_code=ref_code)
+                for (user_id, referrer_id), (_, ref_code) in to_refer.items()
+            ],
+            batch_size=1000,
+        )
+        if referrals:
+            categories.update(
+                User.objects.filter(
+                    id__in=[user_id for user_id, _ in to_refer if user_id not in categories]
+                ).values_list("id", "user_category")
+            )
+            _record_referrals(referrals, categories)
+        for referral, (index, _) in zip(referrals, to_refer.values()):
+            results[index]["referral_id"] = str(referral.id)
+
+
+def ingest_events(items, batch_size=1000):
+    """
+    Traite les événements ``items`` (dictionnaires tels que reçus). Retourne
+    un résultat par événement, dans l'ordre, de statut :
+
+    - ``created`` : utilisateur créé et rattaché au parrain ;
+    - ``linked`` : utilisateur existant sans parrain, rattaché (événements
+      ``referral`` seulement, identifiés par ``user_id``) ;
+    - ``exists`` : déjà rattaché à ce parrain (lot rejoué) ;
+    - ``already_referred`` : utilisateur existant rattaché à un autre parrain ;
+    - ``username_taken`` : nom d'utilisateur pris par un autre compte ; pour
+      une inscription, tout compte existant qui n'est pas déjà rattaché à ce
+      parrain ;
+    - ``duplicate`` : même utilisateur qu'un événement précédent du lot ;
+    - ``invalid_code`` : code de parrainage inconnu ou inactif ;
+    - ``invalid`` : événement mal formé (voir ``message``).
+    """
+    results = [None] * len(items)
+    valid = []
+    for index, item in enumerate(items):
+        try:
+            valid.append((index, _clean(item)))
+        except ValueError as e:
+            event = item.get("event") if isinstance(item, dict) else None
+            results[index] = _result(index, event, "invalid", str(e))
+
+    for start in range(0, len(valid), batch_size):
+        _ingest_chunk(valid[start : start + batch_size], results)
+
+    summary = Counter(result["status"] for result in results)
+    logger.info(
+        f"✅ Événements partenaires : {summary['created']} inscriptions, "
+        f"{summary['linked']} rattachements, {summary['exists']} déjà traités "
+        f"sur {len(results)}"
+    )
+    return results
@@ -0,0 +1,202 @@
+"""
+Pagination par clé (keyset) sur ``(horodatage, id)``.
+
+Au lieu d'un ``OFFSET`` suivi d'un ``COUNT(*)``, chaque page reprend après
+la dernière ligne de la page précédente :
+
+    WHERE created_at <= %s AND (created_at < %s OR id < %s)
+    ORDER BY created_at DESC, id DESC LIMIT 21
+
+Avec un index sur ``(filtre, created_at, id)``, la page 10 000 coûte autant
+que la page 1. Le curseur est opaque pour le client (base64 de la dernière
+clé et du sens de lecture) ; aucun total n'est calculé par défaut.
+``approximate_count`` fournit un total estimé (statistiques PostgreSQL) et
+mis en cache, pour les écrans qui veulent afficher un ordre de grandeur.
+"""
+
+import base64
+import hashlib
+import json
+import logging
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DatabaseError, connections
+from django.db.models import Q
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_ORDERING = ("-created_at", "-id")
+APPROXIMATE_COUNT_CACHE_PREFIX = "affiliate:approx_count:"
+
+
+class InvalidCursor(ValueError):
+    """Curseur illisible ou fabriqué à la main."""
+
+
+def encode_cursor(values, reverse=False):
+    payload = json.dumps([values, int(reverse)], separators=(",", ":"), default=str)
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).rstrip(b"=").decode("ascii")
+
+
+def decode_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values, reverse = json.loads(raw)
+    except (TypeError, ValueError):
+        raise InvalidCursor(cursor)
+    if not isinstance(values, list):
+        raise InvalidCursor(cursor)
+    return values, bool(reverse)
+
+
+class KeysetPage:
+    """Page de résultats et curseurs vers ses voisines."""
+
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next or self.has_previous
+
+
+class KeysetPaginator:
+    """
+    Paginateur par clé pour un queryset.
+
+    ``ordering`` contient le champ de tri puis ``id`` en départage, dans le
+    même sens (``("-created_at", "-id")`` par défaut).
+    """
+
+    def __init__(self, queryset, per_page, ordering=DEFAULT_ORDERING):
+        if len(ordering) != 2 or ordering[0].startswith("-") != ordering[1].startswith("-"):
+            raise ValueError("L'ordre doit être (champ, id) dans le même sens")
+        self.queryset = queryset
+        self.per_page = per_page
+        self.ordering = tuple(ordering)
+        self.descending = ordering[0].startswith("-")
+        self.fields = [name.lstrip("-") for name in ordering]
+        self.model_fields = [queryset.model._meta.get_field(name) for name in self.fields]
+
+    def _key(self, obj):
+        # Chaînes sérialisables (datetime ISO, id), relues par ``to_python``
+        return [field.value_to_string(obj) for field in self.model_fields]
+
+    def _parse_key(self, values):
+        if len(values) != len(self.model_fields):
+            raise InvalidCursor(values)
+        try:
+            return [field.to_python(value) for field, value in zip(self.model_fields, values)]
+        except Exception:
+            raise InvalidCursor(values)
+
+    def _after(self, key, descending):
+        """Lignes strictement après ``key`` dans le sens de lecture."""
+        (field, tiebreak), (value, last_id) = self.fields, key
+        op = "lt" if descending else "gt"
+        # Borne redondante sur le premier champ : condition d'index pour le planificateur
+        bound = Q(**{f"{field}__{op}e": value})
+        return bound & (
+            Q(**{f"{field}__{op}": value}) | Q(**{field: value, f"{tiebreak}__{op}": last_id})
+        )
+
+    def page(self, cursor=None):
+        """
+        Page qui suit (ou précède) ``cursor`` ; première page si ``cursor`` est vide.
+        Lève ``InvalidCursor`` pour un curseur illisible.
+        """
+        reverse = False
+        queryset = self.queryset
+        if cursor:
+            values, reverse = decode_cursor(cursor)
+            descending = self.descending != reverse
+            queryset = queryset.filter(self._after(self._parse_key(values), descending))
+
+        ordering = self.ordering
+        if reverse:
+            # Page précédente : lecture à rebours puis remise dans l'ordre
+            ordering = tuple(name[1:] if name.startswith("-") else f"-{name}" for name in ordering)
+
+        rows = list(queryset.order_by(*ordering)[: self.per_page + 1])
+        has_more = len(rows) > self.per_page
+        rows = rows[: self.per_page]
+        if reverse:
+            rows.reverse()
+
+        if not rows:
+            return KeysetPage(rows)
+
+        has_next = has_more if not reverse else True
+        has_previous = bool(cursor) if not reverse else has_more
+        return KeysetPage(
+            rows,
+            next_cursor=encode_cursor(self._key(rows[-1])) if has_next else None,
+            previous_cursor=(
+                encode_cursor(self._key(rows[0]), reverse=True) if has_previous else None
+            ),
+        )
+
+
+def approximate_count(queryset, timeout=None):
+    """
+    Nombre approximatif de lignes de ``queryset``, mis en cache.
+
+    Sous PostgreSQL : ``pg_class.reltuples`` pour une table entière,
+    l'estimation du planificateur (``EXPLAIN``) pour un queryset filtré ;
+    aucune ligne n'est parcourue. Sur les autres bases, ``COUNT(*)`` exact.
+    """
+    timeout = settings.AFFILIATE_APPROXIMATE_COUNT_TTL if timeout is None else timeout
+    connection = connections[queryset.db]
+    sql, params = queryset.order_by().query.sql_with_params()
+    digest = hashlib.md5(f"{sql}|{params}".encode("utf-8")).hexdigest()
+    cache_key = f"{APPROXIMATE_COUNT_CACHE_PREFIX}{digest}"
+
+    count = cache.get(cache_key)
+    if count is not None:
+        return count
+
+    count = None
+    if connection.vendor == "postgresql":
+        try:
+            count = _postgres_estimate(connection, queryset, sql, params)
+        except DatabaseError as e:
+            logger.warning(f"⚠️ Estimation PostgreSQL impossible, comptage exact: {str(e)}")
+    if count is None:
+        count = queryset.count()
+
+    cache.set(cache_key, count, timeout)
+    return count
+
+
+def _postgres_estimate(connection, queryset, sql, params):
+    with connection.cursor() as cursor:
+        if not queryset.query.where:
+            cursor.execute(
+                "SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass",
+                [queryset.model._meta.db_table],
+            )
+            row = cursor.fetchone()
+            # reltuples vaut -1 tant que la table n'a pas été analysée
+            if row and row[0] >= 0:
+                return row[0]
+        cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+        plan = cursor.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return int(plan[0]["Plan"]["Plan Rows"])
@@ -0,0 +1,412 @@
+"""
+Outbox transactionnelle des effets de bord des sauvegardes.
+
+Les modèles n'appellent plus Telegram ni Supabase pendant ``save()`` : ils
+enregistrent un ``OutboxEvent`` dans la même transaction (``publish``). Le
+worker ``python manage.py process_outbox`` réclame les événements par lots,
+les livre via un pool de threads et gère :
+
+- l'ordre par objet : un événement n'est livré que lorsque les événements
+  plus anciens du même objet sont livrés ou abandonnés ;
+- les reprises avec délai exponentiel ;
+- la mise à l'écart (statut ``dead``) après ``AFFILIATE_OUTBOX_MAX_ATTEMPTS``
+  échecs, rejouable depuis l'admin ;
+- la livraison groupée : les événements d'un sujet ``batch`` (synchronisation
+  Supabase) sont livrés en un seul appel par lot, et ceux d'un sujet
+  ``coalesce`` sont fusionnés tant qu'ils n'ont pas été réclamés.
+
+Les handlers relisent l'objet en base : un événement livré en retard
+transmet toujours l'état courant.
+"""
+
+import logging
+import random
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections, connections, transaction
+from django.db.models import Exists, OuterRef, Q
+from django.utils import timezone
+
+from apps.affiliate.models import (
+    Commission,
+    CommissionRate,
+    OutboxEvent,
+    Payout,
+    Referral,
+    WhiteLabel,
+)
+
+logger = logging.getLogger(__name__)
+
+# Statuts bloquant la livraison des événements plus récents du même objet
+BLOCKING_STATUSES = ("pending", "processing")
+
+_handlers = {}
+_batch_topics = set()
+_coalesced_topics = set()
+
+
+class OutboxDeliveryError(Exception):
+    """Échec de livraison : l'événement sera retenté."""
+
+
+def register_handler(topic, batch=False, coalesce=False):
+    """
+    Décorateur associant un handler à un sujet.
+
+    - ``batch`` : le handler reçoit la liste des événements du lot
+      (``handler(events)``) au lieu d'un seul (``handler(event)``) ;
+    - ``coalesce`` : un nouvel événement n'est pas créé si un événement du
+      même sujet et du même objet attend déjà (le handler relit l'état
+      courant), et la livraison est différée de
+      ``AFFILIATE_SUPABASE_SYNC_WINDOW`` secondes.
+    """
+
+    def decorator(func):
+        _handlers[topic] = func
+        if batch:
+            _batch_topics.add(topic)
+        if coalesce:
+            _coalesced_topics.add(topic)
+        return func
+
+    return decorator
+
+
+def publish(topic, instance, payload=None):
+    """
+    Enregistre un effet de bord pour ``instance``.
+
+    À appeler dans la transaction de la sauvegarde : l'événement n'existe que
+    si celle-ci est validée.
+    """
+    if topic not in _handlers:
+        raise ValueError(f"Aucun handler pour le sujet d'outbox '{topic}'")
+
+    aggregate_type = instance._meta.label_lower
+    aggregate_id = str(instance.pk)
+    available_at = timezone.now()
+
+    with transaction.atomic():
+        if topic in _coalesced_topics:
+            # Le verrou empêche un worker de réclamer l'événement avant la
+            # validation de la transaction (claim_events ignore les lignes verrouillées).
+            existing = (
+                OutboxEvent.objects.select_for_update()
+                .filter(
+                    topic=topic,
+                    aggregate_type=aggregate_type,
+                    aggregate_id=aggregate_id,
+                    status="pending",
+                )
+                .first()
+            )
+            if existing:
+                return existing
+            available_at += timezone.timedelta(seconds=settings.AFFILIATE_SUPABASE_SYNC_WINDOW)
+
+        return OutboxEvent.objects.create(
+            topic=topic,
+            aggregate_type=aggregate_type,
+            aggregate_id=aggregate_id,
+            payload=payload or {},
+            available_at=available_at,
+        )
+
+
+def publish_many(topic, instances):
+    """
+    Enregistre un effet de bord pour chacun des objets ``instances``, en un
+    seul ``INSERT`` (objets créés par ``bulk_create`` ou modifiés par un
+    ``QuerySet.update``). Pour un sujet ``coalesce``, les objets ayant déjà un
+    événement en attente sont ignorés, comme dans ``publish``.
+    """
+    if topic not in _handlers:
+        raise ValueError(f"Aucun handler pour le sujet d'outbox '{topic}'")
+
+    available_at = timezone.now()
+    if topic in _coalesced_topics:
+        available_at += timezone.timedelta(seconds=settings.AFFILIATE_SUPABASE_SYNC_WINDOW)
+        aggregate_ids = [str(instance.pk) for instance in instances]
+        pending = set()
+        with transaction.atomic():
+            for start in range(0, len(aggregate_ids), 500):
+                pending.update(
+                    OutboxEvent.objects.select_for_update()
+                    .filter(
+                        topic=topic,
+                        aggregate_type=instances[0]._meta.label_lower,
+                        aggregate_id__in=aggregate_ids[start : start + 500],
+                        status="pending",
+                    )
+                    .values_list("aggregate_id", flat=True)
+                )
+        instances = [instance for instance in instances if str(instance.pk) not in pending]
+    return OutboxEvent.objects.bulk_create(
+        [
+            OutboxEvent(
+                topic=topic,
+                aggregate_type=instance._meta.label_lower,
+                aggregate_id=str(instance.pk),
+                payload={},
+                available_at=available_at,
+            )
+            for instance in instances
+        ],
+        batch_size=500,
+    )
+
+
+def claim_events(limit, lease=None):
+    """
+    Réclame jusqu'à ``limit`` événements livrables, au plus un par objet.
+
+    Un événement est livrable s'il est en attente et échu (ou si le bail d'un
+    worker précédent a expiré) et qu'aucun événement plus ancien du même objet
+    n'est encore en attente.
+    """
+    lease = lease or settings.AFFILIATE_OUTBOX_LEASE
+    now = timezone.now()
+    older_blocking = OutboxEvent.objects.filter(
+        aggregate_type=OuterRef("aggregate_type"),
+        aggregate_id=OuterRef("aggregate_id"),
+        status__in=BLOCKING_STATUSES,
+        id__lt=OuterRef("id"),
+    )
+
+    with transaction.atomic():
+        events = list(
+            OutboxEvent.objects.select_for_update(skip_locked=True)
+            .filter(
+                Q(status="pending", available_at__lte=now)
+                | Q(status="processing", locked_until__lt=now)
+            )
+            .filter(~Exists(older_blocking))
+            .order_by("id")[:limit]
+        )
+        if events:
+            OutboxEvent.objects.filter(id__in=[event.id for event in events]).update(
+                status="processing", locked_until=now + timezone.timedelta(seconds=lease)
+            )
+    return events
+
+
+def retry_delay(attempts):
+    """Délai exponentiel (avec gigue) avant la tentative suivante, en secondes."""
+    base = settings.AFFILIATE_OUTBOX_RETRY_BASE_DELAY
+    delay = min(base * 2 ** (attempts - 1), settings.AFFILIATE_OUTBOX_RETRY_MAX_DELAY)
+    return delay * random.uniform(0.8, 1.2)
+
+
+def _record_failure(event, error):
+    attempts = event.attempts + 1
+    updates = {"attempts": attempts, "last_error": str(error)[:2000], "locked_until": None}
+    if attempts >= settings.AFFILIATE_OUTBOX_MAX_ATTEMPTS:
+        updates["status"] = "dead"
+        logger.error(
+            f"☠️ Événement d'outbox {event.id} ({event.topic}) abandonné après "
+            f"{attempts} tentatives: {str(error)}"
+        )
+    else:
+        updates["status"] = "pending"
+        updates["available_at"] = timezone.now() + timezone.timedelta(seconds=retry_delay(attempts))
+        logger.warning(
+            f"⚠️ Échec de livraison de l'événement d'outbox {event.id} ({event.topic}), "
+            f"tentative {attempts}: {str(error)}"
+        )
+    OutboxEvent.objects.filter(id=event.id).update(**updates)
+
+
+def deliver(events):
+    """
+    Livre des événements réclamés et enregistre le résultat.
+
+    ``events`` est un événement, ou la liste des événements d'un sujet
+    ``batch`` (livrés ou retentés ensemble). Retourne le nombre d'événements livrés.
+    """
+    events = events if isinstance(events, list) else [events]
+    topic = events[0].topic
+    handler = _handlers.get(topic)
+    try:
+        if handler is None:
+            raise OutboxDeliveryError(f"Aucun handler pour le sujet '{topic}'")
+        handler(events if topic in _batch_topics else events[0])
+    except Exception as e:
+        for event in events:
+            _record_failure(event, e)
+        return 0
+
+    OutboxEvent.objects.filter(id__in=[event.id for event in events]).update(
+        status="delivered", delivered_at=timezone.now(), locked_until=None
+    )
+    return len(events)
+
+
+def _deliver_in_thread(events):
+    close_old_connections()
+    try:
+        return deliver(events)
+    finally:
+        connections.close_all()
+
+
+def process_outbox(batch_size=None, workers=None):
+    """
+    Réclame un lot d'événements et les livre en parallèle.
+
+    Les événements des sujets ``batch`` sont livrés en un seul appel par sujet.
+    Retourne ``(réclamés, livrés)``.
+    """
+    batch_size = batch_size or settings.AFFILIATE_OUTBOX_BATCH_SIZE
+    workers = workers or settings.AFFILIATE_OUTBOX_WORKERS
+
+    events = claim_events(batch_size)
+    if not events:
+        return 0, 0
+
+    units = []
+    batches = {}
+    for event in events:
+        if event.topic in _batch_topics:
+            batches.setdefault(event.topic, []).append(event)
+        else:
+            units.append(event)
+    units.extend(batches.values())
+
+    if workers <= 1:
+        delivered = sum(deliver(unit) for unit in units)
+    else:
+        # Au plus un événement par objet dans un lot : l'ordre est préservé
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            delivered = sum(pool.map(_deliver_in_thread, units))
+    return len(events), delivered
+
+
+def requeue_dead(queryset):
+    """Remet en file des événements abandonnés (compteur de tentatives remis à zéro)."""
+    return queryset.filter(status="dead").update(
+        status="pending", attempts=0, available_at=timezone.now(), locked_until=None
+    )
+
+
+def purge_delivered(older_than_days):
+    """Supprime les événements livrés depuis plus de ``older_than_days`` jours."""
+    limit = timezone.now() - timezone.timedelta(days=older_than_days)
+    deleted, _ = OutboxEvent.objects.filter(status="delivered", delivered_at__lt=limit).delete()
+    return deleted
+
+
+def _load(model, event, *select_related):
+    """Relit l'objet de l'événement ; None s'il a été supprimé entre-temps."""
+    instance = model.objects.select_related(*select_related).filter(pk=event.aggregate_id).first()
+    if instance is None:
+        logger.info(f"Objet {event.aggregate_type}:{event.aggregate_id} supprimé, événement ignoré")
+    return instance
+
+
+def _ensure(result, message):
+    # Les services renvoient False au lieu de lever une exception
+    if result is False:
+        raise OutboxDeliveryError(message)
+
+
+@register_handler("telegram.new_referral")
+def notify_new_referral(event):
+    from apps.affiliate.services import TelegramService
+
+    referral = _load(Referral, event, "referrer", "referred")
+    if referral:
+        _ensure(
+            TelegramService().notify_new_referral(referral.referrer, referral.referred),
+            "Notification Telegram du parrainage non envoyée",
+        )
+
+
+@register_handler("telegram.commission")
+def notify_commission(event):
+    from apps.affiliate.services import TelegramService
+
+    commission = _load(Commission, event, "user")
+    if commission:
+        _ensure(
+            TelegramService().notify_commission(commission),
+            "Notification Telegram de la commission non envoyée",
+        )
+
+
+@register_handler("telegram.payout")
+def notify_payout(event):
+    from apps.affiliate.services import TelegramService
+
+    payout = _load(Payout, event, "ambassador")
+    if payout:
+        _ensure(
+            TelegramService().notify_payout(payout),
+            "Notification Telegram du paiement non envoyée",
+        )
+
+
+def _load_many(model, events):
+    """Relit les objets d'un lot d'événements en une requête."""
+    return list(model.objects.filter(pk__in=[event.aggregate_id for event in events]))
+
+
+@register_handler("supabase.commission", batch=True, coalesce=True)
+def sync_commissions(events):
+    from apps.affiliate.services import SupabaseService
+
+    commissions = _load_many(Commission, events)
+    if commissions:
+        _ensure(
+            SupabaseService().sync_commissions(commissions),
+            "Synchronisation Supabase des commissions échouée",
+        )
+
+
+@register_handler("supabase.commission_rate", batch=True, coalesce=True)
+def sync_commission_rates(events):
+    from apps.affiliate.services import SupabaseService
+
+    rates = _load_many(CommissionRate, events)
+    if rates:
+        _ensure(
+            SupabaseService().sync_commission_rates(rates),
+            "Synchronisation Supabase des taux de commission échouée",
+        )
+
+
+@register_handler("supabase.payout", batch=True, coalesce=True)
+def sync_payouts(events):
+    from apps.affiliate.services import SupabaseService
+
+    payouts = _load_many(Payout, events)
+    if payouts:
+        _ensure(
+            SupabaseService().sync_payouts(payouts),
+            "Synchronisation Supabase des paiements échouée",
+        )
+
+
+@register_handler("supabase.referral", batch=True, coalesce=True)
+def sync_referrals(events):
+    from apps.affiliate.services import SupabaseService
+
+    referrals = _load_many(Referral, events)
+    if referrals:
+        _ensure(
+            SupabaseService().sync_referrals(referrals),
+            "Synchronisation Supabase des parrainages échouée",
+        )
+
+
+@register_handler("supabase.white_label", batch=True, coalesce=True)
+def sync_white_labels(events):
+    from apps.affiliate.services import SupabaseService
+
+    white_labels = _load_many(WhiteLabel, events)
+    if white_labels:
+        _ensure(
+            SupabaseService().sync_white_labels(white_labels),
+            "Synchronisation Supabase des white labels échouée",
+        )
@@ -0,0 +1,161 @@
+"""
+Compteurs d'affiliation maintenus sur ``AffiliateProfile``.
+
+Chaque événement applique un delta atomique (``F()``) en une seule requête
+UPDATE, quel que soit l'historique de l'ambassadeur ; le taux de conversion
+est recalculé dans la même requête à partir des compteurs.
+``reconcile_profile_counters`` recompte depuis les tables sources et signale
+(ou corrige) les écarts.
+"""
+
+import logging
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db.models import Case, Count, DecimalField, F, Sum, Value, When
+from django.db.models.functions import Cast, Least, Round
+
+from apps.affiliate.models import AffiliateProfile, Commission, Referral, ReferralClick
+
+logger = logging.getLogger(__name__)
+
+# Statuts de commission comptés dans les gains de l'ambassadeur
+EARNING_STATUSES = ("approved", "paid")
+
+# Plafond imposé par AffiliateProfile.conversion_rate (max_digits=5, decimal_places=2)
+MAX_CONVERSION_RATE = Decimal("999.99")
+
+
+def _conversion_rate(referrals, clicks):
+    if not clicks:
+        return Decimal("0")
+    rate = Decimal(referrals) * 100 / Decimal(clicks)
+    return min(rate, MAX_CONVERSION_RATE).quantize(Decimal("0.01"))
+
+
+def increment_counters(user_id, clicks=0, referrals=0, earnings=0):
+    """Applique des deltas aux compteurs d'un ambassadeur en une requête."""
+    if not user_id or not (clicks or referrals or earnings):
+        return
+
+    updates = {}
+    if clicks:
+        updates["total_clicks"] = F("total_clicks") + clicks
+    if referrals:
+        updates["total_referrals"] = F("total_referrals") + referrals
+    if earnings:
+        updates["total_earnings"] = F("total_earnings") + earnings
+
+    if clicks or referrals:
+        # Les expressions d'un UPDATE lisent les anciennes valeurs : on y ajoute les deltas.
+        # Sans clic, le taux reste inchangé (pas de division par zéro).
+        new_referrals = Cast(
+            F("total_referrals") + referrals, DecimalField(max_digits=14, decimal_places=4)
+        )
+        updates["conversion_rate"] = Case(
+            When(
+                total_clicks__gt=-clicks,
+                then=Least(
+                    Round(new_referrals * 100 / (F("total_clicks") + clicks), 2),
+                    Value(MAX_CONVERSION_RATE),
+                ),
+            ),
+            default=F("conversion_rate"),
+        )
+
+    AffiliateProfile.objects.filter(user_id=user_id).update(**updates)
+
+
+def increment_counters_many(rows):
+    """Applique un dictionnaire ``{user_id: {"clicks": n, ...}}`` (une requête par ambassadeur)."""
+    for user_id, deltas in rows.items():
+        increment_counters(user_id, **deltas)
+
+
+def earnings_delta(previous_status, previous_amount, status, amount):
+    """Variation des gains entre deux états (statut, montant) d'une commission."""
+    before = Decimal(previous_amount or 0) if previous_status in EARNING_STATUSES else Decimal("0")
+    after = Decimal(amount or 0) if status in EARNING_STATUSES else Decimal("0")
+    return after - before
+
+
+def record_earnings_transitions(queryset, new_status):
+    """
+    Répercute un changement de statut en masse (``QuerySet.update``) sur les gains.
+
+    À appeler avant l'``update``.
+    """
+    rows = defaultdict(lambda: defaultdict(Decimal))
+    for row in (
+        queryset.exclude(status=new_status)
+        .values("user_id", "status")
+        .annotate(total=Sum("amount"))
+        .order_by()
+    ):
+        rows[row["user_id"]]["earnings"] += earnings_delta(
+            row["status"], row["total"], new_status, row["total"]
+        )
+    increment_counters_many(rows)
+
+
+def reconcile_profile_counters(fix=False, user_ids=None):
+    """
+    Recalcule les compteurs depuis les tables sources.
+
+    Retourne la liste des écarts ``(profil, {champ: (stocké, attendu)})`` ;
+    avec ``fix=True`` les profils en écart sont corrigés.
+    """
+    profiles = AffiliateProfile.objects.select_related("user")
+    clicks = ReferralClick.objects.all()
+    referrals = Referral.objects.all()
+    commissions = Commission.objects.filter(status__in=EARNING_STATUSES)
+    if user_ids:
+        profiles = profiles.filter(user_id__in=user_ids)
+        clicks = clicks.filter(user_id__in=user_ids)
+        referrals = referrals.filter(referrer_id__in=user_ids)
+        commissions = commissions.filter(user_id__in=user_ids)
+
+    click_counts = dict(
+        clicks.values("user_id").annotate(total=Count("id")).values_list("user_id", "total")
+    )
+    referral_counts = dict(
+        referrals.values("referrer_id")
+        .annotate(total=Count("id"))
+        .values_list("referrer_id", "total")
+    )
+    earnings = dict(
+        commissions.values("user_id").annotate(total=Sum("amount")).values_list("user_id", "total")
+    )
+
+    drifts = []
+    to_fix = []
+    for profile in profiles.iterator():
+        expected = {
+            "total_clicks": click_counts.get(profile.user_id, 0),
+            "total_referrals": referral_counts.get(profile.user_id, 0),
+            "total_earnings": Decimal(earnings.get(profile.user_id) or 0),
+        }
+        expected["conversion_rate"] = _conversion_rate(
+            expected["total_referrals"], expected["total_clicks"]
+        )
+        drift = {
+            field: (getattr(profile, field), value)
+            for field, value in expected.items()
+            if Decimal(getattr(profile, field) or 0) != Decimal(value)
+        }
+        if drift:
+            drifts.append((profile, drift))
+            if fix:
+                for field, value in expected.items():
+                    setattr(profile, field, value)
+                to_fix.append(profile)
+
+    if to_fix:
+        AffiliateProfile.objects.bulk_update(
+            to_fix,
+            ["total_clicks", "total_referrals", "total_earnings", "conversion_rate"],
+            batch_size=500,
+        )
+        logger.warning(f"⚠️ {len(to_fix)} profils d'affiliation corrigés par la réconciliation")
+
+    return drifts
@@ -0,0 +1,332 @@
+"""
+Modifications de taux de commission en masse.
+
+L'administration change le taux de base d'une sélection d'ambassadeurs (ou de
+tous), et les taux spécifiques escortes / ambassadeurs d'un ambassadeur. Une
+opération, quel que soit le nombre d'ambassadeurs :
+
+- s'applique par quelques ``UPDATE`` ensemblistes ;
+- crée les notifications par ``bulk_create`` et met en file les messages
+  Telegram en un seul ``INSERT``, envoyés ensuite par
+  ``python manage.py run_telegram_dispatcher`` ;
+- est tracée par une ligne ``RateChangeAudit``.
+
+Avec ``dry_run=True`` rien n'est écrit. Le résultat donne le nombre
+d'ambassadeurs touchés et l'impact projeté sur leurs commissions en attente,
+calculés en une seule requête : montant actuel, et montant recalculé aux
+nouveaux taux avec les parts de niveau de ``AFFILIATE_COMMISSION_LEVEL_SHARES``.
+Le taux de base (``User.commission_rate``) n'entre pas dans la résolution des
+taux du moteur : son changement a donc un impact projeté nul.
+"""
+
+import logging
+from collections import namedtuple
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Case, Count, DecimalField, F, Q, Sum, Value, When
+from django.utils import timezone
+
+from apps.accounts.models import User, UserProfile
+from apps.affiliate.models import CommissionRate, RateChangeAudit
+from apps.affiliate.services.commission_engine import level_shares
+from apps.affiliate.services.outbox import publish_many
+from apps.affiliate.services.rate_resolver import invalidate_rates
+from apps.dashboard.models import Notification
+from apps.dashboard.telegram_dispatcher import enqueue_messages
+
+logger = logging.getLogger(__name__)
+
+RateChangeResult = namedtuple(
+    "RateChangeResult",
+    [
+        "ambassadors",
+        "pending_commissions",
+        "pending_amount",
+        "projected_amount",
+        "notifications",
+        "telegram_messages",
+        "dry_run",
+    ],
+)
+
+CENT = Decimal("0.01")
+AMOUNT_FIELD = DecimalField(max_digits=14, decimal_places=4)
+
+TELEGRAM_TEMPLATES = {
+    "en": {
+        "title": "Commission Rates Updated",
+        "base_rate": "Your base commission rate has been updated to {rate}%",
+        "specific_rates": "Your commission rates have been updated:\n\n"
+        "• Escort referrals: {escort_rate}%\n• Ambassador referrals: {ambassador_rate}%",
+    },
+    "fr": {
+        "title": "Taux de commission mis à jour",
+        "base_rate": "Votre taux de commission de base est désormais de {rate}%",
+        "specific_rates": "Vos taux de commission ont été mis à jour:\n\n"
+        "• Parrainages d'escortes: {escort_rate}%\n• Parrainages d'ambassadeurs: {ambassador_rate}%",
+    },
+    "es": {
+        "title": "Tasas de comisión actualizadas",
+        "base_rate": "Su tasa de comisión base se ha actualizado a {rate}%",
+        "specific_rates": "Sus tasas de comisión han sido actualizadas:\n\n"
+        "• Referencias de escorts: {escort_rate}%\n• Referencias de embajadores: {ambassador_rate}%",
+    },
+    "de": {
+        "title": "Provisionssätze aktualisiert",
+        "base_rate": "Ihr Basis-Provisionssatz wurde auf {rate}% aktualisiert",
+        "specific_rates": "Ihre Provisionssätze wurden aktualisiert:\n\n"
+        "• Escort-Empfehlungen: {escort_rate}%\n• Botschafter-Empfehlungen: {ambassador_rate}%",
+    },
+    "ru": {
+        "title": "Комиссионные ставки обновлены",
+        "base_rate": "Ваша базовая комиссионная ставка изменена на {rate}%",
+        "specific_rates": "Ваши комиссионные ставки были обновлены:\n\n"
+        "• Рефералы эскортов: {escort_rate}%\n• Рефералы амбассадоров: {ambassador_rate}%",
+    },
+    "zh": {
+        "title": "佣金率已更新",
+        "base_rate": "您的基础佣金率已更新为 {rate}%",
+        "specific_rates": "您的佣金率已更新:\n\n• 伴游推荐: {escort_rate}%\n• 大使推荐: {ambassador_rate}%",
+    },
+    "it": {
+        "title": "Tassi di commissione aggiornati",
+        "base_rate": "Il tuo tasso di commissione base è stato aggiornato a {rate}%",
+        "specific_rates": "I tuoi tassi di commissione sono stati aggiornati:\n\n"
+        "• Referral escort: {escort_rate}%\n• Referral ambasciatori: {ambassador_rate}%",
+    },
+    "ar": {
+        "title": "تم تحديث معدلات العمولة",
+        "base_rate": "تم تحديث معدل العمولة الأساسي الخاص بك إلى {rate}%",
+        "specific_rates": "تم تحديث معدلات العمولة الخاصة بك:\n\n"
+        "• إحالات المرافقات: {escort_rate}%\n• إحالات السفراء: {ambassador_rate}%",
+    },
+}
+
+NOTIFICATIONS = {
+    "base_rate": (
+        "Commission Rate Updated",
+        "Your base commission rate has been updated to {rate}% by an administrator.",
+    ),
+    "specific_rates": (
+        "Commission Rates Updated",
+        "Your commission rates have been updated by an administrator. "
+        "New rates: Escorts: {escort_rate}%, Ambassadors: {ambassador_rate}%",
+    ),
+}
+
+
+def project_pending_impact(ambassadors, escort_rate=None, ambassador_rate=None):
+    """
+    Impact sur les commissions en attente de ``ambassadors`` (QuerySet d'``User``)
+    d'un passage aux taux donnés, en une requête. Sans taux, le montant projeté
+    est le montant actuel.
+
+    Le taux projeté suit le moteur de commissions : au niveau 1, celui de la
+    catégorie du filleul ; aux niveaux suivants, le taux « ambassadeur » ; puis
+    la part du niveau. Les commissions sans montant brut gardent leur montant.
+    Retourne ``(ambassadeurs, commissions, montant actuel, montant projeté)``.
+    """
+    projected = None
+    if escort_rate is not None:
+        whens = []
+        for level, share in level_shares().items():
+            if level == 1:
+                whens.append(
+                    When(
+                        commissions__level=1,
+                        commissions__referral__referred__user_category="escort",
+                        then=Value(Decimal(escort_rate) * share),
+                    )
+                )
+            whens.append(
+                When(commissions__level=level, then=Value(Decimal(ambassador_rate) * share))
+            )
+        projected = Case(
+            When(commissions__gross_amount=0, then=F("commissions__amount")),
+            default=F("commissions__gross_amount")
+            * Case(*whens, default=Value(Decimal("0")), output_field=AMOUNT_FIELD)
+            / Value(Decimal("100")),
+            output_field=AMOUNT_FIELD,
+        )
+    pending = Q(commissions__status="pending")
+
+    aggregates = {
+        "ambassadors": Count("id", distinct=True),
+        "pending_commissions": Count("commissions", filter=pending),
+        "pending_amount": Sum("commissions__amount", filter=pending),
+    }
+    if projected is not None:
+        aggregates["projected_amount"] = Sum(projected, filter=pending)
+
+    totals = ambassadors.order_by().aggregate(**aggregates)
+    pending_amount = Decimal(totals["pending_amount"] or 0).quantize(CENT)
+    return (
+        totals["ambassadors"],
+        totals["pending_commissions"],
+        pending_amount,
+        Decimal(totals.get("projected_amount", pending_amount) or 0).quantize(CENT),
+    )
+
+
+def _notify(operation, recipients, rates):
+    """Notifications et messages Telegram des ambassadeurs ``recipients``."""
+    title, message = NOTIFICATIONS[operation]
+    notifications = Notification.objects.bulk_create(
+        [
+            Notification(
+                user_id=user_id,
+                title=title,
+                message=message.format(**rates),
+                notification_type="system",
+            )
+            for user_id, _, _ in recipients
+        ],
+        batch_size=500,
+    )
+
+    telegram = []
+    for _, chat_id, language in recipients:
+        if chat_id:
+            templates = TELEGRAM_TEMPLATES.get(language, TELEGRAM_TEMPLATES["en"])
+            text = templates[operation].format(**rates)
+            telegram.append((chat_id, f"*{templates['title']}*\n\n{text}"))
+    return len(notifications), len(enqueue_messages(telegram))
+
+
+def _apply(
+    operation, ambassadors, rates, projection, update, admin_user, scope, parameters, dry_run
+):
+    """
+    Déroulé commun : projection (taux escortes, ambassadeurs, ou ``()`` si
+    l'opération ne touche aucun taux du moteur), application
+    par ``update(user_ids)``, notifications et audit.
+    """
+    count, pending, pending_amount, projected_amount = project_pending_impact(
+        ambassadors, *projection
+    )
+    if dry_run:
+        return RateChangeResult(count, pending, pending_amount, projected_amount, 0, 0, True)
+
+    with transaction.atomic():
+        recipients = list(
+            ambassadors.order_by().values_list("id", "telegram_chat_id", "telegram_language")
+        )
+        user_ids = [user_id for user_id, _, _ in recipients]
+        update(user_ids)
+        notifications, telegram = _notify(operation, recipients, rates)
+        RateChangeAudit.objects.create(
+            admin=admin_user,
+            operation=operation,
+            scope=scope,
+            parameters={key: str(value) for key, value in rates.items()} | (parameters or {}),
+            ambassadors_count=len(user_ids),
+            notifications_count=notifications,
+            pending_commissions=pending,
+            pending_amount=pending_amount,
+            projected_amount=projected_amount,
+        )
+
+    logger.info(
+        f"✅ {operation} : {len(user_ids)} ambassadeurs, {notifications} notifications, "
+        f"{telegram} messages Telegram en file"
+    )
+    return RateChangeResult(
+        len(user_ids), pending, pending_amount, projected_amount, notifications, telegram, False
+    )
+
+
+def change_base_rate(ambassadors, rate, admin_user=None, scope="", parameters=None, dry_run=False):
+    """
+    Applique le taux de base ``rate`` (``User.commission_rate``) aux
+    ambassadeurs du QuerySet ``ambassadors``. Retourne un ``RateChangeResult``.
+
+    Seul le champ historique ``User.commission_rate`` change : ni le moteur,
+    ni le recalcul des commissions en attente, ni le résolveur de taux ne le
+    lisent. L'impact projeté est donc nul (montant projeté = montant actuel).
+    """
+    rate = Decimal(str(rate))
+
+    def update(user_ids):
+        User.objects.filter(id__in=user_ids).update(commission_rate=rate)
+
+    return _apply(
+        "base_rate",
+        ambassadors,
+        {"rate": rate},
+        (),
+        update,
+        admin_user,
+        scope,
+        parameters,
+        dry_run,
+    )
+
+
+def change_specific_rates(
+    ambassadors,
+    escort_rate,
+    ambassador_rate,
+    admin_user=None,
+    scope="",
+    parameters=None,
+    dry_run=False,
+):
+    """
+    Applique les taux escortes / ambassadeurs aux profils des ambassadeurs
+    de ``ambassadors`` (profils manquants créés), ainsi qu'à leurs taux
+    personnalisés ``CommissionRate`` existants, prioritaires dans le moteur.
+    Retourne un ``RateChangeResult``.
+    """
+    escort_rate = Decimal(str(escort_rate))
+    ambassador_rate = Decimal(str(ambassador_rate))
+
+    def update(user_ids):
+        now = timezone.now()
+        UserProfile.objects.filter(user_id__in=user_ids).update(
+            escort_commission_rate=escort_rate,
+            ambassador_commission_rate=ambassador_rate,
+            updated_at=now,
+        )
+        existing = set(
+            UserProfile.objects.filter(user_id__in=user_ids).values_list("user_id", flat=True)
+        )
+        UserProfile.objects.bulk_create(
+            [
+                UserProfile(
+                    user_id=user_id,
+                    escort_commission_rate=escort_rate,
+                    ambassador_commission_rate=ambassador_rate,
+                )
+                for user_id in user_ids
+                if user_id not in existing
+            ],
+            batch_size=500,
+            ignore_conflicts=True,
+        )
+
+        for target, rate in (("escort", escort_rate), ("ambassador", ambassador_rate)):
+            changed = list(
+                CommissionRate.objects.filter(ambassador_id__in=user_ids, target_type=target)
+                .exclude(rate=rate)
+                .only("id")
+            )
+            if changed:
+                CommissionRate.objects.filter(id__in=[row.id for row in changed]).update(
+                    rate=rate, updated_at=now
+                )
+                publish_many("supabase.commission_rate", changed)
+        # Mises à jour ensemblistes : les signaux ne voient pas passer ces taux
+        invalidate_rates()
+
+    return _apply(
+        "specific_rates",
+        ambassadors,
+        {"escort_rate": escort_rate, "ambassador_rate": ambassador_rate},
+        (escort_rate, ambassador_rate),
+        update,
+        admin_user,
+        scope,
+        parameters,
+        dry_run,
+    )
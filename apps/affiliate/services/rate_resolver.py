@@ -0,0 +1,232 @@
+"""
+Résolution des taux de commission effectifs.
+
+Le taux d'un ambassadeur pour une catégorie de filleul (``target``) suit une
+seule chaîne de priorité :
+
+1. son taux personnalisé ``CommissionRate`` ;
+2. à défaut, le taux de son ``UserProfile`` (escortes / ambassadeurs) ;
+3. à défaut, ``DEFAULT_COMMISSION_RATES``.
+
+``RateResolver`` garde en mémoire du processus les taux effectifs déjà
+résolus, toutes catégories confondues : un ambassadeur absent de la table est
+chargé avec d'autres en deux requêtes, ensuite ses taux sont servis sans E/S.
+Un lot (``RateTable``) ne coûte qu'une lecture de la version dans le cache
+partagé, quelle que soit sa taille.
+
+Toute écriture d'un ``CommissionRate`` ou d'un taux de ``UserProfile``
+incrémente cette version après le commit ; chaque processus vide alors sa
+table au lot suivant. Les mises à jour ensemblistes (``QuerySet.update``)
+doivent appeler ``invalidate_rates`` elles-mêmes.
+
+La table est de plus vidée après ``AFFILIATE_RATE_RESOLVER_LOCAL_TTL``
+secondes : sans cache partagé (``LocMemCache`` lorsque ``REDIS_URL`` est
+vide), la version n'est pas vue des autres processus et ce délai borne
+l'usage d'un taux modifié ailleurs.
+"""
+
+import logging
+import threading
+import time
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+
+from apps.accounts.models import UserProfile
+from apps.affiliate.models import DEFAULT_COMMISSION_RATES, CommissionRate
+from apps.affiliate.services.shared_cache import is_shared_cache
+
+logger = logging.getLogger(__name__)
+
+VERSION_KEY = "affiliate:rates:version"
+ZERO = Decimal("0.00")
+
+# Catégories résolues pour chaque ambassadeur, et champ du profil correspondant
+PROFILE_FIELDS = {
+    "escort": "escort_commission_rate",
+    "ambassador": "ambassador_commission_rate",
+}
+TARGETS = tuple(dict.fromkeys([*PROFILE_FIELDS, *DEFAULT_COMMISSION_RATES]))
+
+
+class RateResolver:
+    def __init__(self, max_entries=None, local_ttl=None):
+        self.max_entries = max_entries or settings.AFFILIATE_RATE_RESOLVER_MAX_ENTRIES
+        self.local_ttl = local_ttl or settings.AFFILIATE_RATE_RESOLVER_LOCAL_TTL
+        # {id de l'ambassadeur: {catégorie: taux effectif}}
+        self._rates = {}
+        self._version = None
+        self._expires_at = 0.0
+        self._lock = threading.Lock()
+        if not is_shared_cache(self.shared):
+            logger.error(
+                f"❌ Cache {settings.AFFILIATE_RATE_RESOLVER_CACHE} propre au processus : une "
+                f"modification de taux n'atteint les autres processus qu'après {self.local_ttl}s "
+                "(configurer REDIS_URL)"
+            )
+
+    @property
+    def shared(self):
+        return caches[settings.AFFILIATE_RATE_RESOLVER_CACHE]
+
+    def _shared_version(self):
+        """Version courante des taux ; ``None`` si le cache partagé est indisponible."""
+        try:
+            version = self.shared.get(VERSION_KEY)
+            if version is None:
+                self.shared.add(VERSION_KEY, time.time_ns(), None)
+                version = self.shared.get(VERSION_KEY)
+            return version
+        except Exception as e:
+            logger.error(f"❌ Version des taux de commission indisponible: {str(e)}")
+            return None
+
+    def _load(self, ambassador_ids):
+        """Taux effectifs de ``ambassador_ids``, en deux requêtes."""
+        rates = {
+            ambassador_id: {
+                target: DEFAULT_COMMISSION_RATES.get(target, ZERO) for target in TARGETS
+            }
+            for ambassador_id in ambassador_ids
+        }
+        for user_id, *profile_rates in UserProfile.objects.filter(
+            user_id__in=ambassador_ids
+        ).values_list("user_id", *PROFILE_FIELDS.values()):
+            for target, rate in zip(PROFILE_FIELDS, profile_rates):
+                if rate is not None:
+                    rates[user_id][target] = rate
+        for ambassador_id, target, rate in CommissionRate.objects.filter(
+            ambassador_id__in=ambassador_ids
+        ).values_list("ambassador_id", "target_type", "rate"):
+            rates[ambassador_id][target] = rate
+        return rates
+
+    def preload(self, ambassador_ids):
+        """
+        ``{ambassadeur: {catégorie: taux}}`` pour ``ambassador_ids`` ; seuls
+        les ambassadeurs absents de la table interrogent la base.
+        """
+        ambassador_ids = {ambassador_id for ambassador_id in ambassador_ids if ambassador_id}
+        version = self._shared_version()
+        now = time.monotonic()
+        with self._lock:
+            if version is None or version != self._version or now >= self._expires_at:
+                self._rates.clear()
+                self._version = version
+                self._expires_at = now + self.local_ttl
+            known = {
+                ambassador_id: self._rates[ambassador_id]
+                for ambassador_id in ambassador_ids
+                if ambassador_id in self._rates
+            }
+
+        missing = ambassador_ids.difference(known)
+        if not missing:
+            return known
+        loaded = self._load(missing)
+
+        # Une écriture validée pendant le chargement a changé la version :
+        # les taux lus servent à cet appel mais ne sont pas conservés.
+        if version is not None and self._shared_version() == version:
+            with self._lock:
+                if self._version == version:
+                    if len(self._rates) + len(loaded) > self.max_entries:
+                        self._rates.clear()
+                    self._rates.update(loaded)
+        return known | loaded
+
+    def resolve(self, ambassador_id, target):
+        """Taux effectif de ``ambassador_id`` pour la catégorie ``target``."""
+        if not ambassador_id:
+            return DEFAULT_COMMISSION_RATES.get(target, ZERO)
+        return self.preload([ambassador_id])[ambassador_id].get(target, ZERO)
+
+    def clear_local(self):
+        with self._lock:
+            self._rates.clear()
+            self._version = None
+            self._expires_at = 0.0
+
+    def bump_version(self):
+        self.clear_local()
+        try:
+            self.shared.set(VERSION_KEY, time.time_ns(), None)
+        except Exception as e:
+            logger.error(f"❌ Impossible d'invalider les taux de commission: {str(e)}")
+
+
+_resolver = None
+
+
+def get_resolver():
+    global _resolver
+    if _resolver is None:
+        _resolver = RateResolver()
+    return _resolver
+
+
+def resolve_rate(ambassador_id, target):
+    """Raccourci vers le résolveur partagé du processus."""
+    return get_resolver().resolve(ambassador_id, target)
+
+
+def invalidate_rates():
+    """
+    Invalide les taux en mémoire de tous les processus après le commit en
+    cours (une transaction annulée ne laisse ainsi aucun taux non validé).
+    """
+    transaction.on_commit(get_resolver().bump_version)
+
+
+class RateTable:
+    """Taux des bénéficiaires d'un lot, résolus une fois puis lus en mémoire."""
+
+    def __init__(self, beneficiary_ids):
+        self.rates = get_resolver().preload(beneficiary_ids)
+
+    def rate(self, beneficiary_id, target):
+        rates = self.rates.get(beneficiary_id)
+        if rates is None:
+            return DEFAULT_COMMISSION_RATES.get(target, ZERO)
+        return rates.get(target, ZERO)
+
+
+@receiver(post_save, sender=CommissionRate)
+@receiver(post_delete, sender=CommissionRate)
+def invalidate_on_commission_rate_change(sender, instance, **kwargs):
+    invalidate_rates()
+
+
+def _profile_rates(values):
+    return tuple(Decimal(str(rate)) if rate is not None else None for rate in values)
+
+
+@receiver(post_init, sender=UserProfile)
+def remember_profile_rates(sender, instance, **kwargs):
+    """Mémorise les taux chargés pour ne pas invalider sur un autre champ du profil."""
+    instance._commission_rates = _profile_rates(
+        instance.__dict__.get(field) for field in PROFILE_FIELDS.values()
+    )
+
+
+@receiver(post_save, sender=UserProfile)
+def invalidate_on_profile_change(sender, instance, created, **kwargs):
+    current = _profile_rates(getattr(instance, field) for field in PROFILE_FIELDS.values())
+    # Un profil créé aux taux par défaut (à l'inscription) ne change aucun taux résolu
+    previous = (
+        tuple(DEFAULT_COMMISSION_RATES.get(target) for target in PROFILE_FIELDS)
+        if created
+        else getattr(instance, "_commission_rates", None)
+    )
+    if current != previous:
+        invalidate_rates()
+    instance._commission_rates = current
+
+
+@receiver(post_delete, sender=UserProfile)
+def invalidate_on_profile_delete(sender, instance, **kwargs):
+    invalidate_rates()
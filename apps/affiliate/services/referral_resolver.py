@@ -0,0 +1,269 @@
+"""
+Résolution des codes de parrainage avec cache à deux niveaux.
+
+Toutes les vérifications de code (middleware, redirections, pixel, API
+externes, inscription) passent par ``resolve_referral_code`` :
+
+1. un LRU en mémoire du processus (TTL court, aucune E/S) ;
+2. le cache Django partagé (Redis en production) ;
+3. la base de données en dernier recours.
+
+Les codes invalides sont également mis en cache (TTL court) pour qu'un cookie
+ou un lien obsolète ne coûte pas une requête à chaque page vue. Le cache est
+invalidé après le commit lorsque ``User.referral_code`` ou ``User.is_active`` change ; les
+autres processus voient le changement au plus tard après le TTL local.
+
+Ces changements inscrivent aussi le parrain dans la liste des révocations
+(``revoke`` / ``is_revoked``) : les cookies d'attribution signés d'un parrain
+révoqué sont revérifiés auprès du résolveur, les autres sont approuvés sans E/S.
+"""
+
+import logging
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+
+from apps.accounts.models import User
+
+logger = logging.getLogger(__name__)
+
+ResolvedReferrer = namedtuple("ResolvedReferrer", ["id", "username", "referral_code"])
+
+# Valeur stockée dans le cache partagé pour un code invalide
+_NEGATIVE = "-"
+_CACHE_PREFIX = "affiliate:refcode:"
+# Une clé par parrain révoqué : deux révocations concurrentes ne s'écrasent pas
+_REVOKED_PREFIX = "affiliate:refcode:revoked:"
+# Longueur max acceptée avant même de consulter les caches (User.referral_code fait 10)
+_MAX_CODE_LENGTH = 32
+
+
+class ReferralCodeResolver:
+    def __init__(self, maxsize=None, local_ttl=None, shared_ttl=None, negative_ttl=None):
+        self.maxsize = maxsize or settings.AFFILIATE_REFERRAL_RESOLVER_LRU_SIZE
+        self.local_ttl = local_ttl or settings.AFFILIATE_REFERRAL_RESOLVER_LOCAL_TTL
+        self.shared_ttl = shared_ttl or settings.AFFILIATE_REFERRAL_RESOLVER_SHARED_TTL
+        self.negative_ttl = negative_ttl or settings.AFFILIATE_REFERRAL_RESOLVER_NEGATIVE_TTL
+        self._local = OrderedDict()
+        self._lock = threading.Lock()
+        # {id du parrain: (révoqué, échéance)}, relu du cache partagé après le TTL local
+        self._revoked = {}
+
+    @property
+    def shared(self):
+        return caches[settings.AFFILIATE_REFERRAL_RESOLVER_CACHE]
+
+    def _local_get(self, code):
+        with self._lock:
+            entry = self._local.get(code)
+            if entry is None:
+                return False, None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._local[code]
+                return False, None
+            self._local.move_to_end(code)
+            return True, value
+
+    def _local_set(self, code, value):
+        ttl = self.local_ttl if value is not None else min(self.local_ttl, self.negative_ttl)
+        with self._lock:
+            self._local[code] = (time.monotonic() + ttl, value)
+            self._local.move_to_end(code)
+            while len(self._local) > self.maxsize:
+                self._local.popitem(last=False)
+
+    def resolve(self, code):
+        """
+        Retourne un ``ResolvedReferrer`` pour un code actif, sinon ``None``.
+        """
+        if not code or len(code) > _MAX_CODE_LENGTH:
+            return None
+
+        found, value = self._local_get(code)
+        if found:
+            return value
+
+        key = _CACHE_PREFIX + code
+        try:
+            cached = self.shared.get(key)
+        except Exception as e:
+            logger.error(f"❌ Cache partagé des codes de parrainage indisponible: {str(e)}")
+            cached = None
+
+        if cached is not None:
+            value = None if cached == _NEGATIVE else ResolvedReferrer(*cached)
+            self._local_set(code, value)
+            return value
+
+        row = (
+            User.objects.filter(referral_code=code, is_active=True)
+            .values_list("id", "username", "referral_code")
+            .first()
+        )
+        value = ResolvedReferrer(*row) if row else None
+
+        try:
+            if value is None:
+                self.shared.set(key, _NEGATIVE, self.negative_ttl)
+            else:
+                self.shared.set(key, tuple(value), self.shared_ttl)
+        except Exception as e:
+            logger.error(f"❌ Impossible d'écrire dans le cache des codes de parrainage: {str(e)}")
+        self._local_set(code, value)
+        return value
+
+    async def aresolve(self, code):
+        """Version asynchrone : un code présent dans le LRU local est résolu sans E/S."""
+        if not code or len(code) > _MAX_CODE_LENGTH:
+            return None
+        found, value = self._local_get(code)
+        if found:
+            return value
+        return await sync_to_async(self.resolve)(code)
+
+    def invalidate(self, *codes):
+        codes = [code for code in codes if code]
+        if not codes:
+            return
+        with self._lock:
+            for code in codes:
+                self._local.pop(code, None)
+        try:
+            self.shared.delete_many([_CACHE_PREFIX + code for code in codes])
+        except Exception as e:
+            logger.error(f"❌ Impossible d'invalider les codes de parrainage {codes}: {str(e)}")
+
+    def clear_local(self):
+        with self._lock:
+            self._local.clear()
+            self._revoked.clear()
+
+    def _load_revoked(self, referrer_ids):
+        """Parrains de ``referrer_ids`` révoqués, en une lecture du cache partagé."""
+        try:
+            found = self.shared.get_many([_REVOKED_PREFIX + str(pk) for pk in referrer_ids])
+        except Exception as e:
+            logger.error(f"❌ Liste des parrains révoqués indisponible: {str(e)}")
+            found = {}
+        # Chaque clé expire avec le dernier cookie émis avant la révocation
+        return {pk for pk in referrer_ids if _REVOKED_PREFIX + str(pk) in found}
+
+    def _remember_revoked(self, referrer_id, revoked):
+        with self._lock:
+            if len(self._revoked) >= self.maxsize:
+                self._revoked.clear()
+            self._revoked[referrer_id] = (revoked, time.monotonic() + self.local_ttl)
+
+    def revoke(self, referrer_id):
+        """
+        Signale que le code ou le statut du parrain a changé : ses cookies
+        d'attribution ne sont plus approuvés sur leur seule signature.
+        """
+        try:
+            self.shared.set(
+                _REVOKED_PREFIX + str(referrer_id), time.time(), settings.AFFILIATE_COOKIE_AGE
+            )
+        except Exception as e:
+            logger.error(f"❌ Impossible de révoquer le parrain {referrer_id}: {str(e)}")
+        self._remember_revoked(referrer_id, True)
+
+    def is_revoked(self, referrer_id):
+        """Vrai si le parrain a été révoqué (sans E/S tant que la copie locale est fraîche)."""
+        with self._lock:
+            revoked, expires_at = self._revoked.get(referrer_id, (False, 0.0))
+        if expires_at > time.monotonic():
+            return revoked
+        revoked = referrer_id in self._load_revoked([referrer_id])
+        self._remember_revoked(referrer_id, revoked)
+        return revoked
+
+
+_resolver = None
+
+
+def get_resolver():
+    global _resolver
+    if _resolver is None:
+        _resolver = ReferralCodeResolver()
+    return _resolver
+
+
+def resolve_referral_code(code):
+    """Raccourci vers le résolveur partagé du processus."""
+    return get_resolver().resolve(code)
+
+
+async def aresolve_referral_code(code):
+    return await get_resolver().aresolve(code)
+
+
+def get_referrer(code):
+    """
+    Retourne l'instance ``User`` du parrain pour un code valide.
+
+    Lève ``User.DoesNotExist`` pour un code invalide sans interroger la base ;
+    pour un code valide, le chargement se fait par clé primaire.
+    """
+    resolved = resolve_referral_code(code)
+    if resolved is None:
+        raise User.DoesNotExist(f"Code de parrainage invalide: {code}")
+    return User.objects.get(pk=resolved.id)
+
+
+async def aget_referrer(code):
+    """Version asynchrone de ``get_referrer``."""
+    resolved = await aresolve_referral_code(code)
+    if resolved is None:
+        raise User.DoesNotExist(f"Code de parrainage invalide: {code}")
+    return await User.objects.aget(pk=resolved.id)
+
+
+def invalidate_referral_code(*codes):
+    """
+    Invalide ``codes`` après le commit en cours : un code résolu entre
+    l'écriture et le commit remettrait sinon l'ancien état dans le cache partagé.
+    """
+    transaction.on_commit(lambda: get_resolver().invalidate(*codes))
+
+
+def revoke_referrer(referrer_id):
+    """Révoque les cookies d'attribution de ``referrer_id`` après le commit en cours."""
+    transaction.on_commit(lambda: get_resolver().revoke(referrer_id))
+
+
+def is_referrer_revoked(referrer_id):
+    return get_resolver().is_revoked(referrer_id)
+
+
+@receiver(post_init, sender=User)
+def remember_referral_state(sender, instance, **kwargs):
+    """Mémorise le code et le statut chargés pour détecter leur modification."""
+    instance._referral_state = (
+        instance.__dict__.get("referral_code"),
+        instance.__dict__.get("is_active"),
+    )
+
+
+@receiver(post_save, sender=User)
+def invalidate_on_user_change(sender, instance, created, **kwargs):
+    previous_code, previous_active = getattr(instance, "_referral_state", (None, None))
+    current = (instance.referral_code, instance.is_active)
+    if created or current != (previous_code, previous_active):
+        invalidate_referral_code(previous_code, instance.referral_code)
+        if not created:
+            revoke_referrer(instance.pk)
+    instance._referral_state = current
+
+
+@receiver(post_delete, sender=User)
+def invalidate_on_user_delete(sender, instance, **kwargs):
+    invalidate_referral_code(instance.referral_code)
+    revoke_referrer(instance.pk)
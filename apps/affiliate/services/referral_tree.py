@@ -0,0 +1,230 @@
+"""
+Graphe de parrainage : table de fermeture ``ReferralClosure``.
+
+``User.referred_by`` ne relie un utilisateur qu'à son parrain direct ;
+parcourir une downline imposait une requête par niveau (ou par filleul).
+La table de fermeture stocke chaque couple (ancêtre, descendant) avec son
+niveau, ce qui ramène à une seule requête indexée :
+
+- la taille d'une downline (``downline_size``) ;
+- une sous-arborescence limitée en profondeur (``downline``) ;
+- le nombre de filleuls par niveau (``level_counts``, ``direct_referral_counts``) ;
+- la lignée d'un utilisateur (``upline``).
+
+Un changement de parrain détache la sous-arborescence de l'utilisateur de
+ses anciens ancêtres puis la rattache aux nouveaux, en deux requêtes
+ensemblistes (``DELETE`` puis ``INSERT ... SELECT``) quelle que soit sa
+taille. La maintenance suit ``referred_by`` via les signaux de ``User``
+(inscription, ``AffiliateService.process_referral``, API, commandes) ;
+``rebuild_referral_closure`` recalcule la table niveau par niveau.
+"""
+
+import logging
+
+from django.db import connection, transaction
+from django.db.models import Count, F, Q
+from django.db.models.signals import post_init, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from apps.accounts.models import User
+from apps.affiliate.models import ReferralClosure
+
+logger = logging.getLogger(__name__)
+
+# Garde-fou de la reconstruction contre un cycle dans referred_by
+MAX_DEPTH = 100
+
+
+class ReferralCycleError(ValueError):
+    """Le nouveau parrain fait partie de la downline de l'utilisateur."""
+
+
+def _table(model):
+    return connection.ops.quote_name(model._meta.db_table)
+
+
+def _detach(user_id):
+    """Supprime les chemins reliant la sous-arborescence de ``user_id`` à ses ancêtres."""
+    subtree = ReferralClosure.objects.filter(ancestor_id=user_id).values("descendant_id")
+    ancestors = ReferralClosure.objects.filter(descendant_id=user_id).values("ancestor_id")
+    return ReferralClosure.objects.filter(
+        Q(descendant_id=user_id) | Q(descendant_id__in=subtree),
+        ancestor_id__in=ancestors,
+    ).delete()[0]
+
+
+def _attach(user_id, parent_id):
+    """Relie la sous-arborescence de ``user_id`` à ``parent_id`` et à ses ancêtres."""
+    closure = _table(ReferralClosure)
+    with connection.cursor() as cursor:
+        # (ancêtres du parent + parent) × (descendants de l'utilisateur + utilisateur)
+        cursor.execute(
+            f"""
+            INSERT INTO {closure} (ancestor_id, descendant_id, depth)
+            SELECT up.ancestor_id, down.descendant_id, up.depth + down.depth + 1
+            FROM (
+                SELECT ancestor_id, depth FROM {closure} WHERE descendant_id = %s
+                UNION ALL SELECT %s, 0
+            ) up
+            CROSS JOIN (
+                SELECT descendant_id, depth FROM {closure} WHERE ancestor_id = %s
+                UNION ALL SELECT %s, 0
+            ) down
+            """,
+            [parent_id, parent_id, user_id, user_id],
+        )
+        return cursor.rowcount
+
+
+def check_referrer(user_id, parent_id):
+    """Lève ``ReferralCycleError`` si ``parent_id`` est ``user_id`` ou appartient à sa downline."""
+    if parent_id is not None and (
+        parent_id == user_id
+        or ReferralClosure.objects.filter(ancestor_id=user_id, descendant_id=parent_id).exists()
+    ):
+        raise ReferralCycleError(
+            f"{parent_id} appartient à la downline de {user_id} : parrainage circulaire"
+        )
+
+
+def move_subtree(user_id, parent_id):
+    """Répercute ``user.referred_by = parent`` (ou ``None``) sur la table."""
+    with transaction.atomic():
+        check_referrer(user_id, parent_id)
+        removed = _detach(user_id)
+        added = _attach(user_id, parent_id) if parent_id is not None else 0
+    logger.info(
+        f"🌳 Downline de {user_id} rattachée à {parent_id} ({removed} liens retirés, {added} ajoutés)"
+    )
+
+
+# --- Requêtes ---------------------------------------------------------------
+
+
+def _paths(ancestor_id, max_depth=None):
+    paths = ReferralClosure.objects.filter(ancestor_id=ancestor_id)
+    return paths.filter(depth__lte=max_depth) if max_depth else paths
+
+
+def downline_size(user_id, max_depth=None):
+    """Nombre de filleuls directs et indirects (jusqu'à ``max_depth`` niveaux)."""
+    return _paths(user_id, max_depth).count()
+
+
+def downline(user_id, max_depth=None):
+    """Utilisateurs de la downline, annotés de leur niveau (``referral_depth``)."""
+    # Un seul filter() : les deux conditions portent sur le même lien de fermeture
+    lookups = {"upline_paths__ancestor_id": user_id}
+    if max_depth:
+        lookups["upline_paths__depth__lte"] = max_depth
+    return User.objects.filter(**lookups).annotate(referral_depth=F("upline_paths__depth"))
+
+
+def level_counts(user_id, max_depth=None):
+    """``{niveau: nombre de filleuls}`` en une requête groupée."""
+    return dict(
+        _paths(user_id, max_depth)
+        .values("depth")
+        .annotate(count=Count("id"))
+        .order_by("depth")
+        .values_list("depth", "count")
+    )
+
+
+def direct_referral_counts(user_ids, depth=1):
+    """``{id: nombre de filleuls au niveau depth}`` pour plusieurs utilisateurs."""
+    return dict(
+        ReferralClosure.objects.filter(ancestor_id__in=user_ids, depth=depth)
+        .values("ancestor_id")
+        .annotate(count=Count("id"))
+        .order_by()
+        .values_list("ancestor_id", "count")
+    )
+
+
+def upline(user_id, max_depth=None):
+    """Parrains successifs de ``user_id`` (niveau 1 = parrain direct), du plus proche au plus éloigné."""
+    paths = ReferralClosure.objects.filter(descendant_id=user_id)
+    if max_depth:
+        paths = paths.filter(depth__lte=max_depth)
+    return (
+        User.objects.filter(downline_paths__in=paths)
+        .annotate(referral_depth=F("downline_paths__depth"))
+        .order_by("referral_depth")
+    )
+
+
+# --- Reconstruction ---------------------------------------------------------
+
+
+def rebuild_referral_closure():
+    """
+    Recalcule toute la table depuis ``User.referred_by``, un niveau par requête
+    (``INSERT ... SELECT``). Retourne le nombre de liens créés.
+    """
+    closure = _table(ReferralClosure)
+    users = _table(User)
+    total = 0
+    with transaction.atomic(), connection.cursor() as cursor:
+        ReferralClosure.objects.all().delete()
+        cursor.execute(f"""
+            INSERT INTO {closure} (ancestor_id, descendant_id, depth)
+            SELECT referred_by_id, id, 1 FROM {users}
+            WHERE referred_by_id IS NOT NULL AND referred_by_id <> id
+            """)
+        inserted = cursor.rowcount
+        depth = 1
+        while inserted > 0:
+            total += inserted
+            if depth >= MAX_DEPTH:
+                logger.error(
+                    f"❌ Profondeur {MAX_DEPTH} atteinte : cycle probable dans referred_by"
+                )
+                break
+            # Niveau suivant : filleuls directs des descendants du niveau courant
+            cursor.execute(
+                f"""
+                INSERT INTO {closure} (ancestor_id, descendant_id, depth)
+                SELECT c.ancestor_id, u.id, c.depth + 1
+                FROM {closure} c
+                JOIN {users} u ON u.referred_by_id = c.descendant_id
+                WHERE c.depth = %s AND u.id <> c.ancestor_id
+                """,
+                [depth],
+            )
+            inserted = cursor.rowcount
+            depth += 1
+    logger.info(f"🌳 Table de fermeture reconstruite : {total} liens sur {depth - 1} niveaux")
+    return total
+
+
+# --- Maintenance incrémentale -----------------------------------------------
+
+
+@receiver(post_init, sender=User)
+def remember_referrer(sender, instance, **kwargs):
+    instance._closure_parent_id = instance.__dict__.get("referred_by_id")
+
+
+@receiver(pre_save, sender=User)
+def refuse_referral_cycle(sender, instance, **kwargs):
+    # Avant l'UPDATE : un parrainage circulaire n'est jamais écrit
+    if instance.pk and instance.referred_by_id != getattr(instance, "_closure_parent_id", None):
+        check_referrer(instance.pk, instance.referred_by_id)
+
+
+@receiver(post_save, sender=User)
+def closure_on_referrer_change(sender, instance, created, **kwargs):
+    previous = None if created else getattr(instance, "_closure_parent_id", None)
+    current = instance.referred_by_id
+    if current != previous:
+        move_subtree(instance.pk, current)
+    instance._closure_parent_id = current
+
+
+@receiver(pre_delete, sender=User)
+def closure_on_user_delete(sender, instance, **kwargs):
+    # Les filleuls passent à referred_by=NULL (SET_NULL, sans signal) : leur
+    # sous-arborescence est détachée des ancêtres de l'utilisateur supprimé.
+    # Les liens passant par l'utilisateur lui-même partent en cascade.
+    _detach(instance.pk)
@@ -0,0 +1,18 @@
+"""
+Détection des caches propres au processus.
+
+Les invalidations par version (statistiques, taux de commission) ne
+traversent les processus que si le cache est partagé (Redis). Sans
+``REDIS_URL``, les caches retombent sur ``LocMemCache`` : chaque worker
+garde sa copie, et ces services bornent alors la durée de leurs entrées.
+"""
+
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+
+PROCESS_LOCAL_BACKENDS = (LocMemCache, DummyCache)
+
+
+def is_shared_cache(cache):
+    """Vrai si une écriture dans ``cache`` est visible des autres processus."""
+    return not isinstance(cache, PROCESS_LOCAL_BACKENDS)
@@ -0,0 +1,160 @@
+"""
+Regroupement des calculs identiques concurrents (« single flight »).
+
+Quand plusieurs requêtes (onglets, appels groupés du frontend) demandent le
+même calcul coûteux en même temps, une seule l'exécute : elle prend un verrou
+court dans le cache partagé (``cache.add``, atomique sous Redis), calcule,
+puis dépose le résultat sous une clé de résultat. Les autres attendent ce
+résultat au lieu de lancer le même calcul sur un autre worker.
+
+Si le calculateur échoue, son verrou est libéré et un des requérants en
+attente reprend le calcul ; au-delà de ``AFFILIATE_SINGLE_FLIGHT_WAIT``
+secondes, un requérant calcule lui-même plutôt que d'attendre indéfiniment.
+
+Les compteurs (calculs exécutés, dédoublonnés, expirations) sont tenus dans
+le processus (``metrics``) et agrégés dans le cache pour l'ensemble des
+workers (``shared_metrics``, commande ``single_flight_status``).
+"""
+
+import logging
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import caches
+
+logger = logging.getLogger(__name__)
+
+LOCK_KEY = "affiliate:singleflight:lock:{key}"
+RESULT_KEY = "affiliate:singleflight:result:{key}"
+METRIC_KEY = "affiliate:singleflight:metrics:{name}"
+
+# Attente entre deux lectures de la clé de résultat (doublée jusqu'au plafond)
+POLL_INITIAL_DELAY = 0.01
+POLL_MAX_DELAY = 0.1
+
+
+class SingleFlightMetrics:
+    """Compteurs du processus courant (thread-safe)."""
+
+    FIELDS = ("computed", "deduplicated", "shared", "timeouts", "errors")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.counters = dict.fromkeys(self.FIELDS, 0)
+            self.wait_seconds = 0.0
+
+    def add(self, wait=0.0, **counters):
+        with self._lock:
+            for name, value in counters.items():
+                self.counters[name] += value
+            self.wait_seconds += wait
+        _incr_shared(counters)
+
+    def snapshot(self):
+        with self._lock:
+            data = dict(self.counters)
+            data["wait_seconds"] = round(self.wait_seconds, 3)
+        return _with_ratio(data)
+
+
+metrics = SingleFlightMetrics()
+
+
+def _cache():
+    return caches[settings.AFFILIATE_SINGLE_FLIGHT_CACHE]
+
+
+def _incr_shared(counters):
+    cache = _cache()
+    for name, value in counters.items():
+        key = METRIC_KEY.format(name=name)
+        try:
+            try:
+                cache.incr(key, value)
+            except ValueError:
+                if not cache.add(key, value, None):
+                    cache.incr(key, value)
+        except Exception as e:
+            logger.debug(f"Compteur single-flight {name} non agrégé: {str(e)}")
+
+
+def _with_ratio(data):
+    requests = data["computed"] + data["deduplicated"] + data["shared"]
+    # Part des demandes servies sans recalcul
+    data["dedup_ratio"] = (
+        round((data["deduplicated"] + data["shared"]) / requests, 3) if requests else 0.0
+    )
+    return data
+
+
+def shared_metrics():
+    """Compteurs agrégés de tous les workers."""
+    cache = _cache()
+    keys = {name: METRIC_KEY.format(name=name) for name in SingleFlightMetrics.FIELDS}
+    values = cache.get_many(list(keys.values()))
+    return _with_ratio({name: values.get(key, 0) for name, key in keys.items()})
+
+
+def reset_shared_metrics():
+    _cache().delete_many([METRIC_KEY.format(name=name) for name in SingleFlightMetrics.FIELDS])
+
+
+def single_flight(key, builder, result_ttl=None, lock_ttl=None, wait=None):
+    """
+    Résultat de ``builder()`` pour ``key``, calculé une seule fois pour
+    toutes les requêtes concurrentes portant la même clé.
+
+    Le résultat reste partagé ``result_ttl`` secondes : la clé doit donc
+    identifier précisément les données (version, période, date...).
+    """
+    cache = _cache()
+    lock_key = LOCK_KEY.format(key=key)
+    result_key = RESULT_KEY.format(key=key)
+    result_ttl = settings.AFFILIATE_SINGLE_FLIGHT_RESULT_TTL if result_ttl is None else result_ttl
+    lock_ttl = settings.AFFILIATE_SINGLE_FLIGHT_LOCK_TTL if lock_ttl is None else lock_ttl
+    wait = settings.AFFILIATE_SINGLE_FLIGHT_WAIT if wait is None else wait
+
+    start = time.monotonic()
+    delay = POLL_INITIAL_DELAY
+    token = uuid.uuid4().hex
+    waited = False
+
+    while True:
+        try:
+            # Résultat emballé dans un tuple : un calcul peut légitimement renvoyer None
+            found = cache.get(result_key)
+            if found is not None:
+                elapsed = time.monotonic() - start
+                metrics.add(wait=elapsed, **{"deduplicated" if waited else "shared": 1})
+                return found[0]
+            acquired = cache.add(lock_key, token, lock_ttl)
+        except Exception as e:
+            logger.error(f"❌ Cache single-flight indisponible pour {key}: {str(e)}")
+            metrics.add(errors=1)
+            return builder()
+
+        if acquired:
+            try:
+                value = builder()
+                cache.set(result_key, (value,), result_ttl)
+                metrics.add(computed=1)
+                return value
+            finally:
+                # Ne pas libérer un verrou expiré puis repris par un autre worker
+                if cache.get(lock_key) == token:
+                    cache.delete(lock_key)
+
+        if time.monotonic() - start >= wait:
+            logger.warning(f"⚠️ Attente single-flight dépassée pour {key}, calcul local")
+            metrics.add(wait=time.monotonic() - start, timeouts=1)
+            return builder()
+
+        waited = True
+        time.sleep(delay)
+        delay = min(delay * 2, POLL_MAX_DELAY)
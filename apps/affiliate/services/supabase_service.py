@@ -1,53 +1,162 @@
+from django.utils import timezone
+
 from apps.affiliate.supabase_client import get_supabase_client
+from .supabase_sync import SupabaseSyncEngine
 import logging
 
 logger = logging.getLogger(__name__)
 
 
+def _isoformat(value):
+    return value.isoformat() if value else None
+
+
+def commission_row(commission):
+    return {
+        "id": str(commission.id),
+        "user_id": str(commission.user_id),
+        "referral_id": str(commission.referral_id) if commission.referral_id else None,
+        "amount": float(commission.amount),
+        "status": commission.status,
+        "transaction_id": commission.transaction_id,
+        "created_at": _isoformat(commission.created_at),
+        "paid_at": _isoformat(commission.paid_at),
+    }
+
+
+def commission_rate_row(rate):
+    return {
+        "id": str(rate.id),
+        "ambassador_id": str(rate.ambassador_id),
+        "target_type": rate.target_type,
+        "rate": float(rate.rate),
+        "created_at": _isoformat(rate.created_at),
+        "updated_at": _isoformat(rate.updated_at),
+    }
+
+
+def payout_row(payout):
+    return {
+        "id": str(payout.id),
+        "ambassador_id": str(payout.ambassador_id),
+        "amount": float(payout.amount),
+        "status": payout.status,
+        "created_at": _isoformat(payout.created_at),
+        "completed_at": _isoformat(payout.completed_at),
+    }
+
+
+def referral_row(referral):
+    return {
+        "id": str(referral.id),
+        "referrer_id": str(referral.referrer_id),
+        "referred_id": str(referral.referred_id),
+        "referral_code": referral.referral_code,
+        "created_at": _isoformat(referral.created_at),
+    }
+
+
+def white_label_row(white_label):
+    return {
+        "id": str(white_label.id),
+        "name": white_label.name,
+        "domain": white_label.domain,
+        "primary_color": white_label.primary_color,
+        "secondary_color": white_label.secondary_color,
+        "is_active": white_label.is_active,
+        "created_at": _isoformat(white_label.created_at),
+        "updated_at": _isoformat(white_label.updated_at),
+    }
+
+
 class SupabaseService:
+    """
+    Synchronisation avec Supabase.
+
+    Les méthodes ``sync_*`` acceptent un objet ; les variantes au pluriel une
+    liste, envoyée en ``upsert`` groupés par le moteur de synchronisation.
+    """
+
     def __init__(self):
         self.supabase = get_supabase_client()
+        self.engine = SupabaseSyncEngine(self.supabase)
+
+    def _upsert(self, table, rows, label):
+        try:
+            count = self.engine.upsert(table, rows)
+            logger.info(f"{count} {label} synchronisé(s) avec Supabase")
+            return True
+        except Exception as e:
+            logger.exception(f"Erreur lors de la synchronisation Supabase ({table}): {str(e)}")
+            return False
+
+    def sync_commissions(self, commissions):
+        return self._upsert("commissions", [commission_row(c) for c in commissions], "commission")
 
     def sync_commission(self, commission):
         """
         Synchronise une commission avec Supabase
         """
-        try:
-            data = {
-                "id": str(commission.id),
-                "user_id": str(commission.user.id),
-                "referral_id": str(commission.referral.id),
-                "amount": float(commission.amount),
-                "status": commission.status,
-                "transaction_id": commission.transaction_id,
-                "created_at": commission.created_at.isoformat(),
-                "paid_at": (commission.paid_at.isoformat() if commission.paid_at else None),
-            }
-
-            # Vérifier si la commission existe déjà
-            existing = (
-                self.supabase.table("commissions")
-                .select("id")
-                .eq("id", str(commission.id))
-                .execute()
-            )
+        return self.sync_commissions([commission])
+
+    def sync_commission_rates(self, rates):
+        return self._upsert(
+            "commission_rates", [commission_rate_row(r) for r in rates], "taux de commission"
+        )
+
+    def sync_commission_rate(self, rate):
+        """
+        Synchronise un taux de commission avec Supabase
+        """
+        return self.sync_commission_rates([rate])
+
+    def sync_payouts(self, payouts):
+        return self._upsert("payouts", [payout_row(p) for p in payouts], "paiement")
+
+    def sync_payout(self, payout):
+        """
+        Synchronise un paiement avec Supabase
+        """
+        return self.sync_payouts([payout])
+
+    def sync_referrals(self, referrals):
+        return self._upsert("referrals", [referral_row(r) for r in referrals], "parrainage")
+
+    def sync_referral(self, referral):
+        """
+        Synchronise un parrainage avec Supabase
+        """
+        return self.sync_referrals([referral])
+
+    def sync_white_labels(self, white_labels):
+        return self._upsert(
+            "white_labels", [white_label_row(w) for w in white_labels], "white label"
+        )
 
-            if existing.data:
-                # Mettre à jour la commission existante
-                self.supabase.table("commissions").update(data).eq(
-                    "id", str(commission.id)
-                ).execute()
-                logger.info(f"Commission {commission.id} mise à jour dans Supabase")
-            else:
-                # Créer une nouvelle commission
-                self.supabase.table("commissions").insert(data).execute()
-                logger.info(f"Commission {commission.id} créée dans Supabase")
+    def sync_white_label(self, white_label):
+        """
+        Synchronise un site white label avec Supabase
+        """
+        return self.sync_white_labels([white_label])
 
+    def mark_commissions_paid(self, commission_ids, payout_id):
+        """
+        Marque des commissions comme payées dans Supabase, par paquets
+        (quelques requêtes pour des centaines de commissions).
+        """
+        try:
+            self.engine.update_many(
+                "commissions",
+                commission_ids,
+                {
+                    "status": "paid",
+                    "paid_at": timezone.now().isoformat(),
+                    "payout_id": str(payout_id),
+                },
+            )
             return True
         except Exception as e:
-            logger.exception(
-                f"Erreur lors de la synchronisation de la commission {commission.id}: {str(e)}"
-            )
+            logger.exception(f"Erreur lors du marquage des commissions comme payées: {str(e)}")
             return False
 
     def get_ambassador_stats(self, ambassador_id):
@@ -89,45 +198,3 @@ class SupabaseService:
                 f"Erreur lors de la récupération des stats du white label {white_label_id}: {str(e)}"
             )
             return None
-
-    def sync_white_label(self, white_label):
-        """
-        Synchronise un site white label avec Supabase
-        """
-        try:
-            data = {
-                "id": str(white_label.id),
-                "name": white_label.name,
-                "domain": white_label.domain,
-                "primary_color": white_label.primary_color,
-                "secondary_color": white_label.secondary_color,
-                "is_active": white_label.is_active,
-                "created_at": white_label.created_at.isoformat(),
-                "updated_at": white_label.updated_at.isoformat(),
-            }
-
-            # Vérifier si le white label existe déjà
-            existing = (
-                self.supabase.table("white_labels")
-                .select("id")
-                .eq("id", str(white_label.id))
-                .execute()
-            )
-
-            if existing.data:
-                # Mettre à jour le white label existant
-                self.supabase.table("white_labels").update(data).eq(
-                    "id", str(white_label.id)
-                ).execute()
-                logger.info(f"White label {white_label.id} mis à jour dans Supabase")
-            else:
-                # Créer un nouveau white label
-                self.supabase.table("white_labels").insert(data).execute()
-                logger.info(f"White label {white_label.id} créé dans Supabase")
-
-            return True
-        except Exception as e:
-            logger.exception(
-                f"Erreur lors de la synchronisation du white label {white_label.id}: {str(e)}"
-            )
-            return False
@@ -0,0 +1,148 @@
+"""
+Moteur de synchronisation par lots vers Supabase.
+
+Au lieu d'un aller-retour ``select`` puis ``insert``/``update`` par ligne,
+les lignes modifiées sont regroupées par table, dédoublonnées (la dernière
+version d'une ligne l'emporte) et envoyées en ``upsert`` par paquets de
+``AFFILIATE_SUPABASE_SYNC_BATCH_SIZE``. Les mises à jour d'un même champ sur
+de nombreuses lignes (ex. commissions payées) passent par un seul
+``update ... in (...)`` par paquet.
+
+Côté outbox, les événements Supabase d'un même objet sont fusionnés tant
+qu'ils n'ont pas été réclamés, et retardés de
+``AFFILIATE_SUPABASE_SYNC_WINDOW`` secondes pour absorber les rafales de
+sauvegardes (voir ``services/outbox.py``).
+"""
+
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db.models import Count, Min
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+
+def _chunks(items, size):
+    for start in range(0, len(items), size):
+        yield items[start : start + size]
+
+
+class SyncMetrics:
+    """Compteurs de débit du processus courant (thread-safe)."""
+
+    FIELDS = ("rows_requested", "rows_coalesced", "rows_sent", "requests", "failures")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.counters = dict.fromkeys(self.FIELDS, 0)
+            self.busy_seconds = 0.0
+            self.started_at = time.monotonic()
+            self.last_success_at = None
+
+    def add(self, duration=0.0, success=True, **counters):
+        with self._lock:
+            for name, value in counters.items():
+                self.counters[name] += value
+            self.busy_seconds += duration
+            if success:
+                self.last_success_at = timezone.now()
+
+    def snapshot(self):
+        with self._lock:
+            data = dict(self.counters)
+            elapsed = time.monotonic() - self.started_at
+            data["rows_per_second"] = round(data["rows_sent"] / elapsed, 2) if elapsed else 0.0
+            data["rows_per_request"] = (
+                round(data["rows_sent"] / data["requests"], 2) if data["requests"] else 0.0
+            )
+            data["busy_seconds"] = round(self.busy_seconds, 3)
+            data["last_success_at"] = self.last_success_at
+            return data
+
+
+metrics = SyncMetrics()
+
+
+class SupabaseSyncEngine:
+    """Envoie des lignes à Supabase par ``upsert`` groupés."""
+
+    def __init__(self, client, batch_size=None):
+        self.client = client
+        self.batch_size = batch_size or settings.AFFILIATE_SUPABASE_SYNC_BATCH_SIZE
+
+    def _execute(self, request, rows):
+        start = time.perf_counter()
+        try:
+            request.execute()
+        except Exception:
+            metrics.add(time.perf_counter() - start, success=False, requests=1, failures=1)
+            raise
+        metrics.add(time.perf_counter() - start, requests=1, rows_sent=rows)
+
+    def upsert(self, table, rows):
+        """
+        Insère ou met à jour ``rows`` (dictionnaires avec une clé ``id``).
+
+        Les doublons sont fusionnés ; retourne le nombre de lignes envoyées.
+        Lève l'exception du client en cas d'échec.
+        """
+        merged = {}
+        for row in rows:
+            merged.setdefault(row["id"], {}).update(row)
+        metrics.add(rows_requested=len(rows), rows_coalesced=len(rows) - len(merged))
+
+        for chunk in _chunks(list(merged.values()), self.batch_size):
+            self._execute(self.client.table(table).upsert(chunk, on_conflict="id"), len(chunk))
+        logger.debug(f"{len(merged)} lignes synchronisées vers Supabase ({table})")
+        return len(merged)
+
+    def update_many(self, table, ids, values):
+        """Applique ``values`` aux lignes ``ids`` (un ``update ... in`` par paquet)."""
+        ids = list(dict.fromkeys(str(pk) for pk in ids))
+        metrics.add(rows_requested=len(ids))
+        for chunk in _chunks(ids, self.batch_size):
+            self._execute(self.client.table(table).update(values).in_("id", chunk), len(chunk))
+        return len(ids)
+
+
+def sync_lag():
+    """
+    Retard de synchronisation mesuré sur l'outbox (tous processus confondus) :
+    nombre d'événements Supabase non livrés par sujet et âge du plus ancien.
+    """
+    from apps.affiliate.models import OutboxEvent
+
+    now = timezone.now()
+    rows = (
+        OutboxEvent.objects.filter(
+            topic__startswith="supabase.", status__in=("pending", "processing")
+        )
+        .values("topic")
+        .annotate(pending=Count("id"), oldest=Min("created_at"))
+        .order_by("topic")
+    )
+    return {
+        row["topic"]: {
+            "pending": row["pending"],
+            "lag_seconds": round((now - row["oldest"]).total_seconds(), 1),
+        }
+        for row in rows
+    }
+
+
+def sync_throughput(minutes=5):
+    """Événements Supabase livrés par minute sur les ``minutes`` dernières minutes."""
+    from apps.affiliate.models import OutboxEvent
+
+    since = timezone.now() - timezone.timedelta(minutes=minutes)
+    delivered = OutboxEvent.objects.filter(
+        topic__startswith="supabase.", status="delivered", delivered_at__gte=since
+    ).count()
+    return round(delivered / minutes, 1)
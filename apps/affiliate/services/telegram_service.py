@@ -1,34 +1,33 @@
-import requests
 from django.conf import settings
 import logging
 
+from apps.dashboard.telegram_digest import notify
+from apps.dashboard.telegram_dispatcher import enqueue_message
+
 logger = logging.getLogger(__name__)
 
 
 class TelegramService:
     def __init__(self):
-        self.bot_token = settings.TELEGRAM_BOT_TOKEN
         self.chat_id = settings.TELEGRAM_CHAT_ID
-        self.api_url = f"https://api.telegram.org/bot{self.bot_token}/sendMessage"
 
-    def send_message(self, message):
+    def send_message(self, message, kind=None, amount=None):
         """
-        Envoie un message via l'API Telegram
+        Met en file un message pour le chat d'administration (envoyé par le dispatcher).
+
+        Avec ``kind``, le message est regroupé avec les notifications du même
+        type arrivées dans la fenêtre ``TELEGRAM_COALESCE_WINDOW``.
         """
-        try:
-            response = requests.post(
-                self.api_url,
-                json={"chat_id": self.chat_id, "text": message, "parse_mode": "HTML"},
-            )
-            if response.status_code == 200:
-                logger.info(f"Message Telegram envoyé avec succès: {message}")
-                return True
-            else:
-                logger.error(f"Erreur lors de l'envoi du message Telegram: {response.text}")
-                return False
-        except Exception as e:
-            logger.exception(f"Erreur lors de l'envoi du message Telegram: {str(e)}")
-            return False
+        if not self.chat_id:
+            # Pas de chat d'administration configuré : rien à envoyer, rien à retenter
+            logger.warning("TELEGRAM_CHAT_ID non configuré, notification ignorée")
+            return None
+        if kind:
+            notify(self.chat_id, message, kind=kind, amount=amount, parse_mode="HTML")
+        else:
+            enqueue_message(self.chat_id, message, parse_mode="HTML")
+        logger.info(f"Message Telegram mis en file: {message}")
+        return True
 
     def notify_new_referral(self, referrer, referred):
         """
@@ -40,7 +39,7 @@ class TelegramService:
             f"Parrainé: {referred.username}\n"
             f"Date: {referred.date_joined.strftime('%d/%m/%Y %H:%M')}"
         )
-        return self.send_message(message)
+        return self.send_message(message, kind="new_referral")
 
     def notify_commission(self, commission):
         """
@@ -53,7 +52,7 @@ class TelegramService:
             f"Type: {commission.commission_type}\n"
             f"Date: {commission.created_at.strftime('%d/%m/%Y %H:%M')}"
         )
-        return self.send_message(message)
+        return self.send_message(message, kind="new_commission", amount=commission.amount)
 
     def notify_white_label_creation(self, white_label):
         """
@@ -2,6 +2,7 @@ import hashlib
 import hmac
 import json
 import stripe
+from asgiref.sync import sync_to_async
 from typing import Dict
 from django.conf import settings
 from django.http import HttpResponse
@@ -40,6 +41,21 @@ class WebhookHandler:
         logger.warning("handle_coinpayments_ipn appelé mais Transaction model a été supprimé")
         return HttpResponse("Transaction model supprimé", status=500)
 
+    def _apply_payout_status(self, payout, status: int) -> None:
+        """Répercute le statut transmis par le prestataire sur le paiement"""
+        if status == 2:  # Paiement complété
+            payout.status = "completed"
+            payout.save()
+            self.telegram_service.send_message(
+                f"✅ <b>Paiement complété</b>\n\nPayout #{payout.id} ({payout.amount}€)"
+            )
+        elif status == -1:  # Erreur
+            payout.status = "failed"
+            payout.save()
+            self.telegram_service.send_message(
+                f"❌ <b>Échec du paiement</b>\n\nPayout #{payout.id} ({payout.amount}€)"
+            )
+
     def handle_payout_notification(self, request) -> HttpResponse:
         """Gère les notifications de paiement sortant"""
         try:
@@ -52,36 +68,42 @@ class WebhookHandler:
             payout_id = request.POST.get("id")
             status = int(request.POST.get("status", 0))
 
-            # Trouver le paiement
-            try:
-                payout = Payout.objects.get(payment_id=payout_id)
-            except Payout.DoesNotExist:
+            # Trouver le paiement (identifiant de transaction du prestataire)
+            payout = Payout.objects.filter(transaction_id=payout_id).first()
+            if payout is None:
                 return HttpResponse("Payout not found", status=404)
 
             # Mettre à jour le statut du paiement
-            if status == 2:  # Paiement complété
-                payout.status = "completed"
-                payout.save()
+            self._apply_payout_status(payout, status)
+            return HttpResponse("OK")
 
-                # Envoyer une notification
-                self.telegram_service.send_payout_notification(
-                    payout, f"Paiement complété pour le payout #{payout.id}"
-                )
+        except Exception as e:
+            # Envoyer une notification d'erreur
+            self.telegram_service.send_message(f"⚠️ Erreur webhook Payout: {str(e)}")
+            return HttpResponse(str(e), status=500)
+
+    async def ahandle_payout_notification(self, request) -> HttpResponse:
+        """Version asynchrone de ``handle_payout_notification`` (mode ASGI)"""
+        try:
+            signature = request.headers.get("X-Signature")
+            if not signature or not self._verify_signature(request.POST, signature):
+                return HttpResponse("Invalid signature", status=400)
 
-            elif status == -1:  # Erreur
-                payout.status = "failed"
-                payout.save()
+            payout_id = request.POST.get("id")
+            status = int(request.POST.get("status", 0))
 
-                # Envoyer une notification
-                self.telegram_service.send_payout_notification(
-                    payout, f"Échec du paiement pour le payout #{payout.id}"
-                )
+            payout = await Payout.objects.filter(transaction_id=payout_id).afirst()
+            if payout is None:
+                return HttpResponse("Payout not found", status=404)
 
+            # Sauvegarde transactionnelle (commissions + outbox) : un seul passage en synchrone
+            await sync_to_async(self._apply_payout_status)(payout, status)
             return HttpResponse("OK")
 
         except Exception as e:
-            # Envoyer une notification d'erreur
-            self.telegram_service.send_error_notification(f"Erreur webhook Payout: {str(e)}")
+            await sync_to_async(self.telegram_service.send_message)(
+                f"⚠️ Erreur webhook Payout: {str(e)}"
+            )
             return HttpResponse(str(e), status=500)
 
     # Fonction désactivée - Transaction model supprimé
@@ -1,62 +1,55 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import post_delete, post_init, post_save
 from django.dispatch import receiver
+
 from .models import Referral, Commission, ReferralClick
-from django.db import models
+from .services.profile_counters import earnings_delta, increment_counters
+
+
+@receiver(post_init, sender=Commission)
+def remember_commission_earnings(sender, instance, **kwargs):
+    """Mémorise le statut et le montant chargés pour calculer le delta des gains."""
+    instance._counters_state = (
+        instance.__dict__.get("status"),
+        instance.__dict__.get("amount"),
+    )
 
 
 @receiver(post_save, sender=Commission)
 def update_affiliate_stats(sender, instance, created, **kwargs):
-    """Met à jour les statistiques de l'affilié lorsqu'une commission est créée."""
-    if created:
-        affiliate = instance.referral.referrer
-        profile = affiliate.affiliate_profile
+    """Met à jour les gains de l'affilié lorsqu'une commission est créée ou change de statut."""
+    previous_status, previous_amount = (
+        (None, None) if created else getattr(instance, "_counters_state", (None, None))
+    )
+    instance._counters_state = (instance.status, instance.amount)
 
-        # Mettre à jour les gains totaux
-        profile.total_earnings = (
-            Commission.objects.filter(
-                referral__referrer=affiliate, status__in=["approved", "paid"]
-            ).aggregate(total=models.Sum("amount"))["total"]
-            or 0
-        )
+    delta = earnings_delta(previous_status, previous_amount, instance.status, instance.amount)
+    increment_counters(instance.user_id, earnings=delta)
 
-        # Mettre à jour le taux de conversion
-        total_clicks = ReferralClick.objects.filter(user=affiliate).count()
-        total_referrals = Referral.objects.filter(referrer=affiliate).count()
-        if total_clicks > 0:
-            profile.conversion_rate = (total_referrals / total_clicks) * 100
 
-        profile.save()
+@receiver(post_delete, sender=Commission)
+def remove_commission_earnings(sender, instance, **kwargs):
+    delta = earnings_delta(instance.status, instance.amount, None, 0)
+    increment_counters(instance.user_id, earnings=delta)
 
 
 @receiver(post_save, sender=Referral)
 def update_referral_stats(sender, instance, created, **kwargs):
     """Met à jour les statistiques de parrainage lorsqu'un nouveau parrainage est créé."""
     if created:
-        affiliate = instance.referrer
-        profile = affiliate.affiliate_profile
+        increment_counters(instance.referrer_id, referrals=1)
 
-        # Mettre à jour le nombre total de parrainages
-        profile.total_referrals = Referral.objects.filter(referrer=affiliate).count()
 
-        # Mettre à jour le taux de conversion
-        total_clicks = ReferralClick.objects.filter(user=affiliate).count()
-        if total_clicks > 0:
-            profile.conversion_rate = (profile.total_referrals / total_clicks) * 100
-
-        profile.save()
+@receiver(post_delete, sender=Referral)
+def remove_referral_stats(sender, instance, **kwargs):
+    increment_counters(instance.referrer_id, referrals=-1)
 
 
 @receiver(post_save, sender=ReferralClick)
 def update_click_stats(sender, instance, created, **kwargs):
-    """Met à jour les statistiques de clics lorsqu'un nouveau clic est enregistré."""
-    if created:
-        affiliate = instance.user
-        profile = affiliate.affiliate_profile
+    """Met à jour les statistiques de clics lorsqu'un nouveau clic est enregistré.
 
-        # Mettre à jour le taux de conversion
-        total_clicks = ReferralClick.objects.filter(user=affiliate).count()
-        total_referrals = Referral.objects.filter(referrer=affiliate).count()
-        if total_clicks > 0:
-            profile.conversion_rate = (total_referrals / total_clicks) * 100
-
-        profile.save()
+    Les clics ingérés par lots (bulk_create) ne passent pas ici : le worker
+    applique un delta groupé par ambassadeur.
+    """
+    if created:
+        increment_counters(instance.user_id, clicks=1)
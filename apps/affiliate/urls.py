@@ -1,3 +1,4 @@
+from django.conf import settings
 from django.urls import path
 from . import views
 from .services.webhook_handler import WebhookHandler
@@ -6,6 +7,15 @@ app_name = "affiliate"
 
 webhook_handler = WebhookHandler()
 
+track_click_view = views.track_click
+payout_webhook_view = webhook_handler.handle_payout_notification
+if settings.AFFILIATE_ASYNC_VIEWS:
+    # Mode ASGI : mêmes URL, servies par les vues asynchrones
+    from . import async_views
+
+    track_click_view = async_views.track_click
+    payout_webhook_view = async_views.payout_webhook
+
 urlpatterns = [
     # Pages principales
     path("", views.home, name="home"),
@@ -44,7 +54,7 @@ urlpatterns = [
     path("api/escorts/", views.api_escorts, name="api_escorts"),
     # Redirection et tracking
     path("ref/<str:referral_code>/", views.referral_redirect, name="referral_redirect"),
-    path("track/<str:referral_code>/", views.track_click, name="track_click"),
+    path("track/<str:referral_code>/", track_click_view, name="track_click"),
     path(
         "process-referral/",
         views.process_external_referral,
@@ -103,7 +113,7 @@ urlpatterns = [
     ),
     path(
         "webhooks/payout/",
-        webhook_handler.handle_payout_notification,
+        payout_webhook_view,
         name="payout-webhook",
     ),
 ]
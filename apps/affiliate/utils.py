@@ -1,6 +1,5 @@
 import string
 import random
-from django.utils import timezone
 from django.conf import settings
 from django.db.models import Sum
 from decimal import Decimal
@@ -8,6 +7,8 @@ import logging
 
 from apps.accounts.models import User
 from .models import ReferralClick, Referral, Commission
+from .services.referral_resolver import get_referrer
+from .services.referral_tree import ReferralCycleError
 
 logger = logging.getLogger(__name__)
 
@@ -76,7 +77,7 @@ class AffiliateService:
 
         # Chercher le parrain par son code avec gestion d'erreur améliorée
         try:
-            referrer = User.objects.get(referral_code=referrer_code)
+            referrer = get_referrer(referrer_code)
             logger.info(f"✅ Parrain trouvé: {referrer.username} (ID: {referrer.id})")
 
             # AMÉLIORATION: Vérifications renforcées et gestion des cas d'erreur
@@ -127,22 +128,24 @@ class AffiliateService:
             from django.db import transaction
 
             with transaction.atomic():
-                # Assigner le parrain à l'utilisateur
+                # Assigner le parrain à l'utilisateur ; la table de fermeture du
+                # graphe de parrainage suit via le signal post_save de User
                 referred_user.referred_by = referrer
-                referred_user.save(update_fields=["referred_by"])
+                try:
+                    referred_user.save(update_fields=["referred_by"])
+                except ReferralCycleError as e:
+                    logger.error(f"❌ Parrainage rejeté: {str(e)}")
+                    referred_user.referred_by_id = referred_user._closure_parent_id
+                    return False
                 logger.info(
                     f"✅ Parrain assigné à l'utilisateur: {username} -> {referrer.username}"
                 )
 
                 # Créer une entrée de parrainage dans l'application affiliate
                 referral, created = Referral.objects.get_or_create(
-                    ambassador=referrer,
-                    referred_user=referred_user,
-                    defaults={
-                        "is_active": True,
-                        "created_at": timezone.now(),
-                        "total_earnings": Decimal("0.00"),
-                    },
+                    referrer=referrer,
+                    referred=referred_user,
+                    defaults={"referral_code": referrer.referral_code},
                 )
 
                 if created:
@@ -251,11 +254,11 @@ class AffiliateService:
             "ambassador_referrals": ambassador_referrals,
             "standard_referrals": standard_referrals,
             "earnings": Commission.objects.filter(
-                referral__referrer=ambassador, status__in=["approved", "paid"]
+                user=ambassador, status__in=["approved", "paid"]
             ).aggregate(Sum("amount"))["amount__sum"]
             or Decimal("0.00"),
             "pending_earnings": Commission.objects.filter(
-                referral__referrer=ambassador, status="pending"
+                user=ambassador, status="pending"
             ).aggregate(Sum("amount"))["amount__sum"]
             or Decimal("0.00"),
         }
@@ -269,40 +272,21 @@ class AffiliateService:
         return stats
 
 
-# AMÉLIORATION: Fonction auxiliaire pour l'envoi de notification avec retry
 def send_referral_notification(referrer, referred_user):
     """
-    Envoie une notification Telegram au parrain avec mécanisme de retry
-    """
-    notification_sent = False
-    max_retries = getattr(settings, "AFFILIATE_NOTIFICATION_MAX_RETRIES", 3)
-    retry_count = 0
-
-    while not notification_sent and retry_count < max_retries:
-        try:
-            from apps.dashboard.telegram_bot import TelegramNotifier
-
-            notifier = TelegramNotifier()
-            success = notifier.send_new_ambassador_notification(referrer, referred_user)
-
-            if success:
-                logger.info(
-                    f"✅ Notification Telegram envoyée à {referrer.username} (tentative {retry_count+1}/{max_retries})"
-                )
-                notification_sent = True
-            else:
-                logger.warning(
-                    f"⚠️ Tentative {retry_count+1}/{max_retries}: Échec de l'envoi de la notification Telegram à {referrer.username}"
-                )
-                retry_count += 1
-                import time
+    Met en file la notification Telegram du parrain.
 
-                time.sleep(1)  # Attendre 1 seconde avant de réessayer
-        except Exception as e:
-            logger.error(f"❌ Erreur lors de l'envoi de la notification Telegram: {str(e)}")
-            retry_count += 1
-            import time
-
-            time.sleep(1)  # Attendre 1 seconde avant de réessayer
-
-    return notification_sent
+    Les reprises sont assurées par le dispatcher Telegram : aucune attente ici.
+    """
+    try:
+        from apps.dashboard.telegram_bot import TelegramNotifier
+
+        notifier = TelegramNotifier()
+        queued = notifier.send_new_ambassador_notification(referrer, referred_user)
+    except Exception as e:
+        logger.error(f"❌ Erreur lors de la mise en file de la notification Telegram: {str(e)}")
+        return False
+
+    if queued:
+        logger.info(f"✅ Notification Telegram mise en file pour {referrer.username}")
+    return queued
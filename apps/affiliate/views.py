@@ -3,7 +3,7 @@ from django.contrib.auth.decorators import login_required, user_passes_test
 from django.http import JsonResponse, HttpResponse, FileResponse
 from django.contrib import messages
 from django.utils import timezone
-from django.db.models import Sum, Count, Avg
+from django.db.models import Sum, Count
 from django.views.decorators.http import require_POST
 from django.views.decorators.csrf import csrf_exempt
 from django.conf import settings
@@ -29,9 +29,22 @@ from .models import (
     WhiteLabel,
     PaymentMethod,
     AffiliateProfile,
+    AffiliateDailyStats,
     Notification,
 )
 from apps.accounts.models import User
+from .services.click_ingestion import enqueue_click
+from .services.daily_stats import get_daily_stats
+from .services.commission_summary import (
+    ambassador_commissions,
+    commission_summary,
+    monthly_summary as get_monthly_summary,
+    referred_users_summary,
+)
+from .services.dashboard_stats import cached_stats, daily_activity
+from .services.keyset import InvalidCursor, KeysetPaginator, approximate_count
+from .services.referral_resolver import get_referrer, resolve_referral_code
+from .services.referral_tree import direct_referral_counts
 from .forms import (
     CommissionRateForm,
     WhiteLabelForm,
@@ -47,64 +60,9 @@ logger = logging.getLogger(__name__)
 # Page d'accueil de l'affiliation
 @login_required
 def home(request):
-    # Statistiques des 30 derniers jours
-    thirty_days_ago = timezone.now() - datetime.timedelta(days=30)
-
-    # Statistiques des clics
-    clicks = ReferralClick.objects.filter(ambassador=request.user, created_at__gte=thirty_days_ago)
-
-    # Statistiques des inscriptions
-    referrals = Referral.objects.filter(ambassador=request.user, created_at__gte=thirty_days_ago)
-
-    # Statistiques des commissions
-    commissions = Commission.objects.filter(
-        referral__ambassador=request.user, created_at__gte=thirty_days_ago
-    )
-
-    # Calcul des totaux
-    total_clicks = clicks.count()
-    total_referrals = referrals.count()
-    total_earnings = (
-        commissions.filter(status="approved").aggregate(Sum("amount"))["amount__sum"] or 0
-    )
-
-    # Calcul du taux de conversion
-    conversion_rate = (total_referrals / total_clicks * 100) if total_clicks > 0 else 0
-
-    # Graphique des clics par jour
-    clicks_by_day = (
-        clicks.annotate(day=TruncDay("created_at"))
-        .values("day")
-        .annotate(count=Count("id"))
-        .order_by("day")
-    )
-
-    # Graphique des inscriptions par jour
-    referrals_by_day = (
-        referrals.annotate(day=TruncDay("created_at"))
-        .values("day")
-        .annotate(count=Count("id"))
-        .order_by("day")
-    )
-
-    # Graphique des gains par jour
-    earnings_by_day = (
-        commissions.filter(status="approved")
-        .annotate(day=TruncDay("created_at"))
-        .values("day")
-        .annotate(total=Sum("amount"))
-        .order_by("day")
-    )
-
-    context = {
-        "total_clicks": total_clicks,
-        "total_referrals": total_referrals,
-        "total_earnings": total_earnings,
-        "conversion_rate": round(conversion_rate, 2),
-        "clicks_by_day": list(clicks_by_day),
-        "referrals_by_day": list(referrals_by_day),
-        "earnings_by_day": list(earnings_by_day),
-    }
+    # Statistiques des 30 derniers jours (totaux et séries quotidiennes), en cache
+    thirty_days_ago = timezone.localdate() - datetime.timedelta(days=30)
+    context = daily_activity(request.user.id, thirty_days_ago)
 
     return render(request, "affiliate/home.html", context)
 
@@ -267,156 +225,62 @@ def commissions(request):
     status = request.GET.get("status", "all")
 
     # Récupérer les commissions selon les filtres
-    commissions_list = Commission.objects.filter(referral__referrer=request.user)
+    all_commissions = ambassador_commissions(request.user)
+    commissions_list = all_commissions
 
     if status != "all":
         commissions_list = commissions_list.filter(status=status)
 
-    # Résumé mensuel des commissions pour l'historique
-    monthly_summary = {}
-
-    # Utiliser les commissions déjà récupérées
-    for commission in commissions_list:
-        # Extraire le mois et l'année
-        month_year = datetime.date(commission.created_at.year, commission.created_at.month, 1)
-
-        # Initialiser le mois s'il n'existe pas
-        if month_year not in monthly_summary:
-            monthly_summary[month_year] = {
-                "total_amount": Decimal("0.00"),
-                "paid_amount": Decimal("0.00"),
-                "pending_amount": Decimal("0.00"),
-                "count": 0,
-                "month_name": commission.created_at.strftime("%B %Y"),
-            }
-
-        # Ajouter au total
-        monthly_summary[month_year]["total_amount"] += commission.amount
-        monthly_summary[month_year]["count"] += 1
-
-        # Ajouter au statut approprié
-        if commission.status == "paid":
-            monthly_summary[month_year]["paid_amount"] += commission.amount
-        elif commission.status in ["pending", "approved"]:
-            monthly_summary[month_year]["pending_amount"] += commission.amount
-
-    # Trier par date décroissante
-    monthly_summary = sorted(
-        monthly_summary.values(),
-        key=lambda x: datetime.datetime.strptime(x["month_name"], "%B %Y"),
-        reverse=True,
-    )
+    # Résumé mensuel des commissions pour l'historique (regroupé en base)
+    monthly_summary = get_monthly_summary(commissions_list)
 
     # Calculer les totaux pour le pied de tableau
-    total_pending = sum(month["pending_amount"] for month in monthly_summary)
-    total_paid = sum(month["paid_amount"] for month in monthly_summary)
+    total_pending = sum((month["pending_amount"] for month in monthly_summary), Decimal("0.00"))
+    total_paid = sum((month["paid_amount"] for month in monthly_summary), Decimal("0.00"))
     total_all = total_pending + total_paid
 
+    # Tous les totaux statut × catégorie en une seule requête
+    summary = commission_summary(all_commissions)
+
     # Sommes totales par statut
     totals = {
-        "pending": Commission.objects.filter(
-            referral__referrer=request.user, status="pending"
-        ).aggregate(Sum("amount"))["amount__sum"]
-        or 0,
-        "approved": Commission.objects.filter(
-            referral__referrer=request.user, status="approved"
-        ).aggregate(Sum("amount"))["amount__sum"]
-        or 0,
-        "rejected": Commission.objects.filter(
-            referral__referrer=request.user, status="rejected"
-        ).aggregate(Sum("amount"))["amount__sum"]
-        or 0,
-        "paid": Commission.objects.filter(referral__referrer=request.user, status="paid").aggregate(
-            Sum("amount")
-        )["amount__sum"]
-        or 0,
+        "pending": summary["pending"],
+        "approved": summary["approved"],
+        "rejected": summary["rejected"],
+        "paid": summary["paid"],
     }
 
-    # MÉTHODE DIRECTE: Compter les utilisateurs référés par catégorie
-    referred_users = User.objects.filter(referred_by=request.user)
-
-    # Pour tous les utilisateurs, compter normalement
-    escort_count = referred_users.filter(user_category="escort").count()
-    ambassador_count = referred_users.filter(user_category="ambassador").count()
-
-    # Pour la compatibilité avec le code existant, les requêtes sur Referral ne sont plus utilisées
-    # Commissions par type d'utilisateur référé
-    escort_commissions = Commission.objects.filter(
-        referral__referrer=request.user, referral__referred__user_category="escort"
-    )
-    ambassador_commissions = Commission.objects.filter(
-        referral__referrer=request.user, referral__referred__user_category="ambassador"
+    # Compter les utilisateurs référés par catégorie
+    referred_counts = User.objects.filter(referred_by=request.user).aggregate(
+        escorts=Count("id", filter=Q(user_category="escort")),
+        ambassadors=Count("id", filter=Q(user_category="ambassador")),
     )
+    escort_count = referred_counts["escorts"]
+    ambassador_count = referred_counts["ambassadors"]
 
-    escort_commissions_total = escort_commissions.aggregate(Sum("amount"))["amount__sum"] or 0
-    ambassador_commissions_total = (
-        ambassador_commissions.aggregate(Sum("amount"))["amount__sum"] or 0
-    )
+    # Commissions par type d'utilisateur référé
+    escort_commissions_total = summary["escort_total"]
+    ambassador_commissions_total = summary["ambassador_total"]
     total_commissions = escort_commissions_total + ambassador_commissions_total
 
     # Commissions par statut
-    paid_commissions_count = Commission.objects.filter(
-        referral__referrer=request.user, status="paid"
-    ).count()
-    pending_commissions_count = Commission.objects.filter(
-        referral__referrer=request.user, status__in=["pending", "approved"]
-    ).count()
+    paid_commissions_count = summary["paid_count"]
+    pending_commissions_count = summary["open_count"]
     commissions_count = paid_commissions_count + pending_commissions_count
 
-    paid_commissions_total = (
-        Commission.objects.filter(referral__referrer=request.user, status="paid").aggregate(
-            Sum("amount")
-        )["amount__sum"]
-        or 0
-    )
-    pending_commissions_total = (
-        Commission.objects.filter(
-            referral__referrer=request.user, status__in=["pending", "approved"]
-        ).aggregate(Sum("amount"))["amount__sum"]
-        or 0
-    )
+    paid_commissions_total = summary["paid"]
+    pending_commissions_total = summary["open"]
 
     # Commissions payées/en attente par type d'utilisateur
-    escort_paid_commissions = (
-        Commission.objects.filter(
-            referral__referrer=request.user,
-            referral__referred__user_category="escort",
-            status="paid",
-        ).aggregate(Sum("amount"))["amount__sum"]
-        or 0
-    )
-
-    escort_pending_commissions = (
-        Commission.objects.filter(
-            referral__referrer=request.user,
-            referral__referred__user_category="escort",
-            status__in=["pending", "approved"],
-        ).aggregate(Sum("amount"))["amount__sum"]
-        or 0
-    )
-
-    ambassador_paid_commissions = (
-        Commission.objects.filter(
-            referral__referrer=request.user,
-            referral__referred__user_category="ambassador",
-            status="paid",
-        ).aggregate(Sum("amount"))["amount__sum"]
-        or 0
-    )
-
-    ambassador_pending_commissions = (
-        Commission.objects.filter(
-            referral__referrer=request.user,
-            referral__referred__user_category="ambassador",
-            status__in=["pending", "approved"],
-        ).aggregate(Sum("amount"))["amount__sum"]
-        or 0
-    )
+    escort_paid_commissions = summary["escort_paid"]
+    escort_pending_commissions = summary["escort_open"]
+    ambassador_paid_commissions = summary["ambassador_paid"]
+    ambassador_pending_commissions = summary["ambassador_open"]
 
     # Performance des affiliations (30 derniers jours)
     thirty_days_ago = timezone.now() - timezone.timedelta(days=30)
     clicks = ReferralClick.objects.filter(
-        user=request.user, created_at__gte=thirty_days_ago
+        user=request.user, clicked_at__gte=thirty_days_ago
     ).count()
     registrations = Referral.objects.filter(
         referrer=request.user, created_at__gte=thirty_days_ago
@@ -427,56 +291,15 @@ def commissions(request):
     if clicks > 0:
         conversion_rate = (registrations / clicks) * 100
 
-    # Commission moyenne
-    recent_commissions = Commission.objects.filter(
-        referral__referrer=request.user, created_at__gte=thirty_days_ago
-    )
-    avg_commission = recent_commissions.aggregate(Avg("amount"))["amount__avg"] or 0
+    # Commission moyenne (30 derniers jours)
+    avg_commission = summary["recent_avg"]
 
     # Totaux des gains et croissance
     total_earnings = paid_commissions_total + pending_commissions_total
 
-    # Calcul de la croissance (comparaison avec le mois précédent)
-    current_month = timezone.now().month
-    current_year = timezone.now().year
-
-    # Commissions du mois actuel
-    current_month_start = timezone.datetime(
-        current_year, current_month, 1, tzinfo=timezone.get_current_timezone()
-    )
-    current_month_commissions = (
-        Commission.objects.filter(
-            referral__referrer=request.user, created_at__gte=current_month_start
-        ).aggregate(Sum("amount"))["amount__sum"]
-        or 0
-    )
-
-    # Commissions du mois précédent
-    if current_month == 1:
-        prev_month = 12
-        prev_year = current_year - 1
-    else:
-        prev_month = current_month - 1
-        prev_year = current_year
-
-    prev_month_start = timezone.datetime(
-        prev_year, prev_month, 1, tzinfo=timezone.get_current_timezone()
-    )
-    if current_month == 1:
-        prev_month_end = timezone.datetime(
-            current_year, 1, 1, tzinfo=timezone.get_current_timezone()
-        ) - timezone.timedelta(seconds=1)
-    else:
-        prev_month_end = current_month_start - timezone.timedelta(seconds=1)
-
-    prev_month_commissions = (
-        Commission.objects.filter(
-            referral__referrer=request.user,
-            created_at__gte=prev_month_start,
-            created_at__lte=prev_month_end,
-        ).aggregate(Sum("amount"))["amount__sum"]
-        or 0
-    )
+    # Croissance (comparaison avec le mois précédent)
+    current_month_commissions = summary["current_month"]
+    prev_month_commissions = summary["prev_month"]
 
     # Pourcentage de croissance
     growth_percentage = 0
@@ -485,87 +308,40 @@ def commissions(request):
             (current_month_commissions - prev_month_commissions) / prev_month_commissions
         ) * 100
 
-    # Préparer les données des escortes affiliées pour l'affichage
-    affiliated_escorts = []
-
-    # Récupérer tous les utilisateurs de type escorte référés par cet utilisateur
-    escort_users = User.objects.filter(referred_by=request.user, user_category="escort")
-
-    for escort in escort_users:
-        # Récupérer les commissions associées à cette escorte
-        escort_commissions = Commission.objects.filter(
-            referral__referrer=request.user, referral__referred=escort
-        )
+    # Montants par filleul (une requête groupée pour tous les filleuls)
+    per_referred = referred_users_summary(all_commissions)
+    empty_totals = {"gross_amount": 0, "commission_amount": 0, "has_paid": False}
 
-        # Calculer les montants bruts et les commissions
-        gross_amount = escort_commissions.aggregate(Sum("gross_amount"))["gross_amount__sum"] or 0
-        commission_amount = escort_commissions.aggregate(Sum("amount"))["amount__sum"] or 0
+    # Taux personnalisés depuis le profil utilisateur
+    profile = getattr(request.user, "account_profile", None)
+    escort_rate = profile.escort_commission_rate if profile else 30.00
+    ambassador_rate = profile.ambassador_commission_rate if profile else 20.00
 
-        # Déterminer le taux effectif
-        # Récupérer le taux de commission de l'ambassadeur pour les escortes
-        try:
-            # Récupérer le taux personnalisé depuis le profil utilisateur
-            profile = request.user.account_profile
-            effective_rate = profile.escort_commission_rate
-        except Exception:
-            effective_rate = 30.00  # Taux par défaut
+    # Préparer les données des filleuls (escortes et ambassadeurs) pour l'affichage
+    affiliated_escorts = []
+    affiliated_ambassadors = []
 
-        affiliated_escorts.append(
-            {
-                "username": escort.username,
-                "referral_date": escort.date_joined,
-                "gross_amount": gross_amount,
-                "commission_amount": commission_amount,
-                "effective_rate": effective_rate,
-                "status": (
-                    "paid" if escort_commissions.filter(status="paid").exists() else "pending"
-                ),
-            }
-        )
+    referred_users = User.objects.filter(
+        referred_by=request.user, user_category__in=["escort", "ambassador"]
+    ).only("id", "username", "date_joined", "user_category")
+
+    for referred in referred_users:
+        referred_totals = per_referred.get(referred.id, empty_totals)
+        is_escort = referred.user_category == "escort"
+        entry = {
+            "username": referred.username,
+            "referral_date": referred.date_joined,
+            "gross_amount": referred_totals["gross_amount"],
+            "commission_amount": referred_totals["commission_amount"],
+            "effective_rate": escort_rate if is_escort else ambassador_rate,
+            "status": "paid" if referred_totals["has_paid"] else "pending",
+        }
+        (affiliated_escorts if is_escort else affiliated_ambassadors).append(entry)
 
     # Calculer les totaux pour les escortes
     total_gross_amount = sum(escort["gross_amount"] for escort in affiliated_escorts)
     total_commission_amount = sum(escort["commission_amount"] for escort in affiliated_escorts)
 
-    # Préparer les données des ambassadeurs affiliés pour l'affichage
-    affiliated_ambassadors = []
-
-    # Récupérer tous les utilisateurs de type ambassadeur référés par cet utilisateur
-    ambassador_users = User.objects.filter(referred_by=request.user, user_category="ambassador")
-
-    for ambassador in ambassador_users:
-        # Récupérer les commissions associées à cet ambassadeur
-        ambassador_commissions = Commission.objects.filter(
-            referral__referrer=request.user, referral__referred=ambassador
-        )
-
-        # Calculer les montants bruts et les commissions
-        gross_amount = (
-            ambassador_commissions.aggregate(Sum("gross_amount"))["gross_amount__sum"] or 0
-        )
-        commission_amount = ambassador_commissions.aggregate(Sum("amount"))["amount__sum"] or 0
-
-        # Déterminer le taux effectif
-        try:
-            # Récupérer le taux personnalisé depuis le profil utilisateur
-            profile = request.user.account_profile
-            effective_rate = profile.ambassador_commission_rate
-        except Exception:
-            effective_rate = 20.00  # Taux par défaut
-
-        affiliated_ambassadors.append(
-            {
-                "username": ambassador.username,
-                "referral_date": ambassador.date_joined,
-                "gross_amount": gross_amount,
-                "commission_amount": commission_amount,
-                "effective_rate": effective_rate,
-                "status": (
-                    "paid" if ambassador_commissions.filter(status="paid").exists() else "pending"
-                ),
-            }
-        )
-
     # Calculer les totaux pour les ambassadeurs
     total_amb_gross_amount = sum(
         ambassador["gross_amount"] for ambassador in affiliated_ambassadors
@@ -745,69 +521,47 @@ def delete_payment_method(request, method_id):
         return redirect("affiliate:payment_methods")
 
 
-# Redirection et suivi
-def referral_redirect(request, referral_code):
-    """Redirection à partir d'un lien d'affiliation avec suivi du clic."""
-    try:
-        ambassador = User.objects.get(referral_code=referral_code)
-
-        # Enregistrement du clic
-        click = ReferralClick(
-            ambassador=ambassador,
-            ip_address=request.META.get("REMOTE_ADDR", "0.0.0.0"),
-            user_agent=request.META.get("HTTP_USER_AGENT", ""),
-            referrer=request.META.get("HTTP_REFERER", ""),
-            landing_page=request.GET.get("next", "/"),
-        )
-        click.save()
-
-        # Stockage du code de référence dans la session
-        request.session["referral_code"] = referral_code
-        request.session["referral_click_id"] = str(click.id)
+# Pixel GIF transparent 1x1 renvoyé par le suivi des clics
+TRACKING_PIXEL = b"GIF89a\x01\x00\x01\x00\x80\x00\x00\x00\x00\x00\x00\x00\x00!\xf9\x04\x01\x00\x00\x00\x00,\x00\x00\x00\x00\x01\x00\x01\x00\x00\x02\x02D\x01\x00;"
 
-        # Redirection vers la page demandée ou la page d'accueil avec le paramètre ref
-        next_url = request.GET.get("next", "/")
-        # Ajouter le code de référence à l'URL de redirection
-        if "?" in next_url:
-            next_url += f"&ref={referral_code}"
-        else:
-            next_url += f"?ref={referral_code}"
 
-        return redirect(next_url)
+# Redirection et suivi
+def referral_redirect(request, referral_code):
+    """Redirection à partir d'un lien d'affiliation avec suivi du clic.
 
-    except User.DoesNotExist:
+    Le clic est ajouté au tampon d'ingestion ; il est validé et persisté par
+    lots par le worker ``flush_referral_clicks``.
+    """
+    if resolve_referral_code(referral_code) is None:
         # Code de référence invalide
         messages.error(request, "Code de référence invalide.")
         return redirect("home")
 
+    enqueue_click(request, referral_code)
+
+    # Redirection vers la page demandée ou la page d'accueil avec le paramètre ref
+    next_url = request.GET.get("next", "/")
+    # Ajouter le code de référence à l'URL de redirection
+    if "?" in next_url:
+        next_url += f"&ref={referral_code}"
+    else:
+        next_url += f"?ref={referral_code}"
+
+    return redirect(next_url)
+
 
 @csrf_exempt
 def track_click(request, referral_code):
-    """API pour suivi des clics (utilisable via pixel ou JavaScript)."""
-    try:
-        ambassador = User.objects.get(referral_code=referral_code)
-
-        # Enregistrement du clic
-        ReferralClick.objects.create(
-            ambassador=ambassador,
-            ip_address=request.META.get("REMOTE_ADDR", "0.0.0.0"),
-            user_agent=request.META.get("HTTP_USER_AGENT", ""),
-            referrer=request.META.get("HTTP_REFERER", ""),
-            landing_page=request.META.get("HTTP_REFERER", ""),
-        )
+    """API pour suivi des clics (utilisable via pixel ou JavaScript).
 
-        # Retourner une image transparente 1x1 pixel
-        return HttpResponse(
-            b"GIF89a\x01\x00\x01\x00\x80\x00\x00\x00\x00\x00\x00\x00\x00!\xf9\x04\x01\x00\x00\x00\x00,\x00\x00\x00\x00\x01\x00\x01\x00\x00\x02\x02D\x01\x00;",
-            content_type="image/gif",
-        )
+    Aucune requête en base sur ce chemin : le code est vérifié via le cache des
+    codes de parrainage puis le clic est mis en tampon.
+    """
+    if resolve_referral_code(referral_code) is not None:
+        enqueue_click(request, referral_code)
 
-    except User.DoesNotExist:
-        # Code de référence invalide
-        return HttpResponse(
-            b"GIF89a\x01\x00\x01\x00\x80\x00\x00\x00\x00\x00\x00\x00\x00!\xf9\x04\x01\x00\x00\x00\x00,\x00\x00\x00\x00\x01\x00\x01\x00\x00\x02\x02D\x01\x00;",
-            content_type="image/gif",
-        )
+    # Retourner une image transparente 1x1 pixel
+    return HttpResponse(TRACKING_PIXEL, content_type="image/gif")
 
 
 # API pour applications
@@ -817,108 +571,88 @@ def api_stats(request):
     # Récupérer le paramètre de période si présent
     period = request.GET.get("period", "30")
 
-    # Calculer la date de début de période
-    today = timezone.now()
-    if period == "7":
-        start_date = today - timezone.timedelta(days=7)
-    elif period == "30":
-        start_date = today - timezone.timedelta(days=30)
-    elif period == "90":
-        start_date = today - timezone.timedelta(days=90)
-    elif period == "365":
-        start_date = today - timezone.timedelta(days=365)
+    # Calculer la date de début de période (date locale)
+    today = timezone.localdate()
+    period_days = {"7": 7, "30": 30, "90": 90, "365": 365}
+    if period in period_days:
+        start_date = today - timezone.timedelta(days=period_days[period])
     else:
         # Pour 'all' ou autres valeurs, on prend toutes les données
         start_date = None
 
-    # Base de filtrage pour les commissions
-    commission_filter = {"referral__ambassador": request.user}
-    if start_date:
-        commission_filter["created_at__gte"] = start_date
-
-    # Statistiques générales
-    clicks_count = ReferralClick.objects.filter(ambassador=request.user).count()
-    referrals_count = Referral.objects.filter(ambassador=request.user).count()
-
-    # Commissions par statut
-    total_commissions = Commission.objects.filter(**commission_filter)
-
-    # Commissions payées
-    paid_commissions = total_commissions.filter(status="paid")
-    paid_amount = paid_commissions.aggregate(Sum("amount"))["amount__sum"] or 0
-
-    # Commissions en attente
-    pending_commissions = total_commissions.filter(status__in=["pending", "approved"])
-    pending_amount = pending_commissions.aggregate(Sum("amount"))["amount__sum"] or 0
-
-    # Total des commissions (payées + en attente)
-    total_earnings = paid_amount + pending_amount
-
-    # Statistiques ambassadeurs et escortes
-    ambassador_count = Referral.objects.filter(
-        ambassador=request.user, referred__user_category="ambassador"
-    ).count()
+    def build():
+        # Toutes les statistiques proviennent de la table pré-agrégée
+        daily_stats = AffiliateDailyStats.objects.filter(ambassador=request.user)
 
-    escort_count = Referral.objects.filter(
-        ambassador=request.user, referred__user_category="escort"
-    ).count()
-
-    # Calcul du taux de conversion
-    conversion_rate = 0
-    if clicks_count > 0:
-        conversion_rate = (referrals_count / clicks_count) * 100
-
-    # Données pour graphique
-    dates = []
-    ambassadors_data = []
-    escorts_data = []
-    total_data = []
-
-    # Si une date de début est spécifiée, générer des données de tendance
-    if start_date:
-        # Générer des dates pour la période
-        date_list = []
-        days = (today - start_date).days + 1
-        for i in range(days):
-            date = (today - timezone.timedelta(days=days - i - 1)).date()
-            date_list.append(date)
-
-        # Pour chaque date, calculer le nombre d'affiliés
-        for date in date_list:
-            date_str = date.strftime("%Y-%m-%d")
-            dates.append(date_str)
-
-            # Calculer le nombre d'ambassadeurs à cette date
-            ambassadors = Referral.objects.filter(
-                ambassador=request.user,
-                referred__user_category="ambassador",
-                created_at__date__lte=date,
-            ).count()
-            ambassadors_data.append(ambassadors)
-
-            # Calculer le nombre d'escortes à cette date
-            escorts = Referral.objects.filter(
-                ambassador=request.user,
-                referred__user_category="escort",
-                created_at__date__lte=date,
-            ).count()
-            escorts_data.append(escorts)
-
-            # Total des affiliés à cette date
-            total_data.append(ambassadors + escorts)
+        # Statistiques générales
+        totals = daily_stats.aggregate(
+            clicks=Sum("clicks"),
+            referrals=Sum("referrals"),
+            ambassadors=Sum("ambassador_referrals"),
+            escorts=Sum("escort_referrals"),
+        )
+        clicks_count = totals["clicks"] or 0
+        referrals_count = totals["referrals"] or 0
+        ambassador_count = totals["ambassadors"] or 0
+        escort_count = totals["escorts"] or 0
+
+        # Commissions par statut sur la période
+        period_stats = daily_stats.filter(date__gte=start_date) if start_date else daily_stats
+        amounts = period_stats.aggregate(
+            paid=Sum("commissions_paid"),
+            pending=Sum("commissions_pending"),
+            approved=Sum("commissions_approved"),
+        )
+        paid_amount = amounts["paid"] or 0
+        pending_amount = (amounts["pending"] or 0) + (amounts["approved"] or 0)
+
+        # Total des commissions (payées + en attente)
+        total_earnings = paid_amount + pending_amount
+
+        # Calcul du taux de conversion
+        conversion_rate = 0
+        if clicks_count > 0:
+            conversion_rate = (referrals_count / clicks_count) * 100
+
+        # Données pour graphique
+        dates = []
+        ambassadors_data = []
+        escorts_data = []
+        total_data = []
+
+        # Si une date de début est spécifiée, générer des données de tendance cumulées
+        if start_date:
+            before = daily_stats.filter(date__lt=start_date).aggregate(
+                ambassadors=Sum("ambassador_referrals"), escorts=Sum("escort_referrals")
+            )
+            ambassadors = before["ambassadors"] or 0
+            escorts = before["escorts"] or 0
+
+            for day in get_daily_stats(request.user, start_date, today):
+                ambassadors += day.ambassador_referrals
+                escorts += day.escort_referrals
+                dates.append(day.date.strftime("%Y-%m-%d"))
+                ambassadors_data.append(ambassadors)
+                escorts_data.append(escorts)
+                # Total des affiliés à cette date
+                total_data.append(ambassadors + escorts)
+
+        return {
+            "ambassador_count": ambassador_count,
+            "escort_count": escort_count,
+            "total_commission_amount": float(total_earnings),
+            "paid_commission_amount": float(paid_amount),
+            "pending_commission_amount": float(pending_amount),
+            "conversion_rate": round(conversion_rate, 2),
+            "dates": dates,
+            "ambassador_data": ambassadors_data,
+            "escort_data": escorts_data,
+            "total_affiliate_data": total_data,
+        }
 
-    data = {
-        "ambassador_count": ambassador_count,
-        "escort_count": escort_count,
-        "total_commission_amount": float(total_earnings),
-        "paid_commission_amount": float(paid_amount),
-        "pending_commission_amount": float(pending_amount),
-        "conversion_rate": round(conversion_rate, 2),
-        "dates": dates,
-        "ambassador_data": ambassadors_data,
-        "escort_data": escorts_data,
-        "total_affiliate_data": total_data,
-    }
+    # Appels simultanés du frontend : un seul calcul partagé, puis le cache versionné
+    period_key = period if start_date else "all"
+    data = cached_stats(request.user.id, f"api_stats:{period_key}:{today.isoformat()}", build)
 
     return JsonResponse(data)
 
@@ -991,11 +725,13 @@ def api_ambassadors(request):
         :10
     ]  # Limiter à 10 ambassadeurs
 
+    # Filleuls directs de chaque ambassadeur, en une requête sur la table de fermeture
+    referred_counts = direct_referral_counts([ambassador.id for ambassador in ambassadors])
+
     # Préparer les données pour le JSON
     ambassadors_data = []
     for ambassador in ambassadors:
-        # Compter les utilisateurs référés par cet ambassadeur
-        referred_count = User.objects.filter(referred_by=ambassador).count()
+        referred_count = referred_counts.get(ambassador.id, 0)
 
         ambassadors_data.append(
             {
@@ -1071,7 +807,7 @@ def process_external_referral(request):
 
         # Récupérer l'ambassadeur
         try:
-            ambassador = User.objects.get(referral_code=affiliate_id)
+            ambassador = get_referrer(affiliate_id)
             logger.info(f"Ambassadeur trouvé: {ambassador.username}")
         except User.DoesNotExist:
             logger.warning(f"Aucun ambassadeur trouvé avec le code: {affiliate_id}")
@@ -1735,18 +1471,16 @@ def affiliate_list(request):
             Q(username__icontains=search_query) | Q(email__icontains=search_query)
         )
 
-    # Pagination
-    paginator = Paginator(affiliates, 20)
-    page = request.GET.get("page")
+    # Pagination par curseur (pas d'OFFSET ni de COUNT sur les pages profondes)
+    paginator = KeysetPaginator(affiliates, 20, ordering=("-date_joined", "-id"))
     try:
-        affiliates_page = paginator.page(page)
-    except PageNotAnInteger:
-        affiliates_page = paginator.page(1)
-    except EmptyPage:
-        affiliates_page = paginator.page(paginator.num_pages)
+        affiliates_page = paginator.page(request.GET.get("cursor"))
+    except InvalidCursor:
+        affiliates_page = paginator.page()
 
     context = {
         "affiliates": affiliates_page,
+        "affiliates_count": approximate_count(affiliates),
         "status": status,
         "search_query": search_query,
     }
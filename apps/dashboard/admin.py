@@ -1,6 +1,7 @@
 from django.contrib import admin
+from django.utils import timezone
 
-from .models import Notification, UserStatistics
+from .models import Notification, TelegramMessage, UserStatistics
 
 
 @admin.register(Notification)
@@ -19,3 +20,20 @@ class UserStatisticsAdmin(admin.ModelAdmin):
     search_fields = ["user__username"]
     date_hierarchy = "created_at"
     ordering = ["-created_at"]
+
+
+@admin.register(TelegramMessage)
+class TelegramMessageAdmin(admin.ModelAdmin):
+    list_display = ["id", "chat_id", "status", "attempts", "created_at", "sent_at"]
+    list_filter = ["status"]
+    search_fields = ["chat_id", "text", "last_error"]
+    ordering = ["-id"]
+    actions = ["requeue"]
+
+    def requeue(self, request, queryset):
+        count = queryset.filter(status="failed").update(
+            status="pending", attempts=0, available_at=timezone.now(), locked_until=None
+        )
+        self.message_user(request, f"{count} messages remis en file")
+
+    requeue.short_description = "Remettre en file les messages en échec"
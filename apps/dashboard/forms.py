@@ -31,6 +31,16 @@ class TelegramSettingsForm(forms.Form):
         widget=forms.Select(attrs={"class": "form-select"}),
     )
 
+    telegram_digest = forms.ChoiceField(
+        choices=[
+            ("instant", _("Immédiat (les rafales sont regroupées)")),
+            ("hourly", _("Récapitulatif toutes les heures")),
+            ("daily", _("Récapitulatif quotidien")),
+        ],
+        required=False,
+        widget=forms.Select(attrs={"class": "form-select"}),
+    )
+
     def __init__(self, user=None, *args, **kwargs):
         super(TelegramSettingsForm, self).__init__(*args, **kwargs)
 
@@ -38,6 +48,7 @@ class TelegramSettingsForm(forms.Form):
             self.initial["telegram_chat_id"] = user.telegram_chat_id or ""
             self.initial["enable_telegram"] = bool(user.telegram_chat_id)
             self.initial["telegram_language"] = user.telegram_language or "fr"
+            self.initial["telegram_digest"] = user.telegram_digest or "instant"
 
     def clean(self):
         cleaned_data = super().clean()
@@ -0,0 +1,45 @@
+import asyncio
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from apps.dashboard.telegram_dispatcher import TelegramDispatcher
+
+
+class Command(BaseCommand):
+    help = "Envoie les messages Telegram en file en respectant les limites de débit de l'API"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=settings.TELEGRAM_DISPATCHER_BATCH_SIZE,
+            help="Nombre maximum de messages réclamés par passe",
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=settings.TELEGRAM_DISPATCHER_POLL_INTERVAL,
+            help="Délai en secondes entre deux passes lorsque la file est vide",
+        )
+        parser.add_argument(
+            "--loop",
+            action="store_true",
+            help="Tourner en continu (mode worker) au lieu d'une seule passe",
+        )
+
+    def handle(self, *args, **options):
+        dispatcher = TelegramDispatcher()
+        claimed = asyncio.run(
+            dispatcher.run(
+                batch_size=options["batch_size"],
+                loop=options["loop"],
+                interval=options["interval"],
+            )
+        )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{dispatcher.sent} messages envoyés, {dispatcher.failed} en échec définitif "
+                f"({claimed} traités)"
+            )
+        )
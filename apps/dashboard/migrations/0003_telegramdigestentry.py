@@ -0,0 +1,71 @@
+# Generated by Django 4.2.20 on 2026-10-17 23:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("dashboard", "0002_telegrammessage"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="TelegramDigestEntry",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "chat_id",
+                    models.CharField(max_length=100, verbose_name="Telegram Chat ID"),
+                ),
+                (
+                    "kind",
+                    models.CharField(
+                        choices=[
+                            ("new_commission", "Nouvelle commission"),
+                            ("new_referral", "Nouveau filleul"),
+                            ("other", "Autre"),
+                        ],
+                        default="other",
+                        max_length=20,
+                    ),
+                ),
+                (
+                    "amount",
+                    models.DecimalField(
+                        blank=True, decimal_places=2, max_digits=10, null=True
+                    ),
+                ),
+                ("language", models.CharField(default="fr", max_length=5)),
+                ("digest_mode", models.CharField(default="instant", max_length=10)),
+                ("text", models.TextField()),
+                (
+                    "parse_mode",
+                    models.CharField(blank=True, default="Markdown", max_length=20),
+                ),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("deliver_after", models.DateTimeField()),
+            ],
+            options={
+                "verbose_name": "notification à regrouper",
+                "verbose_name_plural": "notifications à regrouper",
+                "ordering": ["id"],
+                "indexes": [
+                    models.Index(
+                        fields=["deliver_after"], name="dashboard_t_deliver_fe48e8_idx"
+                    ),
+                    models.Index(
+                        fields=["chat_id"], name="dashboard_t_chat_id_2e2280_idx"
+                    ),
+                ],
+            },
+        ),
+    ]
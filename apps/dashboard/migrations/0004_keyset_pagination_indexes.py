@@ -0,0 +1,20 @@
+# Generated by Django 4.2.20 on 2026-10-17 23:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("dashboard", "0003_telegramdigestentry"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="notification",
+            index=models.Index(
+                fields=["user", "created_at", "id"],
+                name="dashboard_n_user_id_8ce52d_idx",
+            ),
+        ),
+    ]
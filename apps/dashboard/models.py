@@ -28,6 +28,10 @@ class Notification(models.Model):
 
     class Meta:
         ordering = ["-created_at"]
+        indexes = [
+            # Pagination par curseur des notifications d'un utilisateur
+            models.Index(fields=["user", "created_at", "id"]),
+        ]
 
     def __str__(self):
         return f"{self.title} - {self.user.username}"
@@ -107,3 +111,80 @@ class UserProfile(models.Model):
 
     def __str__(self):
         return f"Profil de {self.user.username}"
+
+
+class TelegramMessage(models.Model):
+    """
+    File persistante des messages Telegram.
+
+    Les vues et services ne font qu'insérer une ligne ; l'envoi, le respect des
+    limites de débit de Telegram et les reprises sont assurés par
+    ``python manage.py run_telegram_dispatcher`` (voir ``telegram_dispatcher.py``).
+    """
+
+    STATUS_CHOICES = (
+        ("pending", _("En attente")),
+        ("sending", _("En cours d'envoi")),
+        ("sent", _("Envoyé")),
+        ("failed", _("Échec définitif")),
+    )
+
+    chat_id = models.CharField(_("Telegram Chat ID"), max_length=100)
+    text = models.TextField()
+    parse_mode = models.CharField(max_length=20, blank=True, default="Markdown")
+
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default="pending")
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    available_at = models.DateTimeField(default=timezone.now)
+    locked_until = models.DateTimeField(null=True, blank=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = _("message Telegram")
+        verbose_name_plural = _("messages Telegram")
+        ordering = ["id"]
+        indexes = [models.Index(fields=["status", "available_at"])]
+
+    def __str__(self):
+        return f"Message {self.id} pour {self.chat_id} ({self.status})"
+
+
+class TelegramDigestEntry(models.Model):
+    """
+    Notification en attente de regroupement (voir ``telegram_digest.py``).
+
+    Les entrées d'un même chat sont fusionnées en un seul message à
+    ``deliver_after`` : fin de la fenêtre de regroupement, ou prochain
+    récapitulatif horaire / quotidien selon la préférence de l'utilisateur.
+    """
+
+    KIND_CHOICES = (
+        ("new_commission", _("Nouvelle commission")),
+        ("new_referral", _("Nouveau filleul")),
+        ("other", _("Autre")),
+    )
+
+    chat_id = models.CharField(_("Telegram Chat ID"), max_length=100)
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES, default="other")
+    amount = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    language = models.CharField(max_length=5, default="fr")
+    digest_mode = models.CharField(max_length=10, default="instant")
+
+    # Message individuel, envoyé tel quel si l'entrée est seule dans sa fenêtre
+    text = models.TextField()
+    parse_mode = models.CharField(max_length=20, blank=True, default="Markdown")
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    deliver_after = models.DateTimeField()
+
+    class Meta:
+        verbose_name = _("notification à regrouper")
+        verbose_name_plural = _("notifications à regrouper")
+        ordering = ["id"]
+        indexes = [models.Index(fields=["deliver_after"]), models.Index(fields=["chat_id"])]
+
+    def __str__(self):
+        return f"{self.kind} pour {self.chat_id} ({self.digest_mode})"
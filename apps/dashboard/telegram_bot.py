@@ -1,7 +1,9 @@
-import requests
 import logging
 from django.conf import settings
 
+from .telegram_digest import notify
+from .telegram_dispatcher import enqueue_message
+
 logger = logging.getLogger(__name__)
 
 # Messages multilingues pour les notifications
@@ -93,7 +95,6 @@ class TelegramNotifier:
 
     def __init__(self):
         self.api_token = getattr(settings, "TELEGRAM_BOT_TOKEN", "")
-        self.api_url = f"https://api.telegram.org/bot{self.api_token}/sendMessage"
 
         # Traductions pour différentes langues
         self.translations = {
@@ -226,14 +227,14 @@ class TelegramNotifier:
 
     def send_message(self, chat_id, message):
         """
-        Envoie un message par Telegram
+        Met en file un message Telegram (envoyé par ``run_telegram_dispatcher``)
 
         Args:
             chat_id: ID du chat Telegram
             message: Message à envoyer (peut contenir du formatage Markdown)
 
         Returns:
-            bool: True si l'envoi a réussi, False sinon
+            bool: True si le message a été mis en file, False sinon
         """
         if not chat_id:
             logger.error("Chat ID manquant, impossible d'envoyer la notification Telegram")
@@ -249,59 +250,11 @@ class TelegramNotifier:
             logger.error("Chat ID invalide après nettoyage")
             return False
 
-        # Préparation des données pour l'envoi
-        url = f"https://api.telegram.org/bot{self.api_token}/sendMessage"
-        data = {"chat_id": chat_id, "text": message, "parse_mode": "Markdown"}
-
-        # Envoi de la requête avec retry
-        max_retries = 3
-        retry_count = 0
-
-        while retry_count < max_retries:
-            try:
-                response = requests.post(url, json=data, timeout=10)
-                result = response.json()
-
-                if result.get("ok"):
-                    logger.info(f"✅ Message Telegram envoyé avec succès à {chat_id}")
-                    return True
-                else:
-                    error_code = result.get("error_code", "inconnu")
-                    error_desc = result.get("description", "Erreur inconnue")
-
-                    # Gérer les différents types d'erreur
-                    if error_code == 400 and "chat not found" in error_desc.lower():
-                        logger.error(f"❌ Chat ID invalide ({chat_id}): {error_desc}")
-                        return False  # Ne pas réessayer, l'ID est invalide
-                    elif error_code == 403 and "blocked" in error_desc.lower():
-                        logger.error(
-                            f"❌ Le bot a été bloqué par l'utilisateur ({chat_id}): {error_desc}"
-                        )
-                        return False  # Ne pas réessayer, l'utilisateur a bloqué le bot
-                    else:
-                        logger.warning(
-                            f"❌ Tentative {retry_count+1}/{max_retries}: Erreur Telegram {error_code}: {error_desc}"
-                        )
-                        retry_count += 1
-                        import time
-
-                        time.sleep(2)  # Attendre 2 secondes avant de réessayer
-
-            except requests.exceptions.RequestException as e:
-                logger.warning(
-                    f"❌ Tentative {retry_count+1}/{max_retries}: Erreur de connexion: {str(e)}"
-                )
-                retry_count += 1
-                import time
-
-                time.sleep(2)  # Attendre 2 secondes avant de réessayer
-
-            except Exception as e:
-                logger.error(f"❌ Erreur inattendue: {str(e)}")
-                return False
-
-        logger.error(f"❌ Échec d'envoi du message Telegram après {max_retries} tentatives")
-        return False
+        # Mise en file : l'envoi (limites de débit, reprises) est assuré par le dispatcher
+        if enqueue_message(chat_id, message, parse_mode="Markdown") is None:
+            return False
+        logger.info(f"📨 Message Telegram mis en file pour {chat_id}")
+        return True
 
     def notify_user(self, user, notification):
         """
@@ -422,8 +375,8 @@ class TelegramNotifier:
 
         message += f"📅 *{msg['registration_date']}* {date_str}"
 
-        # Envoyer le message
-        return self.send_message(ambassador.telegram_chat_id, message)
+        # Regroupé avec les autres notifications du chat (fenêtre ou récapitulatif)
+        return notify(ambassador.telegram_chat_id, message, kind="new_referral", user=ambassador)
 
     def send_commission_notification(self, referrer, referred_user, amount, total_earnings):
         """
@@ -491,8 +444,15 @@ class TelegramNotifier:
             total=f"{total_earnings:.2f}",
         )
 
-        # Envoyer la notification
-        return self.send_message(chat_id=referrer.telegram_chat_id, message=message)
+        # Regroupée avec les autres notifications du chat (fenêtre ou récapitulatif)
+        return notify(
+            referrer.telegram_chat_id,
+            message,
+            kind="new_commission",
+            amount=amount,
+            user=referrer,
+            parse_mode="",
+        )
 
     def get_user_language(self, user):
         """
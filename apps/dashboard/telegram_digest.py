@@ -0,0 +1,199 @@
+"""
+Regroupement des notifications Telegram par chat.
+
+Les notifications « métier » (commissions, filleuls) ne partent pas
+directement : ``notify`` les enregistre dans ``TelegramDigestEntry``. Le
+dispatcher (``flush_due_digests``) fusionne ensuite les entrées d'un même chat
+en un seul message localisé, par exemple « 12 nouvelles commissions, total
+340.00€ » :
+
+- mode ``instant`` (par défaut) : les notifications arrivées dans la fenêtre
+  ``TELEGRAM_COALESCE_WINDOW`` sont regroupées ; une notification isolée est
+  envoyée telle quelle ;
+- modes ``hourly`` / ``daily`` : un récapitulatif au début de chaque heure,
+  ou chaque jour à ``TELEGRAM_DIGEST_DAILY_HOUR`` (heure locale).
+"""
+
+import logging
+from collections import defaultdict
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import TelegramDigestEntry
+from .telegram_dispatcher import enqueue_message
+
+logger = logging.getLogger(__name__)
+
+DIGEST_TEMPLATES = {
+    "fr": {
+        "instant": "📬 *Nouvelles notifications*",
+        "hourly": "📊 *Récapitulatif de la dernière heure*",
+        "daily": "📊 *Récapitulatif de la journée*",
+        "new_commission": "💰 {count} nouvelle(s) commission(s), total {total}€",
+        "new_referral": "🎉 {count} nouveau(x) filleul(s)",
+        "other": "ℹ️ {count} autre(s) notification(s)",
+    },
+    "en": {
+        "instant": "📬 *New notifications*",
+        "hourly": "📊 *Last hour summary*",
+        "daily": "📊 *Daily summary*",
+        "new_commission": "💰 {count} new commission(s), total {total}€",
+        "new_referral": "🎉 {count} new referral(s)",
+        "other": "ℹ️ {count} other notification(s)",
+    },
+    "es": {
+        "instant": "📬 *Nuevas notificaciones*",
+        "hourly": "📊 *Resumen de la última hora*",
+        "daily": "📊 *Resumen del día*",
+        "new_commission": "💰 {count} nueva(s) comisión(es), total {total}€",
+        "new_referral": "🎉 {count} nuevo(s) referido(s)",
+        "other": "ℹ️ {count} otra(s) notificación(es)",
+    },
+    "de": {
+        "instant": "📬 *Neue Benachrichtigungen*",
+        "hourly": "📊 *Zusammenfassung der letzten Stunde*",
+        "daily": "📊 *Tageszusammenfassung*",
+        "new_commission": "💰 {count} neue Provision(en), insgesamt {total}€",
+        "new_referral": "🎉 {count} neue Empfehlung(en)",
+        "other": "ℹ️ {count} weitere Benachrichtigung(en)",
+    },
+    "it": {
+        "instant": "📬 *Nuove notifiche*",
+        "hourly": "📊 *Riepilogo dell'ultima ora*",
+        "daily": "📊 *Riepilogo giornaliero*",
+        "new_commission": "💰 {count} nuove commissioni, totale {total}€",
+        "new_referral": "🎉 {count} nuovi referral",
+        "other": "ℹ️ {count} altre notifiche",
+    },
+    "ru": {
+        "instant": "📬 *Новые уведомления*",
+        "hourly": "📊 *Сводка за последний час*",
+        "daily": "📊 *Сводка за день*",
+        "new_commission": "💰 Новых комиссий: {count}, всего {total}€",
+        "new_referral": "🎉 Новых рефералов: {count}",
+        "other": "ℹ️ Других уведомлений: {count}",
+    },
+    "ar": {
+        "instant": "📬 *إشعارات جديدة*",
+        "hourly": "📊 *ملخص الساعة الأخيرة*",
+        "daily": "📊 *ملخص اليوم*",
+        "new_commission": "💰 {count} عمولات جديدة، المجموع {total}€",
+        "new_referral": "🎉 {count} إحالات جديدة",
+        "other": "ℹ️ {count} إشعارات أخرى",
+    },
+    "zh": {
+        "instant": "📬 *新通知*",
+        "hourly": "📊 *过去一小时摘要*",
+        "daily": "📊 *每日摘要*",
+        "new_commission": "💰 {count} 笔新佣金，总计 {total}€",
+        "new_referral": "🎉 {count} 位新推荐用户",
+        "other": "ℹ️ {count} 条其他通知",
+    },
+}
+
+# Ordre des lignes dans un récapitulatif
+DIGEST_KINDS = ("new_commission", "new_referral", "other")
+
+
+def next_delivery(mode, now=None):
+    """Date d'envoi d'une nouvelle entrée selon le mode de regroupement."""
+    now = now or timezone.now()
+    local = timezone.localtime(now)
+    if mode == "hourly":
+        return local.replace(minute=0, second=0, microsecond=0) + timezone.timedelta(hours=1)
+    if mode == "daily":
+        target = local.replace(
+            hour=settings.TELEGRAM_DIGEST_DAILY_HOUR, minute=0, second=0, microsecond=0
+        )
+        return target if target > local else target + timezone.timedelta(days=1)
+    return now + timezone.timedelta(seconds=settings.TELEGRAM_COALESCE_WINDOW)
+
+
+def notify(chat_id, text, kind="other", amount=None, user=None, parse_mode="Markdown"):
+    """
+    Enregistre une notification à regrouper pour ``chat_id``.
+
+    ``user`` fournit la langue et le mode de regroupement (``telegram_digest``).
+    Retourne True si la notification a été prise en compte.
+    """
+    chat_id = str(chat_id or "").strip()
+    if not chat_id:
+        logger.error("Chat ID manquant, impossible d'enregistrer la notification Telegram")
+        return False
+
+    mode = getattr(user, "telegram_digest", None) or "instant"
+    language = getattr(user, "telegram_language", None) or "fr"
+
+    with transaction.atomic():
+        # Rejoindre la fenêtre déjà ouverte pour ce chat, s'il y en a une
+        pending = (
+            TelegramDigestEntry.objects.filter(chat_id=chat_id, digest_mode=mode)
+            .order_by("deliver_after")
+            .values_list("deliver_after", flat=True)
+            .first()
+        )
+        TelegramDigestEntry.objects.create(
+            chat_id=chat_id,
+            kind=kind,
+            amount=amount,
+            language=language,
+            digest_mode=mode,
+            text=text,
+            parse_mode=parse_mode or "",
+            deliver_after=pending or next_delivery(mode),
+        )
+    return True
+
+
+def build_digest(entries):
+    """Message localisé résumant ``entries`` (entrées d'un même chat)."""
+    templates = DIGEST_TEMPLATES.get(entries[-1].language, DIGEST_TEMPLATES["en"])
+    counts = defaultdict(int)
+    totals = defaultdict(Decimal)
+    for entry in entries:
+        counts[entry.kind] += 1
+        totals[entry.kind] += entry.amount or 0
+
+    lines = [templates[entries[-1].digest_mode]]
+    for kind in DIGEST_KINDS:
+        if counts[kind]:
+            lines.append(templates[kind].format(count=counts[kind], total=f"{totals[kind]:.2f}"))
+    return "\n\n".join(lines)
+
+
+def flush_due_digests(now=None):
+    """
+    Envoie (met en file du dispatcher) les notifications dont la fenêtre est
+    écoulée, un message par chat. Retourne le nombre de messages produits.
+    """
+    now = now or timezone.now()
+    # Les entrées arrivées juste après l'échéance rejoignent le même message
+    horizon = now + timezone.timedelta(seconds=settings.TELEGRAM_COALESCE_WINDOW)
+    chats = set(
+        TelegramDigestEntry.objects.filter(deliver_after__lte=now).values_list(
+            "chat_id", "digest_mode"
+        )
+    )
+
+    produced = 0
+    for chat_id, mode in chats:
+        with transaction.atomic():
+            entries = list(
+                TelegramDigestEntry.objects.select_for_update(skip_locked=True)
+                .filter(chat_id=chat_id, digest_mode=mode, deliver_after__lte=horizon)
+                .order_by("id")
+            )
+            if not entries:
+                continue
+            if len(entries) == 1 and mode == "instant":
+                enqueue_message(chat_id, entries[0].text, parse_mode=entries[0].parse_mode)
+            else:
+                enqueue_message(chat_id, build_digest(entries), parse_mode="Markdown")
+            TelegramDigestEntry.objects.filter(id__in=[entry.id for entry in entries]).delete()
+            produced += 1
+            if len(entries) > 1:
+                logger.info(f"📦 {len(entries)} notifications regroupées pour {chat_id}")
+    return produced
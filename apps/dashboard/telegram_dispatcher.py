@@ -0,0 +1,321 @@
+"""
+Envoi asynchrone des messages Telegram.
+
+``enqueue_message`` insère le message dans la file persistante
+(``TelegramMessage``) et rend la main immédiatement : aucune vue n'attend
+l'API Telegram. Le dispatcher (``python manage.py run_telegram_dispatcher``)
+réclame les messages par lots et les envoie depuis une boucle asyncio :
+
+- un client HTTP partagé (``httpx.AsyncClient``, connexions keep-alive) ;
+- des seaux à jetons pour la limite globale du bot et la limite par chat
+  (plus stricte pour les groupes) ;
+- les messages d'un même chat partent dans l'ordre, l'un après l'autre ;
+  un chat dont le seau est vide ne retient pas le lot : ses messages restants
+  repartent en file jusqu'au prochain jeton ;
+- une réponse 429 suspend le chat pendant ``retry_after`` secondes ; les
+  erreurs réseau et 5xx sont retentées avec un délai exponentiel. Dans les
+  deux cas, les messages suivants du chat sont remis en file avec le même
+  délai pour garder leur ordre ;
+- chat introuvable ou bot bloqué : échec définitif, sans nouvelle tentative.
+
+Les seaux sont propres au processus : lancer un seul dispatcher par bot.
+"""
+
+import asyncio
+import logging
+import random
+import time
+from collections import defaultdict
+
+import httpx
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import TelegramMessage
+
+logger = logging.getLogger(__name__)
+
+# Erreurs 400/403 pour lesquelles une nouvelle tentative est inutile
+PERMANENT_ERRORS = (
+    "chat not found",
+    "blocked",
+    "user is deactivated",
+    "kicked",
+    "not enough rights",
+)
+
+
+def enqueue_message(chat_id, text, parse_mode="Markdown"):
+    """
+    Ajoute un message à la file d'envoi. Retourne le ``TelegramMessage`` créé,
+    ou None si le chat ID est vide.
+    """
+    chat_id = str(chat_id or "").strip()
+    if not chat_id:
+        logger.error("Chat ID manquant, impossible de mettre en file la notification Telegram")
+        return None
+    return TelegramMessage.objects.create(chat_id=chat_id, text=text, parse_mode=parse_mode or "")
+
+
+def enqueue_messages(messages, parse_mode="Markdown"):
+    """
+    Ajoute à la file une série de messages ``(chat_id, texte)`` en un seul
+    ``INSERT`` (diffusion à de nombreux chats). Les chat ID vides sont ignorés.
+    """
+    rows = [
+        TelegramMessage(chat_id=str(chat_id).strip(), text=text, parse_mode=parse_mode or "")
+        for chat_id, text in messages
+        if str(chat_id or "").strip()
+    ]
+    return TelegramMessage.objects.bulk_create(rows, batch_size=500)
+
+
+class TokenBucket:
+    """Seau à jetons : ``rate`` jetons par seconde, au plus ``capacity`` en réserve."""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self.paused_until = 0.0
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+        return now
+
+    def delay(self):
+        """Secondes à attendre avant qu'un jeton soit disponible (0 si disponible)."""
+        now = self._refill()
+        if now < self.paused_until:
+            return self.paused_until - now
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    async def acquire(self):
+        # Pas d'await entre la vérification et la consommation : sûr dans une boucle asyncio
+        while True:
+            wait = self.delay()
+            if not wait:
+                self.tokens -= 1
+                return
+            await asyncio.sleep(wait)
+
+    def pause(self, seconds):
+        """Suspend le seau (réponse 429 de Telegram)."""
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+        self.tokens = 0.0
+
+
+# --- Accès à la file (synchrone, appelé via sync_to_async) ---------------------------
+
+
+def claim_messages(limit):
+    """Réclame jusqu'à ``limit`` messages échus (ou dont le bail a expiré)."""
+    now = timezone.now()
+    lease = timezone.timedelta(seconds=settings.TELEGRAM_DISPATCHER_LEASE)
+    with transaction.atomic():
+        messages = list(
+            TelegramMessage.objects.select_for_update(skip_locked=True)
+            .filter(
+                Q(status="pending", available_at__lte=now)
+                | Q(status="sending", locked_until__lt=now)
+            )
+            .order_by("id")[:limit]
+        )
+        if messages:
+            TelegramMessage.objects.filter(id__in=[m.id for m in messages]).update(
+                status="sending", locked_until=now + lease
+            )
+    return messages
+
+
+def mark_sent(message_id):
+    TelegramMessage.objects.filter(id=message_id).update(
+        status="sent", sent_at=timezone.now(), locked_until=None, last_error=""
+    )
+
+
+def mark_failed(message, error):
+    TelegramMessage.objects.filter(id=message.id).update(
+        status="failed", attempts=message.attempts + 1, last_error=error[:2000], locked_until=None
+    )
+    logger.error(f"❌ Message Telegram {message.id} pour {message.chat_id} abandonné: {error}")
+
+
+def reschedule(message, delay, error, count_attempt=True, **fields):
+    """Remet le message en file dans ``delay`` secondes (ou l'abandonne après trop d'échecs)."""
+    attempts = message.attempts + (1 if count_attempt else 0)
+    if attempts >= settings.TELEGRAM_DISPATCHER_MAX_ATTEMPTS:
+        message.attempts = attempts - 1
+        mark_failed(message, error)
+        return
+    TelegramMessage.objects.filter(id=message.id).update(
+        status="pending",
+        attempts=attempts,
+        last_error=error[:2000],
+        locked_until=None,
+        available_at=timezone.now() + timezone.timedelta(seconds=delay),
+        **fields,
+    )
+
+
+def release(messages, delay):
+    """Remet en file ``messages`` dans ``delay`` secondes, sans compter de tentative."""
+    if messages:
+        TelegramMessage.objects.filter(id__in=[message.id for message in messages]).update(
+            status="pending",
+            locked_until=None,
+            available_at=timezone.now() + timezone.timedelta(seconds=delay),
+        )
+
+
+def backoff_delay(attempts):
+    base = settings.TELEGRAM_DISPATCHER_RETRY_BASE_DELAY
+    delay = min(base * 2**attempts, settings.TELEGRAM_DISPATCHER_RETRY_MAX_DELAY)
+    return delay * random.uniform(0.8, 1.2)
+
+
+# --- Boucle d'envoi ------------------------------------------------------------------
+
+
+class TelegramDispatcher:
+    def __init__(self, token=None):
+        token = token or settings.TELEGRAM_BOT_TOKEN
+        self.api_url = f"https://api.telegram.org/bot{token}/sendMessage"
+        self.global_bucket = TokenBucket(settings.TELEGRAM_DISPATCHER_GLOBAL_RATE)
+        self.chat_buckets = {}
+        self.sent = 0
+        self.failed = 0
+
+    def chat_bucket(self, chat_id):
+        bucket = self.chat_buckets.get(chat_id)
+        if bucket is None:
+            # Les identifiants de groupes et canaux sont négatifs
+            is_group = chat_id.startswith("-")
+            rate = (
+                settings.TELEGRAM_DISPATCHER_GROUP_RATE
+                if is_group
+                else settings.TELEGRAM_DISPATCHER_CHAT_RATE
+            )
+            bucket = self.chat_buckets[chat_id] = TokenBucket(rate, capacity=1)
+        return bucket
+
+    async def send(self, client, message):
+        """
+        Envoie un message et enregistre le résultat.
+
+        Retourne None si le message est traité (envoyé ou abandonné), sinon le
+        délai (secondes) après lequel il est remis en file : les messages
+        suivants du chat doivent attendre autant.
+        """
+        chat_bucket = self.chat_bucket(message.chat_id)
+        await chat_bucket.acquire()
+        await self.global_bucket.acquire()
+
+        data = {"chat_id": message.chat_id, "text": message.text}
+        if message.parse_mode:
+            data["parse_mode"] = message.parse_mode
+
+        try:
+            response = await client.post(self.api_url, json=data)
+            result = response.json()
+        except (httpx.HTTPError, ValueError) as e:
+            delay = backoff_delay(message.attempts)
+            await sync_to_async(reschedule)(message, delay, f"Erreur de connexion: {str(e)}")
+            return delay
+
+        if result.get("ok"):
+            await sync_to_async(mark_sent)(message.id)
+            self.sent += 1
+            return None
+
+        error_code = result.get("error_code", response.status_code)
+        description = result.get("description", "Erreur inconnue")
+        error = f"Erreur Telegram {error_code}: {description}"
+
+        if error_code == 429:
+            retry_after = (result.get("parameters") or {}).get("retry_after", 1)
+            chat_bucket.pause(retry_after)
+            logger.warning(
+                f"⏳ Limite Telegram atteinte pour {message.chat_id}, pause de {retry_after}s"
+            )
+            await sync_to_async(reschedule)(message, retry_after, error, count_attempt=False)
+            return retry_after
+
+        lowered = description.lower()
+        if error_code == 400 and "parse entities" in lowered and message.parse_mode:
+            # Formatage invalide : renvoyer le message en texte brut
+            await sync_to_async(reschedule)(message, 0, error, count_attempt=False, parse_mode="")
+            return 0
+
+        if error_code in (400, 403) and any(reason in lowered for reason in PERMANENT_ERRORS):
+            await sync_to_async(mark_failed)(message, error)
+            self.failed += 1
+            return None
+
+        delay = backoff_delay(message.attempts)
+        await sync_to_async(reschedule)(message, delay, error)
+        return delay
+
+    async def send_chat(self, client, messages):
+        """
+        Envoie dans l'ordre les messages d'un même chat tant que son seau le
+        permet ; le reste repart en file au lieu de retenir les autres chats.
+        """
+        bucket = self.chat_bucket(messages[0].chat_id)
+        for index, message in enumerate(messages):
+            wait = bucket.delay()
+            if wait:
+                await sync_to_async(release)(messages[index:], wait)
+                return
+            delay = await self.send(client, message)
+            if delay is not None:
+                # Les messages suivants attendent le message remis en file, sans perdre leur ordre
+                await sync_to_async(release)(messages[index + 1 :], delay)
+                return
+
+    async def run_once(self, client, batch_size):
+        messages = await sync_to_async(claim_messages)(batch_size)
+        by_chat = defaultdict(list)
+        for message in messages:
+            by_chat[message.chat_id].append(message)
+        await asyncio.gather(*(self.send_chat(client, chat) for chat in by_chat.values()))
+
+        # Oublier les seaux des chats inactifs (ceux encore limités sont conservés)
+        if len(self.chat_buckets) > 10_000:
+            self.chat_buckets = {
+                chat_id: bucket for chat_id, bucket in self.chat_buckets.items() if bucket.delay()
+            }
+        return len(messages)
+
+    async def run(self, batch_size=None, loop=False, interval=None):
+        from .telegram_digest import flush_due_digests
+
+        batch_size = batch_size or settings.TELEGRAM_DISPATCHER_BATCH_SIZE
+        interval = interval or settings.TELEGRAM_DISPATCHER_POLL_INTERVAL
+        limits = httpx.Limits(
+            max_connections=settings.TELEGRAM_DISPATCHER_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.TELEGRAM_DISPATCHER_MAX_CONNECTIONS,
+        )
+        total = 0
+        async with httpx.AsyncClient(
+            timeout=settings.TELEGRAM_DISPATCHER_HTTP_TIMEOUT, limits=limits
+        ) as client:
+            while True:
+                # Les notifications regroupées échues rejoignent la file d'envoi
+                await sync_to_async(flush_due_digests)()
+                claimed = await self.run_once(client, batch_size)
+                total += claimed
+                if claimed:
+                    continue
+                if not loop:
+                    break
+                await asyncio.sleep(interval)
+        return total
@@ -4,13 +4,14 @@ from django.http import JsonResponse
 from django.contrib import messages
 from django.utils import timezone
 from django.db.models import Sum, Count, Q
+from django.db.models.functions import TruncDate
 from datetime import timedelta, datetime
+from decimal import Decimal
 from django.views.decorators.http import require_POST
 import json
 import uuid
 from django.utils.translation import gettext_lazy as _
 import logging
-from django.core.paginator import Paginator
 from django.contrib.auth import update_session_auth_hash
 import os
 from supabase import create_client, Client
@@ -21,6 +22,12 @@ from apps.affiliate.models import (
     Referral,
     Commission,
 )
+from apps.affiliate.services.bulk_payout import pay_commissions
+from apps.affiliate.services.commission_ledger import ambassador_balances
+from apps.affiliate.services.rate_changes import change_base_rate, change_specific_rates
+from apps.affiliate.services.daily_stats import get_daily_stats
+from apps.affiliate.services.dashboard_stats import cached_stats, dashboard_summary
+from apps.affiliate.services.keyset import InvalidCursor, KeysetPaginator
 from apps.accounts.models import (
     User,
     UserProfile,
@@ -47,27 +54,8 @@ def dashboard_home(request):
     today = timezone.now().date()
     thirty_days_ago = today - timedelta(days=30)
 
-    # Calcul des statistiques pour le tableau de bord
-    stats = {
-        "clicks": ReferralClick.objects.filter(
-            user=request.user, clicked_at__date__gte=thirty_days_ago
-        ).count(),
-        "referrals": Referral.objects.filter(
-            referrer=request.user, created_at__date__gte=thirty_days_ago
-        ).count(),
-        "earnings": Commission.objects.filter(
-            referral__referrer=request.user,
-            status__in=["approved", "paid"],
-            created_at__date__gte=thirty_days_ago,
-        ).aggregate(Sum("amount"))["amount__sum"]
-        or 0,
-    }
-
-    # Calcul du taux de conversion
-    if stats["clicks"] > 0:
-        stats["conversion_rate"] = (stats["referrals"] / stats["clicks"]) * 100
-    else:
-        stats["conversion_rate"] = 0
+    # Statistiques du tableau de bord (clics, parrainages, gains, conversion), en cache
+    stats = dashboard_summary(request.user.id, thirty_days_ago)
 
     # Récupérer les dernières notifications
     notifications = Notification.objects.filter(user=request.user, is_read=False).order_by(
@@ -102,27 +90,8 @@ def overview(request):
     else:
         start_date = today - timedelta(days=30)
 
-    # Statistiques pour la période
-    stats = {
-        "clicks": ReferralClick.objects.filter(
-            user=request.user, created_at__date__gte=start_date
-        ).count(),
-        "referrals": Referral.objects.filter(
-            referrer=request.user, created_at__date__gte=start_date
-        ).count(),
-        "earnings": Commission.objects.filter(
-            referral__referrer=request.user,
-            status__in=["approved", "paid"],
-            created_at__date__gte=start_date,
-        ).aggregate(Sum("amount"))["amount__sum"]
-        or 0,
-    }
-
-    # Calcul du taux de conversion
-    if stats["clicks"] > 0:
-        stats["conversion_rate"] = (stats["referrals"] / stats["clicks"]) * 100
-    else:
-        stats["conversion_rate"] = 0
+    # Statistiques pour la période (en cache, invalidées à chaque écriture)
+    stats = dashboard_summary(request.user.id, start_date)
 
     context = {
         "stats": stats,
@@ -153,90 +122,46 @@ def statistics(request):
     else:
         start_date = today - timedelta(days=30)
 
+    # Période courante et période précédente lues en une seule requête
+    # sur la table pré-agrégée des statistiques quotidiennes
+    previous_start_date = start_date - (today - start_date)
+    all_days = get_daily_stats(request.user, previous_start_date, today)
+    previous_days = [day for day in all_days if day.date < start_date]
+    days = [day for day in all_days if day.date >= start_date]
+
     # Statistiques de base
-    clicks = ReferralClick.objects.filter(
-        user=request.user, clicked_at__date__gte=start_date
-    ).count()
+    clicks = sum(day.clicks for day in days)
     referrals = Referral.objects.filter(referrer=request.user, created_at__date__gte=start_date)
-    total_referrals = referrals.count()
+    total_referrals = sum(day.referrals for day in days)
 
     # Statistiques par type de parrainage
-    ambassador_referrals = referrals.filter(referred__user_type="ambassador").count()
-    escort_referrals = referrals.filter(referred__user_type="escort").count()
+    ambassador_referrals = sum(day.ambassador_referrals for day in days)
+    escort_referrals = sum(day.escort_referrals for day in days)
 
     # Revenus
-    commissions = Commission.objects.filter(
-        referral__referrer=request.user, created_at__date__gte=start_date
-    )
-
-    total_earnings = commissions.aggregate(Sum("amount"))["amount__sum"] or 0
-    pending_earnings = (
-        commissions.filter(status="pending").aggregate(Sum("amount"))["amount__sum"] or 0
-    )
-    paid_earnings = commissions.filter(status="paid").aggregate(Sum("amount"))["amount__sum"] or 0
+    total_earnings = sum((day.commissions_total for day in days), Decimal("0"))
+    pending_earnings = sum((day.commissions_pending for day in days), Decimal("0"))
+    paid_earnings = sum((day.commissions_paid for day in days), Decimal("0"))
 
     # Revenus par type de parrainage
-    ambassador_earnings = (
-        commissions.filter(referral__referred__user_type="ambassador").aggregate(Sum("amount"))[
-            "amount__sum"
-        ]
-        or 0
-    )
-
-    escort_earnings = (
-        commissions.filter(referral__referred__user_type="escort").aggregate(Sum("amount"))[
-            "amount__sum"
-        ]
-        or 0
-    )
+    ambassador_earnings = sum((day.ambassador_commissions for day in days), Decimal("0"))
+    escort_earnings = sum((day.escort_commissions for day in days), Decimal("0"))
 
     # Taux de conversion
     conversion_rate = (total_referrals / clicks * 100) if clicks > 0 else 0
 
     # Statistiques quotidiennes pour le graphique
-    daily_stats = []
-    current_date = start_date
-    while current_date <= today:
-        day_clicks = ReferralClick.objects.filter(
-            user=request.user, clicked_at__date=current_date
-        ).count()
-
-        day_referrals = Referral.objects.filter(
-            referrer=request.user, created_at__date=current_date
-        ).count()
-
-        day_earnings = (
-            Commission.objects.filter(
-                referral__referrer=request.user, created_at__date=current_date
-            ).aggregate(Sum("amount"))["amount__sum"]
-            or 0
-        )
-
-        # Distinguer les affiliés par type
-        day_ambassador_referrals = Referral.objects.filter(
-            referrer=request.user,
-            referred__user_type="ambassador",
-            created_at__date=current_date,
-        ).count()
-
-        day_escort_referrals = Referral.objects.filter(
-            referrer=request.user,
-            referred__user_type="escort",
-            created_at__date=current_date,
-        ).count()
-
-        daily_stats.append(
-            {
-                "date": current_date.strftime("%Y-%m-%d"),
-                "clicks": day_clicks,
-                "referrals": day_referrals,
-                "earnings": float(day_earnings),
-                "ambassador_referrals": day_ambassador_referrals,
-                "escort_referrals": day_escort_referrals,
-            }
-        )
-
-        current_date += timedelta(days=1)
+    daily_stats = [
+        {
+            "date": day.date.strftime("%Y-%m-%d"),
+            "clicks": day.clicks,
+            "referrals": day.referrals,
+            "earnings": float(day.commissions_total),
+            "ambassador_referrals": day.ambassador_referrals,
+            "escort_referrals": day.escort_referrals,
+        }
+        for day in days
+    ]
 
     # Statistiques de performance
     avg_commission = total_earnings / total_referrals if total_referrals > 0 else 0
@@ -245,29 +170,9 @@ def statistics(request):
     )
 
     # Statistiques de croissance (comparaison avec la période précédente)
-    previous_start_date = start_date - (today - start_date)
-
-    previous_clicks = ReferralClick.objects.filter(
-        user=request.user,
-        clicked_at__date__gte=previous_start_date,
-        clicked_at__date__lt=start_date,
-    ).count()
-
-    previous_referrals = Referral.objects.filter(
-        referrer=request.user,
-        created_at__date__gte=previous_start_date,
-        created_at__date__lt=start_date,
-    ).count()
-
-    previous_earnings = (
-        Commission.objects.filter(
-            referral__referrer=request.user,
-            status__in=["approved", "paid"],
-            created_at__date__gte=previous_start_date,
-            created_at__date__lt=start_date,
-        ).aggregate(Sum("amount"))["amount__sum"]
-        or 0
-    )
+    previous_clicks = sum(day.clicks for day in previous_days)
+    previous_referrals = sum(day.referrals for day in previous_days)
+    previous_earnings = sum((day.earnings for day in previous_days), Decimal("0"))
 
     # Calcul des taux de croissance
     clicks_growth = calculate_growth(clicks, previous_clicks)
@@ -482,11 +387,19 @@ def reports(request):
     # Commissions
     if report_type == "commissions":
         commissions = Commission.objects.filter(
-            referral__referrer=request.user, created_at__date__gte=start_date
+            user=request.user, created_at__date__gte=start_date
         ).order_by("-created_at")
 
-        # Agrégations
-        by_status = commissions.values("status").annotate(count=Count("id"), sum=Sum("amount"))
+        # Agrégations (en cache jusqu'à la prochaine écriture de l'ambassadeur)
+        by_status = cached_stats(
+            request.user.id,
+            f"report:commissions:{start_date.isoformat()}",
+            lambda: list(
+                commissions.order_by()
+                .values("status")
+                .annotate(count=Count("id"), sum=Sum("amount"))
+            ),
+        )
 
         context = {
             "report_type": report_type,
@@ -514,15 +427,19 @@ def reports(request):
     # Trafic
     elif report_type == "traffic":
         clicks = ReferralClick.objects.filter(
-            user=request.user, created_at__date__gte=start_date
-        ).order_by("-created_at")
-
-        # Agrégations
-        by_day = (
-            clicks.extra({"day": "date(created_at)"})
-            .values("day")
-            .annotate(count=Count("id"))
-            .order_by("day")
+            user=request.user, clicked_at__date__gte=start_date
+        ).order_by("-clicked_at")
+
+        # Agrégations (en cache jusqu'à la prochaine écriture de l'ambassadeur)
+        by_day = cached_stats(
+            request.user.id,
+            f"report:traffic:{start_date.isoformat()}",
+            lambda: list(
+                clicks.annotate(day=TruncDate("clicked_at"))
+                .values("day")
+                .annotate(count=Count("id"))
+                .order_by("day")
+            ),
         )
 
         context = {
@@ -545,10 +462,13 @@ def notifications(request):
     """
     Liste des notifications de l'utilisateur
     """
-    notifications_list = Notification.objects.filter(user=request.user).order_by("-created_at")
-    paginator = Paginator(notifications_list, 20)
-    page = request.GET.get("page")
-    notifications = paginator.get_page(page)
+    notifications_list = Notification.objects.filter(user=request.user)
+    # Pagination par curseur sur (created_at, id) : ni OFFSET ni COUNT
+    paginator = KeysetPaginator(notifications_list, 20)
+    try:
+        notifications = paginator.page(request.GET.get("cursor"))
+    except InvalidCursor:
+        notifications = paginator.page()
 
     context = {
         "notifications": notifications,
@@ -683,35 +603,17 @@ def api_summary(request):
     # Statistiques de base
     thirty_days_ago = timezone.now().date() - timedelta(days=30)
 
-    clicks = ReferralClick.objects.filter(
-        user=request.user, created_at__date__gte=thirty_days_ago
-    ).count()
-    referrals = Referral.objects.filter(
-        referrer=request.user, created_at__date__gte=thirty_days_ago
-    ).count()
-    earnings = (
-        Commission.objects.filter(
-            referral__referrer=request.user,
-            status__in=["approved", "paid"],
-            created_at__date__gte=thirty_days_ago,
-        ).aggregate(Sum("amount"))["amount__sum"]
-        or 0
-    )
-
-    # Calcul du taux de conversion
-    if clicks > 0:
-        conversion_rate = (referrals / clicks) * 100
-    else:
-        conversion_rate = 0
+    # Interrogée régulièrement par le frontend : une lecture de cache tant que rien ne change
+    stats = dashboard_summary(request.user.id, thirty_days_ago)
 
     # Notifications non lues
     unread_notifications = Notification.objects.filter(user=request.user, is_read=False).count()
 
     data = {
-        "clicks": clicks,
-        "referrals": referrals,
-        "earnings": float(earnings),
-        "conversion_rate": conversion_rate,
+        "clicks": stats["clicks"],
+        "referrals": stats["referrals"],
+        "earnings": float(stats["earnings"]),
+        "conversion_rate": stats["conversion_rate"],
         "unread_notifications": unread_notifications,
     }
 
@@ -725,60 +627,33 @@ def api_chart_data(request, period):
         # Calculer les dates en fonction de la période
         end_date = timezone.now()
         start_date = end_date - timedelta(days=int(period))
-
-        # Récupérer les données des commissions
-        commissions = Commission.objects.filter(
-            ambassador=request.user, created_at__range=(start_date, end_date)
-        ).order_by("created_at")
-
-        # Récupérer les données des parrainages
-        referrals = Referral.objects.filter(
-            referrer=request.user, created_at__range=(start_date, end_date)
-        ).order_by("created_at")
-
-        # Préparer les données pour le graphique
-        dates = []
-        commission_data = []
-        ambassador_data = []
-        escort_data = []
-
-        # Créer un dictionnaire pour stocker les données par date
-        data_by_date = {}
-
-        # Initialiser toutes les dates avec des valeurs nulles
-        current_date = start_date
-        while current_date <= end_date:
-            date_str = current_date.strftime("%Y-%m-%d")
-            data_by_date[date_str] = {"commissions": 0, "ambassadors": 0, "escorts": 0}
-            current_date += timedelta(days=1)
-
-        # Remplir les données des commissions
-        for commission in commissions:
-            date_str = commission.created_at.strftime("%Y-%m-%d")
-            data_by_date[date_str]["commissions"] += commission.amount
-
-        # Remplir les données des parrainages
-        for referral in referrals:
-            date_str = referral.created_at.strftime("%Y-%m-%d")
-            if referral.referred.is_ambassador:
-                data_by_date[date_str]["ambassadors"] += 1
-            else:
-                data_by_date[date_str]["escorts"] += 1
-
-        # Convertir les données en listes pour le graphique
-        for date_str in sorted(data_by_date.keys()):
-            dates.append(date_str)
-            commission_data.append(data_by_date[date_str]["commissions"])
-            ambassador_data.append(data_by_date[date_str]["ambassadors"])
-            escort_data.append(data_by_date[date_str]["escorts"])
-
-        return JsonResponse(
-            {
+        first_day, last_day = timezone.localdate(start_date), timezone.localdate(end_date)
+
+        def build():
+            # Une seule lecture de la table pré-agrégée pour toute la période
+            dates = []
+            commission_data = []
+            ambassador_data = []
+            escort_data = []
+
+            for day in get_daily_stats(request.user, first_day, last_day):
+                dates.append(day.date.strftime("%Y-%m-%d"))
+                commission_data.append(float(day.commissions_total))
+                ambassador_data.append(day.ambassador_referrals)
+                escort_data.append(day.escort_referrals)
+
+            return {
                 "labels": dates,
                 "commissions": commission_data,
                 "ambassadors": ambassador_data,
                 "escorts": escort_data,
             }
+
+        # Appels simultanés du frontend : un seul calcul partagé, puis le cache versionné
+        return JsonResponse(
+            cached_stats(
+                request.user.id, f"chart:{first_day.isoformat()}:{last_day.isoformat()}", build
+            )
         )
 
     except Exception as e:
@@ -850,10 +725,13 @@ def telegram_settings(request):
                 else:
                     request.user.telegram_chat_id = None  # Désactiver les notifications Telegram
 
-                # Toujours mettre à jour la langue
+                # Toujours mettre à jour la langue et le mode de regroupement
                 request.user.telegram_language = telegram_language
+                request.user.telegram_digest = form.cleaned_data.get("telegram_digest") or "instant"
 
-                request.user.save(update_fields=["telegram_chat_id", "telegram_language"])
+                request.user.save(
+                    update_fields=["telegram_chat_id", "telegram_language", "telegram_digest"]
+                )
 
                 messages.success(request, "Votre configuration Telegram a été mise à jour avec succès.")
 
@@ -1135,10 +1013,16 @@ def manage_ambassadors(request):
             except ValueError:
                 messages.error(request, "Invalid commission rate value")
 
+    # Soldes du grand livre de tous les ambassadeurs affichés, en deux requêtes
+    ambassadors = list(ambassadors)
+    balances = ambassador_balances([ambassador.id for ambassador in ambassadors])
+    for ambassador in ambassadors:
+        ambassador.balance = balances[ambassador.id]
+
     context = {
         "ambassadors": ambassadors,
         "query": query,
-        "total_count": ambassadors.count(),
+        "total_count": len(ambassadors),
     }
 
     return render(request, "dashboard/admin/manage_ambassadors.html", context)
@@ -1192,33 +1076,39 @@ def bulk_update_ambassadors(request):
                 status=400,
             )
 
-        # Update commission rates
-        count = 0
-        for user in users_to_update:
-            user.commission_rate = new_rate
-            user.save()
-
-            # Create notification for user
-            Notification.objects.create(
-                user=user,
-                title="Commission Rate Updated",
-                message=f"Your base commission rate has been updated to {new_rate}% by an administrator.",
-                notification_type="system",
-            )
-            count += 1
+        # Update commission rates (set-based UPDATE, bulk notifications, audit entry).
+        # With "dry_run", only the affected counts and pending impact are returned.
+        result = change_base_rate(
+            users_to_update,
+            data.get("commission_rate"),
+            admin_user=request.user,
+            scope=apply_to,
+            parameters={"query": query, "user_ids": user_ids} if apply_to != "all" else {},
+            dry_run=bool(data.get("dry_run")),
+        )
+        count = result.ambassadors
 
         # Log admin action
         admin_username = request.user.username
         logger = logging.getLogger("django")
         logger.info(
-            f"Admin {admin_username} updated commission rates to {new_rate}% for {count} ambassadors"
+            f"Admin {admin_username} {'previewed' if result.dry_run else 'updated'} commission "
+            f"rates to {new_rate}% for {count} ambassadors"
         )
 
         return JsonResponse(
             {
                 "success": True,
-                "message": f"Successfully updated commission rate for {count} ambassadors",
+                "message": (
+                    f"{count} ambassadors would be updated"
+                    if result.dry_run
+                    else f"Successfully updated commission rate for {count} ambassadors"
+                ),
                 "count": count,
+                "dry_run": result.dry_run,
+                "pending_commissions": result.pending_commissions,
+                "pending_amount": str(result.pending_amount),
+                "projected_amount": str(result.projected_amount),
             }
         )
 
@@ -1319,85 +1209,29 @@ def update_specific_rates(request):
         # Get the ambassador
         ambassador = User.objects.get(id=user_id, user_category="ambassador")
 
-        # Update existing referrals based on type
-        escort_referrals = Referral.objects.filter(user=ambassador, referred_user_type="escort")
-        for referral in escort_referrals:
-            referral.commission_rate = escort_rate
-            referral.save()
-
-        ambassador_referrals = Referral.objects.filter(
-            user=ambassador, referred_user_type="ambassador"
-        )
-        for referral in ambassador_referrals:
-            referral.commission_rate = ambassador_rate
-            referral.save()
-
-        # Also store these values in a config or profile for future referrals
-        # This uses UserProfile to store the custom commission rates
-        profile, created = UserProfile.objects.get_or_create(user=ambassador)
-        profile.escort_commission_rate = escort_rate
-        profile.ambassador_commission_rate = ambassador_rate
-        profile.save()
-
-        # Notify the ambassador
-        Notification.objects.create(
-            user=ambassador,
-            title="Commission Rates Updated",
-            message=f"Your commission rates have been updated by an administrator. New rates: Escorts: {escort_rate}%, Ambassadors: {ambassador_rate}%",
-            notification_type="system",
+        # Profile rates (used for future commissions) and existing custom rates,
+        # bulk notifications, queued Telegram message and audit entry
+        result = change_specific_rates(
+            User.objects.filter(id=ambassador.id),
+            escort_rate,
+            ambassador_rate,
+            admin_user=request.user,
+            scope="single",
+            parameters={"user_id": str(ambassador.id)},
+            dry_run=bool(request.POST.get("dry_run")),
         )
-
-        # Envoyer une notification Telegram
-        try:
-            from .telegram_bot import TelegramNotifier
-
-            notifier = TelegramNotifier()
-
-            if ambassador.telegram_chat_id:
-                # Messages multilingues
-                languages = {
-                    "en": f"Your commission rates have been updated:\n\n• Escort referrals: {escort_rate}%\n• Ambassador referrals: {ambassador_rate}%",
-                    "fr": f"Vos taux de commission ont été mis à jour:\n\n• Parrainages d'escortes: {escort_rate}%\n• Parrainages d'ambassadeurs: {ambassador_rate}%",
-                    "es": f"Sus tasas de comisión han sido actualizadas:\n\n• Referencias de escorts: {escort_rate}%\n• Referencias de embajadores: {ambassador_rate}%",
-                    "de": f"Ihre Provisionssätze wurden aktualisiert:\n\n• Escort-Empfehlungen: {escort_rate}%\n• Botschafter-Empfehlungen: {ambassador_rate}%",
-                    "ru": f"Ваши комиссионные ставки были обновлены:\n\n• Рефералы эскортов: {escort_rate}%\n• Рефералы амбассадоров: {ambassador_rate}%",
-                    "zh": f"您的佣金率已更新:\n\n• 伴游推荐: {escort_rate}%\n• 大使推荐: {ambassador_rate}%",
-                    "it": f"I tuoi tassi di commissione sono stati aggiornati:\n\n• Referral escort: {escort_rate}%\n• Referral ambasciatori: {ambassador_rate}%",
-                    "ar": f"تم تحديث معدلات العمولة الخاصة بك:\n\n• إحالات المرافقات: {escort_rate}%\n• إحالات السفراء: {ambassador_rate}%",
-                }
-
-                # Déterminer la langue de l'utilisateur
-                lang = (
-                    ambassador.telegram_language
-                    if ambassador.telegram_language in languages
-                    else "en"
-                )
-                message = languages[lang]
-
-                # Titre de la notification
-                titles = {
-                    "en": "Commission Rates Updated",
-                    "fr": "Taux de commission mis à jour",
-                    "es": "Tasas de comisión actualizadas",
-                    "de": "Provisionssätze aktualisiert",
-                    "ru": "Комиссионные ставки обновлены",
-                    "zh": "佣金率已更新",
-                    "it": "Tassi di commissione aggiornati",
-                    "ar": "تم تحديث معدلات العمولة",
+        if result.dry_run:
+            return JsonResponse(
+                {
+                    "dry_run": True,
+                    "pending_commissions": result.pending_commissions,
+                    "pending_amount": str(result.pending_amount),
+                    "projected_amount": str(result.projected_amount),
                 }
-                title = titles.get(lang, titles["en"])
-
-                # Envoyer la notification
-                notifier.send_message(
-                    chat_id=ambassador.telegram_chat_id,
-                    message=f"*{title}*\n\n{message}",
-                )
-        except Exception as e:
-            # Log the change
-            logger = logging.getLogger("django")
-            logger.error(f"Error sending Telegram notification: {str(e)}")
+            )
 
         # Log the change
+        logger = logging.getLogger("django")
         logger.info(
             f"Admin {request.user.username} updated commission rates for {ambassador.username}. Escort: {escort_rate}%, Ambassador: {ambassador_rate}%"
         )
@@ -1417,6 +1251,24 @@ def update_specific_rates(request):
     return redirect("dashboard:manage_ambassadors")
 
 
+def _report_payout_batch(request, batch, target=""):
+    """Message du paiement en masse, avec les commissions en attente ignorées."""
+    if batch.commission_count > 0:
+        messages.success(
+            request,
+            f"{batch.commission_count} commission(s){target} marquée(s) comme payée(s) "
+            f"pour un total de {batch.total}€.",
+        )
+    elif not batch.skipped:
+        messages.info(request, f"Aucune commission à payer{target}.")
+    if batch.skipped:
+        messages.warning(
+            request,
+            f"{batch.skipped} commission(s){target} non approuvée(s) ignorée(s) : "
+            "seules les commissions approuvées peuvent être payées.",
+        )
+
+
 @login_required
 def admin_commissions(request):
     """Page d'administration des commissions."""
@@ -1464,14 +1316,14 @@ def admin_commissions(request):
             created_at__gte=start_date,
             created_at__lte=end_date,
         )
-        .select_related("referral", "referral__referrer")
+        .select_related("user", "referral")
         .order_by("-created_at")
     )
 
     # Récupérer les commissions récemment payées
     approved_commissions = (
         Commission.objects.filter(status="paid", paid_at__gte=start_date, paid_at__lte=end_date)
-        .select_related("referral", "referral__referrer")
+        .select_related("user", "referral")
         .order_by("-paid_at")[:50]
     )  # Limiter à 50 pour performance
 
@@ -1487,25 +1339,13 @@ def admin_commissions(request):
                 print(f"Commission IDs: {commission_ids}")  # Debug
 
                 if commission_ids:
-                    batch_id = f"BATCH-{uuid.uuid4().hex[:8]}"
-                    count = 0
-                    total_amount = 0
-
-                    for commission_id in commission_ids:
-                        try:
-                            commission = Commission.objects.get(id=commission_id)
-                            if commission.status in ["pending", "approved"]:
-                                commission.mark_as_paid(batch_id=batch_id)
-                                count += 1
-                                total_amount += commission.amount
-                        except Commission.DoesNotExist:
-                            print(f"Commission {commission_id} non trouvée")  # Debug
-                            continue
-
-                    messages.success(
-                        request,
-                        f"{count} commission(s) marquée(s) comme payée(s) pour un total de {total_amount}€.",
+                    # Verrouillage, UPDATE et paiements par ambassadeur en un seul lot
+                    batch = pay_commissions(
+                        Commission.objects.filter(id__in=commission_ids),
+                        admin_user=request.user,
                     )
+
+                    _report_payout_batch(request, batch)
                     return redirect("dashboard:admin_commissions")
 
             elif action == "mark_single_paid":
@@ -1541,26 +1381,8 @@ def admin_commissions(request):
                     return redirect("dashboard:admin_commissions")
 
             elif action == "mark_all_paid":
-                batch_id = f"BATCH-{uuid.uuid4().hex[:8]}"
-                count = 0
-                total_amount = 0
-
-                for commission in pending_commissions:
-                    try:
-                        success = commission.mark_as_paid(batch_id=batch_id)
-                        if success:
-                            count += 1
-                            total_amount += commission.amount
-                    except Exception as e:
-                        print(f"Erreur sur commission {commission.id}: {str(e)}")  # Debug
-
-                if count > 0:
-                    messages.success(
-                        request,
-                        f"{count} commission(s) marquée(s) comme payée(s) pour un total de {total_amount}€.",
-                    )
-                else:
-                    messages.info(request, "Aucune commission à payer.")
+                batch = pay_commissions(pending_commissions, admin_user=request.user)
+                _report_payout_batch(request, batch)
                 return redirect("dashboard:admin_commissions")
 
             elif action == "mark_paid" and request.POST.get("ambassador_id"):
@@ -1569,37 +1391,15 @@ def admin_commissions(request):
 
                 try:
                     ambassador = User.objects.get(id=ambassador_id)
-                    batch_id = f"BATCH-AMB-{uuid.uuid4().hex[:8]}"
-                    count = 0
-                    total_amount = 0
 
                     # Marquer toutes les commissions de cet ambassadeur comme payées
-                    ambassador_commissions = pending_commissions.filter(
-                        referral__referrer=ambassador
+                    batch = pay_commissions(
+                        pending_commissions.filter(user=ambassador),
+                        admin_user=request.user,
+                        reference=f"BATCH-AMB-{uuid.uuid4().hex[:8]}",
                     )
-                    print(
-                        f"Nombre de commissions pour cet ambassadeur: {ambassador_commissions.count()}"
-                    )  # Debug
 
-                    for commission in ambassador_commissions:
-                        try:
-                            success = commission.mark_as_paid(batch_id=batch_id)
-                            if success:
-                                count += 1
-                                total_amount += commission.amount
-                        except Exception as e:
-                            print(f"Erreur sur commission {commission.id}: {str(e)}")  # Debug
-
-                    if count > 0:
-                        messages.success(
-                            request,
-                            f"{count} commission(s) pour {ambassador.username} marquée(s) comme payée(s) pour un total de {total_amount}€.",
-                        )
-                    else:
-                        messages.info(
-                            request,
-                            f"Aucune commission à payer pour {ambassador.username}.",
-                        )
+                    _report_payout_batch(request, batch, f" pour {ambassador.username}")
 
                 except User.DoesNotExist:
                     messages.error(request, "Ambassadeur non trouvé.")
@@ -1634,7 +1434,8 @@ def admin_commissions(request):
     commissions_by_ambassador = {}
 
     for commission in pending_commissions:
-        ambassador = commission.referral.referrer
+        # Bénéficiaire de la commission (parrain direct ou indirect)
+        ambassador = commission.user
         if ambassador not in commissions_by_ambassador:
             commissions_by_ambassador[ambassador] = {
                 "count": 0,
@@ -1710,7 +1511,7 @@ def user_profile(request, username):
 
     # Récupérer toutes les commissions pour les calculs
     if user.is_ambassador:
-        all_commissions = Commission.objects.filter(referral__referrer=user)
+        all_commissions = Commission.objects.filter(user=user)
         # Récupérer les commissions limitées pour l'affichage
         commissions = all_commissions.select_related("referral", "referral__referrer").order_by(
             "-created_at"
@@ -0,0 +1,239 @@
+"""
+Benchmark WSGI (workers synchrones) contre ASGI (vues asynchrones).
+
+À nombre de workers égal, compare le débit et la latence des endpoints
+dominés par les E/S : pixel de suivi et liste publique des white labels.
+
+- WSGI : ``core.wsgi`` et les vues synchrones ; chaque worker (un processus,
+  comme un worker gunicorn ``sync``) traite une requête à la fois ;
+- ASGI : ``core.asgi`` et les vues asynchrones ; chaque worker (une boucle
+  asyncio, comme un worker uvicorn) garde ``--concurrency`` requêtes en vol.
+
+La latence réseau d'une base distante est simulée par ``--db-latency``
+millisecondes ajoutées à chaque requête SQL. Chaque worker est un processus
+distinct (la configuration d'URL est figée à l'import) avec sa propre base
+SQLite temporaire ; les workers d'un même mode démarrent ensemble.
+
+    python -m benchmarks.bench_asgi --workers 2 --concurrency 50 --requests 2000
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+ENDPOINTS = {
+    "pixel": "/affiliate/track/{code}/",
+    "whitelabels": "/api/public/whitelabels/",
+}
+
+
+def _percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))] if values else 0.0
+
+
+def _setup(args):
+    from django.conf import settings
+
+    # Base fichier propre au worker : survit aux fermetures de connexion
+    settings.DATABASES["default"]["TEST"] = {"NAME": args.database}
+    # Clics synthétiques spoolés dans le répertoire temporaire, hors du dépôt
+    settings.AFFILIATE_CLICK_SPOOL_DIR = os.path.join(
+        os.path.dirname(args.database), f"click_spool-{os.getpid()}"
+    )
+
+    from benchmarks.common import create_ambassador, setup_django
+
+    setup_django()
+
+    from django.db.backends.signals import connection_created
+
+    from apps.affiliate.models import WhiteLabel
+
+    def slow_execute(execute, sql, params, many, context):
+        time.sleep(args.db_latency / 1000)
+        return execute(sql, params, many, context)
+
+    def add_latency(sender, connection, **kwargs):
+        # Le wrapper de connexion survit aux reconnexions de fin de requête
+        if slow_execute not in connection.execute_wrappers:
+            connection.execute_wrappers.append(slow_execute)
+
+    connection_created.connect(add_latency, weak=False)
+
+    ambassador = create_ambassador()
+    for index in range(3):  # Maximum autorisé par ambassadeur
+        WhiteLabel.objects.create(
+            ambassador=ambassador, name=f"Bench {index}", domain=f"bench{index}.example.com"
+        )
+    return ambassador.referral_code
+
+
+def run_wsgi(args, path):
+    """Un worker synchrone : les requêtes sont traitées l'une après l'autre."""
+    from django.core.wsgi import get_wsgi_application
+    from django.test.client import RequestFactory
+
+    application = get_wsgi_application()
+    factory = RequestFactory()
+    latencies = []
+
+    start = time.perf_counter()
+    for _ in range(args.requests):
+        environ = factory._base_environ(PATH_INFO=path, REQUEST_METHOD="GET")
+        begin = time.perf_counter()
+        statuses = []
+        body = application(environ, lambda status, headers: statuses.append(status))
+        b"".join(body)
+        latencies.append(time.perf_counter() - begin)
+        assert statuses[0].startswith("200"), statuses
+    return time.perf_counter() - start, latencies
+
+
+def run_asgi(args, path):
+    """Un worker ASGI : une boucle asyncio avec ``--concurrency`` requêtes en vol."""
+    from django.core.asgi import get_asgi_application
+
+    application = get_asgi_application()
+    latencies = []
+
+    async def request():
+        scope = {
+            "type": "http",
+            "asgi": {"version": "3.0"},
+            "http_version": "1.1",
+            "method": "GET",
+            "scheme": "http",
+            "path": path,
+            "raw_path": path.encode(),
+            "query_string": b"",
+            "root_path": "",
+            "headers": [(b"host", b"testserver"), (b"user-agent", b"bench/1.0")],
+            "client": ("127.0.0.1", 50000),
+            "server": ("testserver", 80),
+        }
+        messages = []
+
+        async def receive():
+            return {"type": "http.request", "body": b"", "more_body": False}
+
+        async def send(message):
+            messages.append(message)
+
+        begin = time.perf_counter()
+        await application(scope, receive, send)
+        latencies.append(time.perf_counter() - begin)
+        assert messages[0]["status"] == 200, messages[0]
+
+    async def worker():
+        semaphore = asyncio.Semaphore(args.concurrency)
+
+        async def limited():
+            async with semaphore:
+                await request()
+
+        await asyncio.gather(*(limited() for _ in range(args.requests)))
+
+    start = time.perf_counter()
+    asyncio.run(worker())
+    return time.perf_counter() - start, latencies
+
+
+def child(args):
+    """Processus worker : prépare sa base puis mesure chaque endpoint au signal du parent."""
+    code = _setup(args)
+    runner = run_asgi if args.mode == "asgi" else run_wsgi
+    for template in ENDPOINTS.values():
+        path = template.format(code=code)
+        runner(args, path)  # Échauffement (caches, connexions)
+        print("ready", flush=True)
+        sys.stdin.readline()
+        elapsed, latencies = runner(args, path)
+        print(json.dumps({"elapsed": elapsed, "latencies": latencies}), flush=True)
+
+
+def run_mode(args, mode, tmp):
+    """Lance ``--workers`` processus du mode donné et agrège leurs mesures."""
+    env = dict(os.environ, AFFILIATE_ASYNC_VIEWS=str(mode == "asgi"))
+    env.setdefault("DJANGO_SETTINGS_MODULE", "core.settings.bench")
+    workers = [
+        subprocess.Popen(
+            [sys.executable, "-m", "benchmarks.bench_asgi", *sys.argv[1:], "--mode", mode]
+            + ["--database", os.path.join(tmp, f"{mode}-{index}.sqlite3")],
+            env=env,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            text=True,
+        )
+        for index in range(args.workers)
+    ]
+
+    def read_line(worker, prefix):
+        while True:
+            line = worker.stdout.readline()
+            if not line:
+                raise RuntimeError(f"Le worker {mode} s'est arrêté prématurément")
+            if line.startswith(prefix):
+                return line
+
+    results = {}
+    for name in ENDPOINTS:
+        for worker in workers:
+            read_line(worker, "ready")
+        # Tous les workers démarrent ensemble
+        for worker in workers:
+            worker.stdin.write("go\n")
+            worker.stdin.flush()
+        measures = [json.loads(read_line(worker, "{")) for worker in workers]
+        latencies = [value for measure in measures for value in measure["latencies"]]
+        results[name] = {
+            "rps": sum(args.requests / measure["elapsed"] for measure in measures),
+            "p50": _percentile(latencies, 0.50) * 1000,
+            "p95": _percentile(latencies, 0.95) * 1000,
+        }
+    for worker in workers:
+        worker.wait()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=1000, help="Requêtes par worker")
+    parser.add_argument("--db-latency", type=float, default=20.0)
+    parser.add_argument("--mode", choices=("wsgi", "asgi"), help=argparse.SUPPRESS)
+    parser.add_argument("--database", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        child(args)
+        return
+
+    print(
+        f"{args.workers} worker(s), {args.concurrency} requêtes en vol par worker ASGI, "
+        f"latence SQL simulée {args.db_latency} ms"
+    )
+    with tempfile.TemporaryDirectory() as tmp:
+        results = {mode: run_mode(args, mode, tmp) for mode in ("wsgi", "asgi")}
+
+    for name in ENDPOINTS:
+        for mode in ("wsgi", "asgi"):
+            data = results[mode][name]
+            label = f"{name} {mode.upper()}"
+            print(
+                f"{label:<25} {data['rps']:10.1f} req/s   p50 {data['p50']:7.1f} ms   "
+                f"p95 {data['p95']:7.1f} ms"
+            )
+        gain = results["asgi"][name]["rps"] / results["wsgi"][name]["rps"]
+        print(f"{'Gain ' + name:<25} x{gain:.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+Benchmark du paiement des commissions d'un mois.
+
+Crée ``--commissions`` commissions approuvées réparties entre ``--ambassadors``
+ambassadeurs, puis les paie :
+
+- une par une, comme l'ancienne boucle du tableau de bord (``save()`` par
+  commission, avec ses signaux et ses événements d'outbox), sur un échantillon ;
+- en un lot avec ``pay_commissions`` (un ``UPDATE``, un paiement par ambassadeur).
+
+    python -m benchmarks.bench_bulk_payout --commissions 20000
+"""
+
+import argparse
+import time
+from decimal import Decimal
+
+from benchmarks.common import setup_django
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--commissions", type=int, default=20_000)
+    parser.add_argument("--ambassadors", type=int, default=200)
+    args = parser.parse_args()
+
+    setup_django()
+
+    from django.utils import timezone
+
+    from apps.accounts.models import User
+    from apps.affiliate.models import Commission, OutboxEvent, Payout, Referral
+    from apps.affiliate.services.bulk_payout import pay_commissions
+
+    User.objects.bulk_create(
+        [
+            User(username=f"amb{index}", referral_code=f"AMB{index}", user_type="ambassador")
+            for index in range(args.ambassadors)
+        ]
+    )
+    ambassadors = list(User.objects.filter(user_type="ambassador"))
+    buyer = User.objects.create(username="buyer", referral_code="BUYER", user_category="escort")
+    referrals = Referral.objects.bulk_create(
+        [
+            Referral(referrer=ambassador, referred=buyer, referral_code=ambassador.referral_code)
+            for ambassador in ambassadors
+        ]
+    )
+
+    def create_commissions(count):
+        now = timezone.now()
+        Commission.objects.bulk_create(
+            [
+                Commission(
+                    user=ambassadors[index % len(ambassadors)],
+                    referral=referrals[index % len(referrals)],
+                    amount=Decimal("12.50"),
+                    status="approved",
+                    approved_at=now,
+                )
+                for index in range(count)
+            ],
+            batch_size=1000,
+        )
+
+    def report(label, count, elapsed):
+        print(f"{label:<32} {count:>7} commissions  {elapsed:8.3f}s  {count / elapsed:10.1f} /s")
+
+    # Ancienne boucle : mesurée sur un échantillon, extrapolée au mois
+    sample = max(args.commissions // 20, 1)
+    create_commissions(sample)
+    start = time.perf_counter()
+    for commission in Commission.objects.filter(status="approved"):
+        commission.status = "paid"
+        commission.paid_at = timezone.now()
+        commission.save()
+    elapsed = time.perf_counter() - start
+    report("Une commission à la fois", sample, elapsed)
+    print(
+        f"{'  extrapolé au mois':<32} {args.commissions:>7} commissions  "
+        f"{elapsed * args.commissions / sample:8.1f}s"
+    )
+
+    create_commissions(args.commissions)
+    events = OutboxEvent.objects.count()
+    start = time.perf_counter()
+    batch = pay_commissions(Commission.objects.filter(status="approved"))
+    elapsed = time.perf_counter() - start
+    report("pay_commissions (un lot)", batch.commission_count, elapsed)
+    print(
+        f"{len(batch.payouts)} paiements créés ({batch.total} €), "
+        f"{OutboxEvent.objects.count() - events} événements d'outbox, "
+        f"{Payout.commissions.through.objects.count()} liens paiement-commission"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Benchmark du moteur de commissions multi-niveaux.
+
+Construit un réseau de parrainage de ``--depth`` niveaux puis importe
+``--transactions`` transactions de filleuls en bout de lignée, d'abord une
+par une (``batch_size=1``, équivalent d'un traitement ligne à ligne), puis
+par lots. Affiche le débit en transactions par seconde.
+
+    python -m benchmarks.bench_commission_engine --transactions 20000
+"""
+
+import argparse
+import time
+from decimal import Decimal
+
+from benchmarks.common import setup_django
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--transactions", type=int, default=20_000)
+    parser.add_argument("--buyers", type=int, default=500)
+    parser.add_argument("--depth", type=int, default=3)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    setup_django()
+
+    from apps.accounts.models import User
+    from apps.affiliate.models import Commission, Referral
+    from apps.affiliate.services.commission_engine import (
+        CommissionTransaction,
+        create_transaction_commissions,
+    )
+
+    def create_user(name, parent=None, category="ambassador"):
+        user = User.objects.create(
+            username=name,
+            referral_code=name.upper()[:10],
+            referred_by=parent,
+            user_type="ambassador",
+            user_category=category,
+        )
+        if parent:
+            Referral.objects.create(
+                referrer=parent, referred=user, referral_code=parent.referral_code
+            )
+        return user
+
+    parent = None
+    for level in range(args.depth):
+        parent = create_user(f"amb{level}", parent)
+    buyers = [create_user(f"esc{index}", parent, "escort") for index in range(args.buyers)]
+
+    def transactions(prefix, count):
+        return [
+            CommissionTransaction(
+                transaction_id=f"{prefix}-{index}",
+                user_id=buyers[index % len(buyers)].id,
+                amount=Decimal("100.00"),
+            )
+            for index in range(count)
+        ]
+
+    def timed(label, batch, batch_size):
+        start = time.perf_counter()
+        created = create_transaction_commissions(batch, batch_size=batch_size)
+        elapsed = time.perf_counter() - start
+        print(
+            f"{label:<30} {len(batch):>7} transactions  {len(created):>7} commissions  "
+            f"{elapsed:8.3f}s  {len(batch) / elapsed:10.1f} tx/s"
+        )
+
+    # Le ligne à ligne est nettement plus lent : on le mesure sur un échantillon
+    timed("Une transaction à la fois", transactions("row", args.transactions // 10), 1)
+    timed(f"Lots de {args.batch_size}", transactions("batch", args.transactions), args.batch_size)
+
+    start = time.perf_counter()
+    replayed = create_transaction_commissions(transactions("batch", args.transactions))
+    elapsed = time.perf_counter() - start
+    print(f"{'Rejeu du même import':<30} {len(replayed):>7} commissions créées  {elapsed:8.3f}s")
+    print(f"{Commission.objects.count()} commissions en base")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+Benchmark de l'ingestion des inscriptions des sites partenaires.
+
+Envoie ``--events`` inscriptions réparties entre ``--ambassadors`` parrains :
+
+- une par une, comme ``register_external_escort`` (code de parrainage résolu,
+  ``create_user`` avec hachage du mot de passe par le hasheur de production,
+  ``Referral.objects.create``), sur un échantillon ;
+- par lots avec ``ingest_events`` ;
+- puis rejoue le même lot (aucune création attendue).
+
+Affiche le débit en événements par seconde.
+
+    python -m benchmarks.bench_external_signups --events 10000
+"""
+
+import argparse
+import time
+
+from benchmarks.common import setup_django
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--events", type=int, default=10_000)
+    parser.add_argument("--ambassadors", type=int, default=100)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    setup_django()
+
+    from django.test import override_settings
+
+    from apps.accounts.models import User
+    from apps.affiliate.models import Referral
+    from apps.affiliate.services.external_signups import ingest_events
+    from apps.affiliate.services.referral_resolver import get_referrer
+
+    User.objects.bulk_create(
+        [
+            User(username=f"amb{index}", referral_code=f"AMB{index}", user_type="ambassador")
+            for index in range(args.ambassadors)
+        ]
+    )
+
+    def events(prefix, count):
+        return [
+            {
+                "event": "signup",
+                "ref_code": f"AMB{index % args.ambassadors}",
+                "username": f"{prefix}{index}",
+                "email": f"{prefix}{index}@example.com",
+            }
+            for index in range(count)
+        ]
+
+    def report(label, count, elapsed):
+        print(f"{label:<34} {count:>7} événements  {elapsed:8.3f}s  {count / elapsed:10.1f} /s")
+
+    # Ancien traitement : un événement par requête, mot de passe haché (PBKDF2)
+    sample = max(args.events // 20, 1)
+    with override_settings(PASSWORD_HASHERS=["django.contrib.auth.hashers.PBKDF2PasswordHasher"]):
+        start = time.perf_counter()
+        for event in events("legacy", sample):
+            ambassador = get_referrer(event["ref_code"])
+            escort = User.objects.create_user(
+                username=event["username"],
+                email=event["email"],
+                password=User.objects.make_random_password(),
+                user_category="escort",
+                referred_by=ambassador,
+            )
+            Referral.objects.create(
+                referrer=ambassador, referred=escort, referral_code=event["ref_code"]
+            )
+        report("Un événement à la fois", sample, time.perf_counter() - start)
+
+    batch = events("escort", args.events)
+    start = time.perf_counter()
+    results = ingest_events(batch, batch_size=args.batch_size)
+    report(f"ingest_events (lots de {args.batch_size})", len(results), time.perf_counter() - start)
+
+    start = time.perf_counter()
+    replayed = ingest_events(batch, batch_size=args.batch_size)
+    report("Rejeu du même lot", len(replayed), time.perf_counter() - start)
+    print(
+        f"{sum(result['status'] == 'created' for result in results)} comptes créés, "
+        f"{sum(result['status'] == 'created' for result in replayed)} au rejeu, "
+        f"{Referral.objects.count()} parrainages en base"
+    )
+
+
+if __name__ == "__main__":
+    main()
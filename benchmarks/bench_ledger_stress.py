@@ -0,0 +1,209 @@
+"""
+Test de charge du grand livre des commissions (écrivains parallèles).
+
+Des threads écrivains créent des commissions multi-niveaux (moteur de
+commissions) et les font passer d'un statut à l'autre (approbation, paiement,
+rejet, actions de masse de l'admin) sur quelques ambassadeurs communs, pendant
+qu'un thread reporte périodiquement les écritures dans les instantanés de
+solde. À la fin, le solde de chaque ambassadeur (instantané + écritures) doit
+être égal, au centime près, à celui recalculé depuis les commissions.
+
+Pour comparaison, les mêmes threads incrémentent l'ancien champ
+``User.pending_commission`` en lecture-écriture : les mises à jour perdues
+apparaissent dans l'écart final.
+
+    python -m benchmarks.bench_ledger_stress --threads 8 --operations 300
+
+La base est un fichier SQLite temporaire (les écritures y sont sérialisées) ;
+pour une vraie concurrence, pointer ``DJANGO_SETTINGS_MODULE`` vers PostgreSQL.
+"""
+
+import argparse
+import os
+import random
+import tempfile
+import threading
+import time
+from decimal import Decimal
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--operations", type=int, default=300, help="Opérations par thread")
+    parser.add_argument("--ambassadors", type=int, default=3)
+    parser.add_argument("--snapshot-interval", type=float, default=0.2)
+    args = parser.parse_args()
+
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "core.settings.bench")
+    from django.conf import settings
+
+    # Base fichier partagée par les threads ; attente des verrous plutôt qu'échec immédiat
+    database = os.path.join(tempfile.mkdtemp(prefix="bench-ledger-"), "ledger.sqlite3")
+    settings.DATABASES["default"]["TEST"] = {"NAME": database}
+    settings.DATABASES["default"]["OPTIONS"] = {"timeout": 60}
+
+    from benchmarks.common import setup_django
+
+    setup_django()
+
+    from django.db import OperationalError, close_old_connections, transaction
+
+    from apps.accounts.models import User
+    from apps.affiliate.models import Commission, Referral
+    from apps.affiliate.services.commission_engine import (
+        CommissionTransaction,
+        create_transaction_commissions,
+    )
+    from apps.affiliate.services.commission_ledger import (
+        ambassador_balances,
+        record_ledger_transitions,
+        recompute_balance,
+        take_balance_snapshots,
+    )
+
+    def create_user(name, parent=None, category="ambassador"):
+        user = User.objects.create(
+            username=name,
+            referral_code=name.upper()[:10],
+            referred_by=parent,
+            user_type="ambassador",
+            user_category=category,
+        )
+        if parent:
+            Referral.objects.create(
+                referrer=parent, referred=user, referral_code=parent.referral_code
+            )
+        return user
+
+    # Chaîne d'ambassadeurs : chaque transaction crédite plusieurs niveaux à la fois
+    parent = None
+    ambassadors = []
+    for index in range(args.ambassadors):
+        parent = create_user(f"amb{index}", parent)
+        ambassadors.append(parent)
+    buyers = [create_user(f"esc{index}", parent, "escort") for index in range(20)]
+    ambassador_ids = [ambassador.id for ambassador in ambassadors]
+
+    stop = threading.Event()
+    counters = {"operations": 0, "retries": 0, "legacy_expected": 0}
+    lock = threading.Lock()
+
+    def retry(operation):
+        while True:
+            try:
+                return operation()
+            except OperationalError:
+                # SQLite : base verrouillée par un autre écrivain, on rejoue
+                with lock:
+                    counters["retries"] += 1
+                time.sleep(random.uniform(0, 0.01))
+
+    def transition(status, method):
+        commission = Commission.objects.filter(status=status).order_by("?").first()
+        if commission:
+            try:
+                getattr(commission, method)()
+            except Exception:
+                pass  # Transition refusée (statut déjà changé) : sans effet sur les soldes
+
+    def bulk_transition(from_status, to_status):
+        with transaction.atomic():
+            ids = list(
+                Commission.objects.filter(status=from_status).values_list("id", flat=True)[:5]
+            )
+            queryset = Commission.objects.filter(id__in=ids, status=from_status)
+            record_ledger_transitions(queryset, to_status)
+            queryset.update(status=to_status)
+
+    def legacy_increment():
+        # Ancienne mise à jour en lecture-écriture du solde sur la ligne User
+        user = User.objects.get(pk=random.choice(ambassador_ids))
+        user.pending_commission += Decimal("1.00")
+        user.save(update_fields=["pending_commission"])
+
+    def writer(seed):
+        rng = random.Random(seed)
+        try:
+            for index in range(args.operations):
+                choice = rng.random()
+                if choice < 0.4:
+                    transactions = [
+                        CommissionTransaction(
+                            transaction_id=f"tx-{seed}-{index}-{n}",
+                            user_id=rng.choice(buyers).id,
+                            amount=Decimal(rng.randint(10, 500)),
+                        )
+                        for n in range(rng.randint(1, 5))
+                    ]
+                    retry(lambda: create_transaction_commissions(transactions))
+                elif choice < 0.6:
+                    retry(lambda: transition("pending", "mark_as_approved"))
+                elif choice < 0.75:
+                    retry(lambda: transition("approved", "mark_as_paid"))
+                elif choice < 0.85:
+                    retry(lambda: transition("pending", "mark_as_rejected"))
+                else:
+                    retry(lambda: bulk_transition("approved", rng.choice(["paid", "rejected"])))
+                retry(legacy_increment)
+                with lock:
+                    counters["operations"] += 1
+                    counters["legacy_expected"] += 1
+        finally:
+            close_old_connections()
+
+    def snapshotter():
+        try:
+            while not stop.is_set():
+                retry(take_balance_snapshots)
+                time.sleep(args.snapshot_interval)
+        finally:
+            close_old_connections()
+
+    User.objects.filter(id__in=ambassador_ids).update(pending_commission=0)
+    start = time.perf_counter()
+    snapshot_thread = threading.Thread(target=snapshotter)
+    snapshot_thread.start()
+    writers = [threading.Thread(target=writer, args=(seed,)) for seed in range(args.threads)]
+    for thread in writers:
+        thread.start()
+    for thread in writers:
+        thread.join()
+    stop.set()
+    snapshot_thread.join()
+    elapsed = time.perf_counter() - start
+
+    print(
+        f"{counters['operations']} opérations sur {args.threads} threads en {elapsed:.2f}s "
+        f"({counters['retries']} reprises sur verrou), {Commission.objects.count()} commissions"
+    )
+
+    exact = True
+    for label in ("grand livre", "après instantané"):
+        if label == "après instantané":
+            take_balance_snapshots()
+        balances = ambassador_balances(ambassador_ids)
+        for ambassador in ambassadors:
+            expected = recompute_balance(ambassador.id)
+            balance = balances[ambassador.id]
+            ok = balance == expected
+            exact &= ok
+            print(
+                f"{label:<17} {ambassador.username:<6} {'OK   ' if ok else 'ÉCART'} "
+                f"attente {balance.pending} / disponible {balance.available} / payé {balance.paid}"
+                f" (recalcul : {expected.pending} / {expected.available} / {expected.paid})"
+            )
+
+    legacy_total = sum(
+        User.objects.filter(id__in=ambassador_ids).values_list("pending_commission", flat=True)
+    )
+    lost = counters["legacy_expected"] - legacy_total
+    print(
+        f"Ancien champ User.pending_commission : {legacy_total} pour "
+        f"{counters['legacy_expected']} incréments ({lost} mises à jour perdues)"
+    )
+    print("Soldes exacts" if exact else "ÉCART DÉTECTÉ")
+
+
+if __name__ == "__main__":
+    main()
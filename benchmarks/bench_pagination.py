@@ -0,0 +1,86 @@
+"""
+Benchmark de la pagination des clics : OFFSET contre curseur.
+
+Mesure le temps d'une page de l'API ``/api/referral-clicks/`` au début et au
+fond de la liste, avec l'ancienne pagination par numéro de page (OFFSET et
+COUNT(*)) puis avec la pagination par curseur sur ``(clicked_at, id)``.
+
+    python -m benchmarks.bench_pagination --clicks 200000
+"""
+
+import argparse
+import time
+
+from benchmarks.common import create_ambassador, setup_django
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--clicks", type=int, default=200_000)
+    parser.add_argument("--page-size", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    setup_django()
+
+    from django.utils import timezone
+    from rest_framework.pagination import PageNumberPagination
+    from rest_framework.test import APIClient
+
+    from apps.affiliate.api.pagination import KeysetCursorPagination
+    from apps.affiliate.api.views import ReferralClickViewSet
+    from apps.affiliate.models import ReferralClick
+    from apps.affiliate.services.keyset import encode_cursor
+
+    ambassador = create_ambassador()
+    now = timezone.now()
+    ReferralClick.objects.bulk_create(
+        (
+            ReferralClick(
+                user=ambassador,
+                referral_code=ambassador.referral_code,
+                ip_address="127.0.0.1",
+                user_agent="bench/1.0",
+                clicked_at=now - timezone.timedelta(seconds=index),
+            )
+            for index in range(args.clicks)
+        ),
+        batch_size=5000,
+    )
+
+    client = APIClient()
+    client.force_authenticate(ambassador)
+    last_page = args.clicks // args.page_size
+
+    # Curseur de la dernière page : clé de la dernière ligne de l'avant-dernière page
+    before_last = ReferralClick.objects.order_by("-clicked_at", "-id")[
+        (last_page - 1) * args.page_size - 1
+    ]
+    deep_cursor = encode_cursor([before_last.clicked_at.isoformat(), str(before_last.id)])
+
+    def timed(url):
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            response = client.get(url)
+            assert response.status_code == 200, response.status_code
+        return (time.perf_counter() - start) / args.repeat * 1000
+
+    base = f"/api/referral-clicks/?page_size={args.page_size}"
+    ReferralClickViewSet.pagination_class = PageNumberPagination
+    PageNumberPagination.page_size_query_param = "page_size"
+    offset_first = timed(base)
+    offset_deep = timed(f"{base}&page={last_page}")
+
+    ReferralClickViewSet.pagination_class = KeysetCursorPagination
+    cursor_first = timed(base)
+    cursor_deep = timed(f"{base}&cursor={deep_cursor}")
+
+    print(f"{args.clicks} clics, pages de {args.page_size}, dernière page n° {last_page}")
+    print(f"{'OFFSET + COUNT, page 1':<35} {offset_first:8.2f} ms")
+    print(f"{f'OFFSET + COUNT, page {last_page}':<35} {offset_deep:8.2f} ms")
+    print(f"{'Curseur, page 1':<35} {cursor_first:8.2f} ms")
+    print(f"{f'Curseur, page {last_page}':<35} {cursor_deep:8.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+Benchmark de la résolution des taux de commission.
+
+Résout le taux de ``--transactions`` transactions réparties entre
+``--ambassadors`` ambassadeurs (un tiers avec taux personnalisés) :
+
+- une requête ``CommissionRate`` par transaction, comme l'ancien
+  ``Commission.calculate_commission_amount`` ;
+- par lot avec ``RateTable``, table froide puis chaude ;
+- après la modification d'un taux (table invalidée).
+
+Affiche le temps et le nombre de requêtes SQL de chaque passe.
+
+    python -m benchmarks.bench_rate_resolver --transactions 10000
+"""
+
+import argparse
+import time
+from decimal import Decimal
+
+from benchmarks.common import setup_django
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--transactions", type=int, default=10_000)
+    parser.add_argument("--ambassadors", type=int, default=500)
+    args = parser.parse_args()
+
+    setup_django()
+
+    from django.db import connection
+
+    from apps.accounts.models import User
+    from apps.affiliate.models import DEFAULT_COMMISSION_RATES, CommissionRate
+    from apps.affiliate.services.rate_resolver import RateTable, get_resolver
+
+    User.objects.bulk_create(
+        [
+            User(username=f"amb{index}", referral_code=f"AMB{index}", user_type="ambassador")
+            for index in range(args.ambassadors)
+        ]
+    )
+    ambassador_ids = list(User.objects.filter(user_type="ambassador").values_list("id", flat=True))
+    CommissionRate.objects.bulk_create(
+        [
+            CommissionRate(ambassador_id=ambassador_id, target_type="escort", rate=Decimal("35.00"))
+            for ambassador_id in ambassador_ids[::3]
+        ]
+    )
+    targets = ("escort", "ambassador")
+    pairs = [
+        (ambassador_ids[index % len(ambassador_ids)], targets[index % 2])
+        for index in range(args.transactions)
+    ]
+
+    def legacy(ambassador_id, target):
+        rate = DEFAULT_COMMISSION_RATES.get(target, Decimal("0.00"))
+        try:
+            rate = CommissionRate.objects.get(ambassador_id=ambassador_id, target_type=target).rate
+        except CommissionRate.DoesNotExist:
+            pass
+        return rate
+
+    def batched():
+        rates = RateTable({ambassador_id for ambassador_id, _ in pairs})
+        return [rates.rate(ambassador_id, target) for ambassador_id, target in pairs]
+
+    def measure(label, resolve):
+        queries = []
+
+        def count(execute, sql, params, many, context):
+            queries.append(sql)
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(count):
+            start = time.perf_counter()
+            total = sum(resolve(), Decimal("0"))
+            elapsed = time.perf_counter() - start
+        print(
+            f"{label:<34} {len(pairs):>7} taux  {elapsed:8.3f}s  "
+            f"{len(queries):>6} requêtes  (somme {total})"
+        )
+
+    get_resolver().clear_local()
+    measure("Une requête par transaction", lambda: [legacy(*pair) for pair in pairs])
+    measure("RateTable (table froide)", batched)
+    measure("RateTable (table chaude)", batched)
+
+    rate = CommissionRate.objects.filter(ambassador_id=ambassador_ids[0]).first()
+    rate.rate = Decimal("40.00")
+    rate.save()
+    measure("RateTable (après un taux modifié)", batched)
+    measure("RateTable (table chaude)", batched)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+Benchmark du pixel de suivi ``track_click``.
+
+Compare le débit du pixel en insertion synchrone (avant : une requête
+utilisateur + un INSERT + la mise à jour des statistiques à chaque clic) et en
+mode tampon (après : simple ajout au spool, persistance par lots).
+Mesure également le coût du flush par lots.
+
+    python -m benchmarks.bench_tracking_pixel --requests 2000
+"""
+
+import argparse
+import tempfile
+import time
+
+from benchmarks.common import create_ambassador, measure, setup_django
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=2000)
+    args = parser.parse_args()
+
+    setup_django()
+
+    from django.test import Client, override_settings
+    from django.urls import reverse
+
+    from apps.affiliate.models import ReferralClick
+    from apps.affiliate.services import click_ingestion
+
+    ambassador = create_ambassador()
+    url = reverse("affiliate:track_click", args=[ambassador.referral_code])
+    client = Client(HTTP_USER_AGENT="bench/1.0")
+
+    def hit():
+        response = client.get(url)
+        assert response.status_code == 200
+
+    with override_settings(AFFILIATE_CLICK_BUFFER_ENABLED=False):
+        before = measure("pixel synchrone (avant)", args.requests, hit)
+
+    with tempfile.TemporaryDirectory() as spool_dir:
+        with override_settings(
+            AFFILIATE_CLICK_BUFFER_ENABLED=True,
+            AFFILIATE_CLICK_SPOOL_DIR=spool_dir,
+            AFFILIATE_CLICK_FLUSH_INTERVAL=1,
+        ):
+            click_ingestion._buffer = click_ingestion.SpoolClickBuffer()
+            after = measure("pixel tamponné, spool local (après)", args.requests, hit)
+
+            # Attendre la fermeture de la fenêtre de spool courante
+            time.sleep(1.1)
+            buffer = click_ingestion._buffer
+            start = time.perf_counter()
+            flushed = 0
+            while True:
+                read, _saved = click_ingestion.flush_click_buffer(buffer)
+                if not read:
+                    break
+                flushed += read
+            elapsed = time.perf_counter() - start
+            click_ingestion._buffer = None
+
+    print(f"{'flush par lots':<45} {flushed:>7} clics   {elapsed:8.3f}s")
+    print(f"Clics en base: {ReferralClick.objects.count()} (attendu: {2 * args.requests})")
+    print(f"Gain du pixel: x{after / before:.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+"""
+Outils communs aux benchmarks.
+
+Chaque script s'exécute depuis la racine du projet, par exemple :
+
+    python -m benchmarks.bench_tracking_pixel
+
+Par défaut, les scripts utilisent ``core.settings.bench`` (SQLite en mémoire).
+Pour mesurer contre PostgreSQL, exporter ``DJANGO_SETTINGS_MODULE`` vers une
+configuration pointant sur une base jetable : une base de test y est créée
+puis détruite.
+"""
+
+import os
+import time
+
+
+def setup_django():
+    """Initialise Django et crée une base de test vierge."""
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "core.settings.bench")
+
+    import django
+
+    django.setup()
+
+    from django.db import connection
+    from django.test.utils import setup_test_environment
+
+    setup_test_environment()
+    connection.creation.create_test_db(verbosity=0, autoclobber=True)
+
+
+def create_ambassador(username="bench_ambassador", referral_code="BENCH001"):
+    """Crée un ambassadeur de référence pour les scénarios de benchmark."""
+    from apps.accounts.models import User
+
+    return User.objects.create_user(
+        username=username,
+        email=f"{username}@example.com",
+        password="bench-password",
+        user_type="ambassador",
+        referral_code=referral_code,
+    )
+
+
+def measure(label, iterations, func):
+    """Exécute ``func`` ``iterations`` fois et affiche le débit obtenu."""
+    start = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    elapsed = time.perf_counter() - start
+    rate = iterations / elapsed if elapsed else float("inf")
+    print(f"{label:<45} {iterations:>7} appels  {elapsed:8.3f}s  {rate:10.1f} req/s")
+    return rate
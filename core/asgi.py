@@ -3,6 +3,10 @@ ASGI config for escortdollars project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Production (uvicorn workers, see README "Production"):
+
+    gunicorn core.asgi:application -k uvicorn.workers.UvicornWorker --workers 4
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.0/howto/deployment/asgi/
 """
@@ -12,5 +16,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "core.settings.base")
+# Servir les endpoints dominés par les E/S avec leurs vues asynchrones
+os.environ.setdefault("AFFILIATE_ASYNC_VIEWS", "True")
 
 application = get_asgi_application()
@@ -78,12 +78,15 @@ MIDDLEWARE = [
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
     "allauth.account.middleware.AccountMiddleware",
-    "apps.affiliate.middleware.AffiliateMiddleware",
-    "apps.affiliate.middleware.ReferralMiddleware",
+    "apps.affiliate.middleware.AttributionMiddleware",
 ]
 
 ROOT_URLCONF = "core.urls"
 
+# Vues asynchrones des endpoints dominés par les E/S (pixel, API publiques, webhook).
+# Activées par défaut par core.asgi (uvicorn) ; à laisser désactivées sous WSGI.
+AFFILIATE_ASYNC_VIEWS = os.environ.get("AFFILIATE_ASYNC_VIEWS", "False") == "True"
+
 TEMPLATES = [
     {
         "BACKEND": "django.template.backends.django.DjangoTemplates",
@@ -217,14 +220,43 @@ TELEGRAM_BOT_TOKEN = os.environ.get("TELEGRAM_BOT_TOKEN", "")
 TELEGRAM_BOT_USERNAME = "EscortDollarsBot"
 TELEGRAM_CHAT_ID = os.environ.get("TELEGRAM_CHAT_ID", "")
 
+# Dispatcher Telegram (`python manage.py run_telegram_dispatcher`)
+TELEGRAM_DISPATCHER_GLOBAL_RATE = 30  # Messages par seconde, tous chats confondus
+TELEGRAM_DISPATCHER_CHAT_RATE = 1  # Messages par seconde vers un même chat privé
+TELEGRAM_DISPATCHER_GROUP_RATE = 20 / 60  # Messages par seconde vers un même groupe
+TELEGRAM_DISPATCHER_BATCH_SIZE = 200  # Messages réclamés par passe
+TELEGRAM_DISPATCHER_MAX_CONNECTIONS = 20  # Connexions HTTP keep-alive partagées
+TELEGRAM_DISPATCHER_HTTP_TIMEOUT = 10  # Secondes
+TELEGRAM_DISPATCHER_MAX_ATTEMPTS = 6  # Tentatives avant échec définitif
+TELEGRAM_DISPATCHER_RETRY_BASE_DELAY = 5  # Secondes avant la 1re reprise (doublé ensuite)
+TELEGRAM_DISPATCHER_RETRY_MAX_DELAY = 10 * 60  # Délai max entre deux reprises
+TELEGRAM_DISPATCHER_LEASE = 2 * 60  # Secondes avant qu'un message réclamé soit repris
+TELEGRAM_DISPATCHER_POLL_INTERVAL = 1  # Secondes entre deux passes quand la file est vide
+
+# Regroupement des notifications Telegram par chat (voir apps/dashboard/telegram_digest.py)
+TELEGRAM_COALESCE_WINDOW = 30  # Secondes pendant lesquelles les notifications sont regroupées
+TELEGRAM_DIGEST_DAILY_HOUR = 9  # Heure locale du récapitulatif quotidien
+
 # Configuration du système d'affiliation
 AFFILIATE_REF_PARAM = "ref"  # Paramètre d'URL pour les codes d'affiliation
 AFFILIATE_COOKIE_NAME = "affiliate_code"  # Nom du cookie
 AFFILIATE_COOKIE_AGE = 60 * 60 * 24 * 30  # Durée du cookie (30 jours)
 AFFILIATE_FIRST_TOUCH = True
+AFFILIATE_ATTRIBUTION_SKIP_PREFIXES = (  # Chemins ignorés par le middleware d'attribution
+    STATIC_URL,
+    MEDIA_URL,
+    "/health/",
+    "/favicon.ico",
+    "/robots.txt",
+)
+# Clés HMAC des cookies d'attribution, par identifiant. Rotation : ajouter une clé,
+# la désigner comme courante et garder l'ancienne pendant AFFILIATE_COOKIE_AGE.
+AFFILIATE_ATTRIBUTION_KEY_ID = os.environ.get("AFFILIATE_ATTRIBUTION_KEY_ID", "k1")
+AFFILIATE_ATTRIBUTION_KEYS = {
+    "k1": os.environ.get("AFFILIATE_ATTRIBUTION_KEY", SECRET_KEY),
+}
 
 # NOUVELLES OPTIONS pour l'affiliation
-AFFILIATE_NOTIFICATION_MAX_RETRIES = 3  # Nombre max de tentatives pour envoyer une notification
 AFFILIATE_FORCE_UPDATE_REFERRER = False  # Si True, autorise le changement de parrain
 AFFILIATE_ALLOW_NON_AMBASSADOR_REFERRER = True  # Si True, permet aux non-ambassadeurs de parrainer
 AFFILIATE_DEBUG_MODE = True  # Si True, active les logs détaillés pour le système d'affiliation
@@ -232,6 +264,100 @@ AFFILIATE_SIGNUP_BONUS = Decimal(
     "10.00"
 )  # Montant de la commission pour l'inscription d'un ambassadeur
 
+# Redis partagé (tampons, caches). Vide = repli local sans Redis.
+REDIS_URL = os.environ.get("REDIS_URL", "")
+
+if REDIS_URL:
+    CACHES = {
+        "default": {
+            "BACKEND": "django_redis.cache.RedisCache",
+            "LOCATION": REDIS_URL,
+            "OPTIONS": {
+                "CLIENT_CLASS": "django_redis.client.DefaultClient",
+                # Un cache indisponible ne doit pas faire tomber les pages
+                "IGNORE_EXCEPTIONS": True,
+            },
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        }
+    }
+
+# Résolution des codes de parrainage (LRU local + cache partagé)
+AFFILIATE_REFERRAL_RESOLVER_CACHE = "default"  # Alias du cache partagé
+AFFILIATE_REFERRAL_RESOLVER_LRU_SIZE = 10_000  # Entrées max du LRU par processus
+AFFILIATE_REFERRAL_RESOLVER_LOCAL_TTL = 30  # Secondes dans le LRU local
+AFFILIATE_REFERRAL_RESOLVER_SHARED_TTL = 60 * 60  # Secondes dans le cache partagé
+AFFILIATE_REFERRAL_RESOLVER_NEGATIVE_TTL = 60  # Secondes pour un code invalide
+
+# Ingestion des clics de parrainage (pixel + liens de redirection)
+# Tampon actif par défaut avec Redis seulement : sans Redis, le spool local n'est vidé que si un
+# worker `flush_referral_clicks --loop` partage son répertoire (AFFILIATE_CLICK_BUFFER_ENABLED=True)
+AFFILIATE_CLICK_BUFFER_ENABLED = (
+    os.environ.get("AFFILIATE_CLICK_BUFFER_ENABLED", str(bool(REDIS_URL))) == "True"
+)  # Si False, chaque clic est inséré de manière synchrone
+AFFILIATE_CLICK_STREAM_KEY = "affiliate:clicks"  # Stream Redis des clics en attente
+AFFILIATE_CLICK_STREAM_MAXLEN = 1_000_000  # Taille max du stream avant troncature
+AFFILIATE_CLICK_SPOOL_DIR = BASE_DIR / "logs" / "click_spool"  # Spool local de repli
+AFFILIATE_CLICK_FLUSH_SIZE = int(
+    os.environ.get("AFFILIATE_CLICK_FLUSH_SIZE", 500)
+)  # Nombre de clics par lot
+AFFILIATE_CLICK_FLUSH_INTERVAL = float(
+    os.environ.get("AFFILIATE_CLICK_FLUSH_INTERVAL", 2)
+)  # Secondes entre deux passes du worker
+
+# Outbox des effets de bord (Telegram, Supabase) livrés par `process_outbox`
+AFFILIATE_OUTBOX_BATCH_SIZE = 100  # Événements réclamés par passe
+AFFILIATE_OUTBOX_WORKERS = int(
+    os.environ.get("AFFILIATE_OUTBOX_WORKERS", 4)
+)  # Threads de livraison
+AFFILIATE_OUTBOX_MAX_ATTEMPTS = 8  # Tentatives avant mise à l'écart (statut "dead")
+AFFILIATE_OUTBOX_RETRY_BASE_DELAY = 30  # Secondes avant la 1re reprise (doublé ensuite)
+AFFILIATE_OUTBOX_RETRY_MAX_DELAY = 60 * 60  # Délai max entre deux reprises
+AFFILIATE_OUTBOX_LEASE = 5 * 60  # Secondes avant qu'un événement réclamé soit repris
+AFFILIATE_OUTBOX_POLL_INTERVAL = 1  # Secondes entre deux passes quand la file est vide
+
+# Synchronisation Supabase (upserts groupés via l'outbox)
+AFFILIATE_SUPABASE_SYNC_BATCH_SIZE = 200  # Lignes max par requête upsert / update
+AFFILIATE_SUPABASE_SYNC_WINDOW = 2  # Secondes de regroupement des modifications d'une ligne
+
+# Pagination par curseur (listes longues de l'API et de l'administration)
+AFFILIATE_APPROXIMATE_COUNT_TTL = 5 * 60  # Secondes de cache d'un total estimé
+
+# Cache des statistiques des tableaux de bord (invalidé par version à chaque écriture)
+AFFILIATE_STATS_CACHE = "default"  # Alias du cache partagé
+AFFILIATE_STATS_CACHE_TTL = 24 * 60 * 60  # Filet de sécurité : l'invalidation est explicite
+AFFILIATE_STATS_LOCAL_CACHE_TTL = 60  # Secondes si le cache est propre au processus (LocMem)
+
+# Regroupement des calculs identiques concurrents (verrou court + clé de résultat)
+AFFILIATE_SINGLE_FLIGHT_CACHE = "default"  # Alias du cache partagé (Redis en production)
+AFFILIATE_SINGLE_FLIGHT_LOCK_TTL = 30  # Secondes avant qu'un verrou abandonné expire
+AFFILIATE_SINGLE_FLIGHT_RESULT_TTL = 10  # Secondes de partage du résultat calculé
+AFFILIATE_SINGLE_FLIGHT_WAIT = 10  # Attente max d'un résultat avant de calculer soi-même
+
+# Commissions multi-niveaux : part du taux du bénéficiaire pour chaque niveau de la lignée
+# (niveau 1 = parrain direct) ; le nombre d'éléments fixe la profondeur payée.
+AFFILIATE_COMMISSION_LEVEL_SHARES = ("1", "1", "0.5")
+
+# Résolution des taux de commission (table en mémoire par processus, version partagée)
+AFFILIATE_RATE_RESOLVER_CACHE = "default"  # Alias du cache portant la version des taux
+AFFILIATE_RATE_RESOLVER_MAX_ENTRIES = 100_000  # Ambassadeurs max en mémoire par processus
+AFFILIATE_RATE_RESOLVER_LOCAL_TTL = 30  # Secondes max d'un taux en mémoire (borne sans Redis)
+
+# Paiements externes par lots (tableau JSON ou NDJSON signé par X-Api-Signature)
+AFFILIATE_EXTERNAL_PAYMENTS_MAX_BATCH = 20_000  # Paiements max par appel
+AFFILIATE_EXTERNAL_PAYMENTS_MAX_BODY = 16 * 1024 * 1024  # Octets max du corps de requête
+
+# Inscriptions et parrainages des sites partenaires par lots (même format, même signature)
+AFFILIATE_EXTERNAL_EVENTS_MAX_BATCH = 10_000  # Événements max par appel
+AFFILIATE_EXTERNAL_EVENTS_MAX_BODY = 8 * 1024 * 1024  # Octets max du corps de requête
+
+# Grand livre des commissions : report périodique des écritures dans les instantanés de solde
+AFFILIATE_LEDGER_SNAPSHOT_INTERVAL = 5 * 60  # Secondes entre deux reports (mode --loop)
+
 # Crispy forms
 CRISPY_ALLOWED_TEMPLATE_PACKS = "bootstrap5"
 CRISPY_TEMPLATE_PACK = "bootstrap5"
@@ -0,0 +1,36 @@
+"""
+Configuration pour les benchmarks (``benchmarks/``).
+Base SQLite en mémoire et journalisation réduite pour mesurer le code, pas les logs.
+"""
+
+from .base import *
+
+DEBUG = False
+
+DATABASES = {
+    "default": {
+        "ENGINE": "django.db.backends.sqlite3",
+        "NAME": ":memory:",
+    }
+}
+
+# Utiliser un hasheur de mot de passe rapide pour créer les données de test
+PASSWORD_HASHERS = [
+    "django.contrib.auth.hashers.MD5PasswordHasher",
+]
+
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": True,
+    "handlers": {
+        "null": {
+            "class": "logging.NullHandler",
+        },
+    },
+    "loggers": {
+        "": {
+            "handlers": ["null"],
+            "level": "CRITICAL",
+        },
+    },
+}